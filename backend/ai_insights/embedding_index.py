@@ -0,0 +1,485 @@
+"""
+Локальный векторный индекс по содержимому шагов, отзывам и рекомендациям.
+
+Векторы хранятся на диске (AI_EMBEDDING_INDEX_DIR) в файле .npy и открываются
+через memory map, поэтому индекс не загружается в память процесса целиком.
+Каждое обновление записывает новую версию файлов и атомарно заменяет meta.json:
+читатели продолжают работать со своей версией до перезагрузки.
+Обновления из разных процессов выполняются по очереди под блокировкой файла
+LOCK_FILE в каталоге индекса, и каждое начинается с перечитывания meta.json.
+Обновление инкрементальное: заново векторизуются только новые и измененные
+документы (по хэшу текста)
+"""
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+from langchain_community.embeddings.openai import OpenAIEmbeddings
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from onboarding.feedback_models import StepFeedback
+from onboarding.models import OnboardingStep
+from .recommendations_models import AIRecommendationV2
+
+logger = logging.getLogger(__name__)
+
+META_FILE = 'meta.json'
+LOCK_FILE = 'index.lock'
+# Количество попыток открыть версию индекса, замененную другим процессом
+LOAD_ATTEMPTS = 3
+# Количество строк матрицы, обрабатываемых за один проход при поиске и копировании
+CHUNK_SIZE = 65536
+
+
+def iter_documents():
+    """
+    Документы индекса: шаги, комментарии к шагам и рекомендации
+
+    Yields:
+        tuple: (ключ вида "<тип>:<id>", текст)
+    """
+    steps = OnboardingStep.objects.values_list(
+        'id', 'name', 'description').order_by('id')
+    for step_id, name, description in steps.iterator(chunk_size=2000):
+        yield f'step:{step_id}', f'{name}\n{description}'.strip()
+
+    feedbacks = StepFeedback.objects.exclude(comment='').values_list(
+        'id', 'step__name', 'comment').order_by('id')
+    for feedback_id, step_name, comment in feedbacks.iterator(chunk_size=2000):
+        yield f'feedback:{feedback_id}', f'{step_name}\n{comment}'
+
+    recommendations = AIRecommendationV2.objects.values_list(
+        'id', 'title', 'recommendation_text').order_by('id')
+    for recommendation_id, title, text in recommendations.iterator(chunk_size=2000):
+        yield f'recommendation:{recommendation_id}', f'{title}\n{text}'
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+class LocalEmbeddingProvider:
+    """
+    Детерминированные векторы без обращения к сети: TF-IDF и TruncatedSVD.
+    Модель обучается на корпусе индекса при полной перестройке
+    """
+    name = 'local'
+    needs_fit = True
+
+    def __init__(self, dimensions=None):
+        self.dimensions = dimensions or getattr(settings, 'AI_EMBEDDING_DIMENSIONS', 128)
+        self.vectorizer = None
+        self.svd = None
+
+    def fit(self, texts):
+        self.vectorizer = TfidfVectorizer(
+            max_features=50000, sublinear_tf=True, ngram_range=(1, 2))
+        matrix = self.vectorizer.fit_transform(texts)
+
+        components = min(self.dimensions, matrix.shape[1] - 1, matrix.shape[0] - 1)
+        self.svd = None
+        if components >= 2:
+            self.svd = TruncatedSVD(n_components=components, random_state=42)
+            self.svd.fit(matrix)
+
+    def embed(self, texts):
+        matrix = self.vectorizer.transform(texts)
+        if self.svd is not None:
+            return _normalize(self.svd.transform(matrix))
+        return _normalize(matrix.toarray())
+
+
+class OpenAIEmbeddingProvider:
+    """
+    Векторы OpenAI; клиент создается один раз на провайдера
+    """
+    name = 'openai'
+    needs_fit = False
+
+    def __init__(self):
+        self.client = OpenAIEmbeddings(openai_api_key=getattr(
+            settings, 'OPENAI_API_KEY', os.getenv('OPENAI_API_KEY')))
+
+    def fit(self, texts):
+        pass
+
+    def embed(self, texts):
+        return _normalize(self.client.embed_documents(list(texts)))
+
+
+def get_embedding_provider(name=None):
+    """
+    Создает провайдера векторов по настройке AI_EMBEDDING_PROVIDER (local или openai)
+    """
+    name = name or getattr(settings, 'AI_EMBEDDING_PROVIDER', 'local')
+    if name == 'local':
+        return LocalEmbeddingProvider()
+    if name == 'openai':
+        return OpenAIEmbeddingProvider()
+    raise ValueError(f"Unknown embedding provider: {name}")
+
+
+class EmbeddingIndex:
+    """
+    Векторный индекс документов с поиском ближайших соседей по косинусной мере
+    """
+
+    # Локальная модель переобучается, когда корпус вырос во столько раз
+    REFIT_GROWTH = 2
+
+    def __init__(self, directory=None, provider_name=None):
+        self.directory = str(directory or getattr(
+            settings, 'AI_EMBEDDING_INDEX_DIR',
+            os.path.join(settings.BASE_DIR, 'embedding_index')))
+        self.provider_name = provider_name or getattr(
+            settings, 'AI_EMBEDDING_PROVIDER', 'local')
+        self.lock = threading.Lock()
+        self._reset()
+        self.load()
+
+    def _reset(self):
+        self.version = 0
+        self.keys = []
+        self.hashes = []
+        self.positions = {}
+        self.kinds = np.array([], dtype=object)
+        self.vectors = None
+        self.provider = None
+        self.fitted_documents = 0
+
+    @property
+    def size(self):
+        return len(self.keys)
+
+    def load(self):
+        """
+        Открывает текущую версию индекса с диска. Если файлы версии удалены
+        другим процессом между чтением meta.json и их открытием, meta.json
+        перечитывается
+
+        Returns:
+            bool: True, если индекс найден
+        """
+        for _ in range(LOAD_ATTEMPTS):
+            try:
+                with open(os.path.join(self.directory, META_FILE), encoding='utf-8') as meta_file:
+                    meta = json.load(meta_file)
+            except (OSError, ValueError):
+                return False
+
+            if meta.get('provider') != self.provider_name:
+                # Индекс построен другим провайдером, его векторы несовместимы
+                return False
+
+            try:
+                if meta['keys']:
+                    vectors = np.load(self._path('vectors', meta['version']), mmap_mode='r')
+                else:
+                    vectors = np.empty((0, meta['dimensions']), dtype=np.float32)
+                provider = self._load_provider(meta['version'])
+            except OSError:
+                # Версия заменена более новой, пока meta.json читался
+                continue
+
+            with self.lock:
+                self.version = meta['version']
+                self.keys = meta['keys']
+                self.hashes = meta['hashes']
+                self.fitted_documents = meta.get('fitted_documents', 0)
+                self.positions = {key: position for position, key in enumerate(self.keys)}
+                self.kinds = np.array([key.split(':', 1)[0] for key in self.keys], dtype=object)
+                self.vectors = vectors
+                self.provider = provider
+            return True
+
+        logger.warning(f"Could not open embedding index in {self.directory}: "
+                       f"files of the current version are missing")
+        return False
+
+    def refresh(self):
+        """
+        Перечитывает индекс, если на диске появилась более новая версия
+        """
+        try:
+            with open(os.path.join(self.directory, META_FILE), encoding='utf-8') as meta_file:
+                version = json.load(meta_file).get('version', 0)
+        except (OSError, ValueError):
+            return
+        if version != self.version:
+            self.load()
+
+    def sync(self, documents=None):
+        """
+        Приводит индекс в соответствие с документами: векторизует новые
+        и измененные документы, удаляет отсутствующие
+
+        Args:
+            documents: Итерируемое пар (ключ, текст); по умолчанию iter_documents()
+
+        Returns:
+            dict: Количество добавленных, обновленных и удаленных документов
+                и признак полной перестройки
+        """
+        documents = dict(iter_documents() if documents is None else documents)
+        hashes = {
+            key: hashlib.sha1(text.encode('utf-8')).hexdigest()
+            for key, text in documents.items()
+        }
+
+        with self._write_lock():
+            return self._sync(documents, hashes)
+
+    def _sync(self, documents, hashes):
+        provider = self.provider
+        if (self.vectors is None or provider is None or (
+                provider.needs_fit and len(documents) > self.fitted_documents * self.REFIT_GROWTH)):
+            return self._rebuild(documents, hashes)
+
+        current = dict(zip(self.keys, self.hashes))
+        changed = [key for key in documents if current.get(key) != hashes[key]]
+        removed = [key for key in current if key not in documents]
+        stats = {
+            'added': sum(1 for key in changed if key not in current),
+            'updated': sum(1 for key in changed if key in current),
+            'removed': len(removed),
+            'rebuilt': False,
+        }
+        if not changed and not removed:
+            return stats
+
+        # Неизмененные строки копируются из текущей версии, остальные векторизуются
+        changed_set = set(changed)
+        kept = [key for key in self.keys if key in documents and key not in changed_set]
+        new_vectors = provider.embed([documents[key] for key in changed]) if changed else None
+        self._write(
+            kept + changed,
+            [hashes[key] for key in kept + changed],
+            [self.positions[key] for key in kept],
+            new_vectors,
+            provider
+        )
+        return stats
+
+    def rebuild(self, documents=None, hashes=None):
+        """
+        Перестраивает индекс полностью (с переобучением локальной модели)
+        """
+        documents = dict(iter_documents() if documents is None else documents)
+        if hashes is None:
+            hashes = {
+                key: hashlib.sha1(text.encode('utf-8')).hexdigest()
+                for key, text in documents.items()
+            }
+
+        with self._write_lock():
+            return self._rebuild(documents, hashes)
+
+    def _rebuild(self, documents, hashes):
+        keys = list(documents)
+        provider = get_embedding_provider(self.provider_name)
+        texts = [documents[key] for key in keys]
+        vectors = None
+        if keys:
+            provider.fit(texts)
+            vectors = provider.embed(texts)
+        self._write(keys, [hashes[key] for key in keys], [], vectors, provider,
+                    fitted_documents=len(keys))
+        logger.info(f"Embedding index rebuilt: {len(keys)} documents")
+        return {'added': len(keys), 'updated': 0, 'removed': 0, 'rebuilt': True}
+
+    def similar(self, keys, k=5, kinds=None):
+        """
+        Ищет документы, похожие на документы индекса с указанными ключами
+
+        Args:
+            keys: Ключи документов-запросов
+            k (int): Количество соседей для каждого запроса
+            kinds: Типы документов в результатах (step, feedback, recommendation)
+
+        Returns:
+            dict: Списки пар (ключ, сходство) по ключам запросов;
+                ключи, отсутствующие в индексе, не возвращаются
+        """
+        known = [key for key in keys if key in self.positions]
+        if not known:
+            return {}
+        queries = np.asarray(self.vectors[[self.positions[key] for key in known]])
+        results = self._top_k(queries, k, kinds, [{key} for key in known])
+        return dict(zip(known, results))
+
+    def search(self, texts, k=5, kinds=None):
+        """
+        Ищет документы, похожие на произвольные тексты (пакетом для всех текстов)
+
+        Returns:
+            list: Списки пар (ключ, сходство) в порядке текстов
+        """
+        if not texts or not self.size or self.provider is None:
+            return [[] for _ in texts]
+        return self._top_k(self.provider.embed(texts), k, kinds, [set() for _ in texts])
+
+    def _top_k(self, queries, k, kinds, excluded):
+        """
+        Поиск k ближайших соседей для матрицы запросов по частям memory map
+        """
+        total = len(self.keys)
+        # Запасные кандидаты на случай, если в топ попали исключенные документы
+        limit = k + max((len(keys) for keys in excluded), default=0)
+        mask = np.isin(self.kinds, list(kinds)) if kinds else None
+
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, total, CHUNK_SIZE):
+            end = min(start + CHUNK_SIZE, total)
+            scores = queries @ np.asarray(self.vectors[start:end]).T
+            if mask is not None:
+                scores[:, ~mask[start:end]] = -np.inf
+
+            scores = np.concatenate([best_scores, scores], axis=1)
+            rows = np.concatenate(
+                [best_rows, np.broadcast_to(np.arange(start, end), (len(queries), end - start))],
+                axis=1)
+            if scores.shape[1] > limit:
+                top = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+                scores = np.take_along_axis(scores, top, axis=1)
+                rows = np.take_along_axis(rows, top, axis=1)
+            best_scores, best_rows = scores, rows
+
+        results = []
+        for query_scores, query_rows, query_excluded in zip(best_scores, best_rows, excluded):
+            matches = []
+            for position in np.argsort(-query_scores):
+                score = float(query_scores[position])
+                key = self.keys[query_rows[position]]
+                if score == -np.inf or key in query_excluded:
+                    continue
+                matches.append((key, score))
+                if len(matches) == k:
+                    break
+            results.append(matches)
+        return results
+
+    @contextmanager
+    def _write_lock(self):
+        """
+        Межпроцессная блокировка обновления индекса. Под блокировкой индекс
+        перечитывается с диска: версия и векторы могли измениться в другом
+        процессе
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, LOCK_FILE), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if not self.load():
+                    self._reset()
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _path(self, name, version):
+        extension = 'npy' if name == 'vectors' else 'pkl'
+        return os.path.join(self.directory, f'{name}-{version}.{extension}')
+
+    def _load_provider(self, version):
+        if self.provider_name != 'local':
+            return get_embedding_provider(self.provider_name)
+        # Отсутствующий файл (OSError) обрабатывает load
+        with open(self._path('provider', version), 'rb') as provider_file:
+            try:
+                return pickle.load(provider_file)
+            except pickle.UnpicklingError:
+                return None
+
+    def _write(self, keys, hashes, kept_rows, new_vectors, provider, fitted_documents=None):
+        """
+        Записывает новую версию индекса: строки kept_rows текущей версии,
+        затем new_vectors. Вызывается под _write_lock; файлы пишутся под
+        временными именами и переименовываются целиком
+        """
+        version = self.version + 1
+        suffix = f'.{uuid.uuid4().hex}.tmp'
+
+        if new_vectors is not None:
+            dimensions = new_vectors.shape[1]
+        else:
+            dimensions = self.vectors.shape[1] if self.vectors is not None else 0
+
+        if keys:
+            vectors_path = self._path('vectors', version)
+            vectors = np.lib.format.open_memmap(
+                vectors_path + suffix, mode='w+', dtype=np.float32,
+                shape=(len(keys), dimensions))
+            for start in range(0, len(kept_rows), CHUNK_SIZE):
+                rows = kept_rows[start:start + CHUNK_SIZE]
+                vectors[start:start + len(rows)] = self.vectors[rows]
+            if new_vectors is not None:
+                vectors[len(kept_rows):] = new_vectors
+            vectors.flush()
+            del vectors
+            os.replace(vectors_path + suffix, vectors_path)
+
+        if provider.needs_fit:
+            provider_path = self._path('provider', version)
+            with open(provider_path + suffix, 'wb') as provider_file:
+                pickle.dump(provider, provider_file)
+            os.replace(provider_path + suffix, provider_path)
+
+        meta = {
+            'version': version,
+            'provider': self.provider_name,
+            'dimensions': dimensions,
+            'fitted_documents': (
+                fitted_documents if fitted_documents is not None else self.fitted_documents),
+            'keys': keys,
+            'hashes': hashes,
+        }
+        meta_path = os.path.join(self.directory, META_FILE)
+        with open(meta_path + suffix, 'w', encoding='utf-8') as meta_file:
+            json.dump(meta, meta_file)
+        os.replace(meta_path + suffix, meta_path)
+
+        previous = self.version
+        self.load()
+        self._remove_version(previous)
+
+    def _remove_version(self, version):
+        # Открытые memory map других процессов остаются валидными после удаления
+        for name in ('vectors', 'provider'):
+            try:
+                os.remove(self._path(name, version))
+            except OSError:
+                continue
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_embedding_index():
+    """
+    Общий индекс процесса. Версия на диске перечитывается при каждом
+    обращении, если ее обновил другой процесс
+    """
+    global _index
+    directory = str(getattr(settings, 'AI_EMBEDDING_INDEX_DIR',
+                            os.path.join(settings.BASE_DIR, 'embedding_index')))
+    provider_name = getattr(settings, 'AI_EMBEDDING_PROVIDER', 'local')
+    with _index_lock:
+        if (_index is None or _index.directory != directory
+                or _index.provider_name != provider_name):
+            _index = EmbeddingIndex(directory, provider_name)
+        else:
+            _index.refresh()
+        return _index
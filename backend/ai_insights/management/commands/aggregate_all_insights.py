@@ -12,10 +12,17 @@ class Command(BaseCommand):
         self.stdout.write('Начинаем сбор и агрегацию инсайтов...')
 
         try:
-            count = SmartInsightsAggregatorService.aggregate_all_insights()
+            report = SmartInsightsAggregatorService.aggregate_all_insights()
+            for name, stage in report['stages'].items():
+                line = f"{name}: {stage['status']}, {stage['count']} инсайтов, {stage['duration']} с"
+                if stage['error']:
+                    self.stderr.write(self.style.ERROR(f"{line} ({stage['error']})"))
+                else:
+                    self.stdout.write(line)
             self.stdout.write(
                 self.style.SUCCESS(
-                    f'Успешно собрано и обработано {count} инсайтов')
+                    f"Успешно собрано и обработано {report['total']} инсайтов "
+                    f"за {report['duration']} с")
             )
         except Exception as e:
             logger.error(f"Ошибка при агрегации инсайтов: {e}")
@@ -1,30 +1,38 @@
 from django.core.management.base import BaseCommand
-from django.contrib.auth import get_user_model
 from ai_insights.services import AIRecommendationService
 
-User = get_user_model()
-
 
 class Command(BaseCommand):
     help = 'Генерирует AI-рекомендации для всех пользователей'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user-id-from',
+            type=int,
+            help='Обрабатывать пользователей с id не меньше указанного',
+        )
+        parser.add_argument(
+            '--user-id-to',
+            type=int,
+            help='Обрабатывать пользователей с id меньше указанного',
+        )
+
     def handle(self, *args, **options):
-        users = User.objects.all()
-        total_users = users.count()
-        success_count = 0
+        # Диапазоны id позволяют запускать несколько команд параллельно
+        user_filter = {}
+        if options.get('user_id_from') is not None:
+            user_filter['user_id__gte'] = options['user_id_from']
+        if options.get('user_id_to') is not None:
+            user_filter['user_id__lt'] = options['user_id_to']
 
-        for user in users:
-            try:
-                AIRecommendationService.generate_recommendations(user)
-                success_count += 1
-                self.stdout.write(self.style.SUCCESS(
-                    f'Успешно сгенерированы рекомендации для пользователя {user.email}'
-                ))
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(
-                    f'Ошибка при генерации рекомендаций для пользователя {user.email}: {str(e)}'
-                ))
+        try:
+            count = AIRecommendationService.generate_recommendations_bulk(user_filter)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(
+                f'Ошибка при генерации рекомендаций: {str(e)}'
+            ))
+            return
 
         self.stdout.write(self.style.SUCCESS(
-            f'Рекомендации успешно сгенерированы для {success_count} из {total_users} пользователей'
+            f'Создано {count} новых рекомендаций'
         ))
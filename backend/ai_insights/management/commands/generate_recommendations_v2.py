@@ -8,11 +8,40 @@ logger = logging.getLogger(__name__)
 class Command(BaseCommand):
     help = 'Генерирует AI-рекомендации v2 для всех пользователей'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Количество процессов; пользователи делятся между ними по диапазонам id',
+        )
+        parser.add_argument(
+            '--shard-size',
+            type=int,
+            default=AIRecommendationEngineV2.BATCH_SIZE,
+            help='Количество пользователей в одном диапазоне',
+        )
+        parser.add_argument(
+            '--user-id-from',
+            type=int,
+            help='Обрабатывать пользователей с id не меньше указанного',
+        )
+        parser.add_argument(
+            '--user-id-to',
+            type=int,
+            help='Обрабатывать пользователей с id меньше указанного',
+        )
+
     def handle(self, *args, **options):
         self.stdout.write('Начинаем генерацию AI-рекомендаций v2...')
 
         try:
-            count = AIRecommendationEngineV2.generate_all_recommendations()
+            count = AIRecommendationEngineV2.generate_all_recommendations(
+                workers=options['workers'],
+                shard_size=options['shard_size'],
+                user_id_from=options.get('user_id_from'),
+                user_id_to=options.get('user_id_to'),
+            )
             self.stdout.write(
                 self.style.SUCCESS(
                     f'Успешно сгенерировано {count} рекомендаций')
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from ai_insights.embedding_index import get_embedding_index
+
+
+class Command(BaseCommand):
+    help = 'Update the recommendation embedding index with new and changed documents'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Rebuild the index from scratch (refits the local embedding model)',
+        )
+
+    def handle(self, *args, **options):
+        index = get_embedding_index()
+        stats = index.rebuild() if options['rebuild'] else index.sync()
+        self.stdout.write(
+            f"Added: {stats['added']}, updated: {stats['updated']}, "
+            f"removed: {stats['removed']}, rebuilt: {stats['rebuilt']}, "
+            f"documents: {index.size}")
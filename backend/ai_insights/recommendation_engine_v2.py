@@ -1,93 +1,334 @@
-from users.models import User
-from onboarding.feedback_models import FeedbackMood, StepFeedback
-from onboarding.models import UserStepProgress
-from .models import AIRecommendation
 import logging
-from django.db.models import Count, Q
-from django.utils import timezone
-from django.db import transaction
-from django.conf import settings
-from langchain_community.embeddings.openai import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
 
+from django.db import connections
+from django.db.models import DurationField, ExpressionWrapper, F
+
+from onboarding.feedback_models import StepFeedback
+from onboarding.models import OnboardingStep, UserOnboardingAssignment, UserStepProgress
+from .embedding_index import get_embedding_index
 from .recommendations_models import AIRecommendationV2
-from .insights_models import AIInsightV2, InsightTag
+from .workers import close_worker_connections, init_django_worker
 
 logger = logging.getLogger(__name__)
 
 
+def _generate_shard(shard):
+    """
+    Генерирует рекомендации для диапазона id пользователей в процессе-обработчике
+
+    Returns:
+        int: Количество созданных рекомендаций
+    """
+    try:
+        return len(AIRecommendationEngineV2().generate_for_user_range(*shard))
+    finally:
+        close_worker_connections()
+
+
 class AIRecommendationEngineV2:
     """
-    Улучшенная версия движка рекомендаций с использованием векторного анализа и машинного обучения
+    Улучшенная версия движка рекомендаций с использованием векторного анализа.
+    Похожие шаги подбираются по локальному векторному индексу (embedding_index)
+    одним пакетным запросом на группу пользователей
     """
 
-    def __init__(self):
-        self.openai_api_key = settings.OPENAI_API_KEY
-        self.embeddings = OpenAIEmbeddings(openai_api_key=self.openai_api_key)
+    # Шаг считается медленным, если от планового начала до завершения прошло больше
+    SLOW_STEP_THRESHOLD = timedelta(days=3)
+    NEGATIVE_FEEDBACK_TAGS = ['negative', 'unclear_instruction', 'delay_warning']
+    RELATED_STEPS_LIMIT = 2
+    BATCH_SIZE = 500
+
+    def __init__(self, index=None):
+        self.index = index if index is not None else get_embedding_index()
 
     def generate_recommendations(self, user):
         """
         Генерирует рекомендации для пользователя на основе его прогресса и обратной связи
         """
-        try:
-            # Получаем данные о пользователе
-            user_steps = UserStepProgress.objects.filter(user=user)
-            user_feedback = StepFeedback.objects.filter(user=user)
-
-            # Анализируем прогресс пользователя
-            slow_steps = user_steps.filter(
-                completion_time__gt=timezone.timedelta(days=3),
-                status='completed'
-            )
+        return self.generate_for_users([user])
 
-            # Анализируем обратную связь
-            negative_feedback = user_feedback.filter(
-                mood__in=[FeedbackMood.CONFUSED, FeedbackMood.FRUSTRATED]
-            )
+    def generate_for_users(self, users):
+        """
+        Генерирует рекомендации для группы пользователей
 
-            recommendations = []
-
-            # Формируем рекомендации на основе медленного прогресса
-            if slow_steps.exists():
-                for step in slow_steps:
-                    recommendation = AIRecommendationV2.objects.create(
-                        user=user,
-                        title=f"Рекомендация по шагу: {step.step.title}",
-                        content=f"Мы заметили, что вы потратили больше времени на шаг '{step.step.title}'. "
-                        f"Рекомендуем обратить внимание на дополнительные материалы и возможно "
-                        f"запросить помощь у наставника.",
-                        recommendation_type="PROGRESS_IMPROVEMENT",
-                        priority="MEDIUM"
-                    )
-                    recommendations.append(recommendation)
-
-            # Формируем рекомендации на основе негативной обратной связи
-            if negative_feedback.exists():
-                for feedback in negative_feedback:
-                    recommendation = AIRecommendationV2.objects.create(
-                        user=user,
-                        title=f"Рекомендация по обратной связи: {feedback.step.title}",
-                        content=f"Мы заметили, что у вас возникли трудности с шагом '{feedback.step.title}'. "
-                        f"Рекомендуем посмотреть дополнительное видео по этой теме или "
-                        f"записаться на консультацию с экспертом.",
-                        recommendation_type="EXPERIENCE_IMPROVEMENT",
-                        priority="HIGH"
-                    )
-                    recommendations.append(recommendation)
-
-            return recommendations
+        Args:
+            users: Пользователи или их идентификаторы
 
-        except Exception as e:
-            logger.error(f"Error generating recommendations: {e}")
+        Returns:
+            list: Созданные рекомендации
+        """
+        user_ids = [getattr(user, 'id', user) for user in users]
+        return self._generate({'user_id__in': user_ids})
+
+    def generate_for_user_range(self, start_id, end_id):
+        """
+        Генерирует рекомендации для пользователей с id в диапазоне [start_id, end_id)
+        """
+        return self._generate({'user_id__gte': start_id, 'user_id__lt': end_id})
+
+    def _generate(self, user_filter):
+        """
+        Кандидаты вычисляются сгруппированными запросами сразу для всех
+        пользователей фильтра, дубликаты открытых рекомендаций отсекаются
+        одной выборкой, новые записи сохраняются через bulk_create
+        """
+        assignments = {}
+        for assignment_id, user_id, program_id in UserOnboardingAssignment.objects.filter(
+                status=UserOnboardingAssignment.AssignmentStatus.ACTIVE, **user_filter
+        ).order_by('assigned_at').values_list('id', 'user_id', 'program_id'):
+            assignments[(user_id, program_id)] = assignment_id
+        if not assignments:
+            return []
+
+        candidates = self._slow_step_candidates(user_filter, assignments) + \
+            self._negative_feedback_candidates(user_filter)
+        candidates = self._exclude_open(candidates, user_filter)
+        if not candidates:
             return []
 
+        step_ids = {candidate['step_id'] for candidate in candidates}
+        step_names = dict(OnboardingStep.objects.filter(
+            id__in=step_ids).values_list('id', 'name'))
+        related = self._related_steps(step_ids)
+        recommendations = [
+            self._build_recommendation(
+                candidate, step_names[candidate['step_id']],
+                related.get(candidate['step_id'], []))
+            for candidate in candidates
+        ]
+        return AIRecommendationV2.objects.bulk_create(recommendations, batch_size=1000)
+
+    def _slow_step_candidates(self, user_filter, assignments):
+        progress = UserStepProgress.objects.filter(
+            status=UserStepProgress.ProgressStatus.DONE,
+            completed_at__isnull=False,
+            planned_date_start__isnull=False,
+            **user_filter
+        ).annotate(
+            duration=ExpressionWrapper(
+                F('completed_at') - F('planned_date_start'), output_field=DurationField())
+        ).filter(duration__gt=self.SLOW_STEP_THRESHOLD).values_list(
+            'user_id', 'step_id', 'step__program_id')
+
+        candidates = []
+        for user_id, step_id, program_id in progress:
+            # Рекомендации привязываются к активному назначению программы шага
+            assignment_id = assignments.get((user_id, program_id))
+            if assignment_id is None:
+                continue
+            candidates.append({
+                'kind': AIRecommendationV2.RecommendationType.PROGRESS,
+                'user_id': user_id,
+                'assignment_id': assignment_id,
+                'step_id': step_id,
+            })
+        return candidates
+
+    def _negative_feedback_candidates(self, user_filter):
+        feedbacks = StepFeedback.objects.filter(
+            auto_tag__in=self.NEGATIVE_FEEDBACK_TAGS,
+            assignment__status=UserOnboardingAssignment.AssignmentStatus.ACTIVE,
+            **user_filter
+        ).values_list('user_id', 'assignment_id', 'step_id').distinct()
+        return [
+            {
+                'kind': AIRecommendationV2.RecommendationType.FEEDBACK,
+                'user_id': user_id,
+                'assignment_id': assignment_id,
+                'step_id': step_id,
+            }
+            for user_id, assignment_id, step_id in feedbacks
+        ]
+
+    def _exclude_open(self, candidates, user_filter):
+        """
+        Убирает кандидатов, для которых уже есть активная рекомендация
+        того же типа по тому же шагу, и повторы внутри пакета
+        """
+        if not candidates:
+            return []
+
+        seen = set(AIRecommendationV2.objects.filter(
+            status=AIRecommendationV2.RecommendationStatus.ACTIVE,
+            step_id__in={candidate['step_id'] for candidate in candidates},
+            **user_filter
+        ).values_list('user_id', 'step_id', 'recommendation_type'))
+
+        unique = []
+        for candidate in candidates:
+            key = (candidate['user_id'], candidate['step_id'], candidate['kind'])
+            if key in seen:
+                continue
+            seen.add(key)
+            unique.append(candidate)
+        return unique
+
+    def _related_steps(self, step_ids):
+        """
+        Похожие шаги для всех шагов-кандидатов одним запросом к индексу
+
+        Returns:
+            dict: Названия похожих шагов по id шага
+        """
+        if not self.index.size:
+            return {}
+
+        matches = self.index.similar(
+            [f'step:{step_id}' for step_id in step_ids],
+            k=self.RELATED_STEPS_LIMIT, kinds=['step'])
+        related_ids = {
+            int(key.split(':', 1)[1]) for results in matches.values() for key, _ in results}
+        names = dict(OnboardingStep.objects.filter(
+            id__in=related_ids).values_list('id', 'name'))
+
+        related = {}
+        for query_key, results in matches.items():
+            step_names = [
+                names[int(key.split(':', 1)[1])] for key, score in results
+                if score > 0 and int(key.split(':', 1)[1]) in names
+            ]
+            related[int(query_key.split(':', 1)[1])] = step_names
+        return related
+
+    def _build_recommendation(self, candidate, step_name, related_names):
+        if candidate['kind'] == AIRecommendationV2.RecommendationType.PROGRESS:
+            title = f"Рекомендация по шагу: {step_name}"
+            text = (
+                f"Мы заметили, что вы потратили больше времени на шаг '{step_name}'. "
+                f"Рекомендуем обратить внимание на дополнительные материалы и возможно "
+                f"запросить помощь у наставника."
+            )
+            priority = AIRecommendationV2.RecommendationPriority.MEDIUM
+        else:
+            title = f"Рекомендация по обратной связи: {step_name}"
+            text = (
+                f"Мы заметили, что у вас возникли трудности с шагом '{step_name}'. "
+                f"Рекомендуем посмотреть дополнительное видео по этой теме или "
+                f"записаться на консультацию с экспертом."
+            )
+            priority = AIRecommendationV2.RecommendationPriority.HIGH
+
+        if related_names:
+            text += " Связанные материалы: " + \
+                ", ".join(f"'{name}'" for name in related_names) + "."
+
+        return AIRecommendationV2(
+            user_id=candidate['user_id'],
+            assignment_id=candidate['assignment_id'],
+            step_id=candidate['step_id'],
+            title=title[:255],
+            recommendation_text=text,
+            recommendation_type=candidate['kind'],
+            priority=priority
+        )
+
+    @staticmethod
+    def generate_recommendations_for_user(user):
+        """
+        Генерирует рекомендации для одного пользователя
+
+        Returns:
+            int: Количество созданных рекомендаций
+        """
+        engine = AIRecommendationEngineV2()
+        if not engine.index.size:
+            engine.index.sync()
+        return len(engine.generate_for_users([user]))
+
+    @staticmethod
+    def user_id_shards(shard_size=None, user_id_from=None, user_id_to=None):
+        """
+        Делит пользователей с активным онбордингом на диапазоны id
+        примерно по shard_size пользователей
+
+        Returns:
+            list: Пары (start_id, end_id), правая граница не включается
+        """
+        shard_size = shard_size or AIRecommendationEngineV2.BATCH_SIZE
+        assignments = UserOnboardingAssignment.objects.filter(
+            status=UserOnboardingAssignment.AssignmentStatus.ACTIVE)
+        if user_id_from is not None:
+            assignments = assignments.filter(user_id__gte=user_id_from)
+        if user_id_to is not None:
+            assignments = assignments.filter(user_id__lt=user_id_to)
+        user_ids = list(assignments.values_list(
+            'user_id', flat=True).distinct().order_by('user_id'))
+
+        return [
+            (user_ids[start], user_ids[min(start + shard_size, len(user_ids)) - 1] + 1)
+            for start in range(0, len(user_ids), shard_size)
+        ]
+
+    @staticmethod
+    def generate_all_recommendations(workers=1, shard_size=None, user_id_from=None,
+                                     user_id_to=None):
+        """
+        Генерирует рекомендации для всех пользователей с активным онбордингом.
+        Перед генерацией индекс обновляется инкрементально.
+        Пользователи обрабатываются диапазонами id; при workers > 1 диапазоны
+        распределяются по отдельным процессам. Границы user_id_from/user_id_to
+        позволяют разделить работу между несколькими запусками команды
+
+        Returns:
+            int: Количество созданных рекомендаций
+        """
+        engine = AIRecommendationEngineV2()
+        engine.index.sync()
+        shards = AIRecommendationEngineV2.user_id_shards(
+            shard_size, user_id_from, user_id_to)
+
+        if workers <= 1 or len(shards) <= 1:
+            return sum(len(engine.generate_for_user_range(*shard)) for shard in shards)
+
+        # Соединения родителя не должны переходить в дочерние процессы
+        connections.close_all()
+        with ProcessPoolExecutor(
+                max_workers=min(workers, len(shards)),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_django_worker
+        ) as executor:
+            return sum(executor.map(_generate_shard, shards))
+
+    @staticmethod
+    def accept_recommendation(recommendation_id, reason=None, user=None):
+        """
+        Returns:
+            tuple: (успех, сообщение)
+        """
+        try:
+            recommendation = AIRecommendationV2.objects.get(id=recommendation_id)
+        except AIRecommendationV2.DoesNotExist:
+            return False, "Рекомендация не найдена"
+        if recommendation.status != AIRecommendationV2.RecommendationStatus.ACTIVE:
+            return False, "Рекомендация уже обработана"
+        recommendation.accept(reason, user)
+        return True, "Рекомендация принята"
+
+    @staticmethod
+    def reject_recommendation(recommendation_id, reason=None, user=None):
+        """
+        Returns:
+            tuple: (успех, сообщение)
+        """
+        try:
+            recommendation = AIRecommendationV2.objects.get(id=recommendation_id)
+        except AIRecommendationV2.DoesNotExist:
+            return False, "Рекомендация не найдена"
+        if recommendation.status != AIRecommendationV2.RecommendationStatus.ACTIVE:
+            return False, "Рекомендация уже обработана"
+        recommendation.reject(reason, user)
+        return True, "Рекомендация отклонена"
+
     @staticmethod
     def get_recommendations_for_user(user, limit=5):
         """
         Получает последние рекомендации для пользователя
         """
         try:
-            return AIRecommendationV2.objects.filter(user=user).order_by('-created_at')[:limit]
+            return AIRecommendationV2.objects.filter(user=user).order_by('-generated_at')[:limit]
         except Exception as e:
             logger.error(f"Error getting recommendations for user: {e}")
             return []
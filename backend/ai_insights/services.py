@@ -1,7 +1,8 @@
 from ai_insights.models import AIInsight, AIRecommendation, RiskLevel
+from django.db.models import Count
 from django.utils import timezone
 from users.models import User
-from onboarding.models import UserStepProgress
+from onboarding.models import OnboardingStep, UserOnboardingAssignment, UserStepProgress
 from onboarding.feedback_models import FeedbackMood, StepFeedback
 
 
@@ -89,125 +90,148 @@ class AIInsightService:
 
 
 class AIRecommendationService:
+    # Тексты рекомендаций совпадают с прежней генерацией по одному пользователю,
+    # поэтому проверка дубликатов по тексту работает и для старых записей
+    NEGATIVE_FEEDBACK_TAGS = ['negative', 'unclear_instruction', 'delay_warning']
+
     @staticmethod
     def generate_recommendations(user: User):
         """
         Генерирует персонализированные AI-рекомендации для пользователя на основе поведения.
         Использует данные из FeedbackMood, StepFeedback, UserStepProgress и AIInsight.
         """
+        if not user.onboarding_assignments.filter(status='active').exists():
+            return False
+
+        AIRecommendationService.generate_recommendations_bulk({'user_id': user.id})
+        return True
+
+    @staticmethod
+    def generate_recommendations_bulk(user_filter=None):
+        """
+        Генерирует рекомендации для всех пользователей с активными назначениями
+        сгруппированными запросами (количество запросов не зависит от числа
+        пользователей) и сохраняет их одним bulk_create
+
+        Args:
+            user_filter (dict): Условия на user_id, например
+                {'user_id__gte': 1, 'user_id__lt': 1000} для обработки диапазона
+
+        Returns:
+            int: Количество созданных рекомендаций
+        """
+        user_filter = user_filter or {}
+        now = timezone.now()
+        assignments = list(UserOnboardingAssignment.objects.filter(
+            status='active', **user_filter).select_related('user', 'program'))
+        if not assignments:
+            return 0
+
+        assignment_ids = [assignment.id for assignment in assignments]
+        user_ids = {assignment.user_id for assignment in assignments}
+        program_ids = {assignment.program_id for assignment in assignments}
+
+        # Последнее настроение по каждому назначению
+        latest_moods = dict(FeedbackMood.objects.filter(
+            assignment_id__in=assignment_ids
+        ).order_by('assignment_id', '-created_at').distinct(
+            'assignment_id').values_list('assignment_id', 'value'))
+
+        negative_feedbacks = {}
+        for feedback in StepFeedback.objects.filter(
+                assignment_id__in=assignment_ids,
+                auto_tag__in=AIRecommendationService.NEGATIVE_FEEDBACK_TAGS
+        ).select_related('step').order_by('id'):
+            negative_feedbacks.setdefault(feedback.assignment_id, []).append(feedback)
+
+        overdue_counts = {
+            (row['user_id'], row['step__program_id']): row['count']
+            for row in UserStepProgress.objects.filter(
+                user_id__in=user_ids,
+                step__program_id__in=program_ids,
+                status__in=['not_started', 'in_progress'],
+                planned_date_end__lt=now
+            ).values('user_id', 'step__program_id').annotate(count=Count('id'))
+        }
+
+        required_counts = dict(OnboardingStep.objects.filter(
+            program_id__in=program_ids, is_required=True
+        ).values('program_id').annotate(count=Count('id')).values_list('program_id', 'count'))
+
+        completed_counts = {
+            (row['user_id'], row['step__program_id']): row['count']
+            for row in UserStepProgress.objects.filter(
+                user_id__in=user_ids,
+                step__program_id__in=program_ids,
+                step__is_required=True,
+                status='done'
+            ).values('user_id', 'step__program_id').annotate(count=Count('id'))
+        }
+
+        risky_insights = {}
+        for insight in AIInsight.objects.filter(
+                assignment_id__in=assignment_ids,
+                risk_level__in=[RiskLevel.HIGH, RiskLevel.MEDIUM]
+        ).order_by('id'):
+            risky_insights.setdefault(insight.assignment_id, []).append(insight)
+
+        # Существующие нескрытые рекомендации - одним запросом для всех назначений
+        existing = set(AIRecommendation.objects.filter(
+            assignment_id__in=assignment_ids, dismissed=False
+        ).values_list('user_id', 'assignment_id', 'recommendation_text'))
+
         recommendations = []
-        active_assignments = user.onboarding_assignments.filter(
-            status='active')
 
-        if not active_assignments.exists():
-            return False
+        def add(assignment, text, step=None):
+            key = (assignment.user_id, assignment.id, text)
+            if key in existing:
+                return
+            existing.add(key)
+            recommendations.append(AIRecommendation(
+                user_id=assignment.user_id,
+                assignment=assignment,
+                step=step,
+                recommendation_text=text,
+                generated_at=now
+            ))
+
+        for assignment in assignments:
+            user = assignment.user
+            program = assignment.program
 
-        for active_assignment in active_assignments:
             # Проверка настроения пользователя (FeedbackMood)
-            latest_mood = FeedbackMood.objects.filter(
-                user=user,
-                assignment=active_assignment
-            ).order_by('-created_at').first()
-
-            if latest_mood and latest_mood.value in ['bad', 'terrible']:
-                recommendations.append(
-                    AIRecommendation(
-                        user=user,
-                        assignment=active_assignment,
-                        recommendation_text=f"Обнаружен низкий тонус пользователя {user.email} ({latest_mood.get_value_display()}). Рекомендуем оказать поддержку и обсудить возможные трудности.",
-                        generated_at=timezone.now()
-                    )
-                )
+            mood = latest_moods.get(assignment.id)
+            if mood in ['bad', 'terrible']:
+                add(assignment, f"Обнаружен низкий тонус пользователя {user.email} ({FeedbackMood.MoodValue(mood).label}). Рекомендуем оказать поддержку и обсудить возможные трудности.")
 
             # Проверка отзывов по шагам (StepFeedback)
-            negative_feedbacks = StepFeedback.objects.filter(
-                user=user,
-                assignment=active_assignment,
-                auto_tag__in=['negative',
-                              'unclear_instruction', 'delay_warning']
-            )
-
-            for feedback in negative_feedbacks:
-                recommendations.append(
-                    AIRecommendation(
-                        user=user,
-                        assignment=active_assignment,
-                        step=feedback.step,
-                        recommendation_text=f"Пользователь {user.email} оставил отрицательный отзыв с тегом '{feedback.get_auto_tag_display()}' по шагу \"{feedback.step.name}\". Рекомендуем проверить инструкцию к шагу или связаться с пользователем.",
-                        generated_at=timezone.now()
-                    )
-                )
+            for feedback in negative_feedbacks.get(assignment.id, []):
+                if feedback.user_id != assignment.user_id:
+                    continue
+                add(assignment, f"Пользователь {user.email} оставил отрицательный отзыв с тегом '{feedback.get_auto_tag_display()}' по шагу \"{feedback.step.name}\". Рекомендуем проверить инструкцию к шагу или связаться с пользователем.", feedback.step)
 
             # Проверка прогресса по шагам (UserStepProgress)
-            current_date = timezone.now()
-            overdue_steps = UserStepProgress.objects.filter(
-                user=user,
-                step__program=active_assignment.program,
-                status__in=['not_started', 'in_progress'],
-                planned_date_end__lt=current_date
-            )
-
-            if overdue_steps.exists():
-                recommendations.append(
-                    AIRecommendation(
-                        user=user,
-                        assignment=active_assignment,
-                        recommendation_text=f"Обнаружены просроченные шаги ({overdue_steps.count()}) в программе \"{active_assignment.program.name}\". Рекомендуется связаться с пользователем {user.email} для выяснения причин.",
-                        generated_at=timezone.now()
-                    )
-                )
+            overdue = overdue_counts.get((assignment.user_id, assignment.program_id), 0)
+            if overdue:
+                add(assignment, f"Обнаружены просроченные шаги ({overdue}) в программе \"{program.name}\". Рекомендуется связаться с пользователем {user.email} для выяснения причин.")
 
             # Проверка низкого прогресса
-            total_steps = active_assignment.program.steps.filter(
-                is_required=True).count()
+            total_steps = required_counts.get(assignment.program_id, 0)
             if total_steps > 0:
-                completed_steps = UserStepProgress.objects.filter(
-                    user=user,
-                    step__program=active_assignment.program,
-                    step__is_required=True,
-                    status='done'
-                ).count()
-
+                completed_steps = completed_counts.get(
+                    (assignment.user_id, assignment.program_id), 0)
                 progress_percent = (completed_steps / total_steps) * 100
-                if progress_percent < 30 and (current_date - active_assignment.assigned_at).days >= 14:
-                    recommendations.append(
-                        AIRecommendation(
-                            user=user,
-                            assignment=active_assignment,
-                            recommendation_text=f"Низкий прогресс пользователя {user.email} в программе \"{active_assignment.program.name}\" ({progress_percent:.1f}%). Программа назначена более 14 дней назад. Рекомендуем проверить, требуется ли помощь.",
-                            generated_at=timezone.now()
-                        )
-                    )
+                if progress_percent < 30 and (now - assignment.assigned_at).days >= 14:
+                    add(assignment, f"Низкий прогресс пользователя {user.email} в программе \"{program.name}\" ({progress_percent:.1f}%). Программа назначена более 14 дней назад. Рекомендуем проверить, требуется ли помощь.")
 
             # Проверка AI-инсайтов (AIInsight)
-            risky_insights = AIInsight.objects.filter(
-                user=user,
-                assignment=active_assignment,
-                risk_level__in=[RiskLevel.HIGH, RiskLevel.MEDIUM]
-            )
-
-            for insight in risky_insights:
-                recommendations.append(
-                    AIRecommendation(
-                        user=user,
-                        assignment=active_assignment,
-                        recommendation_text=f"AI выявил {insight.get_risk_level_display()} риск для пользователя {user.email} в программе \"{active_assignment.program.name}\": {insight.reason}. Рекомендуем обратить внимание.",
-                        generated_at=timezone.now()
-                    )
-                )
+            for insight in risky_insights.get(assignment.id, []):
+                if insight.user_id != assignment.user_id:
+                    continue
+                add(assignment, f"AI выявил {insight.get_risk_level_display()} риск для пользователя {user.email} в программе \"{program.name}\": {insight.reason}. Рекомендуем обратить внимание.")
 
-        # Создаем только уникальные рекомендации (простая проверка по тексту для данного пользователя и назначения)
-        if active_assignment:
-            existing_texts = set(AIRecommendation.objects.filter(
-                user=user, assignment=active_assignment, dismissed=False).values_list('recommendation_text', flat=True))
-            new_recommendations = []
-            for rec in recommendations:
-                if rec.recommendation_text not in existing_texts:
-                    new_recommendations.append(rec)
-                    existing_texts.add(rec.recommendation_text)
-
-            if new_recommendations:
-                AIRecommendation.objects.bulk_create(new_recommendations)
+        AIRecommendation.objects.bulk_create(recommendations, batch_size=1000)
+        return len(recommendations)
 
     @staticmethod
     def dismiss_recommendation(recommendation_id: int):
@@ -1,45 +1,75 @@
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+from jobs import outbox
 from onboarding.feedback_models import FeedbackMood, StepFeedback
-from onboarding.models import UserStepProgress
+from onboarding.models import UserOnboardingAssignment, UserStepProgress
 from .services import AIInsightService, AIRecommendationService
 
 
-@receiver(post_save, sender=FeedbackMood)
-def analyze_after_mood_update(sender, instance, created, **kwargs):
+def _created_or_updated(instance, created, update_fields):
+    return bool(created or update_fields)
+
+
+def analyze_after_mood_update(instance, event):
     """
-    Выполняет анализ после создания/обновления настроения
+    Выполняет анализ после создания/обновления настроения (через outbox)
     """
-    if created or kwargs.get("update_fields"):
-        AIInsightService.analyze_onboarding_progress(instance.assignment)
-        # Генерируем рекомендации после обновления настроения
-        AIRecommendationService.generate_recommendations(instance.user)
+    AIInsightService.analyze_onboarding_progress(instance.assignment)
+    # Генерируем рекомендации после обновления настроения
+    AIRecommendationService.generate_recommendations(instance.user)
+
+
+def analyze_after_feedback_update(instance, event):
+    """
+    Выполняет анализ после создания/обновления отзыва о шаге (через outbox)
+    """
+    AIInsightService.analyze_onboarding_progress(instance.assignment)
+    # Генерируем рекомендации после обновления отзыва
+    AIRecommendationService.generate_recommendations(instance.user)
 
 
-@receiver(post_save, sender=StepFeedback)
-def analyze_after_feedback_update(sender, instance, created, **kwargs):
+def analyze_after_step_progress_update(instance, event):
     """
-    Выполняет анализ после создания/обновления отзыва о шаге
+    Выполняет анализ после обновления прогресса по шагу (через outbox)
     """
-    if created or kwargs.get("update_fields"):
-        AIInsightService.analyze_onboarding_progress(instance.assignment)
-        # Генерируем рекомендации после обновления отзыва
+    # Получаем задание онбординга
+    assignment = UserOnboardingAssignment.objects.filter(
+        user=instance.user,
+        program=instance.step.program
+    ).first()
+    if assignment is not None:
+        AIInsightService.analyze_onboarding_progress(assignment)
+        # Генерируем рекомендации после обновления прогресса
         AIRecommendationService.generate_recommendations(instance.user)
 
 
-@receiver(post_save, sender=UserStepProgress)
-def analyze_after_step_progress_update(sender, instance, created, **kwargs):
+def analyze_after_step_progress_updates(instances, events):
     """
-    Выполняет анализ после обновления прогресса по шагу
+    Пакетный вариант analyze_after_step_progress_update (outbox.coalesce):
+    анализ один раз на назначение, рекомендации одним пакетом
     """
-    if not created and kwargs.get("update_fields"):
-        # Получаем задание онбординга
-        from onboarding.models import UserOnboardingAssignment
-        assignments = UserOnboardingAssignment.objects.filter(
-            user=instance.user,
-            program=instance.step.program
-        )
-        if assignments.exists():
-            AIInsightService.analyze_onboarding_progress(assignments.first())
-            # Генерируем рекомендации после обновления прогресса
-            AIRecommendationService.generate_recommendations(instance.user)
+    pairs = {
+        (progress.user_id, progress.step.program_id) for progress in UserStepProgress.objects.filter(
+            id__in=[instance.id for instance in instances]).select_related('step')
+    }
+    assignments = {}
+    for assignment in UserOnboardingAssignment.objects.filter(
+            user_id__in={user_id for user_id, _ in pairs},
+            program_id__in={program_id for _, program_id in pairs}
+    ).order_by('id').select_related('user', 'program'):
+        assignments.setdefault((assignment.user_id, assignment.program_id), assignment)
+
+    user_ids = set()
+    for pair in pairs:
+        assignment = assignments.get(pair)
+        if assignment is not None:
+            AIInsightService.analyze_onboarding_progress(assignment)
+            user_ids.add(assignment.user_id)
+    if user_ids:
+        AIRecommendationService.generate_recommendations_bulk({'user_id__in': list(user_ids)})
+
+
+outbox.subscribe(FeedbackMood, analyze_after_mood_update, when=_created_or_updated)
+outbox.subscribe(StepFeedback, analyze_after_feedback_update, when=_created_or_updated)
+outbox.subscribe(
+    UserStepProgress, analyze_after_step_progress_update,
+    when=lambda instance, created, update_fields: not created and bool(update_fields),
+    batch_handler=analyze_after_step_progress_updates)
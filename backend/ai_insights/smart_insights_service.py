@@ -1,58 +1,185 @@
 from scheduler.ai_services import SmartPrioritizationEngine as SchedulerAIInsightsService
 from feedback.services.ai_insights_service import FeedbackAIInsightsService
 from .training_insights_service import TrainingInsightsService
-from .services import AIInsightService
-from .recommendations_models import AIRecommendationV2
+from .workers import close_worker_connections, init_django_worker
 import logging
-from django.db.models import Count, Q
-from django.utils import timezone
+import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from django.conf import settings
-from langchain_community.embeddings.openai import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
-from sklearn.cluster import KMeans
-import numpy as np
 
-from .insights_models import AIInsightV2, InsightTag
+from .insights_models import AIInsightV2
 
 logger = logging.getLogger(__name__)
 
 
+def _aggregate_scheduler_insights():
+    """
+    Критически важные шаги из модуля планирования сохраняются как инсайты Smart Insights Hub
+    """
+    return SmartInsightsAggregatorService.store_critical_steps(
+        SchedulerAIInsightsService.identify_critical_steps())
+
+
+def _analyze_feedback():
+    return FeedbackAIInsightsService.analyze_all_feedback()
+
+
+def _analyze_training():
+    return TrainingInsightsService.run_all_analysis()
+
+
+def _run_stage(target):
+    """
+    Выполняет источник в потоке или процессе пула
+
+    Returns:
+        tuple: (результат, длительность в секундах)
+    """
+    started_at = time.monotonic()
+    try:
+        return target(), time.monotonic() - started_at
+    finally:
+        close_worker_connections()
+
+
 class SmartInsightsAggregatorService:
     """
     Сервис для агрегации всех инсайтов из разных модулей системы
     """
 
+    # Источники инсайтов: pool - thread для запросов к БД и языковой модели,
+    # process для вычислений, которые упираются в процессор.
+    # Таймауты (секунды) переопределяются настройкой AI_INSIGHTS_STAGE_TIMEOUTS
+    STAGES = {
+        'scheduler': {'target': _aggregate_scheduler_insights, 'pool': 'thread', 'timeout': 300},
+        'feedback': {'target': _analyze_feedback, 'pool': 'thread', 'timeout': 1800},
+        'training': {'target': _analyze_training, 'pool': 'process', 'timeout': 900},
+    }
+
+    OPEN_STATUSES = [
+        AIInsightV2.InsightStatus.NEW,
+        AIInsightV2.InsightStatus.ACKNOWLEDGED,
+        AIInsightV2.InsightStatus.IN_PROGRESS,
+    ]
+
     @staticmethod
-    def aggregate_all_insights():
+    def aggregate_all_insights(stages=None):
         """
-        Агрегирует все инсайты из различных модулей системы
+        Агрегирует все инсайты из различных модулей системы.
+        Источники выполняются параллельно и независимо: ошибка или таймаут
+        одного источника не отменяет результаты остальных, каждый источник
+        сохраняет свои инсайты сам
+
+        Args:
+            stages (dict): Описания источников (по умолчанию STAGES)
+
+        Returns:
+            dict: Общее количество инсайтов и по каждому источнику статус
+                (ok, failed, timeout), количество, длительность и ошибка
         """
+        stages = stages or SmartInsightsAggregatorService.STAGES
+        timeouts = getattr(settings, 'AI_INSIGHTS_STAGE_TIMEOUTS', {})
+        started_at = time.monotonic()
+
+        thread_stages = {
+            name: stage for name, stage in stages.items() if stage['pool'] == 'thread'}
+        process_stages = {
+            name: stage for name, stage in stages.items() if stage['pool'] == 'process'}
+
+        thread_pool = ThreadPoolExecutor(
+            max_workers=max(1, len(thread_stages)), thread_name_prefix='insights')
+        process_pool = None
+        if process_stages:
+            process_pool = multiprocessing.get_context('spawn').Pool(
+                processes=len(process_stages), initializer=init_django_worker)
+
+        pending = {}
+        for name, stage in thread_stages.items():
+            pending[name] = thread_pool.submit(_run_stage, stage['target'])
+        for name, stage in process_stages.items():
+            pending[name] = process_pool.apply_async(_run_stage, (stage['target'],))
+
+        report = {'total': 0, 'stages': {}}
         try:
-            insights_count = 0
-
-            # Получаем инсайты из сервиса планирования
-            scheduler_insights = SchedulerAIInsightsService.analyze_all()
-            if scheduler_insights:
-                insights_count += len(scheduler_insights)
-                logger.info(
-                    f"Aggregated {len(scheduler_insights)} insights from scheduler")
-
-            # Получаем инсайты из сервиса обратной связи
-            feedback_insights = FeedbackAIInsightsService.analyze_all_feedback()
-            if feedback_insights:
-                insights_count += len(feedback_insights)
-                logger.info(
-                    f"Aggregated {len(feedback_insights)} insights from feedback")
-
-            # Получаем инсайты из сервиса обучения
-            training_insights_count = TrainingInsightsService.analyze_all()
-            if training_insights_count:
-                insights_count += training_insights_count
-                logger.info(
-                    f"Aggregated {training_insights_count} insights from training")
-
-            return insights_count
-        except Exception as e:
-            logger.error(
-                f"Error in SmartInsightsAggregatorService.aggregate_all_insights: {e}")
-            return 0
+            for name, result in pending.items():
+                timeout = timeouts.get(name, stages[name].get('timeout'))
+                # Таймаут каждого источника отсчитывается от общего старта
+                remaining = None
+                if timeout is not None:
+                    remaining = max(0, timeout - (time.monotonic() - started_at))
+
+                stage_report = {'status': 'ok', 'count': 0, 'error': None}
+                try:
+                    if name in process_stages:
+                        value, duration = result.get(remaining)
+                    else:
+                        value, duration = result.result(remaining)
+                    stage_report['count'] = value if isinstance(value, int) else len(value or [])
+                    stage_report['duration'] = round(duration, 3)
+                except (FutureTimeoutError, multiprocessing.TimeoutError):
+                    stage_report['status'] = 'timeout'
+                    stage_report['error'] = f"Stage exceeded {timeout} s"
+                    logger.error(f"Insights stage {name} timed out after {timeout} s")
+                except Exception as e:
+                    stage_report['status'] = 'failed'
+                    stage_report['error'] = str(e)
+                    logger.error(f"Insights stage {name} failed: {e}")
+
+                # Для неуспешного источника - время до получения ошибки или таймаута
+                stage_report.setdefault('duration', round(time.monotonic() - started_at, 3))
+                report['stages'][name] = stage_report
+                report['total'] += stage_report['count']
+                if stage_report['status'] == 'ok':
+                    logger.info(
+                        f"Aggregated {stage_report['count']} insights from {name} "
+                        f"in {stage_report['duration']} s")
+        finally:
+            # Зависший поток остановить нельзя: он завершится в фоне,
+            # а зависший процесс завершается принудительно
+            thread_pool.shutdown(wait=False, cancel_futures=True)
+            if process_pool is not None:
+                process_pool.terminate()
+                process_pool.join()
+
+        report['duration'] = round(time.monotonic() - started_at, 3)
+        return report
+
+    @staticmethod
+    def store_critical_steps(critical_steps):
+        """
+        Сохраняет критически важные шаги как инсайты типа schedule.
+        Для шага с открытым инсайтом новый не создается
+
+        Args:
+            critical_steps (list): Результат SmartPrioritizationEngine.identify_critical_steps
+
+        Returns:
+            list: Созданные инсайты
+        """
+        source_ids = [f"step:{item['step_id']}" for item in critical_steps]
+        existing = set(AIInsightV2.objects.filter(
+            source='scheduler',
+            source_id__in=source_ids,
+            status__in=SmartInsightsAggregatorService.OPEN_STATUSES
+        ).values_list('source_id', flat=True))
+
+        insights = []
+        for item, source_id in zip(critical_steps, source_ids):
+            if source_id in existing:
+                continue
+            insights.append(AIInsightV2(
+                title=f"Критически важный шаг: {item['step_name']}"[:255],
+                description=(
+                    f"Шаг \"{item['step_name']}\" получил приоритет {item['priority']}. "
+                    f"Рекомендуется контролировать его выполнение и сроки."
+                ),
+                insight_type=AIInsightV2.InsightType.SCHEDULE,
+                level=(AIInsightV2.InsightLevel.CRITICAL if item['priority'] >= 9
+                       else AIInsightV2.InsightLevel.HIGH),
+                source='scheduler',
+                source_id=source_id,
+                metadata={'priority': item['priority'], 'metrics': item['metrics']},
+                step_id=item['step_id']
+            ))
+        return AIInsightV2.objects.bulk_create(insights)
@@ -1,8 +1,15 @@
-from django.test import TestCase
+import tempfile
+from unittest import mock
+
+import numpy as np
+from django.test import TestCase, override_settings
 from django.utils import timezone
 from datetime import timedelta
 from django.contrib.auth import get_user_model
+from ai_insights.embedding_index import EmbeddingIndex
 from ai_insights.models import AIRecommendation
+from ai_insights.recommendation_engine_v2 import AIRecommendationEngineV2
+from ai_insights.recommendations_models import AIRecommendationV2
 from ai_insights.services import AIRecommendationService
 from onboarding.models import OnboardingProgram, OnboardingStep, UserOnboardingAssignment, UserStepProgress
 from onboarding.feedback_models import FeedbackMood, StepFeedback
@@ -111,3 +118,223 @@ class RecommendationServiceTestCase(TestCase):
         self.assertTrue(result)
         recommendation.refresh_from_db()
         self.assertTrue(recommendation.dismissed)
+
+
+class RecommendationBulkGenerationTestCase(TestCase):
+    def setUp(self):
+        self.hr_user = User.objects.create_user(
+            username='hr', email='hr@example.com', password='password123', role='hr')
+        self.user = User.objects.create_user(
+            username='employee', email='employee@example.com',
+            password='password123', role='employee')
+        self.program = OnboardingProgram.objects.create(
+            name='Test Program', description='Test Description', author=self.hr_user)
+        step = OnboardingStep.objects.create(
+            name='Test Step', program=self.program, order=1, is_required=True)
+        UserOnboardingAssignment.objects.create(
+            user=self.user, program=self.program, status='active')
+        UserStepProgress.objects.create(
+            user=self.user,
+            step=step,
+            status='not_started',
+            planned_date_start=timezone.now() - timedelta(days=30),
+            planned_date_end=timezone.now() - timedelta(days=15)
+        )
+
+    def test_bulk_generation_skips_existing(self):
+        other = User.objects.create_user(
+            username='other',
+            email='other@example.com',
+            password='password123',
+            role='employee'
+        )
+        UserOnboardingAssignment.objects.create(
+            user=other,
+            program=self.program,
+            status='active'
+        )
+
+        created = AIRecommendationService.generate_recommendations_bulk()
+
+        # Просроченный шаг есть только у первого пользователя
+        self.assertEqual(created, 1)
+        self.assertTrue(AIRecommendation.objects.filter(
+            user=self.user, recommendation_text__icontains='просроченные шаги').exists())
+        self.assertEqual(AIRecommendationService.generate_recommendations_bulk(), 0)
+
+
+class EmbeddingIndexTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.documents = {
+            'step:1': 'Настройка рабочего окружения и доступов к git',
+            'step:2': 'Знакомство с командой и встреча с наставником',
+            'step:3': 'Настройка git и первого репозитория',
+            'feedback:1': 'Не понятно, как получить доступы к git',
+        }
+
+    def _index(self):
+        return EmbeddingIndex(directory=self.directory.name, provider_name='local')
+
+    def test_similar_documents(self):
+        index = self._index()
+        stats = index.sync(self.documents.items())
+
+        self.assertTrue(stats['rebuilt'])
+        matches = index.similar(['step:1'], k=1, kinds=['step'])
+        self.assertEqual(matches['step:1'][0][0], 'step:3')
+
+        # Запросы пакетом: по результату на каждый текст
+        results = index.search(['встреча с наставником', 'git'], k=2)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0][0][0], 'step:2')
+
+    def test_incremental_sync(self):
+        self._index().sync(self.documents.items())
+
+        # Новый экземпляр читает индекс с диска
+        index = self._index()
+        self.assertEqual(index.size, 4)
+
+        documents = dict(self.documents)
+        documents['step:2'] = 'Встреча с командой продукта'
+        del documents['feedback:1']
+        stats = index.sync(documents.items())
+
+        self.assertEqual(
+            stats, {'added': 0, 'updated': 1, 'removed': 1, 'rebuilt': False})
+        self.assertEqual(index.size, 3)
+        self.assertNotIn('feedback:1', index.positions)
+        self.assertEqual(
+            index.sync(documents.items()),
+            {'added': 0, 'updated': 0, 'removed': 0, 'rebuilt': False})
+
+    def test_sync_rereads_version_written_by_other_instance(self):
+        first = self._index()
+        first.sync(self.documents.items())
+        stale = self._index()
+
+        documents = dict(self.documents)
+        documents['step:4'] = 'Оформление пропуска в офис'
+        first.sync(documents.items())
+
+        # Устаревший экземпляр перечитывает индекс и не перезаписывает версию
+        self.assertEqual(
+            stale.sync(documents.items()),
+            {'added': 0, 'updated': 0, 'removed': 0, 'rebuilt': False})
+        self.assertEqual(stale.version, first.version)
+        self.assertEqual(stale.size, 5)
+
+    def test_load_retries_when_version_is_replaced(self):
+        writer = self._index()
+        writer.sync(self.documents.items())
+        reader = self._index()
+        documents = dict(self.documents)
+        documents['step:4'] = 'Оформление пропуска в офис'
+        real_load = np.load
+        swapped = []
+
+        def load_after_swap(path, *args, **kwargs):
+            # Другой процесс заменяет версию между чтением meta.json и файла векторов
+            if not swapped:
+                swapped.append(path)
+                writer.sync(documents.items())
+            return real_load(path, *args, **kwargs)
+
+        with mock.patch('ai_insights.embedding_index.np.load', side_effect=load_after_swap):
+            self.assertTrue(reader.load())
+
+        self.assertEqual(reader.version, writer.version)
+        self.assertEqual(reader.size, 5)
+
+
+class RecommendationEngineV2TestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        settings_override = override_settings(
+            AI_EMBEDDING_INDEX_DIR=self.directory.name, AI_EMBEDDING_PROVIDER='local')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.hr_user = User.objects.create_user(
+            username='hr', email='hr@example.com', password='password123', role='hr')
+        self.user = User.objects.create_user(
+            username='employee', email='employee@example.com',
+            password='password123', role='employee')
+        self.program = OnboardingProgram.objects.create(
+            name='Program', description='Description', author=self.hr_user)
+        self.slow_step = OnboardingStep.objects.create(
+            name='Настройка git', description='Настройка git и доступов к репозиторию',
+            program=self.program, order=1)
+        self.related_step = OnboardingStep.objects.create(
+            name='Первый репозиторий', description='Создание первого репозитория в git',
+            program=self.program, order=2)
+        OnboardingStep.objects.create(
+            name='Встреча с командой', description='Знакомство с коллегами',
+            program=self.program, order=3)
+        self.assignment = UserOnboardingAssignment.objects.create(
+            user=self.user, program=self.program, status='active')
+
+        now = timezone.now()
+        UserStepProgress.objects.create(
+            user=self.user, step=self.slow_step, status='done',
+            planned_date_start=now - timedelta(days=10), completed_at=now)
+        StepFeedback.objects.create(
+            user=self.user, step=self.related_step, assignment=self.assignment,
+            comment='Непонятная инструкция', auto_tag='unclear_instruction')
+
+    def test_generate_all_recommendations(self):
+        count = AIRecommendationEngineV2.generate_all_recommendations()
+
+        self.assertEqual(count, 2)
+        progress = AIRecommendationV2.objects.get(
+            recommendation_type=AIRecommendationV2.RecommendationType.PROGRESS)
+        self.assertEqual(progress.assignment, self.assignment)
+        self.assertEqual(progress.step, self.slow_step)
+        # Похожий шаг подобран по векторному индексу
+        self.assertIn('Первый репозиторий', progress.recommendation_text)
+        self.assertTrue(AIRecommendationV2.objects.filter(
+            recommendation_type=AIRecommendationV2.RecommendationType.FEEDBACK,
+            priority=AIRecommendationV2.RecommendationPriority.HIGH).exists())
+
+    def test_open_recommendations_not_duplicated(self):
+        self.assertEqual(AIRecommendationEngineV2.generate_all_recommendations(), 2)
+        self.assertEqual(AIRecommendationEngineV2.generate_all_recommendations(), 0)
+
+        # После обработки рекомендации кандидат снова может быть предложен
+        AIRecommendationV2.objects.filter(
+            recommendation_type=AIRecommendationV2.RecommendationType.FEEDBACK
+        ).update(status=AIRecommendationV2.RecommendationStatus.REJECTED)
+        self.assertEqual(AIRecommendationEngineV2.generate_all_recommendations(), 1)
+
+    def test_user_id_shards(self):
+        other = User.objects.create_user(
+            username='other', email='other@example.com',
+            password='password123', role='employee')
+        UserOnboardingAssignment.objects.create(
+            user=other, program=self.program, status='active')
+
+        shards = AIRecommendationEngineV2.user_id_shards(shard_size=1)
+        self.assertEqual(
+            shards, [(self.user.id, self.user.id + 1), (other.id, other.id + 1)])
+        self.assertEqual(
+            AIRecommendationEngineV2.user_id_shards(shard_size=10),
+            [(self.user.id, other.id + 1)])
+
+        count = sum(
+            len(AIRecommendationEngineV2(index=EmbeddingIndex()).generate_for_user_range(*shard))
+            for shard in shards)
+        self.assertEqual(count, 2)
+
+    def test_accept_recommendation(self):
+        AIRecommendationEngineV2.generate_recommendations_for_user(self.user)
+        recommendation = AIRecommendationV2.objects.first()
+
+        success, _ = AIRecommendationEngineV2.accept_recommendation(
+            recommendation.id, 'Полезно', self.user)
+        self.assertTrue(success)
+        success, _ = AIRecommendationEngineV2.reject_recommendation(
+            recommendation.id, None, self.user)
+        self.assertFalse(success)
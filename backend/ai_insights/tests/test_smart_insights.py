@@ -0,0 +1,49 @@
+import threading
+
+from django.test import SimpleTestCase, override_settings
+
+from ai_insights.smart_insights_service import SmartInsightsAggregatorService
+
+
+def _ok_stage():
+    return [1, 2, 3]
+
+
+def _failing_stage():
+    raise ValueError('LLM unavailable')
+
+
+class SmartInsightsAggregatorTestCase(SimpleTestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def _slow_stage(self):
+        self.release.wait(5)
+        return 1
+
+    def test_failed_stage_does_not_drop_other_results(self):
+        report = SmartInsightsAggregatorService.aggregate_all_insights({
+            'scheduler': {'target': _ok_stage, 'pool': 'thread', 'timeout': 5},
+            'feedback': {'target': _failing_stage, 'pool': 'thread', 'timeout': 5},
+        })
+
+        self.assertEqual(report['total'], 3)
+        self.assertEqual(report['stages']['scheduler']['status'], 'ok')
+        self.assertEqual(report['stages']['scheduler']['count'], 3)
+        self.assertEqual(report['stages']['feedback']['status'], 'failed')
+        self.assertIn('LLM unavailable', report['stages']['feedback']['error'])
+        for stage in report['stages'].values():
+            self.assertGreaterEqual(stage['duration'], 0)
+
+    @override_settings(AI_INSIGHTS_STAGE_TIMEOUTS={'feedback': 0.1})
+    def test_stage_timeout(self):
+        report = SmartInsightsAggregatorService.aggregate_all_insights({
+            'scheduler': {'target': _ok_stage, 'pool': 'thread', 'timeout': 5},
+            'feedback': {'target': self._slow_stage, 'pool': 'thread', 'timeout': 5},
+        })
+
+        self.assertEqual(report['stages']['feedback']['status'], 'timeout')
+        self.assertEqual(report['stages']['scheduler']['count'], 3)
+        # Медленный источник не задерживает общий результат
+        self.assertLess(report['duration'], 5)
@@ -15,9 +15,11 @@ from .serializers import (
     InsightTagSerializer
 )
 from django.contrib.auth import get_user_model
-from .smart_insights_service import SmartInsightsAggregatorService
+from jobs.services import JobService
 
 User = get_user_model()
+# Задача реестра jobs, выполняющая SmartInsightsAggregatorService
+AGGREGATE_JOB = 'aggregate_all_insights'
 from .recommendation_engine_v2 import AIRecommendationEngineV2
 
 
@@ -108,13 +110,21 @@ class AIInsightViewSet(viewsets.ReadOnlyModelViewSet):
         serializer = self.get_serializer(insight)
         return Response(serializer.data)
 
-    @action(detail=False, methods=['post'])
+    @action(detail=False, methods=['get', 'post'])
     def aggregate(self, request):
         """
-        Запуск сбора и агрегации инсайтов из всех источников
+        Запуск сбора и агрегации инсайтов из всех источников.
+        POST ставит задачу aggregate_all_insights в очередь планировщика
+        и возвращает 202 с ее состоянием; GET возвращает состояние задачи
+        и последнего запуска
         """
-        count = SmartInsightsAggregatorService.aggregate_all_insights()
-        return Response({"message": f"Собрано и обработано {count} инсайтов"})
+        if request.method == 'GET':
+            return Response(JobService.job_status(AGGREGATE_JOB))
+
+        job_status = JobService.enqueue(AGGREGATE_JOB)
+        return Response(
+            dict(job_status, message="Агрегация инсайтов поставлена в очередь"),
+            status=status.HTTP_202_ACCEPTED)
 
     @action(detail=False)
     def by_user(self, request):
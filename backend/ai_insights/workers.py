@@ -0,0 +1,23 @@
+"""
+Общие функции для фоновых процессов ai_insights.
+
+Процессы запускаются через spawn: настройки Django берутся из
+DJANGO_SETTINGS_MODULE, унаследованного от родителя, а соединения
+с базой данных открываются заново в каждом процессе
+"""
+import django
+from django.db import connections
+
+
+def init_django_worker():
+    """
+    Инициализатор пула процессов
+    """
+    django.setup()
+
+
+def close_worker_connections():
+    """
+    Закрывает соединения процесса (или потока) после выполнения задачи
+    """
+    connections.close_all()
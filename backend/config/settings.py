@@ -67,6 +67,7 @@ INSTALLED_APPS = [
     'feedback',
     'scheduler',  # Smart Scheduler
     'onboarding_intelligence',  # AI Onboarding Intelligence Dashboard
+    'jobs',  # Periodic jobs scheduler
 ]
 
 MIDDLEWARE = [
@@ -147,6 +148,108 @@ DATABASES = {
 }
 
 
+# Cache
+# По умолчанию локальная память процесса; при заданном REDIS_URL - Redis
+
+REDIS_URL = env('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'onboardpro',
+        }
+    }
+
+# Кэш и максимальный возраст (в секундах) предрасчитанных данных дашборда онбординга
+INTELLIGENCE_DASHBOARD_CACHE = env(
+    'INTELLIGENCE_DASHBOARD_CACHE', default='default')
+INTELLIGENCE_DASHBOARD_MAX_AGE = env.int(
+    'INTELLIGENCE_DASHBOARD_MAX_AGE', default=3600)
+# Перекрытие (в секундах) окна инкрементальных заданий с прошлым запуском:
+# изменения, зафиксированные позже чтения, попадают в следующий запуск
+INTELLIGENCE_WATERMARK_OVERLAP = env.int(
+    'INTELLIGENCE_WATERMARK_OVERLAP', default=300)
+
+# Окна (в часах) проверки приближающихся и недавно пропущенных дедлайнов
+DEADLINE_APPROACHING_HOURS = env.int('DEADLINE_APPROACHING_HOURS', default=24)
+DEADLINE_MISSED_LOOKBACK_HOURS = env.int(
+    'DEADLINE_MISSED_LOOKBACK_HOURS', default=72)
+
+# Планировщик периодических задач (приложение jobs)
+# JOBS_AUTOSTART запускает планировщик в каждом процессе приложения; аренда задач
+# в БД гарантирует, что каждую задачу выполняет только один процесс
+JOBS_AUTOSTART = env.bool('JOBS_AUTOSTART', default=False)
+JOBS_MAX_WORKERS = env.int('JOBS_MAX_WORKERS', default=4)
+JOBS_POLL_INTERVAL = env.int('JOBS_POLL_INTERVAL', default=15)
+JOBS_LEASE_SECONDS = env.int('JOBS_LEASE_SECONDS', default=300)
+# Переопределение интервалов задач в секундах, например {'check_deadlines': 1800}
+JOBS_SCHEDULE = {}
+
+# Транзакционный outbox (jobs.outbox): обработчики сохранения моделей
+# выполняются после фиксации транзакции командой run_outbox
+OUTBOX_MAX_WORKERS = env.int('OUTBOX_MAX_WORKERS', default=4)
+OUTBOX_BATCH_SIZE = env.int('OUTBOX_BATCH_SIZE', default=100)
+OUTBOX_POLL_INTERVAL = env.float('OUTBOX_POLL_INTERVAL', default=1.0)
+OUTBOX_MAX_ATTEMPTS = env.int('OUTBOX_MAX_ATTEMPTS', default=5)
+# Задержка повтора (секунды) удваивается с каждой попыткой
+OUTBOX_RETRY_BACKOFF = env.int('OUTBOX_RETRY_BACKOFF', default=30)
+OUTBOX_LEASE_SECONDS = env.int('OUTBOX_LEASE_SECONDS', default=300)
+OUTBOX_RETENTION_HOURS = env.int('OUTBOX_RETENTION_HOURS', default=24)
+
+# Общий исполнитель запросов к языковой модели (feedback.services.llm_executor)
+# LLM_PROVIDER: openai или stub (локальные ответы без обращения к сети)
+LLM_PROVIDER = env('LLM_PROVIDER', default='openai')
+LLM_MODEL = env('LLM_MODEL', default='gpt-3.5-turbo')
+LLM_MAX_CONCURRENCY = env.int('LLM_MAX_CONCURRENCY', default=8)
+# 0 - без ограничения частоты
+LLM_REQUESTS_PER_MINUTE = env.int('LLM_REQUESTS_PER_MINUTE', default=500)
+LLM_MAX_RETRIES = env.int('LLM_MAX_RETRIES', default=3)
+LLM_RETRY_BACKOFF = env.float('LLM_RETRY_BACKOFF', default=1.0)
+LLM_TIMEOUT = env.int('LLM_TIMEOUT', default=60)
+# Кэш ответов модели: db, file (каталог LLM_CACHE_DIR) или none
+LLM_CACHE_BACKEND = env('LLM_CACHE_BACKEND', default='db')
+LLM_CACHE_DIR = env('LLM_CACHE_DIR', default=os.path.join(BASE_DIR, 'llm_cache'))
+LLM_CACHE_TTL = env.int('LLM_CACHE_TTL', default=7 * 24 * 3600)
+LLM_CACHE_MAX_ENTRIES = env.int('LLM_CACHE_MAX_ENTRIES', default=50000)
+# Анализ отзывов: structured - один JSON-запрос на отзыв, batched - несколько
+# отзывов в одном запросе, legacy - отдельные запросы на резюме, проблемы,
+# риски и удовлетворенность
+FEEDBACK_ANALYSIS_MODE = env('FEEDBACK_ANALYSIS_MODE', default='structured')
+# Режим batched: бюджет токенов промпта (tiktoken) и максимум отзывов в запросе
+FEEDBACK_BATCH_TOKEN_BUDGET = env.int('FEEDBACK_BATCH_TOKEN_BUDGET', default=3000)
+FEEDBACK_BATCH_MAX_ITEMS = env.int('FEEDBACK_BATCH_MAX_ITEMS', default=10)
+# Векторный индекс рекомендаций (ai_insights.embedding_index): local - TF-IDF и SVD
+# без обращения к сети, openai - векторы OpenAI
+AI_EMBEDDING_PROVIDER = env('AI_EMBEDDING_PROVIDER', default='local')
+AI_EMBEDDING_INDEX_DIR = env('AI_EMBEDDING_INDEX_DIR', default=os.path.join(BASE_DIR, 'embedding_index'))
+AI_EMBEDDING_DIMENSIONS = env.int('AI_EMBEDDING_DIMENSIONS', default=128)
+# Кэш ответов аналитики онбординга (onboarding.services.analytics) и его TTL
+# в секундах; 0 - без кэша
+ANALYTICS_CACHE = env('ANALYTICS_CACHE', default='default')
+ANALYTICS_CACHE_TTL = env.int('ANALYTICS_CACHE_TTL', default=60)
+# Выгрузка отчетов (onboarding.services.reports): каталог готовых файлов,
+# порция чтения из базы, число назначений в одной части PDF, время повторного
+# использования готового файла (с), аренда выполнения (с), число попыток
+# выполнения и срок хранения (ч)
+REPORTS_EXPORT_DIR = env('REPORTS_EXPORT_DIR', default=os.path.join(BASE_DIR, 'report_exports'))
+REPORTS_CHUNK_SIZE = env.int('REPORTS_CHUNK_SIZE', default=2000)
+REPORTS_PDF_CHUNK_SIZE = env.int('REPORTS_PDF_CHUNK_SIZE', default=500)
+REPORTS_EXPORT_MAX_AGE = env.int('REPORTS_EXPORT_MAX_AGE', default=3600)
+REPORTS_EXPORT_LEASE_SECONDS = env.int('REPORTS_EXPORT_LEASE_SECONDS', default=1800)
+REPORTS_EXPORT_MAX_ATTEMPTS = env.int('REPORTS_EXPORT_MAX_ATTEMPTS', default=3)
+REPORTS_EXPORT_RETENTION_HOURS = env.int('REPORTS_EXPORT_RETENTION_HOURS', default=24)
+# Таймауты источников SmartInsightsAggregatorService в секундах, например {'feedback': 600}
+AI_INSIGHTS_STAGE_TIMEOUTS = {}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -1,6 +1,8 @@
+import time
 from django.core.management.base import BaseCommand
 from feedback.models import UserFeedback, FeedbackTemplate
 from feedback.services.ai_insights_service import FeedbackAIInsightsService
+from feedback.services.llm_executor import get_llm_executor
 
 
 class Command(BaseCommand):
@@ -12,6 +14,18 @@ class Command(BaseCommand):
             action='store_true',
             help='Analyze all feedbacks, including already analyzed ones',
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=FeedbackAIInsightsService.BATCH_SIZE,
+            help='Number of feedback records analyzed concurrently in one batch',
+        )
+        parser.add_argument(
+            '--mode',
+            choices=['structured', 'batched', 'legacy'],
+            help='Analysis mode (defaults to FEEDBACK_ANALYSIS_MODE): one JSON request '
+                 'per feedback, many feedbacks per request, or one request per insight type',
+        )
 
     def handle(self, *args, **options):
         analyze_all = options['all']
@@ -29,12 +43,32 @@ class Command(BaseCommand):
             self.stdout.write(
                 f'Found {feedbacks.count()} new feedback records to analyze')
 
-        for feedback in feedbacks:
+        # Отзывы анализируются пакетами: запросы к модели внутри пакета
+        # выполняются конкурентно
+        feedback_ids = list(feedbacks.order_by(
+            'id').values_list('id', flat=True).distinct())
+        batch_size = options['batch_size']
+        executor = get_llm_executor()
+        requests_before = executor.stats['requests']
+        started = time.perf_counter()
+        analyzed = 0
+        for start in range(0, len(feedback_ids), batch_size):
+            batch = UserFeedback.objects.filter(
+                id__in=feedback_ids[start:start + batch_size])
+            results = FeedbackAIInsightsService.analyze_feedbacks(
+                batch, options['mode'])
+            analyzed += len(results)
             self.stdout.write(
-                f'Analyzing feedback #{feedback.id} from {feedback.user.email}')
-            insights = FeedbackAIInsightsService.analyze_feedback(feedback)
+                f'Created {sum(len(insights) for insights in results.values())} insights '
+                f'for {len(results)} feedback records '
+                f'({min(start + batch_size, len(feedback_ids))}/{len(feedback_ids)})')
+
+        elapsed = time.perf_counter() - started
+        if analyzed and elapsed > 0:
             self.stdout.write(
-                f'Created {len(insights)} insights for feedback #{feedback.id}')
+                f'Analyzed {analyzed} feedback records in {elapsed:.1f}s '
+                f'({analyzed / elapsed * 60:.0f} feedbacks/minute, '
+                f'{executor.stats["requests"] - requests_before} LLM requests)')
 
         # Анализ агрегированных данных по шаблонам
         templates = FeedbackTemplate.objects.all()
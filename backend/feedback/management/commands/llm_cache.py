@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from feedback.services.llm_cache import get_response_cache
+
+
+class Command(BaseCommand):
+    help = 'Show statistics of the LLM response cache, evict stale entries or clear it'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--evict',
+            action='store_true',
+            help='Remove expired entries and entries over LLM_CACHE_MAX_ENTRIES',
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Remove all cached responses',
+        )
+
+    def handle(self, *args, **options):
+        cache = get_response_cache()
+        if cache is None:
+            self.stdout.write('LLM response cache is disabled (LLM_CACHE_BACKEND=none)')
+            return
+
+        if options['clear']:
+            cache.clear()
+            self.stdout.write('LLM response cache cleared')
+        elif options['evict']:
+            self.stdout.write(f'Evicted {cache.evict()} cache entries')
+
+        stats = cache.stats()
+        # Каждая запись создана промахом, поэтому доля попаданий - hits / (hits + entries)
+        lookups = stats['hits'] + stats['entries']
+        hit_rate = stats['hits'] / lookups * 100 if lookups else 0
+        self.stdout.write(
+            f"Entries: {stats['entries']}, hits: {stats['hits']}, "
+            f"hit rate: {hit_rate:.1f}%")
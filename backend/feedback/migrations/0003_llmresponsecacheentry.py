@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feedback', '0002_feedbacktrendrule_feedbacktrendalert_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMResponseCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='key')),
+                ('model', models.CharField(max_length=100, verbose_name='model')),
+                ('response', models.TextField(verbose_name='response')),
+                ('hits', models.PositiveIntegerField(default=0, verbose_name='hits')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='created at')),
+                ('last_used_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='last used at')),
+            ],
+            options={
+                'verbose_name': 'LLM response cache entry',
+                'verbose_name_plural': 'LLM response cache entries',
+                'indexes': [models.Index(fields=['last_used_at'], name='feedback_llmcache_used_idx'), models.Index(fields=['created_at'], name='feedback_llmcache_created_idx')],
+            },
+        ),
+    ]
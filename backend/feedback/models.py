@@ -196,3 +196,28 @@ class FeedbackInsight(models.Model):
 
     def __str__(self):
         return f"{self.get_type_display()} - {self.content[:50]}"
+
+
+class LLMResponseCacheEntry(models.Model):
+    """
+    Сохраненный ответ языковой модели (кэш feedback.services.llm_cache)
+    """
+    key = models.CharField(_('key'), max_length=64, unique=True)
+    model = models.CharField(_('model'), max_length=100)
+    response = models.TextField(_('response'))
+    hits = models.PositiveIntegerField(_('hits'), default=0)
+    created_at = models.DateTimeField(_('created at'), default=timezone.now)
+    last_used_at = models.DateTimeField(_('last used at'), default=timezone.now)
+
+    class Meta:
+        verbose_name = _('LLM response cache entry')
+        verbose_name_plural = _('LLM response cache entries')
+        indexes = [
+            models.Index(fields=['last_used_at'],
+                         name='feedback_llmcache_used_idx'),
+            models.Index(fields=['created_at'],
+                         name='feedback_llmcache_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.model} - {self.key[:12]}"
@@ -1,18 +1,84 @@
-import os
 import json
-import openai
-from langchain.chat_models import ChatOpenAI
-from langchain.chains import LLMChain
-from langchain.prompts import ChatPromptTemplate
+import re
+from collections import deque
+from functools import partial
 from django.conf import settings
-from ..models import FeedbackInsight
+from django.db.models import prefetch_related_objects
+from ..models import FeedbackInsight, UserFeedback
+from .llm_executor import count_tokens, get_llm_executor
+
+# Схема ответа на единый запрос анализа записи обратной связи
+STRUCTURED_ANALYSIS_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'summary': {
+            'type': 'string',
+            'description': 'Concise summary of the feedback, under 200 words'
+        },
+        'problem_areas': {
+            'type': 'array',
+            'items': {'type': 'string'},
+            'maxItems': 3,
+            'description': 'Specific, concise and actionable problem areas'
+        },
+        'risks': {
+            'type': 'array',
+            'items': {'type': 'string'},
+            'maxItems': 2,
+            'description': 'Risks that could impact employee retention or satisfaction'
+        },
+        'satisfaction': {
+            'type': 'object',
+            'properties': {
+                'score': {
+                    'type': 'integer',
+                    'minimum': 0,
+                    'maximum': 100,
+                    'description': '0 is extremely dissatisfied, 100 is extremely satisfied'
+                },
+                'explanation': {
+                    'type': 'string',
+                    'description': 'One-sentence explanation of the score'
+                }
+            },
+            'required': ['score', 'explanation']
+        }
+    },
+    'required': ['summary', 'problem_areas', 'risks', 'satisfaction']
+}
+
+# Схема ответа на запрос анализа пакета записей: результаты по id записей
+BATCHED_ANALYSIS_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'results': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': dict(
+                    {'id': {'type': 'integer', 'description': 'id of the feedback record'}},
+                    **STRUCTURED_ANALYSIS_SCHEMA['properties']
+                ),
+                'required': ['id'] + STRUCTURED_ANALYSIS_SCHEMA['required']
+            }
+        }
+    },
+    'required': ['results']
+}
 
 
 class FeedbackAIInsightsService:
     """
-    Сервис для анализа обратной связи с помощью AI
+    Сервис для анализа обратной связи с помощью AI.
+
+    Запросы к языковой модели выполняются общим исполнителем (llm_executor):
+    запросы по одному отзыву и по целому пакету отзывов отправляются
+    конкурентно с учетом лимитов параллельности и частоты
     """
 
+    # Количество отзывов, анализируемых одним пакетом
+    BATCH_SIZE = 200
+
     @staticmethod
     def analyze_feedback(user_feedback):
         """
@@ -24,66 +90,301 @@ class FeedbackAIInsightsService:
         Returns:
             list: Список созданных инсайтов
         """
+        return FeedbackAIInsightsService.analyze_feedbacks(
+            [user_feedback]).get(user_feedback.id, [])
+
+    @staticmethod
+    def analyze_feedbacks(user_feedbacks, mode=None):
+        """
+        Анализирует пакет записей обратной связи. Запросы к модели по всем
+        записям пакета выполняются конкурентно, инсайты сохраняются одним bulk_create.
+
+        Режимы (FEEDBACK_ANALYSIS_MODE):
+            structured (по умолчанию) - один запрос с ответом в JSON на запись;
+            batched - несколько записей в одном запросе в пределах бюджета токенов;
+            legacy - отдельные запросы на каждый вид инсайтов.
+        Записи, ответ по которым не прошел проверку, анализируются следующим
+        по списку режимом вплоть до legacy
+
+        Args:
+            user_feedbacks: Список или QuerySet объектов UserFeedback
+            mode (str): Режим анализа (по умолчанию из настроек)
+
+        Returns:
+            dict: Списки созданных инсайтов по id записи обратной связи
+        """
         try:
-            # Подготавливаем данные для анализа
-            answers = user_feedback.answers.all()
-            if not answers:
-                return []
+            user_feedbacks = list(user_feedbacks)
+            prefetch_related_objects(
+                user_feedbacks, 'template', 'answers__question')
+
+            # Пары (запись, данные для промптов) для записей с ответами
+            pending = []
+            for user_feedback in user_feedbacks:
+                feedback_data = FeedbackAIInsightsService._get_feedback_data(
+                    user_feedback)
+                if feedback_data['answers']:
+                    pending.append((user_feedback, feedback_data))
+            insights = {user_feedback.id: [] for user_feedback, _ in pending}
+
+            mode = mode or getattr(settings, 'FEEDBACK_ANALYSIS_MODE', 'structured')
+            to_create = []
+            # Записи, результат по которым не прошел проверку, анализируются
+            # следующим, более подробным способом
+            if mode == 'batched':
+                pending = FeedbackAIInsightsService._batched_insights(
+                    pending, to_create)
+            if mode in ('batched', 'structured'):
+                pending = FeedbackAIInsightsService._structured_insights(
+                    pending, to_create)
+            FeedbackAIInsightsService._legacy_insights(pending, to_create)
+
+            for insight in FeedbackInsight.objects.bulk_create(to_create):
+                insights[insight.feedback_id].append(insight)
+            return insights
 
-            # Создаем структурированный словарь с ответами
-            feedback_data = {
-                'template_title': user_feedback.template.title,
-                'answers': []
-            }
+        except Exception as e:
+            print(f"Error in FeedbackAIInsightsService.analyze_feedbacks: {e}")
+            return {}
 
-            for answer in answers:
-                answer_data = {
-                    'question': answer.question.text,
-                    'type': answer.question.type
-                }
+    @staticmethod
+    def _structured_insights(pending, to_create):
+        """
+        Анализирует записи одним запросом на запись: модель возвращает резюме,
+        проблемные зоны, риски и индекс удовлетворенности в одном JSON-объекте
 
-                # В зависимости от типа вопроса берем соответствующее значение
-                if answer.question.type == 'text':
-                    answer_data['value'] = answer.text_answer
-                elif answer.question.type == 'scale':
-                    answer_data['value'] = answer.scale_answer
-                elif answer.question.type == 'multiple_choice':
-                    answer_data['value'] = answer.choice_answer
+        Args:
+            pending: Пары (запись, данные для промптов)
+            to_create: Список, в который добавляются несохраненные инсайты
 
-                feedback_data['answers'].append(answer_data)
+        Returns:
+            list: Пары (запись, данные), ответ по которым не удалось разобрать
+        """
+        responses = get_llm_executor().complete_many(
+            [FeedbackAIInsightsService._structured_request(feedback_data)
+             for _, feedback_data in pending],
+            json_mode=True
+        )
+
+        failed = []
+        for (user_feedback, feedback_data), response in zip(pending, responses):
+            analysis = FeedbackAIInsightsService._parse_structured_response(response)
+            if analysis is None:
+                failed.append((user_feedback, feedback_data))
+                continue
+            to_create.extend(FeedbackAIInsightsService._analysis_insights(
+                analysis, user_feedback, feedback_data))
+
+        return failed
 
-            # Создаем инсайты на основе данных
-            insights = []
+    @staticmethod
+    def _batched_insights(pending, to_create):
+        """
+        Анализирует несколько записей одним запросом. Записи берутся из очереди
+        в пакет, пока промпт укладывается в FEEDBACK_BATCH_TOKEN_BUDGET токенов
+        (по подсчету tiktoken) и FEEDBACK_BATCH_MAX_ITEMS записей; пакеты
+        отправляются конкурентно, результаты сопоставляются с записями по id
+
+        Args:
+            pending: Пары (запись, данные для промптов)
+            to_create: Список, в который добавляются несохраненные инсайты
+
+        Returns:
+            list: Пары (запись, данные), для которых нет корректного результата
+        """
+        batches = FeedbackAIInsightsService._pack_batches(pending)
+        responses = get_llm_executor().complete_many(
+            [FeedbackAIInsightsService._batched_request([text for _, _, text in batch])
+             for batch in batches],
+            json_mode=True
+        )
+
+        failed = []
+        for batch, response in zip(batches, responses):
+            results = FeedbackAIInsightsService._parse_batched_response(response)
+            for user_feedback, feedback_data, _ in batch:
+                analysis = results.get(user_feedback.id)
+                if analysis is None:
+                    failed.append((user_feedback, feedback_data))
+                    continue
+                to_create.extend(FeedbackAIInsightsService._analysis_insights(
+                    analysis, user_feedback, feedback_data))
+
+        return failed
+
+    @staticmethod
+    def _pack_batches(pending):
+        """
+        Разбивает записи на пакеты по бюджету токенов промпта
+
+        Returns:
+            list: Пакеты - списки троек (запись, данные, JSON записи для промпта)
+        """
+        budget = getattr(settings, 'FEEDBACK_BATCH_TOKEN_BUDGET', 3000)
+        max_items = getattr(settings, 'FEEDBACK_BATCH_MAX_ITEMS', 10)
+        base_tokens = sum(
+            count_tokens(content)
+            for _, content in FeedbackAIInsightsService._batched_request([]))
+
+        queue = deque()
+        for user_feedback, feedback_data in pending:
+            text = json.dumps({
+                'id': user_feedback.id,
+                'template': feedback_data['template_title'],
+                'answers': feedback_data['answers']
+            }, indent=2)
+            queue.append((user_feedback, feedback_data, text, count_tokens(text)))
+
+        batches = []
+        while queue:
+            batch = []
+            tokens = base_tokens
+            while queue and len(batch) < max_items:
+                # Запись больше бюджета отправляется отдельным пакетом
+                if batch and tokens + queue[0][3] > budget:
+                    break
+                user_feedback, feedback_data, text, item_tokens = queue.popleft()
+                batch.append((user_feedback, feedback_data, text))
+                tokens += item_tokens
+            batches.append(batch)
+        return batches
+
+    @staticmethod
+    def _batched_request(item_texts):
+        """
+        Формирует запрос на анализ пакета записей
+
+        Args:
+            item_texts: JSON-представления записей (id, шаблон, ответы)
+        """
+        return [
+            ("system", "You are an AI assistant that analyzes employee onboarding feedback. "
+                       "You receive a JSON array of feedback records. Analyze every record "
+                       "independently and respond with a single JSON object that matches "
+                       "this JSON schema and nothing else, with one result per record "
+                       "carrying the record id:\n\n"
+             f"{json.dumps(BATCHED_ANALYSIS_SCHEMA, indent=2)}"),
+            ("human", "Please analyze these feedback records:\n\n"
+             "[\n" + ",\n".join(item_texts) + "\n]")
+        ]
+
+    @staticmethod
+    def _parse_batched_response(response):
+        """
+        Разбирает ответ на пакетный запрос
 
-            # Создаем summary
-            summary_insight = FeedbackAIInsightsService._generate_summary(
-                feedback_data, user_feedback)
-            if summary_insight:
-                insights.append(summary_insight)
-
-            # Идентифицируем проблемные зоны
-            problem_areas = FeedbackAIInsightsService._identify_problem_areas(
-                feedback_data, user_feedback)
-            if problem_areas:
-                insights.extend(problem_areas)
-
-            # Выявляем риски
-            risks = FeedbackAIInsightsService._identify_risks(
-                feedback_data, user_feedback)
-            if risks:
-                insights.extend(risks)
-
-            # Вычисляем индекс удовлетворенности
-            satisfaction = FeedbackAIInsightsService._calculate_satisfaction_index(
-                feedback_data, user_feedback)
+        Returns:
+            dict: Проверенные результаты по id записи
+        """
+        data = FeedbackAIInsightsService._extract_json(response)
+        if not isinstance(data, dict) or not isinstance(data.get('results'), list):
+            return {}
+
+        results = {}
+        for item in data['results']:
+            if not isinstance(item, dict):
+                continue
+            feedback_id = item.get('id')
+            if isinstance(feedback_id, bool) or not isinstance(feedback_id, int):
+                continue
+            analysis = FeedbackAIInsightsService._validate_analysis(item)
+            if analysis is not None:
+                results[feedback_id] = analysis
+        return results
+
+    @staticmethod
+    def _analysis_insights(analysis, user_feedback, feedback_data):
+        """
+        Создает (без сохранения) инсайты записи из проверенного результата анализа
+        """
+        insights = []
+        target = {'feedback': user_feedback}
+        insights.append(FeedbackInsight(
+            type=FeedbackInsight.InsightType.SUMMARY,
+            content=analysis['summary'],
+            confidence_score=0.9,
+            **target
+        ))
+        for insight_type, key, confidence in (
+                (FeedbackInsight.InsightType.PROBLEM_AREA, 'problem_areas', 0.8),
+                (FeedbackInsight.InsightType.RISK, 'risks', 0.7)):
+            insights.extend(
+                FeedbackInsight(
+                    type=insight_type,
+                    content=content,
+                    # Убывающая уверенность для каждого следующего пункта
+                    confidence_score=confidence - (i * 0.1),
+                    **target
+                )
+                for i, content in enumerate(analysis[key])
+            )
+
+        satisfaction = FeedbackAIInsightsService._scale_satisfaction_insight(
+            feedback_data, target)
+        if satisfaction is None:
+            satisfaction = FeedbackInsight(
+                type=FeedbackInsight.InsightType.SATISFACTION,
+                content=(f"Satisfaction Index: {analysis['satisfaction']['score']}/100. "
+                         f"{analysis['satisfaction']['explanation']}").strip(),
+                confidence_score=0.7,  # Средняя уверенность для NLP-анализа
+                **target
+            )
+        insights.append(satisfaction)
+        return insights
+
+    @staticmethod
+    def _legacy_insights(pending, to_create):
+        """
+        Анализирует записи отдельными запросами для каждого вида инсайтов
+
+        Args:
+            pending: Пары (запись, данные для промптов)
+            to_create: Список, в который добавляются несохраненные инсайты
+        """
+        planned = []
+        prompts = []
+        for user_feedback, feedback_data in pending:
+            requests = FeedbackAIInsightsService._feedback_requests(feedback_data)
+            planned.append(
+                (user_feedback, feedback_data, [parse for parse, _ in requests]))
+            prompts.extend(messages for _, messages in requests)
+
+        responses = iter(get_llm_executor().complete_many(prompts))
+
+        for user_feedback, feedback_data, parsers in planned:
+            target = {'feedback': user_feedback}
+            for parse in parsers:
+                to_create.extend(parse(next(responses), target))
+
+            # Индекс по числовым шкалам рассчитывается без обращения к модели
+            satisfaction = FeedbackAIInsightsService._scale_satisfaction_insight(
+                feedback_data, target)
             if satisfaction:
-                insights.append(satisfaction)
+                to_create.append(satisfaction)
 
-            return insights
+    @staticmethod
+    def analyze_all_feedback(batch_size=None, mode=None):
+        """
+        Анализирует все записи обратной связи, для которых еще нет инсайтов
 
-        except Exception as e:
-            print(f"Error in FeedbackAIInsightsService.analyze_feedback: {e}")
-            return []
+        Args:
+            batch_size (int): Количество записей в пакете (по умолчанию BATCH_SIZE)
+            mode (str): Режим анализа (см. analyze_feedbacks)
+
+        Returns:
+            list: Список созданных инсайтов
+        """
+        batch_size = batch_size or FeedbackAIInsightsService.BATCH_SIZE
+        feedback_ids = list(UserFeedback.objects.filter(
+            insights__isnull=True).order_by('id').values_list('id', flat=True))
+
+        insights = []
+        for start in range(0, len(feedback_ids), batch_size):
+            batch = UserFeedback.objects.filter(
+                id__in=feedback_ids[start:start + batch_size]).order_by('id')
+            for feedback_insights in FeedbackAIInsightsService.analyze_feedbacks(batch, mode).values():
+                insights.extend(feedback_insights)
+        return insights
 
     @staticmethod
     def analyze_template_feedback(template):
@@ -98,369 +399,337 @@ class FeedbackAIInsightsService:
         """
         try:
             # Получаем все отзывы по этому шаблону
-            feedbacks = template.user_feedbacks.all()
+            feedbacks = list(
+                template.user_feedbacks.prefetch_related('answers__question'))
             if not feedbacks:
                 return []
 
             # Подготавливаем агрегированные данные
             aggregated_data = {
                 'template_title': template.title,
-                'feedback_count': feedbacks.count(),
-                'feedbacks': []
+                'feedback_count': len(feedbacks),
+                'feedbacks': [
+                    {
+                        'user_id': feedback.user_id,
+                        'answers': FeedbackAIInsightsService._get_answers_data(feedback)
+                    }
+                    for feedback in feedbacks
+                ]
             }
 
-            for feedback in feedbacks:
-                feedback_data = {
-                    'user_id': feedback.user.id,
-                    'answers': []
-                }
+            # Общее резюме, общие проблемные зоны и общий индекс
+            # удовлетворенности запрашиваются параллельно
+            requests = FeedbackAIInsightsService._template_requests(
+                aggregated_data)
+            responses = get_llm_executor().complete_many(
+                [messages for _, messages in requests])
 
-                for answer in feedback.answers.all():
-                    answer_data = {
-                        'question': answer.question.text,
-                        'type': answer.question.type
-                    }
+            target = {'template': template}
+            insights = []
+            for (parse, _), response in zip(requests, responses):
+                insights.extend(parse(response, target))
 
-                    if answer.question.type == 'text':
-                        answer_data['value'] = answer.text_answer
-                    elif answer.question.type == 'scale':
-                        answer_data['value'] = answer.scale_answer
-                    elif answer.question.type == 'multiple_choice':
-                        answer_data['value'] = answer.choice_answer
+            return FeedbackInsight.objects.bulk_create(insights)
 
-                    feedback_data['answers'].append(answer_data)
+        except Exception as e:
+            print(
+                f"Error in FeedbackAIInsightsService.analyze_template_feedback: {e}")
+            return []
 
-                aggregated_data['feedbacks'].append(feedback_data)
+    @staticmethod
+    def _get_answers_data(user_feedback):
+        """
+        Преобразует ответы записи обратной связи в список словарей для промптов
+        """
+        answers = []
+        for answer in user_feedback.answers.all():
+            answer_data = {
+                'question': answer.question.text,
+                'type': answer.question.type
+            }
 
-            # Создаем агрегированные инсайты
-            insights = []
+            # В зависимости от типа вопроса берем соответствующее значение
+            if answer.question.type == 'text':
+                answer_data['value'] = answer.text_answer
+            elif answer.question.type == 'scale':
+                answer_data['value'] = answer.scale_answer
+            elif answer.question.type == 'multiple_choice':
+                answer_data['value'] = answer.choice_answer
 
-            # Общее резюме по шаблону
-            template_summary = FeedbackAIInsightsService._generate_template_summary(
-                aggregated_data, template)
-            if template_summary:
-                insights.append(template_summary)
+            answers.append(answer_data)
+        return answers
 
-            # Выявление общих проблемных зон
-            common_problems = FeedbackAIInsightsService._identify_common_problems(
-                aggregated_data, template)
-            if common_problems:
-                insights.extend(common_problems)
+    @staticmethod
+    def _get_feedback_data(user_feedback):
+        return {
+            'template_title': user_feedback.template.title,
+            'answers': FeedbackAIInsightsService._get_answers_data(user_feedback)
+        }
 
-            # Общий индекс удовлетворенности
-            overall_satisfaction = FeedbackAIInsightsService._calculate_overall_satisfaction(
-                aggregated_data, template)
-            if overall_satisfaction:
-                insights.append(overall_satisfaction)
+    @staticmethod
+    def _structured_request(feedback_data):
+        """
+        Формирует единый запрос на резюме, проблемные зоны, риски
+        и индекс удовлетворенности записи обратной связи
+        """
+        return [
+            ("system", "You are an AI assistant that analyzes employee onboarding feedback. "
+                       "Respond with a single JSON object that matches this JSON schema "
+                       "and nothing else:\n\n"
+             f"{json.dumps(STRUCTURED_ANALYSIS_SCHEMA, indent=2)}"),
+            ("human", f"Please analyze this feedback for '{feedback_data['template_title']}':\n\n"
+             f"{json.dumps(feedback_data['answers'], indent=2)}")
+        ]
 
-            return insights
+    @staticmethod
+    def _parse_structured_response(response):
+        """
+        Разбирает и проверяет ответ на единый запрос по STRUCTURED_ANALYSIS_SCHEMA
 
-        except Exception as e:
-            print(
-                f"Error in FeedbackAIInsightsService.analyze_template_feedback: {e}")
-            return []
+        Returns:
+            dict: Проверенный результат или None, если ответ не соответствует схеме
+        """
+        return FeedbackAIInsightsService._validate_analysis(
+            FeedbackAIInsightsService._extract_json(response))
 
     @staticmethod
-    def _generate_summary(feedback_data, user_feedback):
+    def _extract_json(response):
         """
-        Генерирует краткое резюме ответов пользователя
+        Извлекает JSON-объект из ответа модели
+
+        Returns:
+            Разобранный объект или None
         """
+        if not response:
+            return None
+
+        # Модель может обернуть JSON в markdown-блок
+        json_match = re.search(r'\{.*\}', response, re.DOTALL)
+        if not json_match:
+            return None
         try:
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", "You are an AI assistant that analyzes feedback and summarizes it. "
-                           "Keep your summary concise, under 200 words."),
-                ("human", f"Please analyze this feedback for '{feedback_data['template_title']}' "
-                 f"and provide a concise summary:\n\n{json.dumps(feedback_data['answers'], indent=2)}")
-            ])
-
-            summary = FeedbackAIInsightsService._get_completion(prompt)
-
-            if summary:
-                return FeedbackInsight.objects.create(
-                    feedback=user_feedback,
-                    type=FeedbackInsight.InsightType.SUMMARY,
-                    content=summary,
-                    confidence_score=0.9  # Высокая уверенность для суммаризации
-                )
+            return json.loads(json_match.group(0))
+        except json.JSONDecodeError:
             return None
-        except Exception as e:
-            print(f"Error in _generate_summary: {e}")
+
+    @staticmethod
+    def _validate_analysis(data):
+        """
+        Проверяет результат анализа записи по STRUCTURED_ANALYSIS_SCHEMA
+
+        Returns:
+            dict: Проверенный результат или None, если он не соответствует схеме
+        """
+        if not isinstance(data, dict):
+            return None
+
+        summary = data.get('summary')
+        if not isinstance(summary, str) or not summary.strip():
+            return None
+
+        analysis = {'summary': summary.strip()}
+        for key in ('problem_areas', 'risks'):
+            items = data.get(key)
+            if not isinstance(items, list) or not all(isinstance(item, str) for item in items):
+                return None
+            limit = STRUCTURED_ANALYSIS_SCHEMA['properties'][key]['maxItems']
+            analysis[key] = [item.strip() for item in items if item.strip()][:limit]
+
+        satisfaction = data.get('satisfaction')
+        if not isinstance(satisfaction, dict):
+            return None
+        score = satisfaction.get('score')
+        # bool - подкласс int, но не является оценкой
+        if isinstance(score, bool) or not isinstance(score, (int, float)) or not 0 <= score <= 100:
+            return None
+        explanation = satisfaction.get('explanation', '')
+        if not isinstance(explanation, str):
             return None
+        analysis['satisfaction'] = {'score': round(score), 'explanation': explanation.strip()}
+
+        return analysis
 
     @staticmethod
-    def _identify_problem_areas(feedback_data, user_feedback):
+    def _feedback_requests(feedback_data):
         """
-        Выявляет проблемные зоны на основе ответов
+        Формирует запросы к модели по одной записи обратной связи
+
+        Returns:
+            list: Пары (функция разбора ответа, сообщения запроса)
         """
-        try:
-            prompt = ChatPromptTemplate.from_messages([
+        title = feedback_data['template_title']
+        answers = json.dumps(feedback_data['answers'], indent=2)
+        service = FeedbackAIInsightsService
+
+        requests = [
+            # Краткое резюме ответов пользователя
+            (partial(service._summary_insights, confidence=0.9), [
+                ("system", "You are an AI assistant that analyzes feedback and summarizes it. "
+                           "Keep your summary concise, under 200 words."),
+                ("human", f"Please analyze this feedback for '{title}' "
+                 f"and provide a concise summary:\n\n{answers}")
+            ]),
+            # Проблемные зоны
+            (partial(service._paragraph_insights,
+                     insight_type=FeedbackInsight.InsightType.PROBLEM_AREA, confidence=0.8), [
                 ("system", "You are an AI assistant that identifies problem areas in feedback. "
                            "Analyze the feedback and identify up to 3 specific problem areas. "
                            "Each problem area should be concise and actionable."),
-                ("human", f"Please analyze this feedback for '{feedback_data['template_title']}' "
-                 f"and identify problem areas:\n\n{json.dumps(feedback_data['answers'], indent=2)}\n\n"
+                ("human", f"Please analyze this feedback for '{title}' "
+                 f"and identify problem areas:\n\n{answers}\n\n"
                  f"Format each problem area as a separate paragraph.")
-            ])
-
-            problems_text = FeedbackAIInsightsService._get_completion(prompt)
-
-            if problems_text:
-                # Разбиваем текст на отдельные проблемные зоны
-                problems = [p.strip()
-                            for p in problems_text.split('\n\n') if p.strip()]
-
-                insights = []
-                for i, problem in enumerate(problems):
-                    insights.append(
-                        FeedbackInsight.objects.create(
-                            feedback=user_feedback,
-                            type=FeedbackInsight.InsightType.PROBLEM_AREA,
-                            content=problem,
-                            # Убывающая уверенность для каждой следующей проблемы
-                            confidence_score=0.8 - (i * 0.1)
-                        )
-                    )
-                return insights
-            return []
-        except Exception as e:
-            print(f"Error in _identify_problem_areas: {e}")
-            return []
-
-    @staticmethod
-    def _identify_risks(feedback_data, user_feedback):
-        """
-        Выявляет потенциальные риски на основе ответов
-        """
-        try:
-            prompt = ChatPromptTemplate.from_messages([
+            ]),
+            # Потенциальные риски
+            (partial(service._paragraph_insights,
+                     insight_type=FeedbackInsight.InsightType.RISK, confidence=0.7), [
                 ("system", "You are an AI assistant that identifies potential risks in employee feedback. "
                            "Analyze the feedback and identify up to 2 specific risks that could impact employee "
                            "retention or satisfaction. Each risk should be concise and actionable."),
-                ("human", f"Please analyze this feedback for '{feedback_data['template_title']}' "
-                 f"and identify potential risks:\n\n{json.dumps(feedback_data['answers'], indent=2)}\n\n"
+                ("human", f"Please analyze this feedback for '{title}' "
+                 f"and identify potential risks:\n\n{answers}\n\n"
                  f"Format each risk as a separate paragraph.")
-            ])
-
-            risks_text = FeedbackAIInsightsService._get_completion(prompt)
-
-            if risks_text:
-                # Разбиваем текст на отдельные риски
-                risks = [r.strip()
-                         for r in risks_text.split('\n\n') if r.strip()]
-
-                insights = []
-                for i, risk in enumerate(risks):
-                    insights.append(
-                        FeedbackInsight.objects.create(
-                            feedback=user_feedback,
-                            type=FeedbackInsight.InsightType.RISK,
-                            content=risk,
-                            # Убывающая уверенность для каждого следующего риска
-                            confidence_score=0.7 - (i * 0.1)
-                        )
-                    )
-                return insights
-            return []
-        except Exception as e:
-            print(f"Error in _identify_risks: {e}")
-            return []
-
-    @staticmethod
-    def _calculate_satisfaction_index(feedback_data, user_feedback):
-        """
-        Вычисляет индекс удовлетворенности на основе ответов
-        """
-        try:
-            # Находим вопросы с числовыми шкалами
-            scale_answers = [a for a in feedback_data['answers']
-                             if a['type'] == 'scale' and isinstance(a.get('value'), (int, float))]
-
-            # Если нет числовых ответов, используем NLP для оценки текстовых ответов
-            if not scale_answers:
-                prompt = ChatPromptTemplate.from_messages([
+            ]),
+        ]
+
+        # Если нет числовых ответов, используем NLP для оценки текстовых ответов
+        if not service._scale_answers(feedback_data):
+            requests.append((
+                partial(service._satisfaction_insights,
+                        label='Satisfaction Index', confidence=0.7),
+                [
                     ("system", "You are an AI assistant that calculates a satisfaction index based on text feedback. "
                                "Analyze the feedback and calculate a satisfaction score on a scale of 0-100, "
                                "where 0 is extremely dissatisfied and 100 is extremely satisfied."),
-                    ("human", f"Please analyze this feedback for '{feedback_data['template_title']}' "
-                     f"and calculate a satisfaction index:\n\n{json.dumps(feedback_data['answers'], indent=2)}\n\n"
+                    ("human", f"Please analyze this feedback for '{title}' "
+                     f"and calculate a satisfaction index:\n\n{answers}\n\n"
                      f"Respond with only the numeric score (0-100) and a one-sentence explanation.")
-                ])
-
-                result = FeedbackAIInsightsService._get_completion(prompt)
-
-                if result:
-                    try:
-                        # Извлекаем число из ответа
-                        import re
-                        score_match = re.search(r'(\d+)', result)
-                        if score_match:
-                            score = int(score_match.group(1))
-                            explanation = result.replace(
-                                score_match.group(0), '').strip()
-
-                            return FeedbackInsight.objects.create(
-                                feedback=user_feedback,
-                                type=FeedbackInsight.InsightType.SATISFACTION,
-                                content=f"Satisfaction Index: {score}/100. {explanation}",
-                                confidence_score=0.7  # Средняя уверенность для NLP-анализа
-                            )
-                    except Exception as e:
-                        print(f"Error parsing satisfaction score: {e}")
-            else:
-                # Находим среднее значение всех шкальных вопросов и нормализуем к 100
-                total = sum(a.get('value', 0) for a in scale_answers)
-                # Предполагаем, что шкала от 0 до 10
-                max_possible = sum(10 for _ in scale_answers)
-
-                if max_possible > 0:
-                    score = (total / max_possible) * 100
-                    return FeedbackInsight.objects.create(
-                        feedback=user_feedback,
-                        type=FeedbackInsight.InsightType.SATISFACTION,
-                        content=f"Satisfaction Index: {score:.1f}/100 based on {len(scale_answers)} scale questions.",
-                        confidence_score=0.9  # Высокая уверенность для числовых данных
-                    )
+                ]
+            ))
 
-            return None
-        except Exception as e:
-            print(f"Error in _calculate_satisfaction_index: {e}")
-            return None
+        return requests
 
     @staticmethod
-    def _generate_template_summary(aggregated_data, template):
+    def _template_requests(aggregated_data):
         """
-        Генерирует общее резюме по всем отзывам для шаблона
+        Формирует запросы к модели по агрегированным данным шаблона
+
+        Returns:
+            list: Пары (функция разбора ответа, сообщения запроса)
         """
-        try:
-            prompt = ChatPromptTemplate.from_messages([
+        description = (
+            f"'{aggregated_data['template_title']}' "
+            f"with {aggregated_data['feedback_count']} responses"
+        )
+        sample = json.dumps(aggregated_data['feedbacks'][:5], indent=2)
+        service = FeedbackAIInsightsService
+
+        return [
+            # Общее резюме по шаблону
+            (partial(service._summary_insights, confidence=0.85), [
                 ("system", "You are an AI assistant that analyzes aggregated feedback data and provides insights. "
                            "Summarize the key themes and patterns in this feedback."),
-                ("human", f"Please analyze this aggregated feedback data for '{aggregated_data['template_title']}' "
-                 f"with {aggregated_data['feedback_count']} responses and provide a summary:\n\n"
-                 f"Sample of responses: {json.dumps(aggregated_data['feedbacks'][:5], indent=2)}")
-            ])
-
-            summary = FeedbackAIInsightsService._get_completion(prompt)
-
-            if summary:
-                return FeedbackInsight.objects.create(
-                    template=template,
-                    type=FeedbackInsight.InsightType.SUMMARY,
-                    content=summary,
-                    confidence_score=0.85
-                )
-            return None
-        except Exception as e:
-            print(f"Error in _generate_template_summary: {e}")
-            return None
+                ("human", f"Please analyze this aggregated feedback data for {description} "
+                 f"and provide a summary:\n\nSample of responses: {sample}")
+            ]),
+            # Общие проблемные зоны
+            (partial(service._paragraph_insights,
+                     insight_type=FeedbackInsight.InsightType.PROBLEM_AREA, confidence=0.8), [
+                ("system", "You are an AI assistant that identifies common problems in aggregated feedback. "
+                           "Analyze the feedback and identify up to 3 common problem areas."),
+                ("human", f"Please analyze this aggregated feedback data for {description} "
+                 f"and identify common problems:\n\nSample of responses: {sample}\n\n"
+                 f"Format each problem area as a separate paragraph.")
+            ]),
+            # Общий индекс удовлетворенности
+            (partial(service._satisfaction_insights,
+                     label='Overall Satisfaction Index', confidence=0.8), [
+                ("system", "You are an AI assistant that calculates an overall satisfaction index based on "
+                           "aggregated feedback. Calculate a satisfaction score on a scale of 0-100."),
+                ("human", f"Please analyze this aggregated feedback data for {description} "
+                 f"and calculate overall satisfaction:\n\nSample of responses: {sample}\n\n"
+                 f"Respond with only the numeric score (0-100) and a one-sentence explanation.")
+            ]),
+        ]
 
     @staticmethod
-    def _identify_common_problems(aggregated_data, template):
+    def _summary_insights(response, target, confidence):
         """
-        Выявляет общие проблемы на основе всех отзывов для шаблона
+        Создает (без сохранения) инсайт-резюме из ответа модели
         """
-        try:
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", "You are an AI assistant that identifies common problems in aggregated feedback. "
-                           "Analyze the feedback and identify up to 3 common problem areas."),
-                ("human", f"Please analyze this aggregated feedback data for '{aggregated_data['template_title']}' "
-                 f"with {aggregated_data['feedback_count']} responses and identify common problems:\n\n"
-                 f"Sample of responses: {json.dumps(aggregated_data['feedbacks'][:5], indent=2)}\n\n"
-                 f"Format each problem area as a separate paragraph.")
-            ])
-
-            problems_text = FeedbackAIInsightsService._get_completion(prompt)
-
-            if problems_text:
-                # Разбиваем текст на отдельные проблемные зоны
-                problems = [p.strip()
-                            for p in problems_text.split('\n\n') if p.strip()]
-
-                insights = []
-                for i, problem in enumerate(problems):
-                    insights.append(
-                        FeedbackInsight.objects.create(
-                            template=template,
-                            type=FeedbackInsight.InsightType.PROBLEM_AREA,
-                            content=problem,
-                            confidence_score=0.8 - (i * 0.1)
-                        )
-                    )
-                return insights
-            return []
-        except Exception as e:
-            print(f"Error in _identify_common_problems: {e}")
+        if not response:
             return []
+        return [FeedbackInsight(
+            type=FeedbackInsight.InsightType.SUMMARY,
+            content=response,
+            confidence_score=confidence,
+            **target
+        )]
 
     @staticmethod
-    def _calculate_overall_satisfaction(aggregated_data, template):
+    def _paragraph_insights(response, target, insight_type, confidence):
         """
-        Вычисляет общий индекс удовлетворенности для всех отзывов по шаблону
+        Создает (без сохранения) инсайты из ответа модели, по одному на абзац
         """
-        try:
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", "You are an AI assistant that calculates an overall satisfaction index based on "
-                           "aggregated feedback. Calculate a satisfaction score on a scale of 0-100."),
-                ("human", f"Please analyze this aggregated feedback data for '{aggregated_data['template_title']}' "
-                 f"with {aggregated_data['feedback_count']} responses and calculate overall satisfaction:\n\n"
-                 f"Sample of responses: {json.dumps(aggregated_data['feedbacks'][:5], indent=2)}\n\n"
-                 f"Respond with only the numeric score (0-100) and a one-sentence explanation.")
-            ])
-
-            result = FeedbackAIInsightsService._get_completion(prompt)
-
-            if result:
-                try:
-                    # Извлекаем число из ответа
-                    import re
-                    score_match = re.search(r'(\d+)', result)
-                    if score_match:
-                        score = int(score_match.group(1))
-                        explanation = result.replace(
-                            score_match.group(0), '').strip()
-
-                        return FeedbackInsight.objects.create(
-                            template=template,
-                            type=FeedbackInsight.InsightType.SATISFACTION,
-                            content=f"Overall Satisfaction Index: {score}/100. {explanation}",
-                            confidence_score=0.8
-                        )
-                except Exception as e:
-                    print(f"Error parsing overall satisfaction score: {e}")
+        if not response:
+            return []
 
-            return None
-        except Exception as e:
-            print(f"Error in _calculate_overall_satisfaction: {e}")
-            return None
+        paragraphs = [p.strip() for p in response.split('\n\n') if p.strip()]
+        return [
+            FeedbackInsight(
+                type=insight_type,
+                content=paragraph,
+                # Убывающая уверенность для каждого следующего абзаца
+                confidence_score=confidence - (i * 0.1),
+                **target
+            )
+            for i, paragraph in enumerate(paragraphs)
+        ]
 
     @staticmethod
-    def _get_completion(prompt):
+    def _satisfaction_insights(response, target, label, confidence):
         """
-        Получает ответ от языковой модели с использованием LangChain
+        Создает (без сохранения) инсайт индекса удовлетворенности из ответа модели
         """
-        try:
-            # Получаем API ключ из настроек Django или из переменной окружения
-            api_key = getattr(settings, 'OPENAI_API_KEY',
-                              os.getenv('OPENAI_API_KEY'))
-
-            if not api_key:
-                print("OpenAI API key not found")
-                return "No API key available for analysis."
-
-            # Создаем модель языка
-            llm = ChatOpenAI(
-                openai_api_key=api_key,
-                model_name="gpt-3.5-turbo",
-                temperature=0.2
-            )
+        if not response:
+            return []
 
-            # Создаем цепочку для обработки
-            chain = LLMChain(llm=llm, prompt=prompt)
+        # Извлекаем число из ответа
+        score_match = re.search(r'(\d+)', response)
+        if not score_match:
+            return []
 
-            # Выполняем генерацию
-            response = chain.run({})
+        score = int(score_match.group(1))
+        explanation = response.replace(score_match.group(0), '').strip()
+        return [FeedbackInsight(
+            type=FeedbackInsight.InsightType.SATISFACTION,
+            content=f"{label}: {score}/100. {explanation}",
+            confidence_score=confidence,
+            **target
+        )]
 
-            return response
-        except Exception as e:
-            print(f"Error in _get_completion: {e}")
+    @staticmethod
+    def _scale_answers(feedback_data):
+        return [a for a in feedback_data['answers']
+                if a['type'] == 'scale' and isinstance(a.get('value'), (int, float))]
+
+    @staticmethod
+    def _scale_satisfaction_insight(feedback_data, target):
+        """
+        Вычисляет индекс удовлетворенности по ответам на вопросы со шкалой
+        """
+        scale_answers = FeedbackAIInsightsService._scale_answers(feedback_data)
+        if not scale_answers:
             return None
+
+        # Находим среднее значение всех шкальных вопросов и нормализуем к 100
+        total = sum(a.get('value', 0) for a in scale_answers)
+        # Предполагаем, что шкала от 0 до 10
+        max_possible = 10 * len(scale_answers)
+
+        score = (total / max_possible) * 100
+        return FeedbackInsight(
+            type=FeedbackInsight.InsightType.SATISFACTION,
+            content=f"Satisfaction Index: {score:.1f}/100 based on {len(scale_answers)} scale questions.",
+            confidence_score=0.9,  # Высокая уверенность для числовых данных
+            **target
+        )
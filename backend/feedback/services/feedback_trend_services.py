@@ -2,21 +2,17 @@
 Сервисы для анализа трендов обратной связи и генерации алертов
 """
 import json
+import re
 from datetime import datetime, timedelta
 from django.utils import timezone
 from django.db.models import Avg, Count, F, Q, Sum
 from django.db import transaction
-from langchain.chat_models import ChatOpenAI
-from langchain.chains import LLMChain
-from langchain.prompts import ChatPromptTemplate
-import openai
-import os
-from django.conf import settings
-
-from ..models import FeedbackTemplate, UserFeedback, FeedbackInsight
+
+from ..models import UserFeedback, FeedbackInsight
 from ..dashboard_models import FeedbackTrendSnapshot, FeedbackTrendRule, FeedbackTrendAlert
 from departments.models import Department
 from .ai_insights_service import FeedbackAIInsightsService
+from .llm_executor import get_llm_executor
 
 
 class FeedbackTrendAnalyzerService:
@@ -24,44 +20,169 @@ class FeedbackTrendAnalyzerService:
     Сервис для анализа трендов в обратной связи и создания исторических срезов
     """
 
+    # Минимальное количество отзывов для создания снимка
+    MIN_RESPONSES = 3
+    # Окно анализа отзывов (в днях)
+    WINDOW_DAYS = 7
+
     @staticmethod
-    def create_daily_snapshots():
+    def create_daily_snapshots(date=None, analyze_topics=True):
         """
         Создает ежедневные снимки трендов для всех шаблонов и департаментов
+
+        Отзывы за окно читаются один раз и сворачиваются по ячейкам
+        (шаблон, департамент) вместе с итогами по шаблону, департаменту и общим
+        итогом; все снимки сохраняются пакетно в одной транзакции.
+        AI-анализ тем и проблем выполняется только для общего снимка и снимков
+        по шаблонам, остальные ячейки сохраняют ранее рассчитанные темы.
+
+        Args:
+            date: Дата снимков или None для сегодняшней даты
+            analyze_topics: Выполнять ли AI-анализ тем и проблем
+
+        Returns:
+            int: Количество созданных или обновленных снимков
         """
-        today = timezone.now().date()
-        snapshots_created = 0
-
-        # Сначала создаем глобальный снимок по всем отзывам
-        global_snapshot = FeedbackTrendAnalyzerService._create_snapshot(
-            template=None, department=None, date=today)
-        if global_snapshot:
-            snapshots_created += 1
-
-        # Создаем снимки по каждому шаблону
-        templates = FeedbackTemplate.objects.all()
-        for template in templates:
-            template_snapshot = FeedbackTrendAnalyzerService._create_snapshot(
-                template=template, department=None, date=today)
-            if template_snapshot:
-                snapshots_created += 1
-
-        # Создаем снимки по каждому департаменту
-        departments = Department.objects.filter(is_active=True)
-        for department in departments:
-            dept_snapshot = FeedbackTrendAnalyzerService._create_snapshot(
-                template=None, department=department, date=today)
-            if dept_snapshot:
-                snapshots_created += 1
-
-            # Создаем снимки по каждому шаблону + департаменту
-            for template in templates:
-                combination_snapshot = FeedbackTrendAnalyzerService._create_snapshot(
-                    template=template, department=department, date=today)
-                if combination_snapshot:
-                    snapshots_created += 1
-
-        return snapshots_created
+        if date is None:
+            date = timezone.now().date()
+
+        cells = FeedbackTrendAnalyzerService._aggregate_window(
+            date - timedelta(days=FeedbackTrendAnalyzerService.WINDOW_DAYS), date)
+        cells = {
+            key: cell for key, cell in cells.items()
+            if len(cell['feedback_ids']) >= FeedbackTrendAnalyzerService.MIN_RESPONSES
+        }
+        if not cells:
+            return 0
+
+        existing = {
+            (snapshot.template_id, snapshot.department_id): snapshot
+            for snapshot in FeedbackTrendSnapshot.objects.filter(date=date)
+        }
+
+        snapshots_to_create = []
+        snapshots_to_update = []
+        for (template_id, department_id), cell in cells.items():
+            snapshot = existing.get((template_id, department_id))
+            if snapshot is None:
+                snapshot = FeedbackTrendSnapshot(
+                    template_id=template_id,
+                    department_id=department_id,
+                    date=date
+                )
+                snapshots_to_create.append(snapshot)
+            else:
+                snapshots_to_update.append(snapshot)
+
+            snapshot.response_count = len(cell['feedback_ids'])
+            snapshot.sentiment_score = (
+                cell['sentiment_sum'] / cell['sentiment_count']
+                if cell['sentiment_count'] else 0.0
+            )
+            # Предполагаем, что шкала от 1 до 10
+            snapshot.satisfaction_index = (
+                cell['scale_sum'] / (cell['scale_count'] * 10)
+                if cell['scale_count'] else 0.5
+            )
+
+            if analyze_topics and department_id is None:
+                snapshot.main_topics, snapshot.common_issues = \
+                    FeedbackTrendAnalyzerService._analyze_topics_and_issues(
+                        UserFeedback.objects.filter(
+                            id__in=cell['feedback_ids']
+                        ).prefetch_related('answers__question'))
+
+        with transaction.atomic():
+            FeedbackTrendSnapshot.objects.bulk_create(snapshots_to_create)
+            FeedbackTrendSnapshot.objects.bulk_update(
+                snapshots_to_update,
+                ['sentiment_score', 'response_count', 'main_topics',
+                 'common_issues', 'satisfaction_index']
+            )
+
+        return len(cells)
+
+    @staticmethod
+    def _aggregate_window(start_date, end_date):
+        """
+        Сворачивает отзывы за период по ячейкам (template_id, department_id),
+        где None означает итог по всем шаблонам или департаментам
+
+        Отзыв относится к департаменту получателя и к департаменту отправителя
+        (учитываются только активные департаменты).
+
+        Returns:
+            dict: {(template_id, department_id): {'feedback_ids', 'sentiment_sum',
+                'sentiment_count', 'scale_sum', 'scale_count'}}
+        """
+        from ..models import FeedbackAnswer, FeedbackQuestion
+
+        window = UserFeedback.objects.filter(
+            created_at__date__gte=start_date,
+            created_at__date__lte=end_date
+        )
+        active_departments = set(Department.objects.filter(
+            is_active=True).values_list('id', flat=True))
+
+        # Метрики по каждому отзыву
+        sentiments = {}
+        for feedback_id, content in FeedbackInsight.objects.filter(
+            feedback__in=window,
+            type=FeedbackInsight.InsightType.SATISFACTION
+        ).values_list('feedback_id', 'content'):
+            score = FeedbackTrendAnalyzerService._extract_sentiment_score(content)
+            if score is not None:
+                total, count = sentiments.get(feedback_id, (0.0, 0))
+                sentiments[feedback_id] = (total + score, count + 1)
+
+        scales = {
+            row['feedback_id']: (row['total'], row['count'])
+            for row in FeedbackAnswer.objects.filter(
+                feedback__in=window,
+                question__type=FeedbackQuestion.QuestionType.SCALE,
+                scale_answer__isnull=False
+            ).values('feedback_id').annotate(
+                total=Sum('scale_answer'), count=Count('id'))
+        }
+
+        cells = {}
+        for feedback_id, template_id, user_department_id, submitter_department_id in window.values_list(
+                'id', 'template_id', 'user__department_id', 'submitter__department_id'):
+            departments = {user_department_id, submitter_department_id} & active_departments
+            sentiment_sum, sentiment_count = sentiments.get(feedback_id, (0.0, 0))
+            scale_sum, scale_count = scales.get(feedback_id, (0, 0))
+
+            for template_key in (None, template_id):
+                for department_key in (None, *departments):
+                    cell = cells.get((template_key, department_key))
+                    if cell is None:
+                        cell = cells[(template_key, department_key)] = {
+                            'feedback_ids': [],
+                            'sentiment_sum': 0.0,
+                            'sentiment_count': 0,
+                            'scale_sum': 0,
+                            'scale_count': 0,
+                        }
+                    cell['feedback_ids'].append(feedback_id)
+                    cell['sentiment_sum'] += sentiment_sum
+                    cell['sentiment_count'] += sentiment_count
+                    cell['scale_sum'] += scale_sum
+                    cell['scale_count'] += scale_count
+
+        return cells
+
+    @staticmethod
+    def _extract_sentiment_score(content):
+        """
+        Извлекает оценку из инсайта формата "Satisfaction Index: 85/100. ..."
+
+        Returns:
+            float или None, если оценка не найдена
+        """
+        score_match = re.search(r'(\d+)/100', content or '')
+        if score_match:
+            return int(score_match.group(1)) / 100.0
+        return None
 
     @staticmethod
     def _create_snapshot(template=None, department=None, date=None):
@@ -81,7 +202,8 @@ class FeedbackTrendAnalyzerService:
 
         # Фильтруем обратную связь за последние 7 дней
         end_date = date
-        start_date = end_date - timedelta(days=7)
+        start_date = end_date - timedelta(
+            days=FeedbackTrendAnalyzerService.WINDOW_DAYS)
 
         feedbacks_query = UserFeedback.objects.filter(
             created_at__date__gte=start_date,
@@ -94,13 +216,13 @@ class FeedbackTrendAnalyzerService:
 
         if department:
             feedbacks_query = feedbacks_query.filter(
-                Q(user__profile__department=department) |
-                Q(submitter__profile__department=department)
+                Q(user__department=department) |
+                Q(submitter__department=department)
             )
 
         # Проверяем, есть ли данные для снимка
         feedback_count = feedbacks_query.count()
-        if feedback_count < 3:  # Минимальный порог для создания снимка
+        if feedback_count < FeedbackTrendAnalyzerService.MIN_RESPONSES:
             return None
 
         # Рассчитываем метрики
@@ -115,15 +237,11 @@ class FeedbackTrendAnalyzerService:
             # Извлекаем числовые значения из текстовых инсайтов
             sentiment_values = []
             for insight in sentiment_insights:
-                try:
-                    # Формат "Satisfaction Index: 85/100. Excellent feedback."
-                    import re
-                    score_match = re.search(r'(\d+)/100', insight.content)
-                    if score_match:
-                        score = int(score_match.group(1)) / 100.0
-                        sentiment_values.append(score)
-                except Exception as e:
-                    print(f"Error extracting sentiment score: {e}")
+                # Формат "Satisfaction Index: 85/100. Excellent feedback."
+                score = FeedbackTrendAnalyzerService._extract_sentiment_score(
+                    insight.content)
+                if score is not None:
+                    sentiment_values.append(score)
 
             if sentiment_values:
                 avg_sentiment = sum(sentiment_values) / len(sentiment_values)
@@ -184,71 +302,58 @@ class FeedbackTrendAnalyzerService:
             return {}, {}
 
         try:
-            # Получаем API ключ
-            api_key = getattr(settings, 'OPENAI_API_KEY',
-                              os.getenv('OPENAI_API_KEY'))
-            if not api_key:
-                return {}, {}
-
-            # Создаем модель
-            llm = ChatOpenAI(
-                openai_api_key=api_key,
-                model_name="gpt-3.5-turbo",
-                temperature=0.2
-            )
-
-            # Анализ тем
-            topics_prompt = ChatPromptTemplate.from_messages([
-                ("system", "You are an AI assistant that analyzes feedback data to identify main topics. "
-                 "Extract 3-5 main topics mentioned across multiple feedback responses."),
-                ("human", f"Please analyze these {len(feedback_data)} feedback responses and identify the main topics:\n\n"
-                 f"{json.dumps(feedback_data[:20], indent=2)}\n\n"
-                 f"Return a JSON object with topics as keys and frequency counts as values.")
-            ])
-
-            topics_chain = LLMChain(llm=llm, prompt=topics_prompt)
-            topics_result = topics_chain.run({})
-
-            # Извлекаем JSON из ответа
-            import re
-            topics_json_match = re.search(r'\{.*\}', topics_result, re.DOTALL)
-            main_topics = {}
-            if topics_json_match:
-                try:
-                    main_topics = json.loads(topics_json_match.group(0))
-                except json.JSONDecodeError:
-                    main_topics = {'parsing_error': topics_result}
-            else:
-                main_topics = {'text_response': topics_result}
-
-            # Анализ проблем
-            issues_prompt = ChatPromptTemplate.from_messages([
-                ("system", "You are an AI assistant that analyzes feedback data to identify common issues and problems. "
-                 "Extract 3-5 main issues mentioned across multiple feedback responses."),
-                ("human", f"Please analyze these {len(feedback_data)} feedback responses and identify common issues or problems:\n\n"
-                 f"{json.dumps(feedback_data[:20], indent=2)}\n\n"
-                 f"Return a JSON object with issues as keys and frequency counts as values.")
-            ])
-
-            issues_chain = LLMChain(llm=llm, prompt=issues_prompt)
-            issues_result = issues_chain.run({})
-
-            # Извлекаем JSON из ответа
-            issues_json_match = re.search(r'\{.*\}', issues_result, re.DOTALL)
-            common_issues = {}
-            if issues_json_match:
-                try:
-                    common_issues = json.loads(issues_json_match.group(0))
-                except json.JSONDecodeError:
-                    common_issues = {'parsing_error': issues_result}
-            else:
-                common_issues = {'text_response': issues_result}
+            sample = json.dumps(feedback_data[:20], indent=2)
+            prompts = [
+                # Анализ тем
+                [
+                    ("system", "You are an AI assistant that analyzes feedback data to identify main topics. "
+                     "Extract 3-5 main topics mentioned across multiple feedback responses."),
+                    ("human", f"Please analyze these {len(feedback_data)} feedback responses and identify the main topics:\n\n"
+                     f"{sample}\n\n"
+                     f"Return a JSON object with topics as keys and frequency counts as values.")
+                ],
+                # Анализ проблем
+                [
+                    ("system", "You are an AI assistant that analyzes feedback data to identify common issues and problems. "
+                     "Extract 3-5 main issues mentioned across multiple feedback responses."),
+                    ("human", f"Please analyze these {len(feedback_data)} feedback responses and identify common issues or problems:\n\n"
+                     f"{sample}\n\n"
+                     f"Return a JSON object with issues as keys and frequency counts as values.")
+                ],
+            ]
+
+            # Оба запроса выполняются параллельно общим исполнителем
+            topics_result, issues_result = get_llm_executor().complete_many(prompts)
+            main_topics = FeedbackTrendAnalyzerService._parse_json_response(
+                topics_result)
+            common_issues = FeedbackTrendAnalyzerService._parse_json_response(
+                issues_result)
 
             return main_topics, common_issues
         except Exception as e:
             print(f"Error in _analyze_topics_and_issues: {e}")
             return {}, {}
 
+    @staticmethod
+    def _parse_json_response(response):
+        """
+        Извлекает JSON-объект из ответа модели
+
+        Returns:
+            dict: Разобранный объект, текст ответа при ошибке разбора
+                или пустой словарь, если ответа нет
+        """
+        if not response:
+            return {}
+
+        json_match = re.search(r'\{.*\}', response, re.DOTALL)
+        if not json_match:
+            return {'text_response': response}
+        try:
+            return json.loads(json_match.group(0))
+        except json.JSONDecodeError:
+            return {'parsing_error': response}
+
     @staticmethod
     def _calculate_satisfaction_index(feedbacks):
         """
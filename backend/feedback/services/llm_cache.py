@@ -0,0 +1,230 @@
+"""
+Постоянный кэш ответов языковой модели.
+
+Ключ записи - хэш модели, температуры и текста сообщений (llm_executor.request_key),
+поэтому одинаковые промпты не отправляются модели повторно, пока запись не
+устареет (LLM_CACHE_TTL). Размер кэша ограничен (LLM_CACHE_MAX_ENTRIES):
+задача evict_llm_cache удаляет устаревшие записи и записи, которые дольше
+всего не использовались. Запись в кэш не проверяет его размер, поэтому
+между запусками задачи кэш может превысить лимит
+"""
+import json
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from ..models import LLMResponseCacheEntry
+
+
+class DatabaseResponseCache:
+    """
+    Кэш ответов в таблице LLMResponseCacheEntry
+    """
+
+    def __init__(self, ttl=None, max_entries=None):
+        self.ttl = ttl or getattr(settings, 'LLM_CACHE_TTL', 7 * 24 * 3600)
+        self.max_entries = max_entries or getattr(
+            settings, 'LLM_CACHE_MAX_ENTRIES', 50000)
+
+    def get_many(self, keys):
+        """
+        Возвращает сохраненные ответы и отмечает их использование
+
+        Returns:
+            dict: Ответы по ключам (только найденные и не устаревшие)
+        """
+        if not keys:
+            return {}
+
+        now = timezone.now()
+        found = dict(LLMResponseCacheEntry.objects.filter(
+            key__in=list(keys),
+            created_at__gte=now - timedelta(seconds=self.ttl)
+        ).values_list('key', 'response'))
+
+        if found:
+            LLMResponseCacheEntry.objects.filter(key__in=list(found)).update(
+                last_used_at=now, hits=F('hits') + 1)
+        return found
+
+    def set_many(self, entries):
+        """
+        Сохраняет ответы (лишние записи удаляет evict)
+
+        Args:
+            entries (dict): Пары (модель, ответ) по ключам
+        """
+        if not entries:
+            return
+
+        now = timezone.now()
+        LLMResponseCacheEntry.objects.bulk_create(
+            [
+                LLMResponseCacheEntry(
+                    key=key, model=model, response=response,
+                    created_at=now, last_used_at=now
+                )
+                for key, (model, response) in entries.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['key'],
+            update_fields=['model', 'response', 'created_at', 'last_used_at']
+        )
+
+    def evict(self, now=None):
+        """
+        Удаляет устаревшие записи и записи сверх лимита размера
+
+        Returns:
+            int: Количество удаленных записей
+        """
+        if now is None:
+            now = timezone.now()
+
+        deleted, _ = LLMResponseCacheEntry.objects.filter(
+            created_at__lt=now - timedelta(seconds=self.ttl)).delete()
+
+        overflow = LLMResponseCacheEntry.objects.count() - self.max_entries
+        if overflow > 0:
+            stale_ids = list(LLMResponseCacheEntry.objects.order_by(
+                'last_used_at', 'id').values_list('id', flat=True)[:overflow])
+            deleted += LLMResponseCacheEntry.objects.filter(
+                id__in=stale_ids).delete()[0]
+        return deleted
+
+    def clear(self):
+        LLMResponseCacheEntry.objects.all().delete()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Количество записей и суммарное число попаданий
+        """
+        totals = LLMResponseCacheEntry.objects.aggregate(
+            entries=Count('id'), hits=Sum('hits'))
+        return {'entries': totals['entries'], 'hits': totals['hits'] or 0}
+
+
+class FileResponseCache:
+    """
+    Кэш ответов в файлах каталога LLM_CACHE_DIR (по файлу на ключ).
+    Время изменения файла обновляется при чтении и служит временем
+    последнего использования
+    """
+
+    def __init__(self, directory=None, ttl=None, max_entries=None):
+        self.directory = directory or getattr(
+            settings, 'LLM_CACHE_DIR', os.path.join(settings.BASE_DIR, 'llm_cache'))
+        self.ttl = ttl or getattr(settings, 'LLM_CACHE_TTL', 7 * 24 * 3600)
+        self.max_entries = max_entries or getattr(
+            settings, 'LLM_CACHE_MAX_ENTRIES', 50000)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.json')
+
+    def get_many(self, keys):
+        found = {}
+        now = timezone.now().timestamp()
+        for key in keys:
+            path = self._path(key)
+            try:
+                with open(path, encoding='utf-8') as cache_file:
+                    entry = json.load(cache_file)
+            except (OSError, ValueError):
+                continue
+
+            if entry['created_at'] + self.ttl < now:
+                continue
+            entry['hits'] = entry.get('hits', 0) + 1
+            self._write(path, entry)
+            found[key] = entry['response']
+        return found
+
+    def set_many(self, entries):
+        if not entries:
+            return
+
+        now = timezone.now().timestamp()
+        for key, (model, response) in entries.items():
+            self._write(self._path(key), {
+                'model': model, 'response': response, 'created_at': now, 'hits': 0})
+
+    def _write(self, path, entry):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f'{path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as cache_file:
+            json.dump(entry, cache_file, ensure_ascii=False)
+        # Атомарная замена: параллельные читатели не видят недописанный файл
+        os.replace(temporary_path, path)
+
+    def _entries(self):
+        """
+        Returns:
+            list: Пары (время последнего использования, путь)
+        """
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.json'):
+                    path = os.path.join(root, name)
+                    try:
+                        entries.append((os.path.getmtime(path), path))
+                    except OSError:
+                        continue
+        return entries
+
+    def evict(self):
+        entries = sorted(self._entries())
+        now = timezone.now().timestamp()
+        overflow = len(entries) - self.max_entries
+        deleted = 0
+        for position, (used_at, path) in enumerate(entries):
+            # Файл не изменяется дольше TTL - запись точно устарела
+            if position >= overflow and used_at + self.ttl >= now:
+                continue
+            try:
+                os.remove(path)
+                deleted += 1
+            except OSError:
+                continue
+        return deleted
+
+    def clear(self):
+        for _, path in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+
+    def stats(self):
+        hits = 0
+        entries = self._entries()
+        for _, path in entries:
+            try:
+                with open(path, encoding='utf-8') as cache_file:
+                    hits += json.load(cache_file).get('hits', 0)
+            except (OSError, ValueError):
+                continue
+        return {'entries': len(entries), 'hits': hits}
+
+
+def get_response_cache(backend=None):
+    """
+    Создает кэш ответов по настройке LLM_CACHE_BACKEND (db, file или none)
+
+    Returns:
+        Кэш ответов или None, если кэширование отключено
+    """
+    backend = backend or getattr(settings, 'LLM_CACHE_BACKEND', 'db')
+    if backend == 'db':
+        return DatabaseResponseCache()
+    if backend == 'file':
+        return FileResponseCache()
+    if backend == 'none':
+        return None
+    raise ValueError(f"Unknown LLM cache backend: {backend}")
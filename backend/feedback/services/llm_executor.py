@@ -0,0 +1,414 @@
+"""
+Общий асинхронный исполнитель запросов к языковой модели.
+
+Все запросы выполняются в одном фоновом цикле событий, поэтому ограничение
+параллельности, ограничение частоты (token bucket) и объединение одинаковых
+запросов действуют на весь процесс, а не на отдельный вызов сервиса
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from functools import lru_cache
+
+import tiktoken
+from django.conf import settings
+from langchain.chat_models import ChatOpenAI
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
+
+from .llm_cache import get_response_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = 'gpt-3.5-turbo'
+DEFAULT_TEMPERATURE = 0.2
+
+
+class LLMConfigurationError(Exception):
+    """
+    Провайдер не настроен (например, нет API ключа); повтор запроса не поможет
+    """
+
+
+def normalize_messages(messages):
+    """
+    Приводит сообщения к кортежу пар (роль, текст)
+
+    Args:
+        messages: Список пар (роль, текст), где роль - system, human или ai
+
+    Returns:
+        tuple: Кортеж пар (роль, текст)
+    """
+    return tuple((str(role), str(content)) for role, content in messages)
+
+
+def request_key(model, temperature, messages, json_mode=False):
+    """
+    Ключ запроса: хэш модели, температуры, текста сообщений и режима ответа
+    """
+    parts = [model, temperature, messages]
+    if json_mode:
+        parts.append('json')
+    payload = json.dumps(parts, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(model):
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            # Модель неизвестна tiktoken
+            return tiktoken.get_encoding('cl100k_base')
+    except Exception as e:
+        # Словарь кодировки загружается из сети при первом обращении
+        logger.warning(f"Could not load tiktoken encoding for {model}: {e}")
+        return None
+
+
+def count_tokens(text, model=None):
+    """
+    Считает количество токенов текста для модели с помощью tiktoken
+
+    Returns:
+        int: Количество токенов (оценка 4 символа на токен, если кодировка недоступна)
+    """
+    encoding = _get_encoding(model or getattr(settings, 'LLM_MODEL', DEFAULT_MODEL))
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+
+class TokenBucket:
+    """
+    Ограничение частоты запросов алгоритмом token bucket.
+    Используется только из цикла событий исполнителя, поэтому без блокировок
+    """
+
+    def __init__(self, rate, capacity=None):
+        """
+        Args:
+            rate (float): Токенов в секунду (0 - без ограничения)
+            capacity (float): Максимальный запас токенов (размер всплеска)
+        """
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+
+        while True:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class OpenAIProvider:
+    """
+    Провайдер OpenAI через LangChain. Клиенты создаются один раз на пару
+    (модель, температура) и переиспользуются между запросами
+    """
+
+    def __init__(self, api_key=None):
+        self.api_key = api_key or getattr(
+            settings, 'OPENAI_API_KEY', os.getenv('OPENAI_API_KEY'))
+        self.clients = {}
+
+    async def acomplete(self, messages, model, temperature, json_mode=False):
+        if not self.api_key:
+            raise LLMConfigurationError('OpenAI API key not found')
+
+        client = self.clients.get((model, temperature, json_mode))
+        if client is None:
+            # В режиме JSON модель обязана вернуть корректный JSON-объект
+            model_kwargs = (
+                {'response_format': {'type': 'json_object'}} if json_mode else {})
+            # Повторы выполняет исполнитель, чтобы они учитывались в лимитах
+            client = ChatOpenAI(
+                openai_api_key=self.api_key,
+                model_name=model,
+                temperature=temperature,
+                max_retries=0,
+                model_kwargs=model_kwargs
+            )
+            self.clients[(model, temperature, json_mode)] = client
+
+        message_classes = {
+            'system': SystemMessage, 'human': HumanMessage, 'ai': AIMessage}
+        result = await client.agenerate([[
+            message_classes[role](content=content) for role, content in messages
+        ]])
+        return result.generations[0][0].text
+
+
+class StubLLMProvider:
+    """
+    Локальный провайдер без обращения к сети для тестов и разработки
+    """
+
+    def __init__(self, responder=None, latency=0.0):
+        """
+        Args:
+            responder: Функция (messages) -> str, формирующая ответ;
+                исключение из нее обрабатывается как ошибка провайдера
+            latency (float): Искусственная задержка ответа в секундах
+        """
+        self.responder = responder
+        self.latency = latency
+        self.calls = []
+
+    async def acomplete(self, messages, model, temperature, json_mode=False):
+        self.calls.append(messages)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.responder is not None:
+            return self.responder(messages)
+        return f"Stub response to: {messages[-1][1][:100]}"
+
+
+def get_provider(name=None):
+    """
+    Создает провайдера по имени из настройки LLM_PROVIDER
+    """
+    name = name or getattr(settings, 'LLM_PROVIDER', 'openai')
+    if name == 'stub':
+        return StubLLMProvider()
+    if name == 'openai':
+        return OpenAIProvider()
+    raise LLMConfigurationError(f"Unknown LLM provider: {name}")
+
+
+class LLMExecutor:
+    """
+    Исполнитель запросов к языковой модели: ограничение параллельности,
+    ограничение частоты, повторы с экспоненциальной задержкой и объединение
+    одинаковых запросов, выполняющихся одновременно. Ответы на запросы,
+    отправленные через complete/complete_many, сохраняются в кэше ответов
+    """
+
+    def __init__(self, provider=None, max_concurrency=None, requests_per_minute=None,
+                 max_retries=None, retry_backoff=None, timeout=None, cache=None):
+        self.provider = provider or get_provider()
+        # Кэш ответов (llm_cache); по умолчанию - по настройке LLM_CACHE_BACKEND
+        self.cache = cache or get_response_cache()
+        self.max_concurrency = max_concurrency or getattr(
+            settings, 'LLM_MAX_CONCURRENCY', 8)
+        if requests_per_minute is None:
+            requests_per_minute = getattr(settings, 'LLM_REQUESTS_PER_MINUTE', 500)
+        self.rate_limiter = TokenBucket(
+            requests_per_minute / 60, capacity=self.max_concurrency)
+        self.max_retries = max_retries if max_retries is not None else getattr(
+            settings, 'LLM_MAX_RETRIES', 3)
+        self.retry_backoff = retry_backoff if retry_backoff is not None else getattr(
+            settings, 'LLM_RETRY_BACKOFF', 1.0)
+        self.timeout = timeout or getattr(settings, 'LLM_TIMEOUT', 60)
+
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        # Ключ запроса -> задача, выполняющая его
+        self.inflight = {}
+        self.stats = {
+            'requests': 0, 'coalesced': 0, 'retries': 0, 'failures': 0,
+            'cache_hits': 0, 'cache_misses': 0
+        }
+        self.loop = None
+        self.lock = threading.Lock()
+
+    def complete(self, messages, model=None, temperature=None, json_mode=False):
+        """
+        Выполняет один запрос; блокирует вызывающий поток до ответа
+
+        Returns:
+            str: Ответ модели или None, если запрос не удался
+        """
+        return self.complete_many(
+            [messages], model=model, temperature=temperature, json_mode=json_mode)[0]
+
+    def complete_many(self, prompts, model=None, temperature=None, json_mode=False):
+        """
+        Выполняет запросы конкурентно; блокирует вызывающий поток до
+        получения всех ответов. Ответы из кэша возвращаются без обращения
+        к модели, новые успешные ответы сохраняются в кэш
+
+        Args:
+            prompts: Список запросов, каждый - список пар (роль, текст)
+            json_mode (bool): Требовать от модели ответ в виде JSON-объекта
+
+        Returns:
+            list: Ответы в порядке запросов (None для неудавшихся)
+        """
+        if not prompts:
+            return []
+
+        model, temperature = self._resolve(model, temperature)
+        keys = [request_key(model, temperature, normalize_messages(messages), json_mode)
+                for messages in prompts]
+        cached = self._cache_get(keys)
+        responses = [cached.get(key) for key in keys]
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+        self.stats['cache_hits'] += len(keys) - len(missing)
+        self.stats['cache_misses'] += len(missing)
+        if not missing:
+            return responses
+
+        future = asyncio.run_coroutine_threadsafe(
+            self._gather([prompts[i] for i in missing], model, temperature, json_mode),
+            self._ensure_loop()
+        )
+        for i, response in zip(missing, future.result()):
+            responses[i] = response
+
+        self._cache_set({
+            keys[i]: (model, responses[i]) for i in missing if responses[i] is not None})
+        return responses
+
+    async def acomplete(self, messages, model=None, temperature=None, json_mode=False):
+        """
+        Выполняет запрос в цикле событий исполнителя. Одинаковый запрос,
+        уже выполняющийся для другого вызова, не отправляется повторно
+
+        Raises:
+            Exception: Ошибка провайдера после исчерпания повторов
+        """
+        model, temperature = self._resolve(model, temperature)
+        messages = normalize_messages(messages)
+        key = request_key(model, temperature, messages, json_mode)
+
+        task = self.inflight.get(key)
+        if task is not None:
+            self.stats['coalesced'] += 1
+        else:
+            task = asyncio.ensure_future(
+                self._execute(messages, model, temperature, json_mode))
+            self.inflight[key] = task
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+
+        # Отмена одного ожидающего не отменяет запрос для остальных
+        return await asyncio.shield(task)
+
+    def _resolve(self, model, temperature):
+        model = model or getattr(settings, 'LLM_MODEL', DEFAULT_MODEL)
+        if temperature is None:
+            temperature = DEFAULT_TEMPERATURE
+        return model, temperature
+
+    def _cache_get(self, keys):
+        # Ошибка кэша не должна мешать запросам к модели
+        if self.cache is None:
+            return {}
+        try:
+            return self.cache.get_many(set(keys))
+        except Exception as e:
+            logger.warning(f"LLM cache lookup failed: {e}")
+            return {}
+
+    def _cache_set(self, entries):
+        if self.cache is None or not entries:
+            return
+        try:
+            self.cache.set_many(entries)
+        except Exception as e:
+            logger.warning(f"LLM cache update failed: {e}")
+
+    async def _gather(self, prompts, model, temperature, json_mode):
+        results = await asyncio.gather(
+            *(self.acomplete(messages, model, temperature, json_mode)
+              for messages in prompts),
+            return_exceptions=True
+        )
+        responses = []
+        for result in results:
+            if isinstance(result, BaseException):
+                logger.error(f"LLM request failed: {result}")
+                responses.append(None)
+            else:
+                responses.append(result)
+        return responses
+
+    async def _execute(self, messages, model, temperature, json_mode):
+        attempt = 0
+        while True:
+            try:
+                async with self.semaphore:
+                    await self.rate_limiter.acquire()
+                    self.stats['requests'] += 1
+                    return await asyncio.wait_for(
+                        self.provider.acomplete(
+                            messages, model, temperature, json_mode),
+                        self.timeout
+                    )
+            except LLMConfigurationError:
+                self.stats['failures'] += 1
+                raise
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    self.stats['failures'] += 1
+                    raise
+                # Экспоненциальная задержка со случайной составляющей
+                delay = self.retry_backoff * (2 ** attempt) * (0.5 + random.random() / 2)
+                attempt += 1
+                self.stats['retries'] += 1
+                logger.warning(
+                    f"LLM request failed ({e}), retry {attempt} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    def _ensure_loop(self):
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self.loop.run_forever, name='llm-executor', daemon=True
+                ).start()
+            return self.loop
+
+    def close(self):
+        """
+        Останавливает фоновый цикл событий
+        """
+        with self.lock:
+            if self.loop is not None:
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                self.loop = None
+                self.semaphore = asyncio.Semaphore(self.max_concurrency)
+                self.inflight = {}
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_llm_executor():
+    """
+    Общий исполнитель процесса, создается при первом обращении
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = LLMExecutor()
+        return _executor
+
+
+def set_llm_executor(executor):
+    """
+    Подменяет общий исполнитель (например, исполнителем с StubLLMProvider в тестах)
+
+    Returns:
+        LLMExecutor: Предыдущий исполнитель
+    """
+    global _executor
+    with _executor_lock:
+        previous, _executor = _executor, executor
+        return previous
@@ -1,20 +1,22 @@
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-from .models import UserFeedback, FeedbackInsight
+from jobs import outbox
+from .models import UserFeedback
 from .services.ai_insights_service import FeedbackAIInsightsService
 
 
-@receiver(post_save, sender=UserFeedback)
-def create_insights_for_feedback(sender, instance, created, **kwargs):
+def create_insights_for_feedback(instance, event):
     """
-    Автоматически создает инсайты при создании нового отзыва
+    Автоматически создает инсайты для нового отзыва.
+    Анализ выполняется через outbox после фиксации транзакции, а не внутри запроса
     """
-    # Запускаем анализ только при создании нового отзыва и если у него нет инсайтов
-    if created and not hasattr(instance, '_skip_insights'):
-        try:
-            # Запускаем анализ асинхронно или в фоновом режиме, если это возможно
-            # В данном примере мы используем простой вызов функции
-            FeedbackAIInsightsService.analyze_feedback(instance)
-        except Exception as e:
-            # Логируем ошибку, но не прерываем выполнение
-            print(f"Error in auto-generating insights: {e}")
+    # Отзыв мог быть проанализирован пакетной командой до обработки события
+    if instance.insights.exists():
+        return
+    FeedbackAIInsightsService.analyze_feedback(instance)
+
+
+# Анализ запускается только при создании нового отзыва, если его не отключили
+# атрибутом _skip_insights
+outbox.subscribe(
+    UserFeedback, create_insights_for_feedback,
+    when=lambda instance, created, update_fields:
+        created and not hasattr(instance, '_skip_insights'))
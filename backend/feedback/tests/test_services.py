@@ -1,10 +1,22 @@
-from django.test import TestCase
+import json
+import tempfile
+import time
+from datetime import timedelta
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from feedback.models import (
     FeedbackTemplate, FeedbackQuestion, UserFeedback,
-    FeedbackAnswer, FeedbackInsight
+    FeedbackAnswer, FeedbackInsight, LLMResponseCacheEntry
 )
+from feedback.dashboard_models import FeedbackTrendSnapshot
 from feedback.services.ai_insights_service import FeedbackAIInsightsService
+from feedback.services.feedback_trend_services import FeedbackTrendAnalyzerService
+from feedback.services.llm_cache import DatabaseResponseCache, FileResponseCache
+from feedback.services.llm_executor import (
+    LLMExecutor, StubLLMProvider, set_llm_executor
+)
+from departments.models import Department
 
 User = get_user_model()
 
@@ -182,3 +194,400 @@ class FeedbackAIInsightsServiceTestCase(TestCase):
 
         self.assertIn(FeedbackInsight.InsightType.SUMMARY, insight_types)
         self.assertIn(FeedbackInsight.InsightType.SATISFACTION, insight_types)
+
+
+class FeedbackTrendAnalyzerServiceTestCase(TestCase):
+    """Тестирование агрегации снимков трендов обратной связи"""
+
+    def setUp(self):
+        """Создание отзывов по двум шаблонам и двум департаментам"""
+        self.sales = Department.objects.create(name='Продажи')
+        self.support = Department.objects.create(name='Поддержка')
+        self.admin = User.objects.create_user(
+            email='trend-admin@example.com',
+            username='trend-admin',
+            password='admin123',
+            is_staff=True
+        )
+
+        self.templates = []
+        for position in range(2):
+            template = FeedbackTemplate.objects.create(
+                title=f'Шаблон трендов {position}',
+                type=FeedbackTemplate.TemplateType.MANUAL,
+                creator=self.admin
+            )
+            question = FeedbackQuestion.objects.create(
+                template=template,
+                text='Оцените процесс онбординга от 1 до 10',
+                type=FeedbackQuestion.QuestionType.SCALE,
+                order=1
+            )
+            self.templates.append((template, question))
+
+        # 3 отзыва в продажах по первому шаблону, 1 в поддержке по второму
+        self.create_feedbacks(self.sales, *self.templates[0], scores=[8, 6, 10])
+        self.create_feedbacks(self.support, *self.templates[1], scores=[2])
+
+    def create_feedbacks(self, department, template, question, scores):
+        for score in scores:
+            number = User.objects.count()
+            user = User.objects.create_user(
+                email=f'trend-user-{number}@example.com',
+                username=f'trend-user-{number}',
+                password='password123',
+                department=department
+            )
+            feedback = UserFeedback.objects.create(
+                template=template, user=user, submitter=self.admin)
+            FeedbackAnswer.objects.create(
+                feedback=feedback, question=question, scale_answer=score)
+
+    def test_create_daily_snapshots_rolls_up_cells(self):
+        """Снимки создаются для всех ячеек, набравших минимум отзывов"""
+        created = FeedbackTrendAnalyzerService.create_daily_snapshots(
+            analyze_topics=False)
+
+        template = self.templates[0][0]
+        cells = {
+            (snapshot.template_id, snapshot.department_id): snapshot
+            for snapshot in FeedbackTrendSnapshot.objects.all()
+        }
+        self.assertEqual(created, 4)
+        self.assertEqual(set(cells), {
+            (None, None), (template.id, None),
+            (None, self.sales.id), (template.id, self.sales.id)
+        })
+        self.assertEqual(cells[(None, None)].response_count, 4)
+        self.assertAlmostEqual(cells[(None, None)].satisfaction_index, 0.65)
+        self.assertAlmostEqual(
+            cells[(template.id, self.sales.id)].satisfaction_index, 0.8)
+
+    def test_create_daily_snapshots_updates_existing(self):
+        """Повторный запуск обновляет снимки, не создавая дубликатов"""
+        FeedbackTrendAnalyzerService.create_daily_snapshots(analyze_topics=False)
+        self.create_feedbacks(self.support, *self.templates[1], scores=[4])
+
+        FeedbackTrendAnalyzerService.create_daily_snapshots(analyze_topics=False)
+
+        self.assertEqual(FeedbackTrendSnapshot.objects.count(), 4)
+        self.assertEqual(
+            FeedbackTrendSnapshot.objects.get(
+                template=None, department=None).response_count, 5)
+
+
+@override_settings(LLM_CACHE_BACKEND='none')
+class LLMExecutorTestCase(SimpleTestCase):
+    """Тестирование общего исполнителя запросов к языковой модели"""
+
+    def tearDown(self):
+        self.executor.close()
+
+    def test_complete_many_preserves_order_and_coalesces(self):
+        """Одинаковые одновременные запросы отправляются провайдеру один раз"""
+        provider = StubLLMProvider(
+            responder=lambda messages: messages[-1][1].upper(), latency=0.01)
+        self.executor = LLMExecutor(
+            provider, max_concurrency=20, requests_per_minute=0)
+
+        prompts = [[('human', f'prompt {i % 10}')] for i in range(100)]
+        responses = self.executor.complete_many(prompts)
+
+        self.assertEqual(responses, [f'PROMPT {i % 10}' for i in range(100)])
+        self.assertEqual(len(provider.calls), 10)
+        self.assertEqual(self.executor.stats['coalesced'], 90)
+
+    def test_retries_then_gives_up(self):
+        """Ошибки провайдера повторяются, после исчерпания повторов ответ - None"""
+        attempts = []
+
+        def responder(messages):
+            attempts.append(messages)
+            if messages[-1][1] == 'broken' or len(attempts) < 2:
+                raise RuntimeError('provider error')
+            return 'ok'
+
+        self.executor = LLMExecutor(
+            StubLLMProvider(responder), requests_per_minute=0,
+            max_retries=2, retry_backoff=0)
+
+        self.assertEqual(self.executor.complete([('human', 'flaky')]), 'ok')
+        self.assertIsNone(self.executor.complete([('human', 'broken')]))
+        self.assertEqual(self.executor.stats['retries'], 3)
+        self.assertEqual(self.executor.stats['failures'], 1)
+
+    def test_token_bucket_limits_rate(self):
+        """Запросы сверх запаса токенов ждут пополнения корзины"""
+        self.executor = LLMExecutor(
+            StubLLMProvider(), max_concurrency=2, requests_per_minute=600)
+
+        started = time.monotonic()
+        self.executor.complete_many([[('human', f'{i}')] for i in range(4)])
+
+        # 2 запроса из запаса, еще 2 - со скоростью 10 в секунду
+        self.assertGreaterEqual(time.monotonic() - started, 0.15)
+
+
+@override_settings(LLM_CACHE_BACKEND='none')
+class FeedbackBatchAnalysisTestCase(TestCase):
+    """Тестирование пакетного анализа обратной связи через исполнитель"""
+
+    def setUp(self):
+        self.provider = StubLLMProvider(responder=self.respond)
+        self.previous_executor = set_llm_executor(LLMExecutor(
+            self.provider, max_concurrency=10, requests_per_minute=0))
+
+        admin = User.objects.create_user(
+            email='batch-admin@example.com',
+            username='batch-admin',
+            password='admin123',
+            is_staff=True
+        )
+        self.template = FeedbackTemplate.objects.create(
+            title='Шаблон пакетного анализа',
+            type=FeedbackTemplate.TemplateType.MANUAL,
+            creator=admin
+        )
+        question = FeedbackQuestion.objects.create(
+            template=self.template,
+            text='Опишите ваш опыт онбординга',
+            type=FeedbackQuestion.QuestionType.TEXT,
+            order=1
+        )
+        self.feedbacks = []
+        for number in range(3):
+            feedback = UserFeedback.objects.create(
+                template=self.template, user=admin, submitter=admin)
+            FeedbackAnswer.objects.create(
+                feedback=feedback, question=question,
+                text_answer=f'Отзыв feedback-{number}')
+            self.feedbacks.append(feedback)
+
+    def tearDown(self):
+        set_llm_executor(self.previous_executor).close()
+
+    @staticmethod
+    def respond(messages):
+        system = messages[0][1]
+        if 'feedback records' in system:
+            records = json.loads(messages[-1][1].split('\n\n', 1)[1])
+            return json.dumps({'results': [
+                {
+                    'id': record['id'],
+                    'summary': 'Резюме',
+                    'problem_areas': ['Проблема'],
+                    'risks': [],
+                    'satisfaction': {'score': 80, 'explanation': 'Пакет'}
+                }
+                # Результат по второму отзыву модель "потеряла"
+                for record in records if 'feedback-1' not in json.dumps(record)
+            ]})
+        if 'JSON schema' in system:
+            if 'feedback-1' in messages[-1][1]:
+                return '{"summary": "Резюме", "problem_areas": "не список"}'
+            return json.dumps({
+                'summary': 'Резюме',
+                'problem_areas': ['Проблема 1', 'Проблема 2'],
+                'risks': ['Риск'],
+                'satisfaction': {'score': 70, 'explanation': 'Все хорошо'}
+            })
+        if 'problem areas' in system:
+            return 'Проблема 1\n\nПроблема 2'
+        if 'risks' in system:
+            return 'Риск'
+        if 'satisfaction' in system:
+            return '70 Все хорошо'
+        return 'Резюме'
+
+    @override_settings(FEEDBACK_ANALYSIS_MODE='legacy')
+    def test_analyze_feedbacks_runs_all_requests(self):
+        """Для каждого отзыва выполняются 4 запроса и создаются инсайты"""
+        results = FeedbackAIInsightsService.analyze_feedbacks(self.feedbacks)
+
+        self.assertEqual(len(self.provider.calls), 12)
+        self.assertEqual(set(results), {f.id for f in self.feedbacks})
+        for feedback in self.feedbacks:
+            types = [insight.type for insight in results[feedback.id]]
+            self.assertEqual(types, [
+                FeedbackInsight.InsightType.SUMMARY,
+                FeedbackInsight.InsightType.PROBLEM_AREA,
+                FeedbackInsight.InsightType.PROBLEM_AREA,
+                FeedbackInsight.InsightType.RISK,
+                FeedbackInsight.InsightType.SATISFACTION,
+            ])
+        self.assertEqual(
+            FeedbackInsight.objects.filter(feedback__in=self.feedbacks).count(), 15)
+
+    def test_structured_analysis_falls_back_to_legacy(self):
+        """Один JSON-запрос на отзыв; неверный ответ анализируется отдельными запросами"""
+        results = FeedbackAIInsightsService.analyze_feedbacks(self.feedbacks)
+
+        # 3 единых запроса и 4 запроса для отзыва с неверным ответом
+        self.assertEqual(len(self.provider.calls), 7)
+        for feedback in self.feedbacks:
+            insights = results[feedback.id]
+            self.assertEqual([insight.type for insight in insights], [
+                FeedbackInsight.InsightType.SUMMARY,
+                FeedbackInsight.InsightType.PROBLEM_AREA,
+                FeedbackInsight.InsightType.PROBLEM_AREA,
+                FeedbackInsight.InsightType.RISK,
+                FeedbackInsight.InsightType.SATISFACTION,
+            ])
+            self.assertEqual(
+                insights[-1].content, 'Satisfaction Index: 70/100. Все хорошо')
+
+    @override_settings(FEEDBACK_BATCH_MAX_ITEMS=10)
+    def test_batched_analysis_demultiplexes_by_id(self):
+        """Один запрос на пакет; записи без результата анализируются по одной"""
+        results = FeedbackAIInsightsService.analyze_feedbacks(
+            self.feedbacks, mode='batched')
+
+        # Пакетный запрос, единый запрос и 4 отдельных запроса для feedback-1
+        self.assertEqual(len(self.provider.calls), 6)
+        for number in (0, 2):
+            insights = results[self.feedbacks[number].id]
+            self.assertEqual([insight.type for insight in insights], [
+                FeedbackInsight.InsightType.SUMMARY,
+                FeedbackInsight.InsightType.PROBLEM_AREA,
+                FeedbackInsight.InsightType.SATISFACTION,
+            ])
+            self.assertEqual(
+                insights[-1].content, 'Satisfaction Index: 80/100. Пакет')
+        self.assertEqual(len(results[self.feedbacks[1].id]), 5)
+
+    def test_pack_batches_respects_limits(self):
+        """Пакеты ограничены количеством записей и бюджетом токенов"""
+        pending = [
+            (feedback, FeedbackAIInsightsService._get_feedback_data(feedback))
+            for feedback in self.feedbacks
+        ]
+
+        with self.settings(FEEDBACK_BATCH_TOKEN_BUDGET=100000, FEEDBACK_BATCH_MAX_ITEMS=2):
+            sizes = [len(batch) for batch in FeedbackAIInsightsService._pack_batches(pending)]
+        self.assertEqual(sizes, [2, 1])
+
+        # Бюджет меньше одной записи: каждая запись - отдельный пакет
+        with self.settings(FEEDBACK_BATCH_TOKEN_BUDGET=1, FEEDBACK_BATCH_MAX_ITEMS=10):
+            sizes = [len(batch) for batch in FeedbackAIInsightsService._pack_batches(pending)]
+        self.assertEqual(sizes, [1, 1, 1])
+
+    def test_parse_structured_response(self):
+        """Ответ проверяется по схеме, лишние пункты отбрасываются"""
+        parse = FeedbackAIInsightsService._parse_structured_response
+        valid = {
+            'summary': 'Резюме',
+            'problem_areas': ['1', '2', '3', '4'],
+            'risks': [],
+            'satisfaction': {'score': 55, 'explanation': ''}
+        }
+
+        analysis = parse(f"```json\n{json.dumps(valid)}\n```")
+        self.assertEqual(analysis['problem_areas'], ['1', '2', '3'])
+        self.assertEqual(analysis['satisfaction']['score'], 55)
+        self.assertIsNone(parse('не JSON'))
+        self.assertIsNone(parse(json.dumps(
+            dict(valid, satisfaction={'score': 150, 'explanation': ''}))))
+        self.assertIsNone(parse(json.dumps(dict(valid, risks='риск'))))
+
+    def test_analyze_all_feedback_skips_analyzed(self):
+        """Повторный запуск не анализирует отзывы, у которых уже есть инсайты"""
+        FeedbackAIInsightsService.analyze_feedback(self.feedbacks[0])
+
+        insights = FeedbackAIInsightsService.analyze_all_feedback(batch_size=1)
+
+        self.assertEqual(
+            {insight.feedback_id for insight in insights},
+            {self.feedbacks[1].id, self.feedbacks[2].id})
+
+    def test_analyze_template_feedback(self):
+        """Агрегированный анализ шаблона создает инсайты шаблона"""
+        insights = FeedbackAIInsightsService.analyze_template_feedback(
+            self.template)
+
+        self.assertEqual(len(self.provider.calls), 3)
+        self.assertTrue(all(insight.template_id == self.template.id
+                            for insight in insights))
+        self.assertIn('70/100', insights[-1].content)
+
+
+class LLMResponseCacheTestCase(TestCase):
+    """Тестирование кэша ответов языковой модели"""
+
+    def setUp(self):
+        self.provider = StubLLMProvider(
+            responder=lambda messages: messages[-1][1].upper())
+
+    def create_executor(self, cache):
+        self.executor = LLMExecutor(self.provider, requests_per_minute=0, cache=cache)
+        return self.executor
+
+    def tearDown(self):
+        self.executor.close()
+
+    def test_database_cache_hits_skip_provider(self):
+        """Повторный запрос отдается из кэша без обращения к модели"""
+        executor = self.create_executor(DatabaseResponseCache())
+
+        first = executor.complete_many([[('human', 'a')], [('human', 'b')]])
+        second = executor.complete_many([[('human', 'b')], [('human', 'c')]])
+
+        self.assertEqual(first, ['A', 'B'])
+        self.assertEqual(second, ['B', 'C'])
+        self.assertEqual(len(self.provider.calls), 3)
+        self.assertEqual(executor.stats['cache_hits'], 1)
+        self.assertEqual(executor.stats['cache_misses'], 3)
+        self.assertEqual(LLMResponseCacheEntry.objects.count(), 3)
+        self.assertEqual(DatabaseResponseCache().stats(), {'entries': 3, 'hits': 1})
+
+    def test_database_cache_key_includes_model_and_temperature(self):
+        """Ответы разных моделей и температур кэшируются раздельно"""
+        executor = self.create_executor(DatabaseResponseCache())
+
+        executor.complete([('human', 'a')], model='model-1')
+        executor.complete([('human', 'a')], model='model-2')
+        executor.complete([('human', 'a')], model='model-1', temperature=0.7)
+
+        self.assertEqual(len(self.provider.calls), 3)
+
+    def test_database_cache_ttl_and_lru_eviction(self):
+        """Устаревшие записи не используются, лишние вытесняются по давности"""
+        cache = DatabaseResponseCache(ttl=3600, max_entries=2)
+        executor = self.create_executor(cache)
+        executor.complete_many([[('human', 'a')], [('human', 'b')]])
+
+        LLMResponseCacheEntry.objects.update(
+            created_at=timezone.now() - timedelta(hours=2))
+        executor.complete([('human', 'a')])
+        self.assertEqual(len(self.provider.calls), 3)
+
+        # 'a' обновлена, 'b' устарела и удаляется; 'c' и 'd' вытесняют 'a'
+        executor.complete([('human', 'c')])
+        executor.complete([('human', 'd')])
+        self.assertEqual(LLMResponseCacheEntry.objects.count(), 4)
+        self.assertEqual(cache.evict(), 2)
+        self.assertEqual(
+            set(LLMResponseCacheEntry.objects.values_list('response', flat=True)),
+            {'C', 'D'})
+
+    def test_failed_responses_are_not_cached(self):
+        """Неудавшиеся запросы не сохраняются в кэш"""
+        self.provider = StubLLMProvider(responder=lambda messages: 1 / 0)
+        executor = self.create_executor(DatabaseResponseCache())
+        executor.max_retries = 0
+
+        self.assertIsNone(executor.complete([('human', 'a')]))
+        self.assertFalse(LLMResponseCacheEntry.objects.exists())
+
+    def test_file_cache(self):
+        """Файловый кэш сохраняет ответы и ограничивает количество записей"""
+        with tempfile.TemporaryDirectory() as directory:
+            cache = FileResponseCache(directory=directory, max_entries=2)
+            executor = self.create_executor(cache)
+
+            executor.complete_many([[('human', 'a')], [('human', 'b')]])
+            self.assertEqual(executor.complete([('human', 'a')]), 'A')
+            self.assertEqual(len(self.provider.calls), 2)
+
+            executor.complete([('human', 'c')])
+            self.assertEqual(cache.evict(), 1)
+            self.assertEqual(cache.stats()['entries'], 2)
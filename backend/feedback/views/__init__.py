@@ -119,11 +119,9 @@ class FeedbackInsightsViewSet(viewsets.ReadOnlyModelViewSet):
     def run_analysis(self, request):
         try:
             # Запускаем анализ всей обратной связи
-            feedback_without_insights = UserFeedback.objects.filter(
-                insights__isnull=True)
-
-            for feedback in feedback_without_insights:
-                FeedbackAIInsightsService.analyze_feedback(feedback)
+            feedback_insights = FeedbackAIInsightsService.analyze_all_feedback()
+            analyzed_count = len({
+                insight.feedback_id for insight in feedback_insights})
 
             # Запускаем анализ агрегированных данных по шаблонам
             templates = FeedbackTemplate.objects.all()
@@ -131,7 +129,7 @@ class FeedbackInsightsViewSet(viewsets.ReadOnlyModelViewSet):
                 FeedbackAIInsightsService.analyze_template_feedback(template)
 
             return Response({
-                "detail": f"Анализ запущен для {feedback_without_insights.count()} записей обратной связи и {templates.count()} шаблонов."
+                "detail": f"Анализ запущен для {analyzed_count} записей обратной связи и {templates.count()} шаблонов."
             })
         except Exception as e:
             return Response({
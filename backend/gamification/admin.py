@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import UserLevel, UserReward
+from .models import LeaderboardEntry, PointsLedgerEntry, UserLevel, UserReward
 
 
 @admin.register(UserLevel)
@@ -16,3 +16,18 @@ class UserRewardAdmin(admin.ModelAdmin):
     list_filter = ('reward_type',)
     search_fields = ('user__email', 'title', 'achievement_id')
     raw_id_fields = ('user',)
+
+
+@admin.register(PointsLedgerEntry)
+class PointsLedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'event_type', 'object_key', 'points', 'created_at')
+    list_filter = ('event_type',)
+    search_fields = ('user__email', 'object_key')
+    raw_id_fields = ('user',)
+
+
+@admin.register(LeaderboardEntry)
+class LeaderboardEntryAdmin(admin.ModelAdmin):
+    list_display = ('rank', 'user', 'points', 'level', 'refreshed_at')
+    search_fields = ('user__email',)
+    raw_id_fields = ('user',)
@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_ledger(apps, schema_editor):
+    """
+    Текущие очки пользователей переносятся в журнал одной записью
+    """
+    UserLevel = apps.get_model('gamification', 'UserLevel')
+    PointsLedgerEntry = apps.get_model('gamification', 'PointsLedgerEntry')
+    PointsLedgerEntry.objects.bulk_create([
+        PointsLedgerEntry(user_id=user_id, event_type='migration', object_key='initial',
+                          points=points)
+        for user_id, points in UserLevel.objects.filter(
+            points__gt=0).values_list('user_id', 'points')
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamification', '0003_alter_userreward_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PointsLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(max_length=50, verbose_name='event type')),
+                ('object_key', models.CharField(blank=True, max_length=100, null=True, verbose_name='object key')),
+                ('points', models.IntegerField(verbose_name='points')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='points_ledger', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+            options={
+                'verbose_name': 'points ledger entry',
+                'verbose_name_plural': 'points ledger entries',
+                'indexes': [models.Index(fields=['user', 'created_at'], name='gamification_ledger_user_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'event_type', 'object_key'), name='gamification_ledger_idempotency_key')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='leaderboard_entry', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='user')),
+                ('rank', models.PositiveIntegerField(db_index=True, verbose_name='rank')),
+                ('points', models.PositiveIntegerField(verbose_name='points')),
+                ('level', models.PositiveIntegerField(verbose_name='level')),
+                ('refreshed_at', models.DateTimeField(verbose_name='refreshed at')),
+            ],
+            options={
+                'verbose_name': 'leaderboard entry',
+                'verbose_name_plural': 'leaderboard entries',
+                'ordering': ['rank'],
+            },
+        ),
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
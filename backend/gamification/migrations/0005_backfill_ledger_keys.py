@@ -0,0 +1,42 @@
+from django.db import migrations
+
+
+def backfill_ledger_keys(apps, schema_editor):
+    """
+    Ключи идемпотентности для начислений, сделанных до журнала: очки за них
+    уже учтены записью migration/initial, поэтому записи нулевые и только
+    не дают повторно начислить очки при пересохранении объектов
+    """
+    PointsLedgerEntry = apps.get_model('gamification', 'PointsLedgerEntry')
+    UserStepProgress = apps.get_model('onboarding', 'UserStepProgress')
+    LMSUserTestResult = apps.get_model('onboarding', 'LMSUserTestResult')
+    StepFeedback = apps.get_model('onboarding', 'StepFeedback')
+
+    sources = [
+        ('step_completion', 'step', UserStepProgress.objects.filter(
+            status='done').values_list('user_id', 'step_id')),
+        ('test_completion', 'test_result', LMSUserTestResult.objects.values_list('user_id', 'id')),
+        ('feedback_submission', 'feedback', StepFeedback.objects.values_list('user_id', 'id')),
+    ]
+    for event_type, prefix, rows in sources:
+        batch = []
+        for user_id, object_id in rows.iterator(chunk_size=2000):
+            batch.append(PointsLedgerEntry(
+                user_id=user_id, event_type=event_type,
+                object_key=f'{prefix}:{object_id}', points=0))
+            if len(batch) >= 1000:
+                PointsLedgerEntry.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        PointsLedgerEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamification', '0004_pointsledgerentry_leaderboardentry'),
+        ('onboarding', '0022_reportexport_attempts'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_ledger_keys, migrations.RunPython.noop),
+    ]
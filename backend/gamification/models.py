@@ -67,3 +67,66 @@ class UserReward(models.Model):
 
     def __str__(self):
         return f"{self.user.email} - {self.title}"
+
+
+class PointsLedgerEntry(models.Model):
+    """
+    Запись журнала начисления очков. Журнал только дополняется; UserLevel.points
+    равен сумме очков пользователя в журнале. Ключ (пользователь, событие,
+    объект) не дает начислить очки за одно событие дважды; записи без
+    объекта (object_key пустой) не ограничиваются
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="points_ledger",
+        verbose_name=_("user")
+    )
+    event_type = models.CharField(_("event type"), max_length=50)
+    object_key = models.CharField(
+        _("object key"), max_length=100, blank=True, null=True)
+    points = models.IntegerField(_("points"))
+    created_at = models.DateTimeField(_("created at"), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("points ledger entry")
+        verbose_name_plural = _("points ledger entries")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "event_type", "object_key"],
+                name="gamification_ledger_idempotency_key"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["user", "created_at"],
+                         name="gamification_ledger_user_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.event_type} {self.object_key or ''}: {self.points}"
+
+
+class LeaderboardEntry(models.Model):
+    """
+    Место пользователя в рейтинге. Таблица пересчитывается периодически
+    (задача refresh_leaderboard), место читается по первичному ключу
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="leaderboard_entry",
+        verbose_name=_("user")
+    )
+    rank = models.PositiveIntegerField(_("rank"), db_index=True)
+    points = models.PositiveIntegerField(_("points"))
+    level = models.PositiveIntegerField(_("level"))
+    refreshed_at = models.DateTimeField(_("refreshed at"))
+
+    class Meta:
+        verbose_name = _("leaderboard entry")
+        verbose_name_plural = _("leaderboard entries")
+        ordering = ["rank"]
+
+    def __str__(self):
+        return f"#{self.rank} {self.user_id} - {self.points}"
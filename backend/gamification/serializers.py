@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import UserLevel, UserReward
+from .models import LeaderboardEntry, UserLevel, UserReward
 
 
 class UserLevelSerializer(serializers.ModelSerializer):
@@ -12,6 +12,18 @@ class UserLevelSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
+class LeaderboardEntrySerializer(serializers.ModelSerializer):
+    """
+    Сериализатор для модели LeaderboardEntry
+    """
+    email = serializers.EmailField(source="user.email", read_only=True)
+
+    class Meta:
+        model = LeaderboardEntry
+        fields = ["rank", "email", "points", "level", "refreshed_at"]
+        read_only_fields = fields
+
+
 class UserRewardSerializer(serializers.ModelSerializer):
     """
     Сериализатор для модели UserReward
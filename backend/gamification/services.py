@@ -1,6 +1,17 @@
-from django.db import transaction
+from bisect import bisect_right
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Window
+from django.db.models.functions import Rank
 from django.utils import timezone
-from .models import UserLevel, UserReward
+from .models import LeaderboardEntry, PointsLedgerEntry, UserLevel, UserReward
+
+
+def refresh_leaderboard():
+    """
+    Периодическая задача пересчета рейтинга (см. jobs.registry)
+    """
+    return GamificationService.refresh_leaderboard()
 
 
 class GamificationService:
@@ -21,6 +32,10 @@ class GamificationService:
         5: 1000,
     }
 
+    # Пороги по возрастанию для поиска уровня через bisect
+    LEVEL_STEPS = sorted(LEVEL_THRESHOLDS.items(), key=lambda item: item[1])
+    THRESHOLD_POINTS = [threshold for _, threshold in LEVEL_STEPS]
+
     KEY_ACHIEVEMENTS = {
         "first_step": {
             "title": "Первый шаг",
@@ -50,33 +65,51 @@ class GamificationService:
         )[0]
 
     @staticmethod
-    def handle_step_completion(user, step):
+    def level_for_points(points):
         """
-        Обработка завершения шага онбординга
-        Возвращает: (user_level, points)
+        Уровень, соответствующий количеству очков
         """
-        # Начисляем очки за выполнение шага
+        index = bisect_right(GamificationService.THRESHOLD_POINTS, points) - 1
+        return GamificationService.LEVEL_STEPS[max(index, 0)][0]
+
+    @staticmethod
+    def step_points(step):
         points = GamificationService.POINTS_CONFIG["step_completion"]
         if step.is_required:
             points *= 2  # Удвоенные очки за обязательный шаг
+        return points
 
-        # Проверяем, первый ли это шаг пользователя
-        if not UserReward.objects.filter(
-            user=user,
-            achievement_id="first_step"
-        ).exists():
-            achievement = GamificationService.KEY_ACHIEVEMENTS["first_step"]
-            GamificationService.award_achievement(
-                user,
-                "first_step",
-                achievement["title"],
-                achievement["description"],
-                achievement["icon"]
-            )
+    @staticmethod
+    def handle_step_completion(user, step):
+        """
+        Обработка завершения шага онбординга. Очки за шаг начисляются один раз,
+        повторные сохранения выполненного шага ничего не меняют
+        Возвращает: (user_level, points)
+        """
+        points = GamificationService.step_points(step)
+        user_level, created = GamificationService.record_points(
+            user, [("step_completion", f"step:{step.id}", points)])
 
-        user_level = GamificationService.add_points(user, points)
+        # Достижение проверяется только при новом начислении
+        if created:
+            GamificationService.award_achievement(user, "first_step")
         return user_level, points
 
+    @staticmethod
+    def handle_step_completions(user, steps):
+        """
+        Обработка завершения нескольких шагов пользователя одним начислением
+        (для пакетных изменений прогресса)
+        Возвращает: (user_level, points) - очки, начисленные этим вызовом
+        """
+        user_level, created = GamificationService.record_points(user, [
+            ("step_completion", f"step:{step.id}", GamificationService.step_points(step))
+            for step in steps
+        ])
+        if created:
+            GamificationService.award_achievement(user, "first_step")
+        return user_level, sum(entry.points for entry in created)
+
     @staticmethod
     def handle_feedback_submission(user, feedback):
         """
@@ -87,7 +120,7 @@ class GamificationService:
         """
         # Начисляем очки за отправку фидбека
         user_level, points = GamificationService.add_points(
-            user, 'feedback_submission', 1)
+            user, 'feedback_submission', 1, object_key=f"feedback:{feedback.id}")
 
         # Проверяем количество отзывов для получения достижения
         feedback_count = user.step_feedbacks.count()
@@ -104,7 +137,7 @@ class GamificationService:
         """
         # Начисляем очки за прохождение теста
         user_level, points = GamificationService.add_points(
-            user, 'test_completion', 1)
+            user, 'test_completion', 1, object_key=f"test_result:{test_result.id}")
 
         # Если тест пройден идеально, выдаем достижение
         if test_result.score == test_result.max_score:
@@ -113,45 +146,130 @@ class GamificationService:
         return user_level, points
 
     @staticmethod
-    @transaction.atomic
-    def add_points(user, points, points_type=None):  # points_type для обратной совместимости
+    def add_points(user, points, count=1, event_type=None, object_key=None):
         """
         Начисление очков пользователю с проверкой повышения уровня
-        Возвращает: user_level
+
+        Args:
+            points: Количество очков или тип события из POINTS_CONFIG
+            count: Множитель очков
+            event_type: Тип события для журнала (по умолчанию тип из points)
+            object_key: Ключ объекта события; по одному ключу очки
+                начисляются один раз
+
+        Возвращает: (user_level, points) - очки события, в том числе если
+            они были начислены ранее по тому же ключу
         """
         if isinstance(points, str) and points in GamificationService.POINTS_CONFIG:
+            event_type = event_type or points
             points = GamificationService.POINTS_CONFIG[points]
+        points *= count
 
-        user_level = GamificationService.get_or_create_user_level(user)
-        old_level = user_level.level
+        user_level, _ = GamificationService.record_points(
+            user, [(event_type or "manual", object_key, points)])
+        return user_level, points
 
-        user_level.points += points
+    @staticmethod
+    @transaction.atomic
+    def record_points(user, entries):
+        """
+        Записывает начисления в журнал и увеличивает очки пользователя
+        атомарным UPDATE на сумму новых записей. Начисления, ключ которых
+        уже есть в журнале, пропускаются
 
-        # Проверяем повышение уровня
-        for level, threshold in sorted(GamificationService.LEVEL_THRESHOLDS.items(), reverse=True):
-            if user_level.points >= threshold and user_level.level < level:
-                user_level.level = level
-                # Вызываем award_level_up при повышении уровня
-                if level > old_level:
-                    GamificationService.award_level_up(user, level, old_level)
-                break
+        Args:
+            entries (list): Тройки (event_type, object_key, points);
+                object_key None - начисление без ключа идемпотентности
+
+        Returns:
+            tuple: (user_level, созданные записи журнала)
+        """
+        keys = {(event_type, key) for event_type, key, _ in entries if key is not None}
+        seen = set()
+        if keys:
+            seen = set(PointsLedgerEntry.objects.filter(
+                user=user,
+                event_type__in={event_type for event_type, _ in keys},
+                object_key__in={key for _, key in keys}
+            ).values_list("event_type", "object_key"))
+
+        new_entries = []
+        for event_type, key, points in entries:
+            if key is not None:
+                if (event_type, key) in seen:
+                    continue
+                seen.add((event_type, key))
+            new_entries.append(PointsLedgerEntry(
+                user=user, event_type=event_type, object_key=key, points=points))
+
+        created = GamificationService._insert_ledger_entries(new_entries)
+        user_level = GamificationService._increment_points(
+            user, sum(entry.points for entry in created))
+        return user_level, created
+
+    @staticmethod
+    def _insert_ledger_entries(entries):
+        if not entries:
+            return []
+        try:
+            with transaction.atomic():
+                return PointsLedgerEntry.objects.bulk_create(entries)
+        except IntegrityError:
+            pass
+
+        # Ключ успели записать параллельно: записи вставляются по одной,
+        # уже существующие пропускаются
+        created = []
+        for entry in entries:
+            try:
+                with transaction.atomic():
+                    entry.save()
+            except IntegrityError:
+                continue
+            created.append(entry)
+        return created
 
-        user_level.save()
+    @staticmethod
+    def _increment_points(user, points):
+        """
+        Увеличивает очки F-выражением (без потери параллельных начислений)
+        и повышает уровень при достижении порога
+
+        Возвращает: user_level
+        """
+        if points:
+            updated = UserLevel.objects.filter(user=user).update(
+                points=F("points") + points, updated_at=timezone.now())
+            if not updated:
+                GamificationService.get_or_create_user_level(user)
+                UserLevel.objects.filter(user=user).update(
+                    points=F("points") + points, updated_at=timezone.now())
+
+        # Строка заблокирована UPDATE до конца транзакции, чтение согласовано
+        user_level = GamificationService.get_or_create_user_level(user)
+        old_level = user_level.level
+        new_level = GamificationService.level_for_points(user_level.points)
+        if new_level > old_level:
+            UserLevel.objects.filter(user=user, level__lt=new_level).update(level=new_level)
+            user_level.level = new_level
+            GamificationService.award_level_up(user, new_level, old_level)
         return user_level
 
     @staticmethod
-    def award_achievement(user, achievement_id, title, description, icon=None):
+    def award_achievement(user, achievement_id, title=None, description=None, icon=None):
         """
-        Выдача достижения пользователю
+        Выдача достижения пользователю. Для ключевых достижений название,
+        описание и иконка по умолчанию берутся из KEY_ACHIEVEMENTS
         Возвращает: (reward, created)
         """
+        defaults = GamificationService.KEY_ACHIEVEMENTS.get(achievement_id, {})
         reward, created = UserReward.objects.get_or_create(
             user=user,
             achievement_id=achievement_id,
             defaults={
-                "title": title,
-                "description": description,
-                "icon": icon or achievement_id,
+                "title": title or defaults.get("title", achievement_id),
+                "description": description or defaults.get("description", ""),
+                "icon": icon or defaults.get("icon", achievement_id),
                 "reward_type": UserReward.RewardType.ACHIEVEMENT
             }
         )
@@ -208,3 +326,40 @@ class GamificationService:
                 metadata.get("icon")
             )[0]
             return reward
+
+    @staticmethod
+    def refresh_leaderboard():
+        """
+        Пересчитывает таблицу рейтинга: места вычисляются оконной функцией
+        в базе, таблица заменяется целиком в одной транзакции
+
+        Возвращает: количество пользователей в рейтинге
+        """
+        now = timezone.now()
+        entries = [
+            LeaderboardEntry(
+                user_id=user_id, rank=rank, points=points, level=level, refreshed_at=now)
+            for user_id, points, level, rank in UserLevel.objects.annotate(
+                rank=Window(Rank(), order_by=F("points").desc())
+            ).values_list("user_id", "points", "level", "rank")
+        ]
+        with transaction.atomic():
+            LeaderboardEntry.objects.all().delete()
+            LeaderboardEntry.objects.bulk_create(entries, batch_size=1000)
+        return len(entries)
+
+    @staticmethod
+    def get_leaderboard(limit=10):
+        """
+        Первые места рейтинга (по индексу rank)
+        """
+        return LeaderboardEntry.objects.select_related("user").order_by("rank")[:limit]
+
+    @staticmethod
+    def get_rank(user):
+        """
+        Место пользователя в рейтинге на момент последнего пересчета
+        Возвращает: rank или None, если пользователь еще не в рейтинге
+        """
+        return LeaderboardEntry.objects.filter(
+            user_id=user.id).values_list("rank", flat=True).first()
@@ -1,23 +1,50 @@
+from collections import defaultdict
+
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
+from jobs import outbox
 from onboarding.models import UserStepProgress
 from onboarding.lms_models import LMSUserTestResult
 from onboarding.feedback_models import StepFeedback
 from .services import GamificationService
 
 
-@receiver(post_save, sender=UserStepProgress)
-def handle_step_completion(sender, instance, **kwargs):
+def handle_step_completion(instance, event):
     """
-    Обработка сигнала о завершении шага онбординга
+    Обработка события о завершении шага онбординга (через outbox)
     """
-    # Проверяем, что шаг был отмечен как выполненный
+    # Проверяем, что шаг все еще отмечен как выполненный
     if instance.status == UserStepProgress.ProgressStatus.DONE:
         GamificationService.handle_step_completion(
             instance.user, instance.step)
 
 
+def handle_step_completions(instances, events):
+    """
+    Пакетная обработка завершения шагов (outbox.coalesce): одно начисление
+    очков на пользователя
+    """
+    steps_by_user = defaultdict(list)
+    users = {}
+    for progress in UserStepProgress.objects.filter(
+            id__in=[instance.id for instance in instances],
+            status=UserStepProgress.ProgressStatus.DONE
+    ).select_related('user', 'step'):
+        users[progress.user_id] = progress.user
+        steps_by_user[progress.user_id].append(progress.step)
+
+    for user_id, steps in steps_by_user.items():
+        GamificationService.handle_step_completions(users[user_id], steps)
+
+
+outbox.subscribe(
+    UserStepProgress, handle_step_completion,
+    when=lambda instance, created, update_fields:
+        instance.status == UserStepProgress.ProgressStatus.DONE,
+    batch_handler=handle_step_completions)
+
+
 @receiver(post_save, sender=LMSUserTestResult)
 def handle_test_completion(sender, instance, **kwargs):
     """
@@ -3,7 +3,7 @@ from django.contrib.auth import get_user_model
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
-from .models import UserReward, UserLevel
+from .models import LeaderboardEntry, PointsLedgerEntry, UserReward, UserLevel
 from .services import GamificationService
 
 User = get_user_model()
@@ -169,6 +169,39 @@ class GamificationServiceTests(TestCase):
         )
 
 
+    def test_level_for_points(self):
+        self.assertEqual(GamificationService.level_for_points(0), 1)
+        self.assertEqual(GamificationService.level_for_points(99), 1)
+        self.assertEqual(GamificationService.level_for_points(100), 2)
+        self.assertEqual(GamificationService.level_for_points(10000), 5)
+
+    def test_step_completion_points_are_recorded_once(self):
+        from onboarding.models import OnboardingStep, OnboardingProgram
+
+        program = OnboardingProgram.objects.create(
+            name="Test Program", description="Test Description", author=self.user)
+        step = OnboardingStep.objects.create(name="Test Step", program=program, order=1)
+
+        GamificationService.handle_step_completion(self.user, step)
+        # Повторное сохранение выполненного шага не начисляет очки снова
+        user_level, points = GamificationService.handle_step_completion(self.user, step)
+
+        self.assertEqual(points, GamificationService.step_points(step))
+        self.assertEqual(user_level.points, points)
+        self.assertEqual(PointsLedgerEntry.objects.filter(user=self.user).count(), 1)
+
+    def test_refresh_leaderboard(self):
+        other = User.objects.create_user(
+            username="other", email="other@example.com", password="testpass123")
+        GamificationService.add_points(self.user, 30)
+        GamificationService.add_points(other, 120)
+
+        self.assertEqual(GamificationService.refresh_leaderboard(), 2)
+        self.assertEqual(GamificationService.get_rank(other), 1)
+        self.assertEqual(GamificationService.get_rank(self.user), 2)
+        self.assertEqual(LeaderboardEntry.objects.get(user=other).level, 2)
+
+
 class GamificationAPITests(APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -220,6 +253,17 @@ class GamificationAPITests(APITestCase):
         self.assertTrue('points' in response.data)
         self.assertTrue('level' in response.data)
 
+    def test_leaderboard_limit_is_clamped(self):
+        """Тест ограничения параметра limit рейтинга"""
+        GamificationService.add_points(self.user, 30)
+        GamificationService.refresh_leaderboard()
+        url = reverse('gamification-leaderboard')
+
+        for limit in ('-1', '0'):
+            response = self.client.get(url, {'limit': limit})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.data['results']), 1)
+
     def test_unauthorized_access(self):
         """Тест доступа без авторизации"""
         self.client.logout()
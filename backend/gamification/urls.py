@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import GamificationProfileView, GamificationAchievementsView, TrackEventView
+from .views import GamificationProfileView, GamificationAchievementsView, LeaderboardView, TrackEventView
 
 urlpatterns = [
     # Профиль геймификации пользователя
@@ -10,6 +10,10 @@ urlpatterns = [
     path("gamification/achievements/",
          GamificationAchievementsView.as_view(), name="gamification-achievements"),
 
+    # Рейтинг пользователей
+    path("gamification/leaderboard/", LeaderboardView.as_view(),
+         name="gamification-leaderboard"),
+
     # Трекинг событий
     path("gamification/events/", TrackEventView.as_view(),
          name="gamification-events"),
@@ -3,6 +3,7 @@ from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from .models import UserLevel, UserReward
 from .serializers import (
+    LeaderboardEntrySerializer,
     UserLevelSerializer,
     UserRewardSerializer,
     GamificationEventSerializer
@@ -35,6 +36,27 @@ class GamificationAchievementsView(generics.ListAPIView):
         return UserReward.objects.filter(user=self.request.user)
 
 
+class LeaderboardView(generics.GenericAPIView):
+    """
+    Представление для получения рейтинга и места текущего пользователя.
+    Рейтинг читается из таблицы, которую периодически пересчитывает задача
+    refresh_leaderboard
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = LeaderboardEntrySerializer
+
+    def get(self, request):
+        try:
+            limit = max(1, min(int(request.query_params.get("limit", 10)), 100))
+        except ValueError:
+            limit = 10
+        entries = GamificationService.get_leaderboard(limit)
+        return Response({
+            "results": self.get_serializer(entries, many=True).data,
+            "rank": GamificationService.get_rank(request.user),
+        })
+
+
 class TrackEventView(generics.CreateAPIView):
     """
     Представление для отправки событий геймификации
@@ -0,0 +1,33 @@
+from django.contrib import admin
+from .models import JobRun, OutboxEvent, ScheduledJob
+
+
+@admin.register(ScheduledJob)
+class ScheduledJobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'interval_seconds', 'enabled', 'heavy', 'next_run_at',
+                    'locked_by', 'last_started_at', 'last_finished_at')
+    list_filter = ('enabled', 'heavy')
+    list_editable = ('interval_seconds', 'enabled')
+    search_fields = ('name', 'target')
+    readonly_fields = ('registry_interval_seconds', 'locked_by', 'locked_until',
+                       'last_started_at', 'last_finished_at')
+
+
+@admin.register(JobRun)
+class JobRunAdmin(admin.ModelAdmin):
+    list_display = ('job', 'status', 'node', 'started_at', 'finished_at')
+    list_filter = ('status', 'job')
+    readonly_fields = ('job', 'node', 'status', 'started_at', 'finished_at',
+                       'output', 'error')
+    date_hierarchy = 'started_at'
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'event_type', 'aggregate', 'status', 'attempts',
+                    'created_at', 'processed_at')
+    list_filter = ('status', 'event_type')
+    search_fields = ('aggregate',)
+    readonly_fields = ('event_type', 'aggregate', 'payload', 'attempts', 'locked_by',
+                       'locked_until', 'completed_handlers', 'last_error',
+                       'created_at', 'processed_at')
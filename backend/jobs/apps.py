@@ -0,0 +1,29 @@
+import os
+import sys
+
+from django.apps import AppConfig
+from django.conf import settings
+
+
+class JobsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'jobs'
+    verbose_name = 'Periodic Jobs'
+
+    def ready(self):
+        """
+        Запускает планировщик фоновых задач и обработчик outbox в текущем процессе, если это включено
+        настройкой JOBS_AUTOSTART или процесс запущен через runserver.
+        Аренда задач в БД гарантирует, что каждую задачу выполняет только один процесс.
+        """
+        if 'runserver' in sys.argv:
+            # Автоперезагрузчик runserver запускает два процесса, берем только рабочий
+            autostart = os.environ.get('RUN_MAIN') == 'true'
+        else:
+            autostart = getattr(settings, 'JOBS_AUTOSTART', False)
+
+        if autostart:
+            from jobs.outbox import OutboxDispatcher
+            from jobs.services import JobScheduler
+            JobScheduler().start_in_background()
+            OutboxDispatcher().start_in_background()
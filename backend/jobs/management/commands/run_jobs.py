@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+import logging
+from jobs.models import JobRun, ScheduledJob
+from jobs.services import JobScheduler, JobService
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Запускает планировщик периодических задач (или однократно выполняет задачи)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить задачи, время которых пришло, и завершиться'
+        )
+        parser.add_argument(
+            '--job',
+            nargs='+',
+            help='Немедленно выполнить указанные задачи, независимо от расписания'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Количество потоков для выполнения задач (по умолчанию JOBS_MAX_WORKERS)'
+        )
+
+    def handle(self, *args, **options):
+        if options.get('workers') is not None and options['workers'] < 1:
+            raise CommandError('Количество потоков должно быть положительным')
+
+        created = JobService.sync_jobs()
+        if created:
+            self.stdout.write(f'Зарегистрировано новых задач: {created}')
+
+        if not options.get('once') and not options.get('job'):
+            scheduler = JobScheduler(max_workers=options.get('workers'))
+            self.stdout.write(
+                f'Планировщик запущен на {scheduler.node} '
+                f'({scheduler.max_workers} потоков)')
+            try:
+                scheduler.run_forever()
+            except KeyboardInterrupt:
+                scheduler.stop()
+            return
+
+        names = options.get('job')
+        if names:
+            unknown = set(names) - set(
+                ScheduledJob.objects.filter(name__in=names).values_list('name', flat=True))
+            if unknown:
+                raise CommandError(f'Неизвестные задачи: {", ".join(sorted(unknown))}')
+
+        # Однократный запуск выполняется последовательно в текущем процессе
+        claimed = JobService.claim_due_jobs(
+            JobService.node_name(), slots=ScheduledJob.objects.count(), names=names)
+        if not claimed:
+            self.stdout.write('Нет задач для выполнения')
+            return
+
+        for job, run in claimed:
+            run = JobService.execute(job, run)
+            if run.status == JobRun.Status.SUCCEEDED:
+                self.stdout.write(self.style.SUCCESS(
+                    f'{job.name}: выполнена за {run.duration_seconds:.2f} секунд'))
+            else:
+                self.stdout.write(self.style.ERROR(
+                    f'{job.name}: ошибка\n{run.error}'))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from jobs.outbox import OutboxDispatcher, OutboxService
+
+
+class Command(BaseCommand):
+    help = 'Запускает обработчик событий outbox (или однократно обрабатывает накопившиеся события)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Обработать накопившиеся события и завершиться'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Количество потоков (по умолчанию OUTBOX_MAX_WORKERS)'
+        )
+
+    def handle(self, *args, **options):
+        if options.get('workers') is not None and options['workers'] < 1:
+            raise CommandError('Количество потоков должно быть положительным')
+
+        dispatcher = OutboxDispatcher(max_workers=options.get('workers'))
+        if options.get('once'):
+            processed = dispatcher.drain()
+            if dispatcher.executor is not None:
+                dispatcher.executor.shutdown(wait=True)
+            self.stdout.write(
+                f'Обработано событий: {processed}, удалено старых: {OutboxService.purge()}')
+            return
+
+        self.stdout.write(
+            f'Обработчик outbox запущен на {dispatcher.node} '
+            f'({dispatcher.max_workers} потоков)')
+        try:
+            dispatcher.run_forever()
+        except KeyboardInterrupt:
+            dispatcher.stop()
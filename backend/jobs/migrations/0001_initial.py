@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='name')),
+                ('target', models.CharField(help_text='Dotted path to a callable or "command:<management command>"', max_length=255, verbose_name='target')),
+                ('interval_seconds', models.PositiveIntegerField(verbose_name='interval in seconds')),
+                ('heavy', models.BooleanField(default=False, help_text='Long-running job (e.g. LLM calls); never occupies the last free worker', verbose_name='heavy')),
+                ('enabled', models.BooleanField(default=True, verbose_name='enabled')),
+                ('next_run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='next run at')),
+                ('locked_by', models.CharField(blank=True, max_length=255, verbose_name='locked by')),
+                ('locked_until', models.DateTimeField(blank=True, null=True, verbose_name='locked until')),
+                ('last_started_at', models.DateTimeField(blank=True, null=True, verbose_name='last started at')),
+                ('last_finished_at', models.DateTimeField(blank=True, null=True, verbose_name='last finished at')),
+            ],
+            options={
+                'verbose_name': 'scheduled job',
+                'verbose_name_plural': 'scheduled jobs',
+                'ordering': ['name'],
+                'indexes': [models.Index(fields=['enabled', 'next_run_at'], name='jobs_schedu_enabled_5f1c2a_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='JobRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('node', models.CharField(max_length=255, verbose_name='node')),
+                ('status', models.CharField(choices=[('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed'), ('abandoned', 'Abandoned')], default='running', max_length=20, verbose_name='status')),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='started at')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='finished at')),
+                ('output', models.TextField(blank=True, verbose_name='output')),
+                ('error', models.TextField(blank=True, verbose_name='error')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='runs', to='jobs.scheduledjob', verbose_name='job')),
+            ],
+            options={
+                'verbose_name': 'job run',
+                'verbose_name_plural': 'job runs',
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['job', '-started_at'], name='jobs_jobrun_job_id_8e2b41_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(max_length=150, verbose_name='event type')),
+                ('aggregate', models.CharField(max_length=150, verbose_name='aggregate')),
+                ('payload', models.JSONField(default=dict, verbose_name='payload')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20, verbose_name='status')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='attempts')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='available at')),
+                ('locked_by', models.CharField(blank=True, max_length=255, verbose_name='locked by')),
+                ('locked_until', models.DateTimeField(blank=True, null=True, verbose_name='locked until')),
+                ('completed_handlers', models.JSONField(blank=True, default=list, verbose_name='completed handlers')),
+                ('last_error', models.TextField(blank=True, verbose_name='last error')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='created at')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='processed at')),
+            ],
+            options={
+                'verbose_name': 'outbox event',
+                'verbose_name_plural': 'outbox events',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'available_at'], name='jobs_outbox_status_idx'), models.Index(fields=['aggregate', 'id'], name='jobs_outbox_aggregate_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:40
+
+from django.db import migrations, models
+
+
+def copy_intervals(apps, schema_editor):
+    # Текущие интервалы считаются примененными из реестра: правки из
+    # админки сохраняются до изменения интервала в реестре
+    ScheduledJob = apps.get_model('jobs', 'ScheduledJob')
+    ScheduledJob.objects.update(registry_interval_seconds=models.F('interval_seconds'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0002_outboxevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scheduledjob',
+            name='registry_interval_seconds',
+            field=models.PositiveIntegerField(blank=True, help_text='Interval from the registry (JOBS_SCHEDULE) applied by the last sync', null=True, verbose_name='registry interval in seconds'),
+        ),
+        migrations.RunPython(copy_intervals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,144 @@
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+
+class ScheduledJob(models.Model):
+    """
+    Периодическая задача и ее аренда.
+
+    Процесс, захвативший задачу (locked_by), продлевает аренду (locked_until),
+    пока задача выполняется; другие процессы не запускают задачу до истечения
+    аренды, поэтому запуски одной задачи не пересекаются.
+    """
+    name = models.CharField(_('name'), max_length=100, unique=True)
+    target = models.CharField(
+        _('target'),
+        max_length=255,
+        help_text=_('Dotted path to a callable or "command:<management command>"')
+    )
+    interval_seconds = models.PositiveIntegerField(_('interval in seconds'))
+    registry_interval_seconds = models.PositiveIntegerField(
+        _('registry interval in seconds'),
+        null=True,
+        blank=True,
+        help_text=_('Interval from the registry (JOBS_SCHEDULE) applied by the last sync')
+    )
+    heavy = models.BooleanField(
+        _('heavy'),
+        default=False,
+        help_text=_('Long-running job (e.g. LLM calls); never occupies the last free worker')
+    )
+    enabled = models.BooleanField(_('enabled'), default=True)
+    next_run_at = models.DateTimeField(_('next run at'), default=timezone.now)
+    locked_by = models.CharField(_('locked by'), max_length=255, blank=True)
+    locked_until = models.DateTimeField(_('locked until'), null=True, blank=True)
+    last_started_at = models.DateTimeField(_('last started at'), null=True, blank=True)
+    last_finished_at = models.DateTimeField(_('last finished at'), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _('scheduled job')
+        verbose_name_plural = _('scheduled jobs')
+        ordering = ['name']
+        indexes = [
+            models.Index(fields=['enabled', 'next_run_at'],
+                         name='jobs_schedu_enabled_5f1c2a_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class JobRun(models.Model):
+    """
+    История запусков периодических задач
+    """
+    class Status(models.TextChoices):
+        RUNNING = 'running', _('Running')
+        SUCCEEDED = 'succeeded', _('Succeeded')
+        FAILED = 'failed', _('Failed')
+        ABANDONED = 'abandoned', _('Abandoned')
+
+    job = models.ForeignKey(
+        ScheduledJob,
+        on_delete=models.CASCADE,
+        related_name='runs',
+        verbose_name=_('job')
+    )
+    node = models.CharField(_('node'), max_length=255)
+    status = models.CharField(
+        _('status'),
+        max_length=20,
+        choices=Status.choices,
+        default=Status.RUNNING
+    )
+    started_at = models.DateTimeField(_('started at'), default=timezone.now)
+    finished_at = models.DateTimeField(_('finished at'), null=True, blank=True)
+    output = models.TextField(_('output'), blank=True)
+    error = models.TextField(_('error'), blank=True)
+
+    class Meta:
+        verbose_name = _('job run')
+        verbose_name_plural = _('job runs')
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['job', '-started_at'],
+                         name='jobs_jobrun_job_id_8e2b41_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.job.name} - {self.get_status_display()} ({self.started_at})"
+
+    @property
+    def duration_seconds(self):
+        if not self.finished_at:
+            return None
+        return (self.finished_at - self.started_at).total_seconds()
+
+
+class OutboxEvent(models.Model):
+    """
+    Событие транзакционного outbox (см. jobs.outbox).
+
+    Записывается в той же транзакции, что и изменение объекта, и обрабатывается
+    после фиксации. События одного агрегата (aggregate) обрабатываются строго
+    по порядку id; completed_handlers хранит обработчики, уже выполненные
+    успешно, чтобы повтор после ошибки не вызывал их снова.
+    """
+    class Status(models.TextChoices):
+        PENDING = 'pending', _('Pending')
+        PROCESSING = 'processing', _('Processing')
+        DONE = 'done', _('Done')
+        FAILED = 'failed', _('Failed')
+
+    event_type = models.CharField(_('event type'), max_length=150)
+    aggregate = models.CharField(_('aggregate'), max_length=150)
+    payload = models.JSONField(_('payload'), default=dict)
+    status = models.CharField(
+        _('status'),
+        max_length=20,
+        choices=Status.choices,
+        default=Status.PENDING
+    )
+    attempts = models.PositiveIntegerField(_('attempts'), default=0)
+    available_at = models.DateTimeField(_('available at'), default=timezone.now)
+    locked_by = models.CharField(_('locked by'), max_length=255, blank=True)
+    locked_until = models.DateTimeField(_('locked until'), null=True, blank=True)
+    completed_handlers = models.JSONField(_('completed handlers'), default=list, blank=True)
+    last_error = models.TextField(_('last error'), blank=True)
+    created_at = models.DateTimeField(_('created at'), default=timezone.now)
+    processed_at = models.DateTimeField(_('processed at'), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _('outbox event')
+        verbose_name_plural = _('outbox events')
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'available_at'],
+                         name='jobs_outbox_status_idx'),
+            models.Index(fields=['aggregate', 'id'],
+                         name='jobs_outbox_aggregate_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} ({self.aggregate}) - {self.get_status_display()}"
@@ -0,0 +1,559 @@
+"""
+Транзакционный outbox для обработчиков сохранения моделей.
+
+Обработчики, которые раньше висели на post_save и выполнялись внутри запроса,
+регистрируются через subscribe(). При сохранении модели в той же транзакции
+записывается одно событие OutboxEvent со списком обработчиков, которым оно
+нужно. После фиксации транзакции события обрабатывает OutboxDispatcher:
+пакетами, строго по порядку для каждого объекта (агрегата) и с повторами
+при ошибках. Обработчик получает актуальный объект и данные события:
+handler(instance, event), где event - словарь с ключами id, created,
+update_fields. Обработчики должны быть идемпотентными: при сбое процесса
+событие может быть обработано повторно.
+
+Массовые изменения выполняются внутри coalesce(): сохранения не записывают
+событий по одному, а при выходе из блока объединяются - по одному событию
+на объект, а обработчики с пакетным вариантом (batch_handler) получают одно
+событие на весь блок и обрабатывают все объекты сгруппированными запросами.
+Пакетное событие упорядочено с событиями своих объектов так же, как события
+одного агрегата.
+"""
+import logging
+import threading
+import traceback
+import uuid
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+# Метка модели -> список (имя обработчика, обработчик, условие, пакетный обработчик)
+_subscriptions = defaultdict(list)
+# Будит диспетчер текущего процесса после фиксации транзакции с событиями
+_wakeup = threading.Event()
+# Сохранения, накопленные в блоке coalesce() текущего потока
+_local = threading.local()
+
+SAVED = 'saved'
+BATCH = 'batch'
+
+
+def handler_name(handler):
+    return f"{handler.__module__}.{handler.__qualname__}"
+
+
+def subscribe(model, handler, when=None, batch_handler=None):
+    """
+    Регистрирует обработчик сохранения модели, выполняемый через outbox
+
+    Args:
+        model: Класс модели
+        handler: Функция handler(instance, event)
+        when: Условие when(instance, created, update_fields), проверяемое
+            при сохранении; событие не записывается, если условия всех
+            обработчиков модели ложны
+        batch_handler: Пакетный вариант batch_handler(instances, events) для
+            сохранений внутри coalesce(); events - данные событий по id объекта
+    """
+    label = model._meta.label_lower
+    name = handler_name(handler)
+    if any(subscription[0] == name for subscription in _subscriptions[label]):
+        return
+    _subscriptions[label].append((name, handler, when, batch_handler))
+    post_save.connect(
+        _publish_saved, sender=model, weak=False, dispatch_uid=f'outbox:{label}')
+
+
+def unsubscribe(model, handler):
+    label = model._meta.label_lower
+    name = handler_name(handler)
+    _subscriptions[label] = [
+        subscription for subscription in _subscriptions[label] if subscription[0] != name]
+    if not _subscriptions[label]:
+        post_save.disconnect(sender=model, dispatch_uid=f'outbox:{label}')
+
+
+def _publish_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+
+    label = sender._meta.label_lower
+    update_fields = sorted(update_fields) if update_fields else None
+    handlers = [
+        name for name, _, when, _ in _subscriptions[label]
+        if when is None or when(instance, created, update_fields)
+    ]
+    if not handlers:
+        return
+
+    batch = getattr(_local, 'batch', None)
+    if batch is not None:
+        _merge_saved(batch[label], instance.pk, created, update_fields, handlers)
+        return
+
+    publish(f'{label}.{SAVED}', f'{label}:{instance.pk}', {
+        'id': instance.pk,
+        'created': created,
+        'update_fields': update_fields,
+        'handlers': handlers,
+    })
+
+
+def _merge_saved(saved, pk, created, update_fields, handlers):
+    """
+    Объединяет повторные сохранения объекта внутри coalesce()
+    """
+    event = saved.get(pk)
+    if event is None:
+        saved[pk] = {
+            'id': pk, 'created': created, 'update_fields': update_fields,
+            'handlers': list(handlers)}
+        return
+
+    event['created'] = event['created'] or created
+    if event['update_fields'] is None or update_fields is None:
+        # Сохранение без update_fields означает изменение всех полей
+        event['update_fields'] = None
+    else:
+        event['update_fields'] = sorted(set(event['update_fields']) | set(update_fields))
+    event['handlers'] += [name for name in handlers if name not in event['handlers']]
+
+
+@contextmanager
+def coalesce():
+    """
+    Объединяет события сохранений внутри блока (см. описание модуля).
+    События записываются при выходе из внешнего блока. При исключении они
+    записываются, только если блок выполнялся вне транзакции: такие
+    сохранения к этому моменту уже зафиксированы. Внутри транзакции
+    изменения откатываются вместе с ней, а после ошибки базы данных
+    транзакция не принимает новых запросов. Если транзакция помечена на
+    откат, события также не записываются
+
+    Пример:
+        with transaction.atomic(), outbox.coalesce():
+            for progress in progresses:
+                progress.save()
+    """
+    if getattr(_local, 'batch', None) is not None:
+        # Вложенный блок дополняет внешний
+        yield
+        return
+
+    _local.batch = defaultdict(OrderedDict)
+    try:
+        yield
+    except BaseException:
+        batch, _local.batch = _local.batch, None
+        if not transaction.get_connection().in_atomic_block:
+            _publish_batch(batch)
+        raise
+    batch, _local.batch = _local.batch, None
+    if not transaction.get_connection().needs_rollback:
+        _publish_batch(batch)
+
+
+def _publish_batch(batch):
+    events = []
+    for label, saved in batch.items():
+        batch_handlers = {
+            name for name, _, _, batch_handler in _subscriptions[label] if batch_handler}
+
+        # Пакетные обработчики - одно событие на обработчик для всех объектов
+        for name in sorted(batch_handlers):
+            rows = {pk: event for pk, event in saved.items() if name in event['handlers']}
+            if rows:
+                events.append(OutboxEvent(
+                    event_type=f'{label}.{BATCH}',
+                    aggregate=f'{label}:{BATCH}:{uuid.uuid4().hex}',
+                    payload={'handler': name, 'ids': list(rows), 'events': {
+                        str(pk): event for pk, event in rows.items()}}
+                ))
+
+        # Остальные обработчики - одно событие на объект
+        for pk, event in saved.items():
+            handlers = [name for name in event['handlers'] if name not in batch_handlers]
+            if handlers:
+                events.append(OutboxEvent(
+                    event_type=f'{label}.{SAVED}', aggregate=f'{label}:{pk}',
+                    payload=dict(event, handlers=handlers)))
+
+    if events:
+        OutboxEvent.objects.bulk_create(events, batch_size=1000)
+        transaction.on_commit(_wakeup.set)
+
+
+def _object_keys(event):
+    """
+    Агрегаты объектов, к которым относится событие: для пакетного события -
+    агрегаты всех его объектов
+    """
+    label, _, action = event.event_type.rpartition('.')
+    if action == BATCH:
+        return {f'{label}:{pk}' for pk in event.payload['ids']}
+    return {event.aggregate}
+
+
+def publish(event_type, aggregate, payload):
+    """
+    Записывает событие в outbox в текущей транзакции
+
+    Returns:
+        OutboxEvent: Созданное событие
+    """
+    event = OutboxEvent.objects.create(
+        event_type=event_type, aggregate=aggregate, payload=payload)
+    transaction.on_commit(_wakeup.set)
+    return event
+
+
+class OutboxService:
+    """
+    Захват, обработка и очистка событий outbox
+    """
+
+    @staticmethod
+    def claim(node, limit, now=None):
+        """
+        Захватывает до limit событий, готовых к обработке.
+
+        Событие не захватывается, пока не обработано более раннее событие
+        того же агрегата, захваченное другим процессом или ожидающее повтора.
+        Готовые события одного агрегата захватываются вместе и выполняются
+        по порядку в одной группе (см. process_group): после ошибки
+        оставшиеся события группы возвращаются в очередь.
+
+        Пакетное событие (coalesce) относится ко всем своим объектам: оно
+        не захватывается, пока не обработаны более ранние события этих
+        объектов, а более поздние события объектов ждут его обработки.
+        Такие события выполняются в разных группах, поэтому ждут и события,
+        захваченные в том же вызове.
+
+        Returns:
+            list: Захваченные события в порядке id
+        """
+        if now is None:
+            now = timezone.now()
+        lease = timedelta(seconds=getattr(settings, 'OUTBOX_LEASE_SECONDS', 300))
+
+        with transaction.atomic():
+            candidates = list(OutboxEvent.objects.select_for_update(skip_locked=True).filter(
+                Q(status=OutboxEvent.Status.PENDING, available_at__lte=now) |
+                # Аренда истекла: процесс, обрабатывавший событие, считается упавшим
+                Q(status=OutboxEvent.Status.PROCESSING, locked_until__lt=now)
+            ).order_by('id')[:limit])
+            if not candidates:
+                return []
+
+            # Необработанные более ранние события тех же объектов: события
+            # агрегатов кандидатов и пакетные события их моделей
+            candidate_ids = {event.id for event in candidates}
+            object_keys = set().union(*(_object_keys(event) for event in candidates))
+            labels = {event.event_type.rpartition('.')[0] for event in candidates}
+            earlier = list(OutboxEvent.objects.filter(
+                Q(aggregate__in=object_keys) |
+                Q(event_type__in=[f'{label}.{BATCH}' for label in labels]),
+                status__in=[OutboxEvent.Status.PENDING, OutboxEvent.Status.PROCESSING],
+                id__lt=candidates[-1].id
+            ).order_by('id').only('id', 'event_type', 'aggregate', 'payload'))
+            earlier = [(other, _object_keys(other)) for other in earlier]
+
+            claimed = []
+            blocked_aggregates = set()
+            for event in candidates:
+                keys = _object_keys(event)
+                blocked = event.aggregate in blocked_aggregates or any(
+                    (other.aggregate == event.aggregate and other.id not in candidate_ids) or
+                    (other.aggregate != event.aggregate and keys & other_keys)
+                    for other, other_keys in earlier if other.id < event.id
+                )
+                if blocked:
+                    # Следующие события агрегата ждут вместе с этим
+                    blocked_aggregates.add(event.aggregate)
+                else:
+                    claimed.append(event)
+            OutboxEvent.objects.filter(id__in=[event.id for event in claimed]).update(
+                status=OutboxEvent.Status.PROCESSING, locked_by=node,
+                locked_until=now + lease)
+        return claimed
+
+    @staticmethod
+    def load_instances(events):
+        """
+        Загружает объекты событий сохранения одним запросом на модель
+
+        Returns:
+            dict: Объекты по паре (метка модели, id)
+        """
+        ids_by_label = defaultdict(set)
+        for event in events:
+            label, _, action = event.event_type.rpartition('.')
+            if action == SAVED:
+                ids_by_label[label].add(event.payload['id'])
+            elif action == BATCH:
+                ids_by_label[label].update(event.payload['ids'])
+
+        instances = {}
+        for label, ids in ids_by_label.items():
+            model = apps.get_model(label)
+            for pk, instance in model.objects.in_bulk(list(ids)).items():
+                instances[(label, pk)] = instance
+        return instances
+
+    @staticmethod
+    def process_group(events, instances):
+        """
+        Обрабатывает события одного агрегата по порядку. После ошибки
+        оставшиеся события агрегата возвращаются в очередь без попытки
+
+        Returns:
+            list: События с обновленным состоянием (сохраняются save_results)
+        """
+        now = timezone.now()
+        max_attempts = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 5)
+        backoff = getattr(settings, 'OUTBOX_RETRY_BACKOFF', 30)
+
+        for position, event in enumerate(events):
+            error = OutboxService._dispatch(event, instances)
+            event.locked_by = ''
+            event.locked_until = None
+            if error is None:
+                event.status = OutboxEvent.Status.DONE
+                event.processed_at = timezone.now()
+                continue
+
+            event.attempts += 1
+            event.last_error = error
+            if event.attempts >= max_attempts:
+                event.status = OutboxEvent.Status.FAILED
+                logger.error(
+                    f"Outbox event {event.id} ({event.event_type}) failed "
+                    f"after {event.attempts} attempts")
+            else:
+                event.status = OutboxEvent.Status.PENDING
+                event.available_at = now + timedelta(
+                    seconds=backoff * 2 ** (event.attempts - 1))
+
+            for later in events[position + 1:]:
+                later.status = OutboxEvent.Status.PENDING
+                later.locked_by = ''
+                later.locked_until = None
+            break
+        return events
+
+    @staticmethod
+    def _dispatch(event, instances):
+        """
+        Returns:
+            str: Текст ошибки или None при успехе
+        """
+        label, _, action = event.event_type.rpartition('.')
+        if action == BATCH:
+            return OutboxService._dispatch_batch(event, label, instances)
+        if action != SAVED:
+            logger.warning(f"Unknown outbox event type {event.event_type}")
+            return None
+
+        instance = instances.get((label, event.payload['id']))
+        if instance is None:
+            # Объект удален до обработки события
+            return None
+
+        handlers = {
+            subscription[0]: subscription[1] for subscription in _subscriptions[label]}
+        for name in event.payload.get('handlers', []):
+            if name in event.completed_handlers:
+                continue
+            handler = handlers.get(name)
+            if handler is None:
+                logger.warning(f"Outbox handler {name} is not registered")
+                continue
+            try:
+                with transaction.atomic():
+                    handler(instance, event.payload)
+            except Exception as e:
+                logger.exception(f"Outbox handler {name} failed for {event.aggregate}: {e}")
+                return traceback.format_exc()[-10000:]
+            event.completed_handlers = event.completed_handlers + [name]
+        return None
+
+    @staticmethod
+    def _dispatch_batch(event, label, instances):
+        name = event.payload['handler']
+        batch_handlers = {
+            subscription[0]: subscription[3] for subscription in _subscriptions[label]}
+        batch_handler = batch_handlers.get(name)
+        if batch_handler is None:
+            logger.warning(f"Outbox batch handler {name} is not registered")
+            return None
+
+        # Удаленные до обработки объекты пропускаются
+        batch = [
+            instances[(label, pk)] for pk in event.payload['ids'] if (label, pk) in instances]
+        if not batch:
+            return None
+        events = {int(pk) if pk.isdigit() else pk: data
+                  for pk, data in event.payload['events'].items()}
+        try:
+            with transaction.atomic():
+                batch_handler(batch, events)
+        except Exception as e:
+            logger.exception(f"Outbox batch handler {name} failed: {e}")
+            return traceback.format_exc()[-10000:]
+        return None
+
+    @staticmethod
+    def save_results(events):
+        OutboxEvent.objects.bulk_update(events, [
+            'status', 'attempts', 'available_at', 'locked_by', 'locked_until',
+            'completed_handlers', 'last_error', 'processed_at'
+        ])
+
+    @staticmethod
+    def purge(now=None):
+        """
+        Удаляет обработанные события старше OUTBOX_RETENTION_HOURS
+
+        Returns:
+            int: Количество удаленных событий
+        """
+        if now is None:
+            now = timezone.now()
+        retention = timedelta(hours=getattr(settings, 'OUTBOX_RETENTION_HOURS', 24))
+        deleted, _ = OutboxEvent.objects.filter(
+            status=OutboxEvent.Status.DONE, processed_at__lt=now - retention).delete()
+        return deleted
+
+
+class OutboxDispatcher:
+    """
+    Обработчик outbox: захватывает пакет событий и распределяет агрегаты
+    по потокам пула; события одного агрегата выполняются в одном потоке
+    """
+
+    def __init__(self, max_workers=None, batch_size=None, poll_interval=None, node=None):
+        from .services import JobService
+
+        self.max_workers = max_workers or getattr(settings, 'OUTBOX_MAX_WORKERS', 4)
+        self.batch_size = batch_size or getattr(settings, 'OUTBOX_BATCH_SIZE', 100)
+        self.poll_interval = poll_interval or getattr(settings, 'OUTBOX_POLL_INTERVAL', 1)
+        self.node = node or JobService.node_name()
+        self.executor = None
+        if self.max_workers > 1:
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix='outbox')
+        self.stop_event = threading.Event()
+
+    def run_once(self):
+        """
+        Обрабатывает один пакет событий
+
+        Returns:
+            int: Количество захваченных событий
+        """
+        events = OutboxService.claim(self.node, self.batch_size)
+        if not events:
+            return 0
+
+        instances = OutboxService.load_instances(events)
+        groups = OrderedDict()
+        for event in events:
+            groups.setdefault(event.aggregate, []).append(event)
+
+        if self.executor is None:
+            results = [OutboxService.process_group(group, instances) for group in groups.values()]
+        else:
+            futures = [
+                self.executor.submit(self._process_in_worker, group, instances)
+                for group in groups.values()
+            ]
+            results = [future.result() for future in futures]
+
+        OutboxService.save_results([event for group in results for event in group])
+        return len(events)
+
+    @staticmethod
+    def _process_in_worker(events, instances):
+        """
+        Обрабатывает группу событий в потоке пула: соединения потока
+        с базой закрываются до и после обработки
+        """
+        close_old_connections()
+        try:
+            return OutboxService.process_group(events, instances)
+        finally:
+            close_old_connections()
+
+    def drain(self, max_batches=None):
+        """
+        Обрабатывает события, пока они есть
+
+        Returns:
+            int: Количество обработанных событий
+        """
+        total = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            processed = self.run_once()
+            if not processed:
+                break
+            total += processed
+            batches += 1
+        return total
+
+    def run_forever(self):
+        """
+        Обрабатывает события до вызова stop(). Между пакетами ждет не дольше
+        poll_interval; события текущего процесса будят диспетчер сразу
+        после фиксации транзакции
+        """
+        while not self.stop_event.is_set():
+            processed = 0
+            try:
+                processed = self.run_once()
+            except Exception as e:
+                logger.exception(f"Outbox dispatcher iteration failed: {str(e)}")
+            finally:
+                close_old_connections()
+            if not processed:
+                _wakeup.wait(self.poll_interval)
+                _wakeup.clear()
+
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
+    def start_in_background(self):
+        thread = threading.Thread(
+            target=self.run_forever, name='outbox-dispatcher', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.stop_event.set()
+        _wakeup.set()
+
+
+def drain_outbox():
+    """
+    Периодическая задача: обрабатывает накопившиеся события (если
+    диспетчер не запущен) и удаляет старые обработанные события
+
+    Returns:
+        str: Статистика для журнала запусков
+    """
+    dispatcher = OutboxDispatcher()
+    processed = dispatcher.drain()
+    if dispatcher.executor is not None:
+        dispatcher.executor.shutdown(wait=True)
+    return f"processed: {processed}, purged: {OutboxService.purge()}"
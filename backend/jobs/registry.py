@@ -0,0 +1,96 @@
+"""
+Реестр периодических задач.
+
+target - путь к вызываемому объекту или "command:<имя management-команды>".
+interval - период запуска в секундах; heavy - длительные задачи (LLM и т.п.),
+которые не занимают последний свободный поток, чтобы не задерживать
+остальные задачи, например проверку дедлайнов.
+Интервал можно переопределить настройкой JOBS_SCHEDULE = {'<name>': <seconds>}.
+"""
+from django.conf import settings
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+DEFAULT_JOBS = {
+    # Резервная обработка outbox, если диспетчер (run_outbox) не запущен,
+    # и удаление старых обработанных событий
+    'drain_outbox': {
+        'target': 'jobs.outbox.drain_outbox',
+        'interval': 60,
+    },
+    'check_deadlines': {
+        'target': 'notifications.signals.check_approaching_deadlines',
+        'interval': HOUR,
+    },
+    'generate_onboarding_snapshots': {
+        'target': 'command:generate_onboarding_snapshots',
+        'args': ['--bulk', '--summaries'],
+        'interval': DAY,
+    },
+    'analyze_onboarding_risks': {
+        'target': 'command:analyze_onboarding_risks',
+        'args': ['--batch'],
+        'interval': DAY,
+    },
+    'detect_onboarding_anomalies': {
+        'target': 'command:detect_onboarding_anomalies',
+        'args': ['--batch'],
+        'interval': DAY,
+    },
+    'update_hr_snapshots': {
+        'target': 'command:update_hr_snapshots',
+        'interval': DAY,
+    },
+    'generate_hr_alerts': {
+        'target': 'command:generate_hr_alerts',
+        'interval': HOUR,
+    },
+    'auto_reschedule': {
+        'target': 'command:auto_reschedule',
+        'interval': DAY,
+    },
+    'analyze_feedback': {
+        'target': 'command:analyze_feedback',
+        'interval': DAY,
+        'heavy': True,
+    },
+    'evict_llm_cache': {
+        'target': 'command:llm_cache',
+        'args': ['--evict'],
+        'interval': DAY,
+    },
+    'sync_embedding_index': {
+        'target': 'command:sync_embedding_index',
+        'interval': HOUR,
+    },
+    # Фоновые выгрузки PDF-отчетов и удаление старых файлов
+    'render_report_exports': {
+        'target': 'onboarding.services.reports.render_report_exports',
+        'interval': 60,
+        'heavy': True,
+    },
+    'refresh_leaderboard': {
+        'target': 'gamification.services.refresh_leaderboard',
+        'interval': 15 * 60,
+    },
+    'aggregate_all_insights': {
+        'target': 'command:aggregate_all_insights',
+        'interval': DAY,
+        'heavy': True,
+    },
+}
+
+
+def get_job_definitions():
+    """
+    Возвращает описания задач с учетом переопределений из настроек
+    """
+    overrides = getattr(settings, 'JOBS_SCHEDULE', {})
+    definitions = {}
+    for name, definition in DEFAULT_JOBS.items():
+        definition = dict(definition)
+        if name in overrides:
+            definition['interval'] = overrides[name]
+        definitions[name] = definition
+    return definitions
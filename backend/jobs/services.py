@@ -0,0 +1,338 @@
+"""
+Планировщик периодических задач с арендой в БД
+"""
+import io
+import logging
+import os
+import socket
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import JobRun, ScheduledJob
+from .registry import get_job_definitions
+
+logger = logging.getLogger(__name__)
+
+# Максимальная длина сохраняемого вывода и текста ошибки
+MAX_OUTPUT_LENGTH = 10000
+
+
+class JobService:
+    """
+    Операции над задачами: синхронизация реестра, захват, выполнение
+    """
+
+    @staticmethod
+    def node_name():
+        """
+        Имя текущего процесса для аренды задач
+        """
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    @staticmethod
+    def sync_jobs():
+        """
+        Создает задачи из реестра и обновляет существующие: цель и признак
+        heavy - всегда, интервал - только если он изменился в реестре
+        (JOBS_SCHEDULE) с прошлой синхронизации. Интервал, измененный в
+        админке, сохраняется, пока не изменится интервал реестра;
+        включенность задач не меняется
+
+        Returns:
+            int: Количество созданных задач
+        """
+        definitions = get_job_definitions()
+        existing = {job.name: job for job in ScheduledJob.objects.all()}
+        to_create = []
+        to_update = []
+
+        for name, definition in definitions.items():
+            job = existing.get(name)
+            heavy = definition.get('heavy', False)
+            if job is None:
+                to_create.append(ScheduledJob(
+                    name=name,
+                    target=definition['target'],
+                    interval_seconds=definition['interval'],
+                    registry_interval_seconds=definition['interval'],
+                    heavy=heavy
+                ))
+                continue
+
+            changed = job.target != definition['target'] or job.heavy != heavy
+            job.target = definition['target']
+            job.heavy = heavy
+            if job.registry_interval_seconds != definition['interval']:
+                job.interval_seconds = definition['interval']
+                job.registry_interval_seconds = definition['interval']
+                changed = True
+            if changed:
+                to_update.append(job)
+
+        ScheduledJob.objects.bulk_create(to_create, ignore_conflicts=True)
+        ScheduledJob.objects.bulk_update(
+            to_update, ['target', 'heavy', 'interval_seconds', 'registry_interval_seconds'])
+        return len(to_create)
+
+    @staticmethod
+    def enqueue(name, now=None):
+        """
+        Ставит задачу реестра на ближайший запуск планировщиком
+        (run_jobs). Выполняющаяся задача повторно не ставится
+
+        Returns:
+            dict: Состояние задачи (см. job_status)
+        """
+        if now is None:
+            now = timezone.now()
+        if not ScheduledJob.objects.filter(name=name).exists():
+            JobService.sync_jobs()
+
+        ScheduledJob.objects.filter(
+            Q(locked_until__isnull=True) | Q(locked_until__lt=now),
+            name=name, next_run_at__gt=now
+        ).update(next_run_at=now)
+        return JobService.job_status(name, now)
+
+    @staticmethod
+    def job_status(name, now=None):
+        """
+        Состояние задачи и ее последнего запуска
+
+        Returns:
+            dict: job, state (running, queued, scheduled, disabled),
+                next_run_at, last_run
+        """
+        if now is None:
+            now = timezone.now()
+        job = ScheduledJob.objects.get(name=name)
+
+        if job.locked_until is not None and job.locked_until >= now:
+            state = 'running'
+        elif not job.enabled:
+            state = 'disabled'
+        elif job.next_run_at <= now:
+            state = 'queued'
+        else:
+            state = 'scheduled'
+
+        last_run = job.runs.order_by('-started_at').first()
+        return {
+            'job': job.name,
+            'state': state,
+            'next_run_at': job.next_run_at,
+            'last_run': last_run and {
+                'id': last_run.id,
+                'status': last_run.status,
+                'started_at': last_run.started_at,
+                'finished_at': last_run.finished_at,
+            },
+        }
+
+    @staticmethod
+    def claim_due_jobs(node, slots, heavy_slots=None, names=None, now=None):
+        """
+        Захватывает задачи, время которых пришло и аренда которых свободна.
+
+        Строки блокируются SELECT ... FOR UPDATE SKIP LOCKED, поэтому параллельные
+        процессы захватывают разные задачи; захваченная задача не запускается
+        другими процессами до истечения аренды.
+
+        Args:
+            node (str): Имя процесса
+            slots (int): Максимальное количество задач
+            heavy_slots (int): Максимальное количество длительных задач
+                (None - без ограничения)
+            names (list): Захватить только указанные задачи, независимо от расписания
+            now (datetime): Текущее время
+
+        Returns:
+            list: Пары (ScheduledJob, JobRun)
+        """
+        if slots <= 0:
+            return []
+
+        if now is None:
+            now = timezone.now()
+        lease = timedelta(seconds=getattr(settings, 'JOBS_LEASE_SECONDS', 300))
+
+        claimed = []
+        with transaction.atomic():
+            jobs = ScheduledJob.objects.select_for_update(skip_locked=True).filter(
+                Q(locked_until__isnull=True) | Q(locked_until__lt=now),
+                enabled=True
+            )
+            if names is not None:
+                jobs = jobs.filter(name__in=names)
+            else:
+                jobs = jobs.filter(next_run_at__lte=now)
+
+            for job in jobs.order_by('next_run_at', 'id'):
+                if len(claimed) >= slots:
+                    break
+                if job.heavy and heavy_slots is not None:
+                    if heavy_slots <= 0:
+                        continue
+                    heavy_slots -= 1
+
+                if job.locked_by:
+                    # Аренда истекла: процесс, выполнявший задачу, считается упавшим
+                    JobRun.objects.filter(
+                        job=job, node=job.locked_by, status=JobRun.Status.RUNNING
+                    ).update(status=JobRun.Status.ABANDONED, finished_at=now)
+                    logger.warning(
+                        f"Lease of job {job.name} held by {job.locked_by} expired")
+
+                job.locked_by = node
+                job.locked_until = now + lease
+                job.last_started_at = now
+                job.next_run_at = now + timedelta(seconds=job.interval_seconds)
+                job.save(update_fields=['locked_by', 'locked_until',
+                                        'last_started_at', 'next_run_at'])
+                claimed.append(
+                    (job, JobRun.objects.create(job=job, node=node, started_at=now)))
+
+        return claimed
+
+    @staticmethod
+    def renew_leases(node, job_ids):
+        """
+        Продлевает аренду выполняющихся задач процесса
+        """
+        if not job_ids:
+            return 0
+        lease = timedelta(seconds=getattr(settings, 'JOBS_LEASE_SECONDS', 300))
+        return ScheduledJob.objects.filter(id__in=job_ids, locked_by=node).update(
+            locked_until=timezone.now() + lease)
+
+    @staticmethod
+    def execute(job, run):
+        """
+        Выполняет захваченную задачу, записывает результат запуска
+        и освобождает аренду
+
+        Returns:
+            JobRun: Завершенный запуск
+        """
+        output = io.StringIO()
+        try:
+            JobService._call_target(job, output)
+            run.status = JobRun.Status.SUCCEEDED
+        except BaseException as e:
+            logger.exception(f"Job {job.name} failed: {str(e)}")
+            run.status = JobRun.Status.FAILED
+            run.error = traceback.format_exc()[-MAX_OUTPUT_LENGTH:]
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            run.finished_at = timezone.now()
+            run.output = output.getvalue()[-MAX_OUTPUT_LENGTH:]
+            run.save(update_fields=['status', 'finished_at', 'output', 'error'])
+            ScheduledJob.objects.filter(id=job.id, locked_by=run.node).update(
+                locked_by='', locked_until=None, last_finished_at=run.finished_at)
+
+        return run
+
+    @staticmethod
+    def _call_target(job, output):
+        if job.target.startswith('command:'):
+            args = get_job_definitions().get(job.name, {}).get('args', [])
+            call_command(job.target[len('command:'):], *args,
+                         stdout=output, stderr=output)
+            return
+
+        result = import_string(job.target)()
+        if result is not None:
+            output.write(str(result))
+
+
+class JobScheduler:
+    """
+    Цикл планировщика: каждые poll_interval секунд продлевает аренду
+    выполняющихся задач и отдает освободившимся потокам пула новые задачи
+    """
+
+    def __init__(self, max_workers=None, poll_interval=None, node=None):
+        self.max_workers = max_workers or getattr(settings, 'JOBS_MAX_WORKERS', 4)
+        self.poll_interval = poll_interval or getattr(settings, 'JOBS_POLL_INTERVAL', 15)
+        self.node = node or JobService.node_name()
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix='jobs')
+        self.stop_event = threading.Event()
+        # future -> ScheduledJob
+        self.running = {}
+
+    def run_pending(self):
+        """
+        Одна итерация цикла планировщика
+
+        Returns:
+            int: Количество запущенных задач
+        """
+        self.running = {
+            future: job for future, job in self.running.items() if not future.done()}
+        JobService.renew_leases(self.node, [job.id for job in self.running.values()])
+
+        slots = self.max_workers - len(self.running)
+        # Длительные задачи не занимают последний поток
+        heavy_limit = max(1, self.max_workers - 1)
+        heavy_slots = heavy_limit - sum(1 for job in self.running.values() if job.heavy)
+
+        claimed = JobService.claim_due_jobs(self.node, slots, heavy_slots)
+        for job, run in claimed:
+            self.running[self.executor.submit(self._execute_in_worker, job, run)] = job
+
+        return len(claimed)
+
+    @staticmethod
+    def _execute_in_worker(job, run):
+        """
+        Выполняет задачу в потоке пула: соединения потока с базой
+        закрываются до и после выполнения
+        """
+        close_old_connections()
+        try:
+            return JobService.execute(job, run)
+        finally:
+            close_old_connections()
+
+    def run_forever(self):
+        """
+        Выполняет цикл планировщика до вызова stop()
+        """
+        try:
+            JobService.sync_jobs()
+        except Exception as e:
+            logger.exception(f"Could not sync jobs: {str(e)}")
+
+        while not self.stop_event.is_set():
+            try:
+                self.run_pending()
+            except Exception as e:
+                logger.exception(f"Job scheduler iteration failed: {str(e)}")
+            finally:
+                close_old_connections()
+            self.stop_event.wait(self.poll_interval)
+
+        self.executor.shutdown(wait=True)
+
+    def start_in_background(self):
+        """
+        Запускает цикл планировщика в фоновом потоке
+        """
+        thread = threading.Thread(
+            target=self.run_forever, name='jobs-scheduler', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.stop_event.set()
@@ -0,0 +1,264 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import outbox
+from .models import JobRun, OutboxEvent, ScheduledJob
+from .outbox import OutboxDispatcher, OutboxService
+from .services import JobService
+
+CALLS = []
+
+
+def record_call():
+    CALLS.append(timezone.now())
+    return 'ok'
+
+
+def fail():
+    raise ValueError('boom')
+
+
+class JobServiceTest(TestCase):
+    """
+    Тесты захвата и выполнения периодических задач
+    """
+
+    def setUp(self):
+        CALLS.clear()
+        self.now = timezone.now()
+
+    def create_job(self, name, target='jobs.tests.record_call', heavy=False, **kwargs):
+        return ScheduledJob.objects.create(
+            name=name, target=target, interval_seconds=3600, heavy=heavy,
+            next_run_at=self.now - timedelta(minutes=1), **kwargs)
+
+    def test_sync_jobs_registers_defaults_once(self):
+        created = JobService.sync_jobs()
+
+        self.assertGreater(created, 0)
+        self.assertTrue(ScheduledJob.objects.filter(name='check_deadlines').exists())
+        self.assertEqual(JobService.sync_jobs(), 0)
+
+    def test_sync_jobs_applies_changed_registry_interval(self):
+        JobService.sync_jobs()
+        # Правка из админки сохраняется, пока интервал реестра не изменился
+        ScheduledJob.objects.filter(name='check_deadlines').update(interval_seconds=600)
+        JobService.sync_jobs()
+        self.assertEqual(
+            ScheduledJob.objects.get(name='check_deadlines').interval_seconds, 600)
+
+        with override_settings(JOBS_SCHEDULE={'check_deadlines': 900}):
+            JobService.sync_jobs()
+        job = ScheduledJob.objects.get(name='check_deadlines')
+        self.assertEqual(job.interval_seconds, 900)
+        self.assertEqual(job.registry_interval_seconds, 900)
+
+    def test_enqueue_moves_next_run_to_now(self):
+        job = self.create_job('record')
+        ScheduledJob.objects.filter(id=job.id).update(
+            next_run_at=self.now + timedelta(days=1))
+
+        status = JobService.enqueue('record', now=self.now)
+
+        self.assertEqual(status['state'], 'queued')
+        self.assertIsNone(status['last_run'])
+        claimed = JobService.claim_due_jobs('node-a', slots=5, now=self.now)
+        self.assertEqual([claimed_job.id for claimed_job, _ in claimed], [job.id])
+        # Выполняющаяся задача повторно не ставится
+        self.assertEqual(JobService.enqueue('record', now=self.now)['state'], 'running')
+        self.assertGreater(
+            ScheduledJob.objects.get(id=job.id).next_run_at, self.now)
+
+    def test_claimed_job_is_not_claimed_again_until_lease_expires(self):
+        job = self.create_job('record')
+
+        claimed = JobService.claim_due_jobs('node-a', slots=5, now=self.now)
+        self.assertEqual([claimed_job.id for claimed_job, _ in claimed], [job.id])
+
+        # Другой процесс не получает задачу, даже если время запуска снова пришло
+        ScheduledJob.objects.filter(id=job.id).update(next_run_at=self.now)
+        self.assertEqual(
+            JobService.claim_due_jobs('node-b', slots=5, now=self.now), [])
+
+        # После истечения аренды задача переходит другому процессу,
+        # а запуск упавшего процесса помечается как брошенный
+        expired = self.now + timedelta(hours=1)
+        claimed = JobService.claim_due_jobs('node-b', slots=5, now=expired)
+        self.assertEqual(len(claimed), 1)
+        self.assertEqual(
+            JobRun.objects.get(node='node-a').status, JobRun.Status.ABANDONED)
+
+    def test_execute_records_run_and_releases_lease(self):
+        self.create_job('record')
+        self.create_job('fail', target='jobs.tests.fail')
+
+        runs = {
+            job.name: JobService.execute(job, run)
+            for job, run in JobService.claim_due_jobs('node-a', slots=5, now=self.now)
+        }
+
+        self.assertEqual(len(CALLS), 1)
+        self.assertEqual(runs['record'].status, JobRun.Status.SUCCEEDED)
+        self.assertEqual(runs['record'].output, 'ok')
+        self.assertEqual(runs['fail'].status, JobRun.Status.FAILED)
+        self.assertIn('boom', runs['fail'].error)
+        for job in ScheduledJob.objects.all():
+            self.assertEqual(job.locked_by, '')
+            self.assertIsNone(job.locked_until)
+            self.assertGreater(job.next_run_at, self.now)
+
+    @override_settings(JOBS_LEASE_SECONDS=60)
+    def test_heavy_slots_limit_long_running_jobs(self):
+        self.create_job('heavy-1', heavy=True)
+        self.create_job('heavy-2', heavy=True)
+        light = self.create_job('light')
+
+        claimed = JobService.claim_due_jobs(
+            'node-a', slots=3, heavy_slots=1, now=self.now)
+
+        names = {job.name for job, _ in claimed}
+        self.assertEqual(len(names), 2)
+        self.assertIn(light.name, names)
+        self.assertEqual(
+            claimed[0][0].locked_until, self.now + timedelta(seconds=60))
+
+
+HANDLED = []
+FAILING = set()
+BATCHES = []
+
+
+def record_saved_job(instance, event):
+    if instance.name in FAILING:
+        raise ValueError('handler failed')
+    HANDLED.append((instance.name, event['created']))
+
+
+def count_saved_job(instance, event):
+    BATCHES.append([instance.name])
+
+
+def count_saved_jobs(instances, events):
+    BATCHES.append(sorted(instance.name for instance in instances))
+
+
+class OutboxTest(TestCase):
+    """
+    Тесты транзакционного outbox
+    """
+
+    def setUp(self):
+        HANDLED.clear()
+        FAILING.clear()
+        BATCHES.clear()
+        outbox.subscribe(
+            ScheduledJob, record_saved_job,
+            when=lambda instance, created, update_fields: instance.enabled)
+        self.addCleanup(outbox.unsubscribe, ScheduledJob, record_saved_job)
+        self.dispatcher = OutboxDispatcher(max_workers=1, node='node-a')
+
+    def create_job(self, name, **kwargs):
+        return ScheduledJob.objects.create(
+            name=name, target='jobs.tests.record_call', interval_seconds=60, **kwargs)
+
+    def test_save_records_event_and_dispatch_runs_handler(self):
+        self.create_job('first')
+        self.create_job('disabled', enabled=False)
+
+        # Обработчик не выполняется при сохранении, событие записано одно
+        self.assertEqual(HANDLED, [])
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.payload['handlers'], ['jobs.tests.record_saved_job'])
+
+        self.assertEqual(self.dispatcher.drain(), 1)
+        self.assertEqual(HANDLED, [('first', True)])
+        event.refresh_from_db()
+        self.assertEqual(event.status, OutboxEvent.Status.DONE)
+        self.assertEqual(self.dispatcher.drain(), 0)
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2, OUTBOX_RETRY_BACKOFF=60)
+    def test_failed_event_is_retried_and_blocks_later_events(self):
+        job = self.create_job('flaky')
+        FAILING.add('flaky')
+        job.interval_seconds = 120
+        job.save()
+
+        # События агрегата захватываются вместе
+        self.assertEqual(self.dispatcher.run_once(), 2)
+        first, second = OutboxEvent.objects.order_by('id')
+        self.assertEqual(first.status, OutboxEvent.Status.PENDING)
+        self.assertEqual(first.attempts, 1)
+        self.assertIn('handler failed', first.last_error)
+        # Более позднее событие агрегата возвращено в очередь без попытки
+        # и ждет, пока не обработано первое
+        self.assertEqual(second.status, OutboxEvent.Status.PENDING)
+        self.assertEqual(second.attempts, 0)
+        self.assertEqual(
+            OutboxService.claim('node-b', 10, now=timezone.now() + timedelta(seconds=30)), [])
+
+        FAILING.clear()
+        later = timezone.now() + timedelta(minutes=5)
+        claimed = OutboxService.claim('node-b', 10, now=later)
+        self.assertEqual([event.id for event in claimed], [first.id, second.id])
+        OutboxService.save_results(OutboxService.process_group(
+            claimed, OutboxService.load_instances(claimed)))
+
+        self.assertEqual(HANDLED, [('flaky', True), ('flaky', False)])
+        self.assertFalse(OutboxEvent.objects.exclude(status=OutboxEvent.Status.DONE).exists())
+
+    def test_coalesce_merges_saves_and_runs_batch_handler_once(self):
+        outbox.subscribe(ScheduledJob, count_saved_job, batch_handler=count_saved_jobs)
+        self.addCleanup(outbox.unsubscribe, ScheduledJob, count_saved_job)
+
+        with outbox.coalesce():
+            first = self.create_job('first')
+            second = self.create_job('second')
+            first.interval_seconds = 120
+            first.save(update_fields=['interval_seconds'])
+            self.assertFalse(OutboxEvent.objects.exists())
+
+        batch = OutboxEvent.objects.get(event_type='jobs.scheduledjob.batch')
+        self.assertEqual(batch.payload['handler'], 'jobs.tests.count_saved_job')
+        self.assertEqual(batch.payload['ids'], [first.id, second.id])
+        # Повторные сохранения объекта объединены в одно событие
+        saved = OutboxEvent.objects.filter(event_type='jobs.scheduledjob.saved').order_by('id')
+        self.assertEqual([event.payload['id'] for event in saved], [first.id, second.id])
+        self.assertTrue(saved[0].payload['created'])
+        self.assertIsNone(saved[0].payload['update_fields'])
+        self.assertEqual(saved[0].payload['handlers'], ['jobs.tests.record_saved_job'])
+
+        # События объектов ждут более раннего пакетного события
+        self.assertEqual(self.dispatcher.run_once(), 1)
+        self.assertEqual(BATCHES, [['first', 'second']])
+        self.assertEqual(HANDLED, [])
+        self.assertEqual(self.dispatcher.drain(), 2)
+        self.assertEqual(sorted(HANDLED), [('first', True), ('second', True)])
+        # Результаты сохранены в той же транзакции, что и захват
+        self.assertFalse(OutboxEvent.objects.exclude(status=OutboxEvent.Status.DONE).exists())
+
+    def test_batch_event_waits_for_earlier_object_events(self):
+        outbox.subscribe(ScheduledJob, count_saved_job, batch_handler=count_saved_jobs)
+        self.addCleanup(outbox.unsubscribe, ScheduledJob, count_saved_job)
+
+        job = self.create_job('first')
+        with outbox.coalesce():
+            job.interval_seconds = 120
+            job.save()
+
+        saved, batch, resaved = OutboxEvent.objects.order_by('id')
+        self.assertEqual(batch.event_type, 'jobs.scheduledjob.batch')
+        self.assertEqual(
+            [event.id for event in OutboxService.claim('node-a', 10)], [saved.id])
+        # Пока событие объекта не обработано, пакет и следующие события ждут
+        self.assertEqual(OutboxService.claim('node-b', 10), [])
+
+    def test_coalesce_in_failed_transaction_publishes_nothing(self):
+        with self.assertRaises(ValueError):
+            with transaction.atomic(), outbox.coalesce():
+                self.create_job('first')
+                raise ValueError('database error')
+
+        self.assertFalse(OutboxEvent.objects.exists())
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Notification
+from .models import DeadlineNotificationLog, Notification
 
 
 @admin.register(Notification)
@@ -9,3 +9,10 @@ class NotificationAdmin(admin.ModelAdmin):
     list_filter = ('notification_type', 'is_read', 'created_at')
     search_fields = ('recipient__email', 'title', 'message')
     readonly_fields = ('created_at',)
+
+
+@admin.register(DeadlineNotificationLog)
+class DeadlineNotificationLogAdmin(admin.ModelAdmin):
+    list_display = ('step_progress', 'kind', 'deadline', 'notified_at')
+    list_filter = ('kind', 'notified_at')
+    readonly_fields = ('notified_at',)
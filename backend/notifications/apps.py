@@ -7,12 +7,8 @@ class NotificationsConfig(AppConfig):
 
     def ready(self):
         """
-        Импортируем сигналы и запускаем фоновые задачи при старте приложения
+        Импортируем сигналы при старте приложения.
+        Периодическая проверка дедлайнов выполняется задачей check_deadlines
+        планировщика jobs
         """
         import notifications.signals
-
-        # Не запускаем задачи при выполнении manage.py
-        import sys
-        if 'runserver' in sys.argv:
-            from notifications.tasks import start_deadline_check_task
-            start_deadline_check_task()
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:02
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_notification_content_type_notification_object_id'),
+        ('onboarding', '0020_userstepprogress_status_planned_end_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeadlineNotificationLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('approaching', 'Deadline approaching'), ('missed', 'Deadline missed')], max_length=20, verbose_name='kind')),
+                ('deadline', models.DateTimeField(verbose_name='deadline')),
+                ('notified_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='notified at')),
+                ('step_progress', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deadline_notification_logs', to='onboarding.userstepprogress', verbose_name='step progress')),
+            ],
+            options={
+                'verbose_name': 'deadline notification log',
+                'verbose_name_plural': 'deadline notification logs',
+                'unique_together': {('step_progress', 'kind', 'deadline')},
+            },
+        ),
+    ]
@@ -61,3 +61,37 @@ class Notification(models.Model):
         """
         self.is_read = True
         self.save()
+
+
+class DeadlineNotificationLog(models.Model):
+    """
+    Журнал отправленных уведомлений о дедлайнах шагов.
+
+    Одна запись на шаг, тип уведомления и значение дедлайна: повторные проверки
+    не создают дубликаты, а перенос дедлайна приводит к новому уведомлению.
+    """
+    class Kind(models.TextChoices):
+        APPROACHING = 'approaching', _('Deadline approaching')
+        MISSED = 'missed', _('Deadline missed')
+
+    step_progress = models.ForeignKey(
+        'onboarding.UserStepProgress',
+        on_delete=models.CASCADE,
+        related_name='deadline_notification_logs',
+        verbose_name=_('step progress')
+    )
+    kind = models.CharField(
+        _('kind'),
+        max_length=20,
+        choices=Kind.choices
+    )
+    deadline = models.DateTimeField(_('deadline'))
+    notified_at = models.DateTimeField(_('notified at'), default=timezone.now)
+
+    class Meta:
+        verbose_name = _('deadline notification log')
+        verbose_name_plural = _('deadline notification logs')
+        unique_together = ['step_progress', 'kind', 'deadline']
+
+    def __str__(self):
+        return f"{self.step_progress_id} - {self.kind} - {self.deadline}"
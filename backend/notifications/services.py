@@ -1,5 +1,12 @@
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-from .models import Notification, NotificationType
+from onboarding.models import UserStepProgress
+from .models import DeadlineNotificationLog, Notification, NotificationType
 
 
 class NotificationService:
@@ -114,3 +121,160 @@ class NotificationService:
             content_type=content_type,
             object_id=object_id
         )
+
+
+class DeadlineScanner:
+    """
+    Проверка дедлайнов шагов онбординга.
+
+    Читает только незавершенные шаги, дедлайн которых попадает в окно
+    приближения или недавнего пропуска (индекс по status и planned_date_end),
+    отбрасывает уже уведомленные по журналу DeadlineNotificationLog и создает
+    уведомления пакетно. Стоимость проверки зависит от количества шагов
+    в окнах, а не от общего количества шагов в работе.
+    """
+
+    ACTIVE_STATUSES = (
+        UserStepProgress.ProgressStatus.NOT_STARTED,
+        UserStepProgress.ProgressStatus.IN_PROGRESS,
+    )
+
+    @classmethod
+    def scan(cls, now=None):
+        """
+        Выполняет одну проверку дедлайнов
+
+        Args:
+            now: Момент проверки (по умолчанию текущее время)
+
+        Returns:
+            dict: Количество шагов с приближающимся и пропущенным дедлайном
+                и количество созданных уведомлений
+        """
+        if now is None:
+            now = timezone.now()
+
+        approaching_hours = getattr(settings, 'DEADLINE_APPROACHING_HOURS', 24)
+        lookback_hours = getattr(settings, 'DEADLINE_MISSED_LOOKBACK_HOURS', 72)
+
+        approaching = cls._due_steps(
+            DeadlineNotificationLog.Kind.APPROACHING,
+            planned_date_end__gt=now,
+            planned_date_end__lte=now + timedelta(hours=approaching_hours)
+        )
+        missed = cls._due_steps(
+            DeadlineNotificationLog.Kind.MISSED,
+            planned_date_end__gte=now - timedelta(hours=lookback_hours),
+            planned_date_end__lt=now,
+            completed_at__isnull=True
+        )
+
+        stats = {
+            'approaching': len(approaching),
+            'missed': len(missed),
+            'notifications': 0,
+        }
+        if not approaching and not missed:
+            return stats
+
+        content_type = ContentType.objects.get_for_model(UserStepProgress)
+        # Запись журнала -> уведомления, которые отправляются вместе с ней
+        pending = []
+
+        for step_progress in approaching:
+            pending.append((DeadlineNotificationLog(
+                step_progress_id=step_progress.id,
+                kind=DeadlineNotificationLog.Kind.APPROACHING,
+                deadline=step_progress.planned_date_end,
+                notified_at=now
+            ), [Notification(
+                recipient_id=step_progress.user_id,
+                title=_('Deadline approaching'),
+                message=_(
+                    f'You have less than {approaching_hours} hours to complete the step "{step_progress.step.name}" in program "{step_progress.step.program.name}".'),
+                notification_type=NotificationType.DEADLINE,
+                content_type=content_type,
+                object_id=step_progress.id,
+                created_at=now
+            )]))
+
+        if missed:
+            # Находим HR/менеджеров один раз на всю проверку
+            from users.models import User, UserRole
+            hr_manager_ids = list(User.objects.filter(
+                role__in=[UserRole.HR, UserRole.MANAGER]).values_list('id', flat=True))
+
+            for step_progress in missed:
+                message = _(
+                    f'Employee {step_progress.user.get_full_name()} missed the deadline for step "{step_progress.step.name}" in program "{step_progress.step.program.name}".')
+                pending.append((DeadlineNotificationLog(
+                    step_progress_id=step_progress.id,
+                    kind=DeadlineNotificationLog.Kind.MISSED,
+                    deadline=step_progress.planned_date_end,
+                    notified_at=now
+                ), [Notification(
+                    recipient_id=hr_id,
+                    title=_('Deadline missed'),
+                    message=message,
+                    notification_type=NotificationType.WARNING,
+                    content_type=content_type,
+                    object_id=step_progress.id,
+                    created_at=now
+                ) for hr_id in hr_manager_ids]))
+
+        # Сначала записывается журнал: уведомления создаются только для
+        # записей, вставленных этой проверкой. Записи, которые успела вставить
+        # параллельная проверка, пропускаются вместе с уведомлениями
+        with transaction.atomic():
+            inserted = {id(log) for log in cls._insert_logs([log for log, _ in pending])}
+            notifications = [
+                notification
+                for log, log_notifications in pending if id(log) in inserted
+                for notification in log_notifications
+            ]
+            Notification.objects.bulk_create(notifications, batch_size=1000)
+
+        stats['notifications'] = len(notifications)
+        return stats
+
+    @staticmethod
+    def _insert_logs(logs):
+        """
+        Вставляет записи журнала, пропуская уже существующие
+
+        Returns:
+            list: Вставленные записи
+        """
+        try:
+            with transaction.atomic():
+                return DeadlineNotificationLog.objects.bulk_create(logs, batch_size=1000)
+        except IntegrityError:
+            pass
+
+        # Часть записей вставлена параллельной проверкой: вставка по одной
+        inserted = []
+        for log in logs:
+            try:
+                with transaction.atomic():
+                    log.save()
+            except IntegrityError:
+                continue
+            inserted.append(log)
+        return inserted
+
+    @classmethod
+    def _due_steps(cls, kind, **window):
+        """
+        Незавершенные шаги в окне дедлайнов, по которым еще не было
+        уведомления данного типа для текущего значения дедлайна
+        """
+        already_notified = DeadlineNotificationLog.objects.filter(
+            step_progress=OuterRef('pk'),
+            kind=kind,
+            deadline=OuterRef('planned_date_end')
+        )
+        return list(UserStepProgress.objects.filter(
+            ~Exists(already_notified),
+            status__in=cls.ACTIVE_STATUSES,
+            **window
+        ).select_related('user', 'step', 'step__program').order_by('planned_date_end', 'id'))
@@ -1,7 +1,7 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from jobs import outbox
 from onboarding.models import UserOnboardingAssignment, UserStepProgress
 from .models import Notification, NotificationType
 
@@ -22,15 +22,10 @@ def handle_new_onboarding_assignment(sender, instance, created, **kwargs):
         )
 
 
-@receiver(post_save, sender=UserStepProgress)
-def handle_step_progress_change(sender, instance, created, **kwargs):
+def handle_step_progress_change(instance, event):
     """
-    Обрабатывает изменение статуса прогресса шага
+    Обрабатывает изменение статуса прогресса шага (через outbox)
     """
-    if created:
-        # Новое назначение шага - не делаем ничего
-        return
-
     # Если шаг выполнен, уведомляем HR о завершении
     if instance.status == UserStepProgress.ProgressStatus.DONE:
         # Находим HR или менеджеров, которым нужно отправить уведомление
@@ -39,64 +34,66 @@ def handle_step_progress_change(sender, instance, created, **kwargs):
         hr_managers = User.objects.filter(
             role__in=[UserRole.HR, UserRole.MANAGER])
 
-        for hr in hr_managers:
-            Notification.objects.create(
+        Notification.objects.bulk_create([
+            Notification(
                 recipient=hr,
                 title=_('Step completed'),
                 message=_(
                     f'Employee {instance.user.get_full_name()} completed the step "{instance.step.name}" in program "{instance.step.program.name}".'),
                 notification_type=NotificationType.INFO
             )
+            for hr in hr_managers
+        ])
+
+
+def handle_step_progress_changes(instances, events):
+    """
+    Пакетный вариант handle_step_progress_change (outbox.coalesce):
+    получатели выбираются один раз, уведомления создаются одним запросом
+    """
+    completed = list(UserStepProgress.objects.filter(
+        id__in=[instance.id for instance in instances],
+        status=UserStepProgress.ProgressStatus.DONE
+    ).select_related('user', 'step__program'))
+    if not completed:
+        return
+
+    from users.models import User, UserRole
+    hr_managers = list(User.objects.filter(
+        role__in=[UserRole.HR, UserRole.MANAGER]))
+
+    Notification.objects.bulk_create([
+        Notification(
+            recipient=hr,
+            title=_('Step completed'),
+            message=_(
+                f'Employee {progress.user.get_full_name()} completed the step "{progress.step.name}" in program "{progress.step.program.name}".'),
+            notification_type=NotificationType.INFO
+        )
+        for progress in completed
+        for hr in hr_managers
+    ], batch_size=1000)
+
+
+# Новое назначение шага не требует уведомлений
+outbox.subscribe(
+    UserStepProgress, handle_step_progress_change,
+    when=lambda instance, created, update_fields:
+        not created and instance.status == UserStepProgress.ProgressStatus.DONE,
+    batch_handler=handle_step_progress_changes)
 
 
 def check_approaching_deadlines():
     """
-    Проверяет приближающиеся дедлайны и создает соответствующие уведомления
+    Проверяет приближающиеся и пропущенные дедлайны и создает соответствующие уведомления
     Эта функция будет вызываться из задачи в фоне
+
+    Returns:
+        dict: Статистика проверки (см. DeadlineScanner.scan)
     """
-    from onboarding.models import UserStepProgress
-
-    # Получаем все активные шаги, которые не завершены
-    active_steps = UserStepProgress.objects.filter(
-        status__in=[
-            UserStepProgress.ProgressStatus.NOT_STARTED,
-            UserStepProgress.ProgressStatus.IN_PROGRESS
-        ]
-    )
+    from .services import DeadlineScanner
 
-    now = timezone.now()
-
-    for step_progress in active_steps:
-        # Проверяем наличие запланированной даты окончания
-        if step_progress.planned_date_end:
-            deadline = step_progress.planned_date_end
-
-            # Если до дедлайна осталось менее 24 часов
-            if now + timezone.timedelta(hours=24) >= deadline and now < deadline:
-                # Создаем уведомление о приближающемся дедлайне
-                Notification.objects.create(
-                    recipient=step_progress.user,
-                    title=_('Deadline approaching'),
-                    message=_(
-                        f'You have less than 24 hours to complete the step "{step_progress.step.name}" in program "{step_progress.step.program.name}".'),
-                    notification_type=NotificationType.DEADLINE
-                )
-
-            # Если дедлайн пропущен, уведомляем HR/менеджера
-            elif now > deadline and not step_progress.completed_at:
-                # Находим HR/менеджеров
-                from users.models import User, UserRole
-                hr_managers = User.objects.filter(
-                    role__in=[UserRole.HR, UserRole.MANAGER])
-
-                for hr in hr_managers:
-                    Notification.objects.create(
-                        recipient=hr,
-                        title=_('Deadline missed'),
-                        message=_(
-                            f'Employee {step_progress.user.get_full_name()} missed the deadline for step "{step_progress.step.name}" in program "{step_progress.step.program.name}".'),
-                        notification_type=NotificationType.WARNING
-                    )
+    return DeadlineScanner.scan()
 
 
 def notify_on_test_failure(user, step):
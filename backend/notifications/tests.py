@@ -2,8 +2,15 @@ from django.test import TestCase
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
-from users.models import User
-from notifications.models import Notification, NotificationType
+from datetime import timedelta
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from users.models import User, UserRole
+from onboarding.models import OnboardingProgram, OnboardingStep, UserStepProgress
+from notifications.models import DeadlineNotificationLog, Notification, NotificationType
+from notifications.services import DeadlineScanner
 
 
 class NotificationAPITest(TestCase):
@@ -77,3 +84,100 @@ class NotificationAPITest(TestCase):
         notifications = Notification.objects.filter(recipient=self.user)
         for notification in notifications:
             self.assertTrue(notification.is_read)
+
+
+class DeadlineScannerTest(TestCase):
+    """
+    Тесты проверки дедлайнов шагов онбординга
+    """
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.hr = User.objects.create_user(
+            email='hr@example.com',
+            username='hr',
+            password='testpassword',
+            role=UserRole.HR
+        )
+        self.program = OnboardingProgram.objects.create(
+            name='Deadline Program', author=self.hr)
+        self.step_count = 0
+
+    def create_progress(self, deadline, status=UserStepProgress.ProgressStatus.IN_PROGRESS):
+        self.step_count += 1
+        user = User.objects.create_user(
+            email=f'employee{self.step_count}@example.com',
+            username=f'employee{self.step_count}',
+            password='testpassword'
+        )
+        step = OnboardingStep.objects.create(
+            name=f'Step {self.step_count}', program=self.program, order=self.step_count)
+        return UserStepProgress.objects.create(
+            user=user, step=step, status=status, planned_date_end=deadline)
+
+    def test_scan_notifies_once_per_deadline(self):
+        approaching = self.create_progress(self.now + timedelta(hours=2))
+        missed = self.create_progress(self.now - timedelta(hours=2))
+        # Вне окон и завершенные шаги не учитываются
+        self.create_progress(self.now + timedelta(days=5))
+        self.create_progress(self.now - timedelta(days=30))
+        self.create_progress(self.now - timedelta(hours=1),
+                             status=UserStepProgress.ProgressStatus.DONE)
+
+        stats = DeadlineScanner.scan(self.now)
+
+        self.assertEqual(stats, {'approaching': 1, 'missed': 1, 'notifications': 2})
+        self.assertTrue(Notification.objects.filter(
+            recipient=approaching.user,
+            notification_type=NotificationType.DEADLINE).exists())
+        self.assertTrue(Notification.objects.filter(
+            recipient=self.hr, object_id=missed.id,
+            notification_type=NotificationType.WARNING).exists())
+
+        # Повторная проверка не создает дубликатов
+        self.assertEqual(
+            DeadlineScanner.scan(self.now + timedelta(minutes=30))['notifications'], 0)
+        self.assertEqual(Notification.objects.count(), 2)
+
+        # Перенос дедлайна приводит к новому уведомлению
+        approaching.planned_date_end = self.now + timedelta(hours=3)
+        approaching.save()
+        self.assertEqual(DeadlineScanner.scan(self.now)['approaching'], 1)
+        self.assertEqual(DeadlineNotificationLog.objects.count(), 3)
+
+    def test_insert_logs_skips_logs_of_concurrent_scan(self):
+        notified = self.create_progress(self.now + timedelta(hours=2))
+        fresh = self.create_progress(self.now + timedelta(hours=3))
+        # Запись, вставленная параллельной проверкой
+        DeadlineNotificationLog.objects.create(
+            step_progress=notified, kind=DeadlineNotificationLog.Kind.APPROACHING,
+            deadline=notified.planned_date_end, notified_at=self.now)
+
+        logs = [
+            DeadlineNotificationLog(
+                step_progress=progress, kind=DeadlineNotificationLog.Kind.APPROACHING,
+                deadline=progress.planned_date_end, notified_at=self.now)
+            for progress in (notified, fresh)
+        ]
+        inserted = DeadlineScanner._insert_logs(logs)
+
+        self.assertEqual([log.step_progress_id for log in inserted], [fresh.id])
+        self.assertEqual(DeadlineNotificationLog.objects.count(), 2)
+
+    def test_scan_query_count_does_not_grow_with_due_steps(self):
+        # Тип содержимого кэшируется после первого обращения
+        ContentType.objects.get_for_model(UserStepProgress)
+        for _ in range(2):
+            self.create_progress(self.now + timedelta(hours=1))
+            self.create_progress(self.now - timedelta(hours=1))
+        with CaptureQueriesContext(connection) as small:
+            DeadlineScanner.scan(self.now)
+
+        for _ in range(6):
+            self.create_progress(self.now + timedelta(hours=1))
+            self.create_progress(self.now - timedelta(hours=1))
+        with CaptureQueriesContext(connection) as large:
+            stats = DeadlineScanner.scan(self.now)
+
+        self.assertEqual(stats['approaching'], 6)
+        self.assertEqual(len(small), len(large))
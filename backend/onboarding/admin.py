@@ -1,8 +1,11 @@
 from django.contrib import admin
+from django.db import transaction
+from jobs import outbox
 from .models import OnboardingProgram, OnboardingStep, UserOnboardingAssignment, UserStepProgress, VirtualMeetingSlot
 from .feedback_models import FeedbackMood, StepFeedback
 from .lms_models import LMSModule, LMSTest, LMSQuestion, LMSOption, LMSUserAnswer, LMSUserTestResult
 from .solomia_models import AIChatMessage
+from .reports_models import ReportExport
 
 # Register your models here.
 
@@ -40,6 +43,14 @@ class UserStepProgressAdmin(admin.ModelAdmin):
     raw_id_fields = ('user', 'step')
     list_editable = ('status',)
 
+    def changelist_view(self, request, extra_context=None):
+        # Массовое редактирование и действия над списком: обработчики
+        # сохранений выполняются одним пакетом, а не для каждой строки
+        if request.method != 'POST':
+            return super().changelist_view(request, extra_context)
+        with transaction.atomic(), outbox.coalesce():
+            return super().changelist_view(request, extra_context)
+
 
 @admin.register(FeedbackMood)
 class FeedbackMoodAdmin(admin.ModelAdmin):
@@ -151,3 +162,12 @@ class AIChatMessageAdmin(admin.ModelAdmin):
             return f"{obj.message[:50]}..."
         return obj.message
     message_preview.short_description = 'Сообщение'
+
+
+@admin.register(ReportExport)
+class ReportExportAdmin(admin.ModelAdmin):
+    list_display = ('id', 'report', 'export_format', 'status', 'row_count',
+                    'size', 'created_at', 'finished_at')
+    list_filter = ('report', 'export_format', 'status')
+    raw_id_fields = ('requested_by',)
+    readonly_fields = ('fingerprint', 'file_path', 'error')
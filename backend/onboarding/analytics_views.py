@@ -1,15 +1,25 @@
-from django.db.models import Count, Avg, F, Q, Case, When, IntegerField, ExpressionWrapper
+from django.db.models import Count, Q
 from django.db.models.functions import TruncDay
 from django.utils import timezone
 from datetime import timedelta
-from rest_framework import viewsets, permissions, views
+from rest_framework import views
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 from drf_spectacular.utils import extend_schema, OpenApiResponse, OpenApiParameter
 from users.permissions import IsAdminOrHR
-from .models import UserOnboardingAssignment, UserStepProgress
-from .feedback_models import FeedbackMood, StepFeedback
-from .lms_models import LMSUserTestResult
-from users.models import User
+from .feedback_models import FeedbackMood
+from .services.analytics import AnalyticsService
+
+
+class AssignmentsCursorPagination(CursorPagination):
+    """
+    Постраничный вывод назначений по курсору: следующая страница выбирается
+    условием по ключу сортировки, а не смещением
+    """
+    ordering = ('-assigned_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
 
 
 @extend_schema(
@@ -36,94 +46,19 @@ class AnalyticsSummaryView(views.APIView):
     permission_classes = [IsAdminOrHR]
 
     def get(self, request, format=None):
-        # Дата 7 дней назад для расчета среднего настроения
-        seven_days_ago = timezone.now() - timedelta(days=7)
-
-        # Получаем общие метрики по назначениям
-        total_assignments = UserOnboardingAssignment.objects.count()
-        active_assignments = UserOnboardingAssignment.objects.filter(
-            status=UserOnboardingAssignment.AssignmentStatus.ACTIVE
-        ).count()
-        completed_assignments = UserOnboardingAssignment.objects.filter(
-            status=UserOnboardingAssignment.AssignmentStatus.COMPLETED
-        ).count()
-
-        # Расчет среднего прогресса
-        # Сначала для каждого назначения рассчитываем процент завершенных шагов
-        all_step_progress = UserStepProgress.objects.all()
-        completed_steps = all_step_progress.filter(
-            status=UserStepProgress.ProgressStatus.DONE
-        ).count()
-
-        # Если нет шагов, устанавливаем средний прогресс в 0
-        average_progress = 0
-        if all_step_progress.count() > 0:
-            average_progress = (
-                completed_steps / all_step_progress.count()) * 100
-
-        # Статистика по отзывам
-        total_feedback_moods = FeedbackMood.objects.count()
-        total_step_feedback = StepFeedback.objects.count()
-
-        # Среднее настроение за последние 7 дней
-        # Преобразуем текстовые значения настроения в числовые для расчета среднего
-        mood_value_map = {
-            FeedbackMood.MoodValue.GREAT: 5,
-            FeedbackMood.MoodValue.GOOD: 4,
-            FeedbackMood.MoodValue.NEUTRAL: 3,
-            FeedbackMood.MoodValue.BAD: 2,
-            FeedbackMood.MoodValue.TERRIBLE: 1,
-        }
-
-        recent_moods = FeedbackMood.objects.filter(
-            created_at__gte=seven_days_ago)
-        avg_mood_value = 0
-
-        if recent_moods.exists():
-            # Создаем выражение для числового значения настроения
-            mood_case = Case(
-                *[When(value=k, then=v) for k, v in mood_value_map.items()],
-                output_field=IntegerField()
-            )
-
-            # Вычисляем среднее значение
-            avg_mood = recent_moods.annotate(
-                numeric_value=mood_case
-            ).aggregate(avg_value=Avg('numeric_value'))
-
-            avg_mood_value = avg_mood['avg_value'] or 0
-
-        # Статистика по тестам
-        total_tests_taken = LMSUserTestResult.objects.count()
-        passed_tests = LMSUserTestResult.objects.filter(is_passed=True).count()
-
-        test_success_rate = 0
-        if total_tests_taken > 0:
-            test_success_rate = (passed_tests / total_tests_taken) * 100
-
-        return Response({
-            'active_onboarding_count': active_assignments,
-            'completed_assignments_count': completed_assignments,
-            'total_assignments_count': total_assignments,
-            'average_progress_percentage': round(average_progress, 2),
-            'feedback': {
-                'total_mood_count': total_feedback_moods,
-                'total_step_feedback_count': total_step_feedback,
-                'average_mood_last_7_days': round(avg_mood_value, 2)
-            },
-            'tests': {
-                'total_taken': total_tests_taken,
-                'passed': passed_tests,
-                'success_rate_percentage': round(test_success_rate, 2)
-            }
-        })
+        return Response(AnalyticsService.cached('summary', '', AnalyticsService.summary))
 
 
 @extend_schema(
     tags=["Analytics"],
     summary="Получение таблицы назначений с прогрессом",
     description="API для получения таблицы всех назначений с прогрессом в процентах. "
-                "Включает ФИО, должность, программу, статус, процент прогресса и дату начала.",
+                "Включает ФИО, должность, программу, статус, процент прогресса и дату начала. "
+                "Результаты разбиты на страницы, переход по ссылкам next/previous (параметр cursor).",
+    parameters=[
+        OpenApiParameter(name='cursor', type=str, description='Курсор страницы'),
+        OpenApiParameter(name='page_size', type=int, description='Размер страницы (до 500)'),
+    ],
     responses={
         200: OpenApiResponse(description="Таблица назначений с прогрессом"),
     }
@@ -139,48 +74,24 @@ class AssignmentsAnalyticsView(views.APIView):
     - Статус
     - Процент прогресса
     - Дата начала
+
+    Таблица отдается страницами с курсором по (assigned_at, id), см.
+    AssignmentsCursorPagination
     """
     permission_classes = [IsAdminOrHR]
+    pagination_class = AssignmentsCursorPagination
 
     def get(self, request, format=None):
-        # Получаем все назначения
-        assignments = UserOnboardingAssignment.objects.all()
-
-        result = []
-
-        for assignment in assignments:
-            # Для каждого назначения рассчитываем процент прогресса
-            user = assignment.user
-            program = assignment.program
-
-            # Получаем шаги программы
-            program_steps = program.steps.all()
-            total_steps = program_steps.count()
-
-            # Если нет шагов, устанавливаем прогресс в 0
-            progress_percentage = 0
-
-            if total_steps > 0:
-                # Получаем завершенные шаги пользователя в этой программе
-                completed_steps = UserStepProgress.objects.filter(
-                    user=user,
-                    step__program=program,
-                    status=UserStepProgress.ProgressStatus.DONE
-                ).count()
-
-                progress_percentage = (completed_steps / total_steps) * 100
-
-            result.append({
-                'id': assignment.id,
-                'full_name': user.get_full_name(),
-                'position': user.position,
-                'program': program.name,
-                'status': assignment.get_status_display(),
-                'progress_percentage': round(progress_percentage, 2),
-                'assigned_at': assignment.assigned_at
-            })
-
-        return Response(result)
+        def build():
+            paginator = self.pagination_class()
+            page = paginator.paginate_queryset(
+                AnalyticsService.assignments_queryset(), request, view=self)
+            return paginator.get_paginated_response(
+                AnalyticsService.assignment_rows(page)).data
+
+        # Ссылки next/previous абсолютные, поэтому ключ - полный адрес запроса
+        return Response(AnalyticsService.cached(
+            'assignments', request.build_absolute_uri(), build))
 
 
 @extend_schema(
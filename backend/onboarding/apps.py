@@ -10,3 +10,5 @@ class OnboardingConfig(AppConfig):
     def ready(self):
         import onboarding.lms_models  # Регистрация моделей LMS
         import onboarding.solomia_models  # Регистрация моделей Solomia
+        import onboarding.reports_models  # Регистрация моделей выгрузки отчетов
+        import onboarding.signals  # Сброс кэша аналитики
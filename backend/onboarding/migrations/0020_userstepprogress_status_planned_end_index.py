@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('onboarding', '0019_alter_attachment_id_alter_enhancedlmsquestion_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userstepprogress',
+            index=models.Index(fields=['status', 'planned_date_end'], name='onboarding_usp_deadline_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('onboarding', '0020_userstepprogress_status_planned_end_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportExport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report', models.CharField(max_length=50, verbose_name='report')),
+                ('export_format', models.CharField(choices=[('pdf', 'PDF')], default='pdf', max_length=10, verbose_name='format')),
+                ('fingerprint', models.CharField(max_length=64, verbose_name='data fingerprint')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20, verbose_name='status')),
+                ('file_path', models.CharField(blank=True, max_length=500, verbose_name='file path')),
+                ('size', models.PositiveBigIntegerField(default=0, verbose_name='size')),
+                ('row_count', models.PositiveIntegerField(default=0, verbose_name='row count')),
+                ('error', models.TextField(blank=True, verbose_name='error')),
+                ('locked_until', models.DateTimeField(blank=True, null=True, verbose_name='locked until')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='started at')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='finished at')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='report_exports', to=settings.AUTH_USER_MODEL, verbose_name='requested by')),
+            ],
+            options={
+                'verbose_name': 'report export',
+                'verbose_name_plural': 'report exports',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['report', 'export_format', 'fingerprint'], name='onboarding_export_lookup_idx'), models.Index(fields=['status', 'locked_until'], name='onboarding_export_status_idx')],
+            },
+        ),
+    ]
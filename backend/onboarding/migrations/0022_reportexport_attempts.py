@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('onboarding', '0021_reportexport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportexport',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0, verbose_name='attempts'),
+        ),
+    ]
@@ -154,6 +154,10 @@ class UserStepProgress(models.Model):
         verbose_name_plural = _('user step progress')
         ordering = ['step__order']
         unique_together = ['user', 'step']
+        indexes = [
+            models.Index(fields=['status', 'planned_date_end'],
+                         name='onboarding_usp_deadline_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.step.name} - {self.get_status_display()}"
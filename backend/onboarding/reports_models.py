@@ -0,0 +1,59 @@
+"""
+Модели фоновой выгрузки отчетов
+"""
+from django.db import models
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+
+
+class ReportExport(models.Model):
+    """
+    Задание на выгрузку отчета и готовый файл. Файл переиспользуется для
+    запросов с тем же отпечатком данных (fingerprint)
+    """
+    class Format(models.TextChoices):
+        PDF = 'pdf', _('PDF')
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', _('Pending')
+        RUNNING = 'running', _('Running')
+        DONE = 'done', _('Done')
+        FAILED = 'failed', _('Failed')
+
+    report = models.CharField(_('report'), max_length=50)
+    export_format = models.CharField(
+        _('format'), max_length=10, choices=Format.choices, default=Format.PDF)
+    fingerprint = models.CharField(_('data fingerprint'), max_length=64)
+    status = models.CharField(
+        _('status'), max_length=20, choices=Status.choices, default=Status.PENDING)
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='report_exports',
+        verbose_name=_('requested by')
+    )
+    file_path = models.CharField(_('file path'), max_length=500, blank=True)
+    size = models.PositiveBigIntegerField(_('size'), default=0)
+    row_count = models.PositiveIntegerField(_('row count'), default=0)
+    error = models.TextField(_('error'), blank=True)
+    attempts = models.PositiveIntegerField(_('attempts'), default=0)
+    locked_until = models.DateTimeField(_('locked until'), null=True, blank=True)
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True)
+    started_at = models.DateTimeField(_('started at'), null=True, blank=True)
+    finished_at = models.DateTimeField(_('finished at'), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _('report export')
+        verbose_name_plural = _('report exports')
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['report', 'export_format', 'fingerprint'],
+                         name='onboarding_export_lookup_idx'),
+            models.Index(fields=['status', 'locked_until'],
+                         name='onboarding_export_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.report}.{self.export_format} #{self.id} - {self.status}"
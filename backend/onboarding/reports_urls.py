@@ -1,9 +1,15 @@
 from django.urls import path
-from .reports_views import ReportAssignmentPDFView, ReportAssignmentCSVView
+from .reports_views import (
+    ReportAssignmentPDFView, ReportAssignmentCSVView, ReportExportView, ReportExportDownloadView
+)
 
 urlpatterns = [
     path('assignments/pdf/', ReportAssignmentPDFView.as_view(),
          name='assignment-report-pdf'),
     path('assignments/csv/', ReportAssignmentCSVView.as_view(),
          name='assignment-report-csv'),
+    path('exports/<int:pk>/', ReportExportView.as_view(),
+         name='report-export'),
+    path('exports/<int:pk>/download/', ReportExportDownloadView.as_view(),
+         name='report-export-download'),
 ]
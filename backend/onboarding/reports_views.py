@@ -1,14 +1,13 @@
-import csv
-import tempfile
-from django.http import HttpResponse, FileResponse
-from django.template.loader import render_to_string
+from django.http import FileResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
-from weasyprint import HTML, CSS
-from io import BytesIO, StringIO
 
-from .models import UserOnboardingAssignment, OnboardingProgram, UserStepProgress
-from .serializers import UserOnboardingAssignmentSerializer
+from .reports_models import ReportExport
+from .services.reports import ASSIGNMENTS_REPORT, AssignmentReportService, ReportExportService
 from users.models import UserRole
 
 
@@ -22,124 +21,86 @@ class IsAdminOrHR(IsAuthenticated):
         return is_authenticated and request.user.role in [UserRole.ADMIN, UserRole.HR]
 
 
+def export_data(export):
+    """
+    Состояние выгрузки для ответа API
+    """
+    return {
+        'id': export.id,
+        'status': export.status,
+        'row_count': export.row_count,
+        'error': export.error,
+        'created_at': export.created_at,
+        'finished_at': export.finished_at,
+        'download_url': reverse('report-export-download', args=[export.id])
+        if export.status == ReportExport.Status.DONE else None,
+    }
+
+
 class ReportAssignmentPDFView(APIView):
     """
-    Представление для генерации отчета о назначенных программах в формате PDF
+    Представление для запуска выгрузки отчета о назначенных программах в
+    формате PDF. Отчет формируется в фоне (задача render_report_exports);
+    ответ содержит идентификатор выгрузки, а для готового отчета - ссылку
+    на скачивание
     """
     permission_classes = [IsAdminOrHR]
 
+    def post(self, request, *args, **kwargs):
+        export, created = ReportExportService.request_export(
+            request.user, ASSIGNMENTS_REPORT, ReportExport.Format.PDF)
+        response_status = status.HTTP_200_OK
+        if export.status != ReportExport.Status.DONE:
+            response_status = status.HTTP_202_ACCEPTED
+        return Response(export_data(export), status=response_status)
+
     def get(self, request, *args, **kwargs):
-        # Получаем все назначения с информацией о пользователе и программе
-        assignments = UserOnboardingAssignment.objects.select_related(
-            'user', 'program'
-        ).order_by('program__name')
-
-        # Группировка назначений по программам для отчета
-        programs_data = {}
-        for assignment in assignments:
-            if assignment.program.id not in programs_data:
-                programs_data[assignment.program.id] = {
-                    'program': assignment.program,
-                    'assignments': []
-                }
-
-            # Получаем прогресс (% выполнения)
-            total_steps = assignment.program.steps.count()
-            completed_steps = UserStepProgress.objects.filter(
-                user=assignment.user,
-                step__program=assignment.program,
-                status='done'
-            ).count()
-
-            progress_percentage = 0
-            if total_steps > 0:
-                progress_percentage = int(
-                    (completed_steps / total_steps) * 100)
-
-            # Добавляем данные о назначении
-            programs_data[assignment.program.id]['assignments'].append({
-                'user': assignment.user,
-                'assigned_at': assignment.assigned_at,
-                'status': assignment.status,
-                'progress_percentage': progress_percentage,
-                # 'completed_at': assignment.completed_at  # Закомментировано, так как этого поля нет в UserOnboardingAssignment
-            })
-
-        # Генерация HTML для PDF
-        html_string = render_to_string('onboarding/reports/assignments_pdf.html', {
-            'programs_data': programs_data.values(),
-            'title': 'Отчет по назначенным программам онбординга',
-        })
-
-        # Генерация PDF
-        pdf_file = BytesIO()
-        HTML(string=html_string).write_pdf(pdf_file)
-        pdf_file.seek(0)
-
-        # Возвращаем PDF-файл
-        response = FileResponse(pdf_file, content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename="onboarding_assignments_report.pdf"'
-        return response
+        return self.post(request, *args, **kwargs)
+
+
+class ReportExportView(APIView):
+    """
+    Представление для получения состояния выгрузки отчета
+    """
+    permission_classes = [IsAdminOrHR]
+
+    def get(self, request, pk, *args, **kwargs):
+        export = get_object_or_404(ReportExport, pk=pk)
+        return Response(export_data(export))
+
+
+class ReportExportDownloadView(APIView):
+    """
+    Представление для скачивания готовой выгрузки отчета
+    """
+    permission_classes = [IsAdminOrHR]
+
+    def get(self, request, pk, *args, **kwargs):
+        export = get_object_or_404(ReportExport, pk=pk)
+        if export.status != ReportExport.Status.DONE:
+            return Response(
+                {'detail': 'Отчет еще не сформирован', **export_data(export)},
+                status=status.HTTP_409_CONFLICT)
+        try:
+            report_file = open(export.file_path, 'rb')
+        except FileNotFoundError:
+            return Response(
+                {'detail': 'Файл отчета удален, запросите выгрузку повторно'},
+                status=status.HTTP_410_GONE)
+        return FileResponse(
+            report_file, as_attachment=True,
+            filename=f'onboarding_{export.report}_report.{export.export_format}')
 
 
 class ReportAssignmentCSVView(APIView):
     """
-    Представление для генерации отчета о назначенных программах в формате CSV
+    Представление для генерации отчета о назначенных программах в формате CSV.
+    Отчет отдается потоком по мере чтения назначений из базы
     """
     permission_classes = [IsAdminOrHR]
 
     def get(self, request, *args, **kwargs):
-        # Получаем все назначения с информацией о пользователе и программе
-        assignments = UserOnboardingAssignment.objects.select_related(
-            'user', 'program'
-        ).order_by('program__name')
-
-        # Создаем файл CSV в памяти
-        csv_file = StringIO()
-        writer = csv.writer(csv_file)
-
-        # Добавляем заголовки
-        headers = [
-            'Программа', 'ФИО', 'Должность', 'Статус', 'Прогресс (%)',
-            'Дата начала', 'Дата завершения'
-        ]
-        writer.writerow(headers)
-
-        # Добавляем данные
-        for assignment in assignments:
-            # Получаем прогресс (% выполнения)
-            total_steps = assignment.program.steps.count()
-            completed_steps = UserStepProgress.objects.filter(
-                user=assignment.user,
-                step__program=assignment.program,
-                status='done'
-            ).count()
-
-            progress_percentage = 0
-            if total_steps > 0:
-                progress_percentage = int(
-                    (completed_steps / total_steps) * 100)
-
-            # Форматируем даты
-            assigned_at = assignment.assigned_at.strftime(
-                '%d.%m.%Y') if assignment.assigned_at else ''
-            completed_at = assignment.completed_at.strftime(
-                '%d.%m.%Y') if assignment.completed_at else ''
-
-            # Добавляем строку с данными
-            writer.writerow([
-                assignment.program.name,
-                assignment.user.full_name,
-                assignment.user.position,
-                assignment.get_status_display() if hasattr(
-                    assignment, 'get_status_display') else assignment.status,
-                f"{progress_percentage}%",
-                assigned_at,
-                completed_at
-            ])
-
-        # Возвращаем CSV-файл
-        csv_file.seek(0)
-        response = HttpResponse(csv_file, content_type='text/csv')
+        response = StreamingHttpResponse(
+            AssignmentReportService.iter_csv(), content_type='text/csv')
         response['Content-Disposition'] = 'attachment; filename="onboarding_assignments_report.csv"'
         return response
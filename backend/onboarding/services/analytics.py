@@ -0,0 +1,171 @@
+"""
+Данные аналитики онбординга для дашборда HR.
+
+Каждая метрика считается агрегатом одного запроса к своей таблице, таблица
+назначений - одним запросом с подзапросами на страницу. Ответы хранятся в
+кэше ANALYTICS_CACHE в течение ANALYTICS_CACHE_TTL секунд. Ключи содержат
+версию данных, которую сбрасывают сигналы изменения прогресса, назначений,
+отзывов и тестов (onboarding.signals). Массовые изменения без сигналов
+становятся видны по истечении TTL.
+"""
+import hashlib
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Avg, Case, Count, IntegerField, Q, When
+from django.utils import timezone
+
+from ..feedback_models import FeedbackMood, StepFeedback
+from ..lms_models import LMSUserTestResult
+from ..models import UserOnboardingAssignment, UserStepProgress
+from .reports import AssignmentReportService
+
+MOOD_VALUES = {
+    FeedbackMood.MoodValue.GREAT: 5,
+    FeedbackMood.MoodValue.GOOD: 4,
+    FeedbackMood.MoodValue.NEUTRAL: 3,
+    FeedbackMood.MoodValue.BAD: 2,
+    FeedbackMood.MoodValue.TERRIBLE: 1,
+}
+
+
+class AnalyticsService:
+    """
+    Метрики дашборда и кэш ответов
+    """
+    CACHE_PREFIX = 'onboarding:analytics'
+
+    @staticmethod
+    def summary():
+        """
+        Общая сводка по онбордингу (по одному агрегирующему запросу на таблицу)
+        """
+        seven_days_ago = timezone.now() - timedelta(days=7)
+
+        assignments = UserOnboardingAssignment.objects.aggregate(
+            total=Count('id'),
+            active=Count('id', filter=Q(
+                status=UserOnboardingAssignment.AssignmentStatus.ACTIVE)),
+            completed=Count('id', filter=Q(
+                status=UserOnboardingAssignment.AssignmentStatus.COMPLETED)),
+        )
+        steps = UserStepProgress.objects.aggregate(
+            total=Count('id'),
+            done=Count('id', filter=Q(status=UserStepProgress.ProgressStatus.DONE)),
+        )
+        # Текстовые значения настроения переводятся в числа для среднего
+        moods = FeedbackMood.objects.aggregate(
+            total=Count('id'),
+            average=Avg(
+                Case(*[When(value=value, then=score) for value, score in MOOD_VALUES.items()],
+                     output_field=IntegerField()),
+                filter=Q(created_at__gte=seven_days_ago)
+            ),
+        )
+        tests = LMSUserTestResult.objects.aggregate(
+            total=Count('id'),
+            passed=Count('id', filter=Q(is_passed=True)),
+        )
+
+        average_progress = 0
+        if steps['total'] > 0:
+            average_progress = steps['done'] / steps['total'] * 100
+        test_success_rate = 0
+        if tests['total'] > 0:
+            test_success_rate = tests['passed'] / tests['total'] * 100
+
+        return {
+            'active_onboarding_count': assignments['active'],
+            'completed_assignments_count': assignments['completed'],
+            'total_assignments_count': assignments['total'],
+            'average_progress_percentage': round(average_progress, 2),
+            'feedback': {
+                'total_mood_count': moods['total'],
+                'total_step_feedback_count': StepFeedback.objects.count(),
+                'average_mood_last_7_days': round(moods['average'] or 0, 2)
+            },
+            'tests': {
+                'total_taken': tests['total'],
+                'passed': tests['passed'],
+                'success_rate_percentage': round(test_success_rate, 2)
+            }
+        }
+
+    @staticmethod
+    def assignments_queryset():
+        """
+        Назначения с прогрессом для таблицы дашборда: пользователь, программа
+        и количества шагов выбираются в том же запросе
+        """
+        return AssignmentReportService.annotated_assignments().values(
+            'id', 'assigned_at', 'status', 'user__full_name', 'user__first_name',
+            'user__last_name', 'user__position', 'program__name',
+            'total_steps', 'completed_steps')
+
+    @staticmethod
+    def assignment_rows(assignments):
+        """
+        Строки таблицы назначений из результатов assignments_queryset
+        """
+        status_labels = dict(UserOnboardingAssignment.AssignmentStatus.choices)
+        rows = []
+        for assignment in assignments:
+            progress_percentage = 0
+            if assignment['total_steps'] > 0:
+                progress_percentage = (
+                    assignment['completed_steps'] / assignment['total_steps'] * 100)
+            # Как User.get_full_name: full_name, иначе имя и фамилия
+            full_name = assignment['user__full_name'] or (
+                f"{assignment['user__first_name']} {assignment['user__last_name']}".strip())
+            rows.append({
+                'id': assignment['id'],
+                'full_name': full_name,
+                'position': assignment['user__position'],
+                'program': assignment['program__name'],
+                'status': str(status_labels.get(assignment['status'], assignment['status'])),
+                'progress_percentage': round(progress_percentage, 2),
+                'assigned_at': assignment['assigned_at']
+            })
+        return rows
+
+    @staticmethod
+    def cached(name, key, build):
+        """
+        Возвращает данные из кэша или строит их и сохраняет
+
+        Args:
+            name: Имя ответа (представления)
+            key: Параметры запроса, от которых зависят данные
+            build: Функция построения данных
+        """
+        ttl = getattr(settings, 'ANALYTICS_CACHE_TTL', 60)
+        if not ttl:
+            return build()
+
+        cache = AnalyticsService._cache()
+        digest = hashlib.sha1(str(key).encode('utf-8')).hexdigest()
+        cache_key = f'{AnalyticsService.CACHE_PREFIX}:{AnalyticsService._version()}:{name}:{digest}'
+        data = cache.get(cache_key)
+        if data is None:
+            data = build()
+            cache.set(cache_key, data, ttl)
+        return data
+
+    @staticmethod
+    def invalidate():
+        """
+        Сбрасывает кэш ответов сменой версии данных
+        """
+        AnalyticsService._cache().set(
+            f'{AnalyticsService.CACHE_PREFIX}:version', uuid.uuid4().hex, None)
+
+    @staticmethod
+    def _version():
+        return AnalyticsService._cache().get_or_set(
+            f'{AnalyticsService.CACHE_PREFIX}:version', lambda: uuid.uuid4().hex, None)
+
+    @staticmethod
+    def _cache():
+        return caches[getattr(settings, 'ANALYTICS_CACHE', 'default')]
@@ -0,0 +1,382 @@
+"""
+Отчеты по назначениям онбординга.
+
+CSV отдается потоком: строки читаются курсором на стороне сервера
+(iterator) вместе с количествами шагов, посчитанными подзапросами в базе,
+поэтому память не зависит от числа назначений.
+
+PDF собирается в фоне задачей render_report_exports: HTML рендерится частями
+по REPORTS_PDF_CHUNK_SIZE назначений, каждая часть сохраняется во временный
+PDF, затем части объединяются в файл в каталоге REPORTS_EXPORT_DIR. Готовый
+файл отдается повторно, пока не изменился отпечаток данных (fingerprint) и
+не истек REPORTS_EXPORT_MAX_AGE.
+"""
+import csv
+import hashlib
+import logging
+import os
+import tempfile
+from datetime import timedelta
+from itertools import groupby, islice
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery, TextField, Value
+from django.db.models.functions import MD5, Cast, Coalesce, Concat
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from ..models import OnboardingStep, UserOnboardingAssignment, UserStepProgress
+from ..reports_models import ReportExport
+
+logger = logging.getLogger(__name__)
+
+ASSIGNMENTS_REPORT = 'assignments'
+ASSIGNMENTS_TITLE = 'Отчет по назначенным программам онбординга'
+ASSIGNMENTS_TEMPLATE = 'onboarding/reports/assignments_pdf.html'
+# Поля строки отчета, входящие в отпечаток данных
+REPORT_FIELDS = [
+    'id', 'program_id', 'program__name', 'user__full_name', 'user__position',
+    'status', 'assigned_at', 'total_steps', 'completed_steps', 'last_completed_at',
+]
+CSV_HEADERS = [
+    'Программа', 'ФИО', 'Должность', 'Статус', 'Прогресс (%)',
+    'Дата начала', 'Дата завершения'
+]
+
+
+def render_report_exports():
+    """
+    Периодическая задача: выполняет ожидающие выгрузки и удаляет старые файлы
+    (см. jobs.registry)
+
+    Returns:
+        dict: Количество выполненных и удаленных выгрузок
+    """
+    return {
+        'rendered': ReportExportService.render_pending(),
+        'purged': ReportExportService.purge(),
+    }
+
+
+class _Echo:
+    """
+    Псевдофайл для csv.writer: writerow возвращает строку вместо записи
+    """
+
+    def write(self, value):
+        return value
+
+
+class AssignmentReportService:
+    """
+    Данные отчета по назначениям
+    """
+
+    @staticmethod
+    def annotated_assignments():
+        """
+        Назначения с количеством шагов программы (total_steps), выполненных
+        шагов (completed_steps) и датой последнего выполненного шага
+        (last_completed_at), посчитанными подзапросами в том же запросе
+        """
+        done = UserStepProgress.objects.filter(
+            user=OuterRef('user_id'),
+            step__program=OuterRef('program_id'),
+            status=UserStepProgress.ProgressStatus.DONE
+        ).order_by().values('user')
+        steps = OnboardingStep.objects.filter(
+            program=OuterRef('program_id')).order_by().values('program')
+
+        return UserOnboardingAssignment.objects.annotate(
+            total_steps=Coalesce(
+                Subquery(steps.annotate(count=Count('id')).values('count')), 0),
+            completed_steps=Coalesce(
+                Subquery(done.annotate(count=Count('id')).values('count')), 0),
+            last_completed_at=Subquery(
+                done.annotate(last=Max('completed_at')).values('last')),
+        )
+
+    @staticmethod
+    def queryset():
+        """
+        Строки отчета одним запросом
+        """
+        return AssignmentReportService.annotated_assignments().order_by(
+            'program__name', 'program_id', 'id').values_list(
+            'program_id', 'program__name', 'user__full_name', 'user__position',
+            'status', 'assigned_at', 'total_steps', 'completed_steps',
+            'last_completed_at', named=True)
+
+    @staticmethod
+    def iter_rows(chunk_size=None):
+        """
+        Строки отчета, читаемые из базы порциями по chunk_size
+
+        Yields:
+            dict: Данные назначения для CSV и шаблона PDF
+        """
+        chunk_size = chunk_size or getattr(settings, 'REPORTS_CHUNK_SIZE', 2000)
+        status_labels = dict(UserOnboardingAssignment.AssignmentStatus.choices)
+        completed = UserOnboardingAssignment.AssignmentStatus.COMPLETED
+
+        for row in AssignmentReportService.queryset().iterator(chunk_size=chunk_size):
+            progress_percentage = 0
+            if row.total_steps > 0:
+                progress_percentage = int(row.completed_steps / row.total_steps * 100)
+            yield {
+                'program_id': row.program_id,
+                'program_name': row.program__name,
+                'user': {'full_name': row.user__full_name, 'position': row.user__position},
+                'status': row.status,
+                'status_display': status_labels.get(row.status, row.status),
+                'progress_percentage': progress_percentage,
+                'assigned_at': row.assigned_at,
+                # У назначения нет даты завершения: берется дата последнего шага
+                'completed_at': row.last_completed_at if row.status == completed else None,
+            }
+
+    @staticmethod
+    def iter_csv():
+        """
+        Строки CSV для StreamingHttpResponse
+        """
+        writer = csv.writer(_Echo())
+        yield writer.writerow(CSV_HEADERS)
+        for row in AssignmentReportService.iter_rows():
+            yield writer.writerow([
+                row['program_name'],
+                row['user']['full_name'],
+                row['user']['position'],
+                row['status_display'],
+                f"{row['progress_percentage']}%",
+                row['assigned_at'].strftime('%d.%m.%Y') if row['assigned_at'] else '',
+                row['completed_at'].strftime('%d.%m.%Y') if row['completed_at'] else '',
+            ])
+
+    @staticmethod
+    def fingerprint():
+        """
+        Отпечаток данных отчета: хэш всех полей строк отчета, посчитанный
+        в базе одним запросом. Меняется при любом изменении, видимом в
+        отчете: названия программы, имени или должности сотрудника, статуса
+        назначения, количества и дат выполненных шагов
+
+        Returns:
+            str: sha256 хэша строк
+        """
+        fields = []
+        for field in REPORT_FIELDS:
+            fields += [Cast(field, TextField()), Value('|')]
+        digest = AssignmentReportService.annotated_assignments().annotate(
+            report_row=Concat(*fields, output_field=TextField())
+        ).aggregate(
+            digest=MD5(StringAgg('report_row', delimiter='\n', ordering='id', default=''))
+        )['digest']
+        return hashlib.sha256(digest.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def render_pdf(path, chunk_size=None):
+        """
+        Рендерит отчет в PDF частями и объединяет части в файл path
+
+        Returns:
+            int: Количество назначений в отчете
+        """
+        from pypdf import PdfWriter
+        from weasyprint import HTML
+
+        chunk_size = chunk_size or getattr(settings, 'REPORTS_PDF_CHUNK_SIZE', 500)
+        rows = AssignmentReportService.iter_rows()
+        row_count = 0
+
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(path)) as parts_dir:
+            parts = []
+            chunk = list(islice(rows, chunk_size))
+            while True:
+                # Следующая часть читается заранее, чтобы знать, последняя ли текущая
+                next_chunk = list(islice(rows, chunk_size)) if chunk else []
+                html_string = render_to_string(ASSIGNMENTS_TEMPLATE, {
+                    'programs_data': AssignmentReportService._group_by_program(chunk),
+                    'title': ASSIGNMENTS_TITLE,
+                    'show_header': not parts,
+                    'show_footer': not next_chunk,
+                })
+                part = os.path.join(parts_dir, f'part-{len(parts)}.pdf')
+                HTML(string=html_string).write_pdf(part)
+                parts.append(part)
+                row_count += len(chunk)
+                if not next_chunk:
+                    break
+                chunk = next_chunk
+
+            writer = PdfWriter()
+            for part in parts:
+                writer.append(part)
+            tmp_path = os.path.join(parts_dir, 'report.pdf')
+            with open(tmp_path, 'wb') as output:
+                writer.write(output)
+            writer.close()
+            os.replace(tmp_path, path)
+        return row_count
+
+    @staticmethod
+    def _group_by_program(rows):
+        return [
+            {'program': {'name': rows_group[0]['program_name']}, 'assignments': rows_group}
+            for rows_group in (
+                list(group) for _, group in groupby(rows, key=lambda row: row['program_id']))
+        ]
+
+
+class ReportExportService:
+    """
+    Фоновые выгрузки отчетов: постановка, выполнение и очистка
+    """
+
+    RENDERERS = {
+        (ASSIGNMENTS_REPORT, ReportExport.Format.PDF): AssignmentReportService.render_pdf,
+    }
+    FINGERPRINTS = {
+        ASSIGNMENTS_REPORT: AssignmentReportService.fingerprint,
+    }
+
+    @staticmethod
+    def request_export(user, report=ASSIGNMENTS_REPORT, export_format=ReportExport.Format.PDF):
+        """
+        Возвращает выгрузку для текущих данных: готовую или уже выполняемую
+        с тем же отпечатком, иначе ставит новую в очередь
+
+        Returns:
+            tuple: (ReportExport, created)
+        """
+        fingerprint = ReportExportService.FINGERPRINTS[report]()
+        max_age = timedelta(seconds=getattr(settings, 'REPORTS_EXPORT_MAX_AGE', 3600))
+
+        existing = ReportExport.objects.filter(
+            report=report,
+            export_format=export_format,
+            fingerprint=fingerprint,
+            status__in=[
+                ReportExport.Status.PENDING, ReportExport.Status.RUNNING,
+                ReportExport.Status.DONE],
+            created_at__gte=timezone.now() - max_age
+        ).order_by('-created_at').first()
+        if existing is not None and (
+                existing.status != ReportExport.Status.DONE or os.path.exists(existing.file_path)):
+            return existing, False
+
+        export = ReportExport.objects.create(
+            report=report, export_format=export_format, fingerprint=fingerprint,
+            requested_by=user)
+        return export, True
+
+    @staticmethod
+    def claim(now=None):
+        """
+        Захватывает одну ожидающую выгрузку или выгрузку с истекшей арендой.
+        Выгрузка, аренда которой истекла REPORTS_EXPORT_MAX_ATTEMPTS раз
+        (процесс падал при ее формировании), помечается как неудавшаяся
+
+        Returns:
+            ReportExport: Захваченная выгрузка или None
+        """
+        if now is None:
+            now = timezone.now()
+        lease = timedelta(seconds=getattr(settings, 'REPORTS_EXPORT_LEASE_SECONDS', 1800))
+        max_attempts = getattr(settings, 'REPORTS_EXPORT_MAX_ATTEMPTS', 3)
+
+        with transaction.atomic():
+            ReportExport.objects.filter(
+                status=ReportExport.Status.RUNNING, locked_until__lt=now,
+                attempts__gte=max_attempts
+            ).update(
+                status=ReportExport.Status.FAILED, locked_until=None, finished_at=now,
+                error=f'Выгрузка не завершилась за {max_attempts} попыток')
+
+            export = ReportExport.objects.select_for_update(skip_locked=True).filter(
+                Q(status=ReportExport.Status.PENDING) |
+                Q(status=ReportExport.Status.RUNNING, locked_until__lt=now)
+            ).order_by('id').first()
+            if export is None:
+                return None
+            export.status = ReportExport.Status.RUNNING
+            export.locked_until = now + lease
+            export.started_at = now
+            export.attempts = F('attempts') + 1
+            export.save(update_fields=['status', 'locked_until', 'started_at', 'attempts'])
+            export.refresh_from_db(fields=['attempts'])
+        return export
+
+    @staticmethod
+    def render(export):
+        """
+        Формирует файл выгрузки и сохраняет результат
+
+        Returns:
+            ReportExport: Выгрузка со статусом done или failed
+        """
+        directory = getattr(
+            settings, 'REPORTS_EXPORT_DIR', os.path.join(settings.BASE_DIR, 'report_exports'))
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(
+            directory, f'{export.report}-{export.id}-{export.fingerprint[:12]}.{export.export_format}')
+
+        try:
+            renderer = ReportExportService.RENDERERS[(export.report, export.export_format)]
+            export.row_count = renderer(path)
+            export.file_path = path
+            export.size = os.path.getsize(path)
+            export.status = ReportExport.Status.DONE
+            export.error = ''
+        except Exception as e:
+            logger.exception(f"Report export {export.id} failed: {e}")
+            export.status = ReportExport.Status.FAILED
+            export.error = str(e)
+
+        export.locked_until = None
+        export.finished_at = timezone.now()
+        export.save(update_fields=[
+            'row_count', 'file_path', 'size', 'status', 'error', 'locked_until', 'finished_at'])
+        return export
+
+    @staticmethod
+    def render_pending(limit=None):
+        """
+        Выполняет ожидающие выгрузки по одной
+
+        Returns:
+            int: Количество выполненных выгрузок
+        """
+        count = 0
+        while limit is None or count < limit:
+            export = ReportExportService.claim()
+            if export is None:
+                break
+            ReportExportService.render(export)
+            count += 1
+        return count
+
+    @staticmethod
+    def purge(now=None):
+        """
+        Удаляет выгрузки старше REPORTS_EXPORT_RETENTION_HOURS вместе с файлами
+
+        Returns:
+            int: Количество удаленных выгрузок
+        """
+        if now is None:
+            now = timezone.now()
+        retention = timedelta(hours=getattr(settings, 'REPORTS_EXPORT_RETENTION_HOURS', 24))
+        expired = ReportExport.objects.filter(
+            created_at__lt=now - retention
+        ).exclude(status=ReportExport.Status.RUNNING)
+
+        for path in expired.exclude(file_path='').values_list('file_path', flat=True):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        deleted, _ = expired.delete()
+        return deleted
@@ -0,0 +1,24 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .feedback_models import FeedbackMood, StepFeedback
+from .lms_models import LMSUserTestResult
+from .models import UserOnboardingAssignment, UserStepProgress
+
+
+@receiver(post_save, sender=UserStepProgress)
+@receiver(post_delete, sender=UserStepProgress)
+@receiver(post_save, sender=UserOnboardingAssignment)
+@receiver(post_delete, sender=UserOnboardingAssignment)
+@receiver(post_save, sender=FeedbackMood)
+@receiver(post_save, sender=StepFeedback)
+@receiver(post_save, sender=LMSUserTestResult)
+def invalidate_analytics_cache(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш ответов аналитики после фиксации изменений, чтобы
+    параллельный запрос не закэшировал данные до фиксации
+    """
+    from .services.analytics import AnalyticsService
+
+    transaction.on_commit(AnalyticsService.invalidate)
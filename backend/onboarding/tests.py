@@ -1,3 +1,221 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from users.models import User, UserRole
+from .models import OnboardingProgram, OnboardingStep, UserOnboardingAssignment, UserStepProgress
+from .reports_models import ReportExport
+from .services.reports import AssignmentReportService, ReportExportService
+
+
+class AssignmentReportTestMixin:
+    """
+    Данные для тестов отчетов: программа из двух шагов и два сотрудника,
+    один из которых выполнил один шаг
+    """
+
+    def create_report_data(self):
+        self.hr_user = User.objects.create_user(
+            email="hr@test.com", username="hr", password="password",
+            role=UserRole.HR, full_name="HR User")
+        self.program = OnboardingProgram.objects.create(
+            name="Test Program", description="Test", author=self.hr_user)
+        self.steps = [
+            OnboardingStep.objects.create(name=f"Step {order}", program=self.program, order=order)
+            for order in (1, 2)
+        ]
+        self.employees = []
+        for index in range(2):
+            employee = User.objects.create_user(
+                email=f"employee{index}@test.com", username=f"employee{index}",
+                password="password", role=UserRole.EMPLOYEE,
+                full_name=f"Employee {index}", position="Developer")
+            UserOnboardingAssignment.objects.create(user=employee, program=self.program)
+            self.employees.append(employee)
+        self.progress = UserStepProgress.objects.create(
+            user=self.employees[0], step=self.steps[0],
+            status=UserStepProgress.ProgressStatus.DONE)
+
+
+class AssignmentReportServiceTest(AssignmentReportTestMixin, TestCase):
+    """
+    Тесты данных отчета по назначениям и постановки выгрузок
+    """
+
+    def setUp(self):
+        self.create_report_data()
+
+    def test_rows_are_read_with_single_query(self):
+        with self.assertNumQueries(1):
+            rows = list(AssignmentReportService.iter_rows(chunk_size=1))
+
+        progress = {row['user']['full_name']: row['progress_percentage'] for row in rows}
+        self.assertEqual(progress, {'Employee 0': 50, 'Employee 1': 0})
+
+    def test_request_export_reuses_export_until_data_changes(self):
+        export, created = ReportExportService.request_export(self.hr_user)
+        self.assertTrue(created)
+        self.assertEqual(export.status, ReportExport.Status.PENDING)
+
+        same, created = ReportExportService.request_export(self.hr_user)
+        self.assertFalse(created)
+        self.assertEqual(same.id, export.id)
+
+        self.progress.status = UserStepProgress.ProgressStatus.IN_PROGRESS
+        self.progress.save()
+        changed, created = ReportExportService.request_export(self.hr_user)
+        self.assertTrue(created)
+        self.assertNotEqual(changed.fingerprint, export.fingerprint)
+
+    def test_fingerprint_changes_with_report_content(self):
+        fingerprint = AssignmentReportService.fingerprint()
+
+        # Выполнен другой шаг вместо отмененного: количества те же,
+        # меняется дата последнего выполненного шага
+        self.progress.status = UserStepProgress.ProgressStatus.IN_PROGRESS
+        self.progress.save()
+        UserStepProgress(user=self.employees[0], step=self.steps[1]).mark_as_done()
+        moved = AssignmentReportService.fingerprint()
+        self.assertNotEqual(moved, fingerprint)
+
+        self.program.name = "Renamed Program"
+        self.program.save()
+        renamed = AssignmentReportService.fingerprint()
+        self.assertNotEqual(renamed, moved)
+
+        UserOnboardingAssignment.objects.filter(user=self.employees[1]).update(
+            status=UserOnboardingAssignment.AssignmentStatus.COMPLETED)
+        self.assertNotEqual(AssignmentReportService.fingerprint(), renamed)
+
+    def test_claim_leases_export_once(self):
+        export, _ = ReportExportService.request_export(self.hr_user)
+
+        claimed = ReportExportService.claim()
+        self.assertEqual(claimed.id, export.id)
+        self.assertEqual(claimed.status, ReportExport.Status.RUNNING)
+        self.assertEqual(claimed.attempts, 1)
+        self.assertIsNone(ReportExportService.claim())
+
+    @override_settings(REPORTS_EXPORT_MAX_ATTEMPTS=2, REPORTS_EXPORT_LEASE_SECONDS=60)
+    def test_export_fails_after_max_attempts(self):
+        export, _ = ReportExportService.request_export(self.hr_user)
+
+        # Процесс падает, не завершив выгрузку: аренда истекает
+        now = timezone.now()
+        for attempt in (1, 2):
+            claimed = ReportExportService.claim(now=now)
+            self.assertEqual(claimed.attempts, attempt)
+            now += timedelta(minutes=5)
+
+        self.assertIsNone(ReportExportService.claim(now=now))
+        export.refresh_from_db()
+        self.assertEqual(export.status, ReportExport.Status.FAILED)
+
+
+class AssignmentReportViewsTest(AssignmentReportTestMixin, APITestCase):
+    """
+    Тесты представлений отчетов
+    """
+
+    def setUp(self):
+        self.create_report_data()
+        self.client.force_authenticate(user=self.hr_user)
+
+    def test_csv_report_is_streamed(self):
+        response = self.client.get(reverse('assignment-report-csv'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertIn('Employee 0,Developer', lines[1])
+        self.assertIn('50%', lines[1])
+
+    def test_pdf_report_returns_export_handle(self):
+        response = self.client.post(reverse('assignment-report-pdf'))
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], ReportExport.Status.PENDING)
+        self.assertIsNone(response.data['download_url'])
+
+        download = self.client.get(
+            reverse('report-export-download', args=[response.data['id']]))
+        self.assertEqual(download.status_code, 409)
+
+
+class AnalyticsViewsTest(AssignmentReportTestMixin, APITestCase):
+    """
+    Тесты представлений аналитики: число запросов не зависит от числа
+    назначений, ответы кэшируются до изменения прогресса
+    """
+
+    def setUp(self):
+        caches['default'].clear()
+        self.create_report_data()
+        self.client.force_authenticate(user=self.hr_user)
+
+    def add_assignments(self, count):
+        for index in range(count):
+            employee = User.objects.create_user(
+                email=f"extra{index}@test.com", username=f"extra{index}",
+                password="password", role=UserRole.EMPLOYEE)
+            UserOnboardingAssignment.objects.create(user=employee, program=self.program)
+
+    @override_settings(ANALYTICS_CACHE_TTL=0)
+    def test_assignments_query_count_is_constant(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('analytics-assignments'))
+        self.assertEqual(len(response.data['results']), 2)
+
+        self.add_assignments(10)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('analytics-assignments'))
+        self.assertEqual(len(response.data['results']), 12)
+        progress = {row['full_name']: row['progress_percentage']
+                    for row in response.data['results']}
+        self.assertEqual(progress['Employee 0'], 50)
+
+    @override_settings(ANALYTICS_CACHE_TTL=0)
+    def test_assignments_are_paginated_by_cursor(self):
+        self.add_assignments(3)
+        url = reverse('analytics-assignments')
+
+        first = self.client.get(url, {'page_size': 3})
+        self.assertEqual(len(first.data['results']), 3)
+        self.assertIsNotNone(first.data['next'])
+
+        second = self.client.get(first.data['next'])
+        self.assertEqual(len(second.data['results']), 2)
+        self.assertIsNone(second.data['next'])
+        ids = [row['id'] for row in first.data['results'] + second.data['results']]
+        self.assertEqual(len(set(ids)), 5)
+
+    @override_settings(ANALYTICS_CACHE_TTL=0)
+    def test_summary_query_count_is_constant(self):
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('analytics-summary'))
+        self.assertEqual(response.data['total_assignments_count'], 2)
+        self.assertEqual(response.data['average_progress_percentage'], 100)
+
+        self.add_assignments(10)
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('analytics-summary'))
+        self.assertEqual(response.data['total_assignments_count'], 12)
+
+    @override_settings(ANALYTICS_CACHE_TTL=60)
+    def test_summary_is_cached_until_progress_changes(self):
+        self.client.get(reverse('analytics-summary'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('analytics-summary'))
+        self.assertEqual(response.data['average_progress_percentage'], 100)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.progress.status = UserStepProgress.ProgressStatus.IN_PROGRESS
+            self.progress.save()
+
+        response = self.client.get(reverse('analytics-summary'))
+        self.assertEqual(response.data['average_progress_percentage'], 0)
@@ -5,3 +5,7 @@ class OnboardingIntelligenceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'onboarding_intelligence'
     verbose_name = 'Onboarding Intelligence Dashboard'
+
+    def ready(self):
+        # Импорт сигналов отслеживания изменений прогресса
+        import onboarding_intelligence.signals
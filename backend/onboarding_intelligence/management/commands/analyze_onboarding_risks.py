@@ -4,7 +4,11 @@ from django.contrib.auth import get_user_model
 import logging
 
 from departments.models import Department
-from onboarding_intelligence.services import OnboardingRiskAnalyzerService
+from onboarding_intelligence.services import (
+    OnboardingRiskAnalyzerService,
+    RISK_BATCH_SIZE,
+    IntelligenceDashboardService
+)
 
 User = get_user_model()
 
@@ -25,6 +29,17 @@ class Command(BaseCommand):
             type=int,
             help='ID департамента для анализа рисков'
         )
+        parser.add_argument(
+            '--batch',
+            action='store_true',
+            help='Использовать пакетный конвейер (векторный расчет и массовая запись)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=RISK_BATCH_SIZE,
+            help='Количество назначений в одной пачке пакетного конвейера'
+        )
 
     def handle(self, *args, **options):
         start_time = timezone.now()
@@ -32,6 +47,24 @@ class Command(BaseCommand):
 
         user_id = options.get('user')
         department_id = options.get('department')
+        batch_size = options.get('batch_size')
+
+        def analyze_risks(**kwargs):
+            if not options.get('batch'):
+                return OnboardingRiskAnalyzerService.analyze_user_risks(**kwargs)
+
+            stats = OnboardingRiskAnalyzerService.analyze_user_risks_batch(
+                batch_size=batch_size, **kwargs)
+            timings = stats['timings']
+            self.stdout.write(
+                f"Назначений: {stats['assignments']}, "
+                f"создано прогнозов: {stats['predictions_created']}, "
+                f"обновлено: {stats['predictions_updated']}")
+            self.stdout.write(
+                f"Этапы: загрузка {timings['load']:.3f} с, "
+                f"расчет {timings['score']:.3f} с, "
+                f"запись {timings['write']:.3f} с")
+            return stats
 
         try:
             if user_id:
@@ -39,7 +72,7 @@ class Command(BaseCommand):
                 user = User.objects.get(id=user_id)
                 self.stdout.write(
                     f'Анализ рисков для пользователя {user.email}')
-                OnboardingRiskAnalyzerService.analyze_user_risks(user=user)
+                analyze_risks(user=user)
                 self.stdout.write(self.style.SUCCESS(
                     f'Риски успешно проанализированы для {user.email}'))
             elif department_id:
@@ -47,16 +80,14 @@ class Command(BaseCommand):
                 department = Department.objects.get(id=department_id)
                 self.stdout.write(
                     f'Анализ рисков для департамента {department.name}')
-                OnboardingRiskAnalyzerService.analyze_user_risks(
-                    department=department)
+                analyze_risks(department=department)
                 self.stdout.write(self.style.SUCCESS(
                     f'Риски успешно проанализированы для департамента {department.name}'))
             else:
                 # Анализируем риски для всех пользователей
                 self.stdout.write(
                     'Анализ рисков для всех активных пользователей')
-                OnboardingRiskAnalyzerService.analyze_user_risks(
-                    all_users=True)
+                analyze_risks(all_users=True)
                 self.stdout.write(self.style.SUCCESS(
                     'Риски успешно проанализированы для всех пользователей'))
 
@@ -69,6 +100,9 @@ class Command(BaseCommand):
             logger.exception('Ошибка при анализе рисков: %s', str(e))
             raise CommandError(f'Ошибка при анализе рисков: {str(e)}')
 
+        # Пересобираем предрасчитанные данные дашборда
+        IntelligenceDashboardService.rebuild()
+
         end_time = timezone.now()
         execution_time = end_time - start_time
         self.stdout.write(f'Завершение анализа рисков: {end_time}')
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+import logging
+
+from onboarding_intelligence.services import (
+    ProgressSnapshotStateService,
+    SNAPSHOT_RETENTION_DAYS
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = ('Прореживает старую историю снимков прогресса онбординга '
+            'до одного снимка в неделю на назначение')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=SNAPSHOT_RETENTION_DAYS,
+            help='Прореживать снимки старше указанного количества дней'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только подсчитать снимки, подлежащие удалению'
+        )
+
+    def handle(self, *args, **options):
+        start_time = timezone.now()
+        self.stdout.write(
+            f'Начало прореживания истории снимков прогресса: {start_time}')
+
+        try:
+            removed = ProgressSnapshotStateService.compact_history(
+                older_than_days=options['days'],
+                dry_run=options['dry_run']
+            )
+            if options['dry_run']:
+                self.stdout.write(
+                    f'Будет удалено снимков: {removed}')
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Удалено снимков: {removed}'))
+        except Exception as e:
+            logger.exception(
+                'Ошибка при прореживании истории снимков: %s', str(e))
+            raise CommandError(
+                f'Ошибка при прореживании истории снимков: {str(e)}')
+
+        end_time = timezone.now()
+        execution_time = end_time - start_time
+        self.stdout.write(
+            f'Завершение прореживания истории снимков: {end_time}')
+        self.stdout.write(f'Время выполнения: {execution_time}')
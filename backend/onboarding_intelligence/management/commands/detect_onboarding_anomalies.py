@@ -4,7 +4,11 @@ from django.contrib.auth import get_user_model
 import logging
 
 from departments.models import Department
-from onboarding_intelligence.services import AnomalyDetectionService
+from onboarding_intelligence.services import (
+    AnomalyDetectionService,
+    ANOMALY_BATCH_SIZE,
+    IntelligenceDashboardService
+)
 
 User = get_user_model()
 
@@ -25,6 +29,17 @@ class Command(BaseCommand):
             type=int,
             help='ID департамента для поиска аномалий'
         )
+        parser.add_argument(
+            '--batch',
+            action='store_true',
+            help='Использовать пакетный поиск (сгруппированные запросы и массовая запись)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=ANOMALY_BATCH_SIZE,
+            help='Количество назначений в одной пачке пакетного поиска'
+        )
 
     def handle(self, *args, **options):
         start_time = timezone.now()
@@ -32,6 +47,18 @@ class Command(BaseCommand):
 
         user_id = options.get('user')
         department_id = options.get('department')
+        batch_size = options.get('batch_size')
+
+        def detect_anomalies(**kwargs):
+            if not options.get('batch'):
+                return AnomalyDetectionService.detect_anomalies(**kwargs)
+
+            stats = AnomalyDetectionService.detect_anomalies_batch(
+                batch_size=batch_size, **kwargs)
+            self.stdout.write(
+                f"Назначений: {stats['assignments']}, "
+                f"создано аномалий: {stats['anomalies_created']}")
+            return stats
 
         try:
             if user_id:
@@ -39,7 +66,7 @@ class Command(BaseCommand):
                 user = User.objects.get(id=user_id)
                 self.stdout.write(
                     f'Поиск аномалий для пользователя {user.email}')
-                AnomalyDetectionService.detect_anomalies(user=user)
+                detect_anomalies(user=user)
                 self.stdout.write(self.style.SUCCESS(
                     f'Поиск аномалий успешно выполнен для {user.email}'))
             elif department_id:
@@ -47,14 +74,14 @@ class Command(BaseCommand):
                 department = Department.objects.get(id=department_id)
                 self.stdout.write(
                     f'Поиск аномалий для департамента {department.name}')
-                AnomalyDetectionService.detect_anomalies(department=department)
+                detect_anomalies(department=department)
                 self.stdout.write(self.style.SUCCESS(
                     f'Поиск аномалий успешно выполнен для департамента {department.name}'))
             else:
                 # Ищем аномалии для всех пользователей
                 self.stdout.write(
                     'Поиск аномалий для всех активных пользователей')
-                AnomalyDetectionService.detect_anomalies(all_users=True)
+                detect_anomalies(all_users=True)
                 self.stdout.write(self.style.SUCCESS(
                     'Поиск аномалий успешно выполнен для всех пользователей'))
 
@@ -67,6 +94,9 @@ class Command(BaseCommand):
             logger.exception('Ошибка при поиске аномалий: %s', str(e))
             raise CommandError(f'Ошибка при поиске аномалий: {str(e)}')
 
+        # Пересобираем предрасчитанные данные дашборда
+        IntelligenceDashboardService.rebuild()
+
         end_time = timezone.now()
         execution_time = end_time - start_time
         self.stdout.write(f'Завершение поиска аномалий: {end_time}')
@@ -1,10 +1,18 @@
 from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
 from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
 import logging
+import time
 
 from departments.models import Department
-from onboarding_intelligence.services import OnboardingProgressAggregatorService
+from onboarding_intelligence.models import OnboardingProgressSnapshot
+from onboarding_intelligence.services import (
+    OnboardingProgressAggregatorService,
+    SNAPSHOT_BULK_BATCH_SIZE,
+    IntelligenceDashboardService
+)
 
 User = get_user_model()
 
@@ -30,6 +38,22 @@ class Command(BaseCommand):
             action='store_true',
             help='Также сгенерировать сводки по департаментам'
         )
+        parser.add_argument(
+            '--bulk',
+            action='store_true',
+            help='Использовать массовый режим (один агрегирующий запрос и bulk_create)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=SNAPSHOT_BULK_BATCH_SIZE,
+            help='Размер пачки bulk_create для массового режима'
+        )
+        parser.add_argument(
+            '--benchmark',
+            action='store_true',
+            help='Сравнить обычный и массовый режимы (изменения откатываются)'
+        )
 
     def handle(self, *args, **options):
         start_time = timezone.now()
@@ -39,6 +63,18 @@ class Command(BaseCommand):
         user_id = options.get('user')
         department_id = options.get('department')
         generate_summaries = options.get('summaries')
+        bulk = options.get('bulk')
+        batch_size = options.get('batch_size')
+
+        if options.get('benchmark'):
+            self._run_benchmark(batch_size)
+            return
+
+        def generate_snapshots(**kwargs):
+            if bulk:
+                return OnboardingProgressAggregatorService.generate_user_snapshots_bulk(
+                    batch_size=batch_size, **kwargs)
+            return OnboardingProgressAggregatorService.generate_user_snapshots(**kwargs)
 
         try:
             if user_id:
@@ -46,8 +82,7 @@ class Command(BaseCommand):
                 user = User.objects.get(id=user_id)
                 self.stdout.write(
                     f'Генерация снимка прогресса для пользователя {user.email}')
-                OnboardingProgressAggregatorService.generate_user_snapshots(
-                    user=user)
+                generate_snapshots(user=user)
                 self.stdout.write(self.style.SUCCESS(
                     f'Снимок прогресса успешно сгенерирован для {user.email}'))
             elif department_id:
@@ -55,8 +90,7 @@ class Command(BaseCommand):
                 department = Department.objects.get(id=department_id)
                 self.stdout.write(
                     f'Генерация снимков прогресса для департамента {department.name}')
-                OnboardingProgressAggregatorService.generate_user_snapshots(
-                    department=department)
+                generate_snapshots(department=department)
                 self.stdout.write(self.style.SUCCESS(
                     f'Снимки прогресса успешно сгенерированы для департамента {department.name}'))
 
@@ -70,8 +104,7 @@ class Command(BaseCommand):
                 # Генерируем снимки для всех пользователей
                 self.stdout.write(
                     'Генерация снимков прогресса для всех активных пользователей')
-                OnboardingProgressAggregatorService.generate_user_snapshots(
-                    all_users=True)
+                generate_snapshots(all_users=True)
                 self.stdout.write(self.style.SUCCESS(
                     'Снимки прогресса успешно сгенерированы для всех пользователей'))
 
@@ -93,8 +126,38 @@ class Command(BaseCommand):
             raise CommandError(
                 f'Ошибка при генерации снимков прогресса: {str(e)}')
 
+        # Пересобираем предрасчитанные данные дашборда
+        IntelligenceDashboardService.rebuild()
+
         end_time = timezone.now()
         execution_time = end_time - start_time
         self.stdout.write(
             f'Завершение генерации снимков прогресса: {end_time}')
         self.stdout.write(f'Время выполнения: {execution_time}')
+
+    def _run_benchmark(self, batch_size):
+        """
+        Замеряет скорость (снимков в секунду) и количество запросов
+        для обычного и массового режимов. Созданные снимки откатываются.
+        """
+        modes = [
+            ('legacy', lambda: OnboardingProgressAggregatorService.generate_user_snapshots(
+                all_users=True)),
+            ('bulk', lambda: OnboardingProgressAggregatorService.generate_user_snapshots_bulk(
+                all_users=True, batch_size=batch_size)),
+        ]
+
+        for name, generate in modes:
+            with transaction.atomic():
+                before = OnboardingProgressSnapshot.objects.count()
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    generate()
+                    elapsed = time.perf_counter() - started
+                rows = OnboardingProgressSnapshot.objects.count() - before
+                transaction.set_rollback(True)
+
+            rate = rows / elapsed if elapsed > 0 else 0.0
+            self.stdout.write(
+                f'{name}: {rows} снимков за {elapsed:.3f} с '
+                f'({rate:.1f} снимков/с, {len(queries)} запросов)')
@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+import logging
+
+from onboarding_intelligence.services import (
+    IncrementalIntelligenceService,
+    IntelligenceDashboardService
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = ('Инкрементально обновляет снимки прогресса, риски и аномалии '
+            'только для назначений, изменившихся с прошлого запуска')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--job',
+            choices=[
+                IncrementalIntelligenceService.SNAPSHOTS_JOB,
+                IncrementalIntelligenceService.RISKS_JOB,
+                IncrementalIntelligenceService.ANOMALIES_JOB,
+            ],
+            help='Выполнить только указанное задание'
+        )
+
+    def handle(self, *args, **options):
+        start_time = timezone.now()
+        self.stdout.write(
+            f'Начало инкрементального обновления аналитики онбординга: {start_time}')
+
+        jobs = {
+            IncrementalIntelligenceService.SNAPSHOTS_JOB: IncrementalIntelligenceService.update_snapshots,
+            IncrementalIntelligenceService.RISKS_JOB: IncrementalIntelligenceService.update_risks,
+            IncrementalIntelligenceService.ANOMALIES_JOB: IncrementalIntelligenceService.update_anomalies,
+        }
+        if options.get('job'):
+            jobs = {options['job']: jobs[options['job']]}
+
+        try:
+            for job, run_job in jobs.items():
+                stats = run_job()
+                if stats['full_run']:
+                    self.stdout.write(
+                        f'{job}: полный пересчет (первый запуск)')
+                else:
+                    self.stdout.write(
+                        f"{job}: изменившихся назначений {stats['assignments_changed']}")
+                self.stdout.write(self.style.SUCCESS(
+                    f'Задание {job} успешно выполнено'))
+        except Exception as e:
+            logger.exception(
+                'Ошибка при инкрементальном обновлении аналитики: %s', str(e))
+            raise CommandError(
+                f'Ошибка при инкрементальном обновлении аналитики: {str(e)}')
+
+        # Пересобираем предрасчитанные данные дашборда
+        IntelligenceDashboardService.rebuild()
+
+        end_time = timezone.now()
+        execution_time = end_time - start_time
+        self.stdout.write(
+            f'Завершение инкрементального обновления: {end_time}')
+        self.stdout.write(f'Время выполнения: {execution_time}')
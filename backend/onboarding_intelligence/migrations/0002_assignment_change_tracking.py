@@ -0,0 +1,40 @@
+# Generated by Django 5.2.1 on 2026-10-17 16:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('onboarding', '0019_alter_attachment_id_alter_enhancedlmsquestion_id_and_more'),
+        ('onboarding_intelligence', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IntelligenceJobWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(max_length=50, unique=True, verbose_name='job')),
+                ('processed_until', models.DateTimeField(verbose_name='processed until')),
+            ],
+            options={
+                'verbose_name': 'intelligence job watermark',
+                'verbose_name_plural': 'intelligence job watermarks',
+            },
+        ),
+        migrations.CreateModel(
+            name='OnboardingAssignmentChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('changed_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='changed at')),
+                ('assignment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='intelligence_change', to='onboarding.useronboardingassignment', verbose_name='assignment')),
+            ],
+            options={
+                'verbose_name': 'onboarding assignment change',
+                'verbose_name_plural': 'onboarding assignment changes',
+            },
+        ),
+    ]
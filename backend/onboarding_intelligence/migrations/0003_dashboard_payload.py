@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:07
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('onboarding_intelligence', '0002_assignment_change_tracking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IntelligenceDashboardPayload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=50, unique=True, verbose_name='key')),
+                ('payload', models.JSONField(default=dict, verbose_name='payload')),
+                ('etag', models.CharField(max_length=64, verbose_name='etag')),
+                ('built_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='built at')),
+            ],
+            options={
+                'verbose_name': 'intelligence dashboard payload',
+                'verbose_name_plural': 'intelligence dashboard payloads',
+            },
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_latest_snapshots(apps, schema_editor):
+    OnboardingProgressSnapshot = apps.get_model(
+        'onboarding_intelligence', 'OnboardingProgressSnapshot')
+    OnboardingLatestSnapshot = apps.get_model(
+        'onboarding_intelligence', 'OnboardingLatestSnapshot')
+    db_alias = schema_editor.connection.alias
+
+    # Для каждого назначения берем самый свежий снимок
+    latest = []
+    seen = set()
+    snapshots = OnboardingProgressSnapshot.objects.using(db_alias).order_by(
+        'assignment_id', '-snapshot_date', '-id'
+    ).values_list('id', 'assignment_id', 'user_id', 'department_id',
+                  'completion_percentage', 'snapshot_date')
+    for snapshot_id, assignment_id, user_id, department_id, percentage, snapshot_date in snapshots.iterator():
+        if assignment_id in seen:
+            continue
+        seen.add(assignment_id)
+        latest.append(OnboardingLatestSnapshot(
+            assignment_id=assignment_id,
+            snapshot_id=snapshot_id,
+            user_id=user_id,
+            department_id=department_id,
+            completion_percentage=percentage,
+            snapshot_date=snapshot_date
+        ))
+
+    OnboardingLatestSnapshot.objects.using(db_alias).bulk_create(
+        latest, batch_size=1000)
+
+
+def reverse_populate_latest_snapshots(apps, schema_editor):
+    # Таблица удаляется вместе с миграцией, данные не теряются
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('departments', '0002_add_manager_field'),
+        ('onboarding', '0019_alter_attachment_id_alter_enhancedlmsquestion_id_and_more'),
+        ('onboarding_intelligence', '0003_dashboard_payload'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OnboardingLatestSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('completion_percentage', models.FloatField(verbose_name='completion percentage')),
+                ('snapshot_date', models.DateTimeField(verbose_name='snapshot date')),
+                ('assignment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='latest_snapshot', to='onboarding.useronboardingassignment', verbose_name='assignment')),
+                ('department', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='latest_progress_snapshots', to='departments.department', verbose_name='department')),
+                ('snapshot', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='latest_state', to='onboarding_intelligence.onboardingprogresssnapshot', verbose_name='snapshot')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='latest_progress_snapshots', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+            options={
+                'verbose_name': 'latest onboarding progress snapshot',
+                'verbose_name_plural': 'latest onboarding progress snapshots',
+                'indexes': [models.Index(fields=['user', 'snapshot_date'], name='onboarding__user_id_7d3374_idx'), models.Index(fields=['department', 'snapshot_date'], name='onboarding__departm_09bb57_idx')],
+            },
+        ),
+        migrations.RunPython(
+            populate_latest_snapshots,
+            reverse_populate_latest_snapshots
+        ),
+    ]
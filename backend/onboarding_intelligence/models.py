@@ -64,6 +64,54 @@ class OnboardingProgressSnapshot(models.Model):
         return f"{self.user.email} Progress - {self.completion_percentage:.1f}% ({self.snapshot_date.strftime('%Y-%m-%d')})"
 
 
+class OnboardingLatestSnapshot(models.Model):
+    """
+    Текущее состояние прогресса по назначению: указатель на последний
+    снимок. Обновляется при каждой записи снимка и позволяет читать
+    последний снимок точечным запросом по индексу, без DISTINCT ON
+    по всей истории снимков
+    """
+    assignment = models.OneToOneField(
+        UserOnboardingAssignment,
+        on_delete=models.CASCADE,
+        related_name='latest_snapshot',
+        verbose_name=_('assignment')
+    )
+    snapshot = models.OneToOneField(
+        OnboardingProgressSnapshot,
+        on_delete=models.CASCADE,
+        related_name='latest_state',
+        verbose_name=_('snapshot')
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='latest_progress_snapshots',
+        verbose_name=_('user')
+    )
+    department = models.ForeignKey(
+        Department,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='latest_progress_snapshots',
+        verbose_name=_('department')
+    )
+    completion_percentage = models.FloatField(_('completion percentage'))
+    snapshot_date = models.DateTimeField(_('snapshot date'))
+
+    class Meta:
+        verbose_name = _('latest onboarding progress snapshot')
+        verbose_name_plural = _('latest onboarding progress snapshots')
+        indexes = [
+            models.Index(fields=['user', 'snapshot_date']),
+            models.Index(fields=['department', 'snapshot_date']),
+        ]
+
+    def __str__(self):
+        return f"Assignment {self.assignment_id} - {self.completion_percentage:.1f}% ({self.snapshot_date.strftime('%Y-%m-%d')})"
+
+
 class OnboardingRiskPrediction(models.Model):
     """
     Модель для хранения прогнозов рисков онбординга
@@ -259,3 +307,59 @@ class OnboardingDepartmentSummary(models.Model):
 
     def __str__(self):
         return f"{self.department.name} Summary ({self.summary_date.strftime('%Y-%m-%d')})"
+
+
+class OnboardingAssignmentChange(models.Model):
+    """
+    Отметка об изменении прогресса по назначению онбординга.
+    Обновляется сигналами UserStepProgress и используется
+    инкрементальными расчетами снимков, рисков и аномалий
+    """
+    assignment = models.OneToOneField(
+        UserOnboardingAssignment,
+        on_delete=models.CASCADE,
+        related_name='intelligence_change',
+        verbose_name=_('assignment')
+    )
+    changed_at = models.DateTimeField(
+        _('changed at'), default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = _('onboarding assignment change')
+        verbose_name_plural = _('onboarding assignment changes')
+
+    def __str__(self):
+        return f"Assignment {self.assignment_id} changed at {self.changed_at.strftime('%Y-%m-%d %H:%M')}"
+
+
+class IntelligenceJobWatermark(models.Model):
+    """
+    Момент, до которого изменения уже обработаны инкрементальным заданием
+    """
+    job = models.CharField(_('job'), max_length=50, unique=True)
+    processed_until = models.DateTimeField(_('processed until'))
+
+    class Meta:
+        verbose_name = _('intelligence job watermark')
+        verbose_name_plural = _('intelligence job watermarks')
+
+    def __str__(self):
+        return f"{self.job}: {self.processed_until.strftime('%Y-%m-%d %H:%M')}"
+
+
+class IntelligenceDashboardPayload(models.Model):
+    """
+    Предрасчитанные данные общего дашборда онбординга.
+    Пересобираются после заданий снимков, рисков и аномалий
+    """
+    key = models.CharField(_('key'), max_length=50, unique=True)
+    payload = models.JSONField(_('payload'), default=dict)
+    etag = models.CharField(_('etag'), max_length=64)
+    built_at = models.DateTimeField(_('built at'), default=timezone.now)
+
+    class Meta:
+        verbose_name = _('intelligence dashboard payload')
+        verbose_name_plural = _('intelligence dashboard payloads')
+
+    def __str__(self):
+        return f"{self.key} ({self.built_at.strftime('%Y-%m-%d %H:%M')})"
@@ -1,10 +1,19 @@
 import datetime
+import hashlib
+import json
+import time
 import numpy as np
 import pandas as pd
 from typing import List, Dict, Any, Optional, Tuple
+from django.apps import apps
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
-from django.db.models import Avg, Count, F, Q, Sum, DurationField
-from django.db.models.functions import TruncDay, Extract
+from django.db import transaction
+from django.db.models import (
+    Avg, Count, F, Q, Sum, Max, DurationField, ExpressionWrapper, Subquery, Window
+)
+from django.db.models.functions import TruncDay, TruncWeek, Extract, Coalesce, RowNumber
 from django.contrib.auth import get_user_model
 from django.conf import settings
 import pytz
@@ -20,12 +29,59 @@ from .models import (
     OnboardingProgressSnapshot,
     OnboardingRiskPrediction,
     OnboardingAnomaly,
-    OnboardingDepartmentSummary
+    OnboardingDepartmentSummary,
+    OnboardingAssignmentChange,
+    IntelligenceJobWatermark,
+    IntelligenceDashboardPayload,
+    OnboardingLatestSnapshot
+)
+from .serializers import (
+    OnboardingAnomalySerializer,
+    OnboardingDepartmentSummarySerializer
 )
 
 
 User = get_user_model()
 
+# Размер пачки для bulk_create при массовой генерации снимков
+SNAPSHOT_BULK_BATCH_SIZE = 1000
+
+# Снимки старше этого срока (в днях) прореживаются до одного в неделю
+SNAPSHOT_RETENTION_DAYS = 90
+
+# Размер пачки назначений для пакетного анализа рисков
+RISK_BATCH_SIZE = 500
+
+# Размер пачки назначений для пакетного поиска аномалий
+ANOMALY_BATCH_SIZE = 500
+
+# Оценка влияния для каждого типа риска
+RISK_ESTIMATED_IMPACTS = {
+    OnboardingRiskPrediction.RiskType.COMPLETION_RISK:
+        "Риск незавершения онбординга может привести к снижению эффективности сотрудника "
+        "и увеличить вероятность его скорого ухода из компании.",
+    OnboardingRiskPrediction.RiskType.DELAY_RISK:
+        "Задержки в онбординге могут привести к сдвигу сроков вхождения сотрудника в "
+        "полноценную работу и снизить эффективность команды.",
+    OnboardingRiskPrediction.RiskType.ENGAGEMENT_RISK:
+        "Низкая вовлеченность может привести к формальному прохождению онбординга без "
+        "усвоения важных знаний и навыков, что повлияет на дальнейшую работу.",
+    OnboardingRiskPrediction.RiskType.KNOWLEDGE_RETENTION_RISK:
+        "Недостаточное усвоение информации может привести к пробелам в знаниях и навыках, "
+        "что повлияет на качество работы и потребует дополнительного обучения в будущем.",
+}
+
+
+def _get_optional_model(app_label, model_name):
+    """
+    Возвращает модель-источник данных или None, если она не
+    зарегистрирована в текущей схеме (например, feedback.OnboardingFeedback)
+    """
+    try:
+        return apps.get_model(app_label, model_name)
+    except LookupError:
+        return None
+
 
 class OnboardingProgressAggregatorService:
     """
@@ -127,6 +183,101 @@ class OnboardingProgressAggregatorService:
                 last_activity_time=last_activity_time
             )
 
+    @classmethod
+    def generate_user_snapshots_bulk(cls, user=None, department=None, all_users=False,
+                                     batch_size=SNAPSHOT_BULK_BATCH_SIZE, assignment_ids=None):
+        """
+        Массовый вариант generate_user_snapshots: все счетчики по шагам
+        вычисляются одним сгруппированным запросом к UserStepProgress,
+        а снимки записываются пачками через bulk_create.
+
+        Количество запросов не зависит от числа назначений
+        (1 агрегирующий запрос + по одному INSERT на пачку).
+        assignment_ids ограничивает расчет заданными назначениями.
+        Возвращает количество созданных снимков.
+        """
+        now = timezone.now()
+        done = UserStepProgress.ProgressStatus.DONE
+
+        # Прогресс по шагам связываем с активным назначением того же
+        # пользователя на ту же программу (unique_together гарантирует
+        # не более одного назначения на пару user/program).
+        # Условия на назначение задаются в одном filter(), иначе Django
+        # добавит отдельный JOIN для каждого вызова
+        assignment_lookups = {
+            'step__program__assignments__user_id': F('user_id'),
+            'step__program__assignments__status': UserOnboardingAssignment.AssignmentStatus.ACTIVE,
+        }
+        if assignment_ids is not None:
+            assignment_lookups['step__program__assignments__id__in'] = assignment_ids
+
+        steps = UserStepProgress.objects.filter(**assignment_lookups)
+
+        if user and not all_users:
+            steps = steps.filter(user=user)
+        elif department and not all_users:
+            steps = steps.filter(user__department=department)
+
+        rows = steps.values(
+            'user_id',
+            'user__department_id',
+            'step__program__assignments__id',
+        ).annotate(
+            steps_total=Count('id'),
+            steps_completed=Count('id', filter=Q(status=done)),
+            steps_in_progress=Count('id', filter=Q(
+                status=UserStepProgress.ProgressStatus.IN_PROGRESS)),
+            steps_not_started=Count('id', filter=Q(
+                status=UserStepProgress.ProgressStatus.NOT_STARTED)),
+            steps_overdue=Count('id', filter=Q(
+                planned_date_end__lt=now) & ~Q(status=done)),
+            avg_step_completion_time=Avg(
+                ExpressionWrapper(
+                    F('actual_completed_at') - F('planned_date_start'),
+                    output_field=DurationField()
+                ),
+                filter=Q(status=done)
+            ),
+            last_activity_time=Max(
+                Coalesce('actual_completed_at', 'completed_at'),
+                filter=~Q(status=UserStepProgress.ProgressStatus.NOT_STARTED)
+            ),
+        ).order_by()
+
+        created = 0
+        batch = []
+        with transaction.atomic():
+            for row in rows.iterator(chunk_size=batch_size):
+                total_steps = row['steps_total']
+                batch.append(OnboardingProgressSnapshot(
+                    user_id=row['user_id'],
+                    assignment_id=row['step__program__assignments__id'],
+                    department_id=row['user__department_id'],
+                    completion_percentage=(
+                        row['steps_completed'] / total_steps) * 100.0,
+                    steps_total=total_steps,
+                    steps_completed=row['steps_completed'],
+                    steps_in_progress=row['steps_in_progress'],
+                    steps_not_started=row['steps_not_started'],
+                    steps_overdue=row['steps_overdue'],
+                    avg_step_completion_time=row['avg_step_completion_time'],
+                    last_activity_time=row['last_activity_time'],
+                    snapshot_date=now
+                ))
+
+                if len(batch) >= batch_size:
+                    OnboardingProgressSnapshot.objects.bulk_create(batch)
+                    ProgressSnapshotStateService.record_snapshots(batch)
+                    created += len(batch)
+                    batch = []
+
+            if batch:
+                OnboardingProgressSnapshot.objects.bulk_create(batch)
+                ProgressSnapshotStateService.record_snapshots(batch)
+                created += len(batch)
+
+        return created
+
     @classmethod
     def generate_department_summaries(cls):
         """
@@ -164,11 +315,9 @@ class OnboardingProgressAggregatorService:
                         completion_times, datetime.timedelta()) / len(completion_times)
 
             # Средний процент прогресса
-            latest_snapshots = OnboardingProgressSnapshot.objects.filter(
+            avg_completion_percentage = OnboardingLatestSnapshot.objects.filter(
                 department=department
-            ).order_by('user', '-snapshot_date').distinct('user')
-
-            avg_completion_percentage = latest_snapshots.aggregate(
+            ).aggregate(
                 avg=Avg('completion_percentage')
             )['avg'] or 0.0
 
@@ -224,9 +373,9 @@ class OnboardingProgressAggregatorService:
         anomaly_factor = recent_anomalies / users_count if users_count > 0 else 0
 
         # Коэффициент прогресса (инвертированный - ниже процент, выше риск)
-        progress_factor = 1.0 - (OnboardingProgressSnapshot.objects.filter(
+        progress_factor = 1.0 - (OnboardingLatestSnapshot.objects.filter(
             department=department
-        ).order_by('user', '-snapshot_date').distinct('user').aggregate(
+        ).aggregate(
             avg=Avg('completion_percentage')
         )['avg'] or 0.0) / 100.0
 
@@ -317,6 +466,353 @@ class OnboardingRiskAnalyzerService:
             # Анализ риска недостаточного усвоения информации
             cls._analyze_knowledge_retention_risk(assignment)
 
+    @classmethod
+    def analyze_user_risks_batch(cls, user=None, department=None, all_users=False,
+                                 batch_size=RISK_BATCH_SIZE, assignment_ids=None):
+        """
+        Пакетный вариант analyze_user_risks.
+
+        Для каждой пачки назначений все входные данные загружаются
+        несколькими сгруппированными запросами в DataFrame, четыре модели
+        риска считаются колоночными операциями, а прогнозы записываются
+        пачкой: прогноз того же типа, созданный сегодня, обновляется,
+        иначе создается новый. assignment_ids ограничивает анализ
+        заданными назначениями.
+
+        Возвращает статистику выполнения с временем по этапам.
+        """
+        stats = {
+            'assignments': 0,
+            'predictions_created': 0,
+            'predictions_updated': 0,
+            'timings': {'load': 0.0, 'score': 0.0, 'write': 0.0},
+        }
+
+        queryset = UserOnboardingAssignment.objects.filter(
+            status=UserOnboardingAssignment.AssignmentStatus.ACTIVE
+        )
+
+        if user and not all_users:
+            queryset = queryset.filter(user=user)
+        elif department and not all_users:
+            queryset = queryset.filter(user__department=department)
+
+        if assignment_ids is not None:
+            queryset = queryset.filter(id__in=assignment_ids)
+
+        assignments = list(queryset.order_by('id').values(
+            'id', 'user_id', 'program_id', 'user__department_id'))
+
+        for offset in range(0, len(assignments), batch_size):
+            batch = assignments[offset:offset + batch_size]
+            now = timezone.now()
+
+            started = time.perf_counter()
+            frame = cls._load_risk_frame(batch, now)
+            loaded = time.perf_counter()
+            scores = cls._score_risk_frame(frame, now)
+            scored = time.perf_counter()
+            created, updated = cls._write_risk_predictions(frame, scores, now)
+            written = time.perf_counter()
+
+            stats['assignments'] += len(batch)
+            stats['predictions_created'] += created
+            stats['predictions_updated'] += updated
+            stats['timings']['load'] += loaded - started
+            stats['timings']['score'] += scored - loaded
+            stats['timings']['write'] += written - scored
+
+        return stats
+
+    @staticmethod
+    def _load_risk_frame(batch, now):
+        """
+        Загружает входные данные всех моделей риска для пачки назначений
+        в один DataFrame, индексированный по id назначения
+        """
+        done = UserStepProgress.ProgressStatus.DONE
+        not_started = UserStepProgress.ProgressStatus.NOT_STARTED
+        assignment_ids = [row['id'] for row in batch]
+
+        frame = pd.DataFrame.from_records(batch, index='id').rename(
+            columns={'user__department_id': 'department_id'})
+
+        # Агрегаты по шагам: базовые метрики прогресса (если нет снимка),
+        # шаги с приближающимся дедлайном, история задержек и обучение
+        step_rows = UserStepProgress.objects.filter(
+            step__program__assignments__id__in=assignment_ids,
+            step__program__assignments__user_id=F('user_id'),
+        ).values('step__program__assignments__id').annotate(
+            step_steps_total=Count('id'),
+            step_steps_overdue=Count('id', filter=Q(
+                planned_date_end__lt=now) & ~Q(status=done)),
+            step_last_activity_time=Max(
+                Coalesce('actual_completed_at', 'completed_at'),
+                filter=~Q(status=not_started)
+            ),
+            steps_done=Count('id', filter=Q(status=done)),
+            # Дедлайн через 1-3 полных дня (как Extract(day) в _analyze_delay_risk)
+            soon_due_steps=Count('id', filter=Q(
+                status=not_started,
+                planned_date_end__gte=now + datetime.timedelta(days=1),
+                planned_date_end__lt=now + datetime.timedelta(days=4)
+            )),
+            timed_steps=Count('id', filter=Q(
+                status=done,
+                actual_completed_at__isnull=False,
+                planned_date_start__isnull=False,
+                planned_date_end__isnull=False
+            )),
+            delayed_steps=Count('id', filter=Q(
+                status=done,
+                planned_date_start__isnull=False,
+                actual_completed_at__gt=F('planned_date_end')
+            )),
+            training_steps=Count('id', filter=Q(
+                status=done,
+                step__step_type=OnboardingStep.StepType.TRAINING,
+                actual_completed_at__isnull=False,
+                planned_date_start__isnull=False
+            )),
+            fast_training_steps=Count('id', filter=Q(
+                status=done,
+                step__step_type=OnboardingStep.StepType.TRAINING,
+                actual_completed_at__lt=F(
+                    'planned_date_start') + datetime.timedelta(hours=1)
+            )),
+        ).order_by()
+        steps = pd.DataFrame.from_records(
+            list(step_rows), index='step__program__assignments__id',
+            columns=['step__program__assignments__id', 'step_steps_total',
+                     'step_steps_overdue', 'step_last_activity_time',
+                     'steps_done', 'soon_due_steps', 'timed_steps',
+                     'delayed_steps', 'training_steps', 'fast_training_steps'])
+
+        # История снимков: первый, последний и их количество
+        snapshot_rows = OnboardingProgressSnapshot.objects.filter(
+            assignment_id__in=assignment_ids
+        ).order_by('assignment_id', 'snapshot_date').values_list(
+            'assignment_id', 'snapshot_date', 'completion_percentage',
+            'steps_total', 'steps_overdue', 'last_activity_time')
+        snapshots = pd.DataFrame.from_records(
+            list(snapshot_rows),
+            columns=['assignment_id', 'snapshot_date', 'completion_percentage',
+                     'steps_total', 'steps_overdue', 'last_activity_time'])
+        first_snapshots = snapshots.drop_duplicates(
+            'assignment_id', keep='first').set_index('assignment_id')
+        last_snapshots = snapshots.drop_duplicates(
+            'assignment_id', keep='last').set_index('assignment_id')
+
+        # Счетчики аномалий
+        anomaly_rows = OnboardingAnomaly.objects.filter(
+            assignment_id__in=assignment_ids
+        ).values('assignment_id').annotate(
+            open_anomalies=Count('id', filter=Q(resolved=False)),
+            open_engagement_anomalies=Count('id', filter=Q(
+                resolved=False,
+                anomaly_type__in=[
+                    OnboardingAnomaly.AnomalyType.SKIPPED_FEEDBACK,
+                    OnboardingAnomaly.AnomalyType.UNUSUAL_ACTIVITY
+                ]
+            )),
+            test_failure_anomalies=Count('id', filter=Q(
+                anomaly_type=OnboardingAnomaly.AnomalyType.TEST_FAILURES)),
+        ).order_by()
+        anomalies = pd.DataFrame.from_records(
+            list(anomaly_rows), index='assignment_id',
+            columns=['assignment_id', 'open_anomalies',
+                     'open_engagement_anomalies', 'test_failure_anomalies'])
+
+        frame = frame.join(steps).join(anomalies)
+        counters = [
+            'step_steps_total', 'step_steps_overdue', 'steps_done',
+            'soon_due_steps', 'timed_steps', 'delayed_steps', 'training_steps',
+            'fast_training_steps', 'open_anomalies', 'open_engagement_anomalies',
+            'test_failure_anomalies',
+        ]
+        frame[counters] = frame[counters].fillna(0)
+
+        # Фидбек по назначению (модель может отсутствовать в текущей схеме)
+        frame['feedbacks'] = np.nan
+        feedback_model = _get_optional_model('feedback', 'OnboardingFeedback')
+        if feedback_model is not None:
+            feedback_counts = dict(feedback_model.objects.filter(
+                assignment_id__in=assignment_ids,
+                user_id=F('assignment__user_id')
+            ).values('assignment_id').annotate(
+                count=Count('id')
+            ).order_by().values_list('assignment_id', 'count'))
+            frame['feedbacks'] = [
+                feedback_counts.get(assignment_id, 0) for assignment_id in frame.index]
+
+        # Данные о прогрессе: последний снимок, а если его нет - агрегаты по шагам
+        frame['snapshots_count'] = snapshots['assignment_id'].value_counts().reindex(
+            frame.index).fillna(0)
+        has_snapshot = frame['snapshots_count'] > 0
+        for column in ('steps_total', 'steps_overdue', 'last_activity_time'):
+            frame[column] = last_snapshots[column].reindex(frame.index).where(
+                has_snapshot, frame['step_' + column])
+        frame['first_snapshot_date'] = first_snapshots['snapshot_date'].reindex(
+            frame.index)
+        frame['first_snapshot_percentage'] = first_snapshots[
+            'completion_percentage'].reindex(frame.index)
+        frame['last_snapshot_date'] = last_snapshots['snapshot_date'].reindex(
+            frame.index)
+        frame['last_snapshot_percentage'] = last_snapshots[
+            'completion_percentage'].reindex(frame.index)
+
+        for column in ('last_activity_time', 'first_snapshot_date', 'last_snapshot_date'):
+            frame[column] = pd.to_datetime(frame[column], utc=True)
+        frame[['steps_total', 'steps_overdue']] = frame[
+            ['steps_total', 'steps_overdue']].fillna(0)
+
+        return frame
+
+    @staticmethod
+    def _score_risk_frame(frame, now):
+        """
+        Рассчитывает четыре модели риска колоночными операциями.
+
+        Для каждого типа риска возвращает пару (базовый уровень, DataFrame
+        факторов), где колонки идут в порядке добавления факторов в
+        _analyze_*_risk, а NaN означает, что фактор не сработал.
+        """
+        now = pd.Timestamp(now)
+        total = frame['steps_total'].clip(lower=1)
+        overdue_ratio = frame['steps_overdue'] / total
+
+        days_inactive = (now - frame['last_activity_time']).dt.days
+        no_activity = frame['last_activity_time'].isna()
+
+        has_history = frame['snapshots_count'] >= 2
+        days_diff = (frame['last_snapshot_date'] -
+                     frame['first_snapshot_date']).dt.days
+        progress_diff = frame['last_snapshot_percentage'] - \
+            frame['first_snapshot_percentage']
+        progress_rate = progress_diff / days_diff.where(has_history & (days_diff > 0))
+
+        no_activity_factor = pd.Series(0.3, index=frame.index).where(no_activity)
+
+        completion = pd.DataFrame({
+            'overdue_steps': (overdue_ratio * 0.5).clip(upper=0.5).where(overdue_ratio > 0),
+            'slow_progress': ((1.5 - progress_rate) / 1.5 * 0.3).clip(lower=0).where(
+                progress_rate < 1.5),
+            'inactivity': (days_inactive / 10 * 0.3).clip(upper=0.3).where(days_inactive > 3),
+            'no_activity': no_activity_factor,
+            'anomalies': (frame['open_anomalies'] * 0.1).clip(upper=0.3).where(
+                frame['open_anomalies'] > 0),
+        })
+
+        delay_ratio = frame['delayed_steps'] / \
+            frame['timed_steps'].where(frame['timed_steps'] > 0)
+        delay = pd.DataFrame({
+            'overdue_steps': (overdue_ratio * 0.4).clip(upper=0.4).where(overdue_ratio > 0),
+            'soon_due_steps': (frame['soon_due_steps'] * 0.1).clip(upper=0.3).where(
+                frame['soon_due_steps'] > 0),
+            'delay_history': (delay_ratio * 0.4).clip(upper=0.4).where(delay_ratio > 0.3),
+        })
+
+        missed_feedback_ratio = 1 - frame['feedbacks'] / \
+            frame['steps_done'].where(frame['steps_done'] > 0)
+        engagement = pd.DataFrame({
+            'inactivity': (days_inactive / 7 * 0.3).clip(upper=0.3).where(days_inactive > 2),
+            'no_activity': no_activity_factor,
+            'missed_feedback': (missed_feedback_ratio * 0.3).clip(upper=0.3).where(
+                missed_feedback_ratio > 0.3),
+            'engagement_anomalies': (frame['open_engagement_anomalies'] * 0.1).clip(
+                upper=0.3).where(frame['open_engagement_anomalies'] > 0),
+        })
+
+        knowledge = pd.DataFrame({
+            'fast_training_completion': (
+                frame['fast_training_steps'] / frame['training_steps'].clip(lower=1) * 0.3
+            ).clip(upper=0.3).where(frame['fast_training_steps'] > 0),
+            'test_failures': (frame['test_failure_anomalies'] * 0.15).clip(upper=0.3).where(
+                frame['test_failure_anomalies'] > 0),
+            'fast_progress_rate': ((progress_rate - 15) / 15 * 0.3).clip(upper=0.3).where(
+                (progress_diff > 0) & (progress_rate > 15)),
+        })
+
+        return {
+            OnboardingRiskPrediction.RiskType.COMPLETION_RISK: (0.1, completion),
+            OnboardingRiskPrediction.RiskType.DELAY_RISK: (0.05, delay),
+            OnboardingRiskPrediction.RiskType.ENGAGEMENT_RISK: (0.05, engagement),
+            OnboardingRiskPrediction.RiskType.KNOWLEDGE_RETENTION_RISK: (0.05, knowledge),
+        }
+
+    @classmethod
+    def _write_risk_predictions(cls, frame, scores, now):
+        """
+        Записывает прогнозы пачкой: сегодняшний прогноз того же типа для
+        назначения обновляется, остальные создаются через bulk_create
+        """
+        recommendation_generators = {
+            OnboardingRiskPrediction.RiskType.COMPLETION_RISK:
+                cls._generate_completion_risk_recommendation,
+            OnboardingRiskPrediction.RiskType.DELAY_RISK:
+                cls._generate_delay_risk_recommendation,
+            OnboardingRiskPrediction.RiskType.ENGAGEMENT_RISK:
+                cls._generate_engagement_risk_recommendation,
+            OnboardingRiskPrediction.RiskType.KNOWLEDGE_RETENTION_RISK:
+                cls._generate_knowledge_retention_recommendation,
+        }
+
+        day_start = timezone.localtime(now).replace(
+            hour=0, minute=0, second=0, microsecond=0)
+        existing = dict(
+            ((assignment_id, str(risk_type)), prediction_id)
+            for prediction_id, assignment_id, risk_type in OnboardingRiskPrediction.objects.filter(
+                assignment_id__in=frame.index.tolist(),
+                created_at__gte=day_start
+            ).order_by('created_at').values_list('id', 'assignment_id', 'risk_type')
+        )
+
+        to_create = []
+        to_update = []
+        for risk_type, (base_risk, factors) in scores.items():
+            # Факторы складываются по порядку, как в _analyze_*_risk
+            probabilities = pd.Series(base_risk, index=factors.index)
+            for column in factors.columns:
+                probabilities = probabilities + factors[column].fillna(0.0)
+            probabilities = probabilities.clip(upper=1.0)
+            records = factors.to_dict('index')
+
+            for assignment_id, probability in probabilities.items():
+                risk_factors = [
+                    (name, value) for name, value in records[assignment_id].items()
+                    if not pd.isna(value)
+                ]
+                probability = float(probability)
+                row = frame.loc[assignment_id]
+                prediction = OnboardingRiskPrediction(
+                    id=existing.get((int(assignment_id), risk_type.value)),
+                    user_id=int(row['user_id']),
+                    assignment_id=int(assignment_id),
+                    department_id=None if pd.isna(
+                        row['department_id']) else int(row['department_id']),
+                    risk_type=risk_type,
+                    severity=cls._determine_risk_severity(probability),
+                    probability=probability,
+                    factors={name: float(value) for name, value in risk_factors},
+                    estimated_impact=RISK_ESTIMATED_IMPACTS[risk_type],
+                    recommendation=recommendation_generators[risk_type](
+                        risk_factors, None),
+                    created_at=now
+                )
+                if prediction.id:
+                    to_update.append(prediction)
+                else:
+                    to_create.append(prediction)
+
+        with transaction.atomic():
+            OnboardingRiskPrediction.objects.bulk_create(to_create)
+            OnboardingRiskPrediction.objects.bulk_update(to_update, [
+                'department', 'severity', 'probability', 'factors',
+                'estimated_impact', 'recommendation', 'created_at'
+            ])
+
+        return len(to_create), len(to_update)
+
     @classmethod
     def _analyze_completion_risk(cls, assignment):
         """
@@ -402,8 +898,8 @@ class OnboardingRiskAnalyzerService:
             probability=probability,
             factors={factor_name: float(factor_value)
                      for factor_name, factor_value in risk_factors},
-            estimated_impact="Риск незавершения онбординга может привести к снижению эффективности сотрудника "
-            "и увеличить вероятность его скорого ухода из компании.",
+            estimated_impact=RISK_ESTIMATED_IMPACTS[
+                OnboardingRiskPrediction.RiskType.COMPLETION_RISK],
             recommendation=cls._generate_completion_risk_recommendation(
                 risk_factors, assignment)
         )
@@ -496,8 +992,8 @@ class OnboardingRiskAnalyzerService:
             probability=probability,
             factors={factor_name: float(factor_value)
                      for factor_name, factor_value in risk_factors},
-            estimated_impact="Задержки в онбординге могут привести к сдвигу сроков вхождения сотрудника в "
-            "полноценную работу и снизить эффективность команды.",
+            estimated_impact=RISK_ESTIMATED_IMPACTS[
+                OnboardingRiskPrediction.RiskType.DELAY_RISK],
             recommendation=cls._generate_delay_risk_recommendation(
                 risk_factors, assignment)
         )
@@ -582,8 +1078,8 @@ class OnboardingRiskAnalyzerService:
             probability=probability,
             factors={factor_name: float(factor_value)
                      for factor_name, factor_value in risk_factors},
-            estimated_impact="Низкая вовлеченность может привести к формальному прохождению онбординга без "
-            "усвоения важных знаний и навыков, что повлияет на дальнейшую работу.",
+            estimated_impact=RISK_ESTIMATED_IMPACTS[
+                OnboardingRiskPrediction.RiskType.ENGAGEMENT_RISK],
             recommendation=cls._generate_engagement_risk_recommendation(
                 risk_factors, assignment)
         )
@@ -680,8 +1176,8 @@ class OnboardingRiskAnalyzerService:
             probability=probability,
             factors={factor_name: float(factor_value)
                      for factor_name, factor_value in risk_factors},
-            estimated_impact="Недостаточное усвоение информации может привести к пробелам в знаниях и навыках, "
-            "что повлияет на качество работы и потребует дополнительного обучения в будущем.",
+            estimated_impact=RISK_ESTIMATED_IMPACTS[
+                OnboardingRiskPrediction.RiskType.KNOWLEDGE_RETENTION_RISK],
             recommendation=cls._generate_knowledge_retention_recommendation(
                 risk_factors, assignment)
         )
@@ -691,9 +1187,10 @@ class OnboardingRiskAnalyzerService:
         """
         Получает данные о прогрессе пользователя для анализа
         """
-        latest_snapshot = OnboardingProgressSnapshot.objects.filter(
+        latest_state = OnboardingLatestSnapshot.objects.filter(
             assignment=assignment
-        ).order_by('-snapshot_date').first()
+        ).select_related('snapshot').first()
+        latest_snapshot = latest_state.snapshot if latest_state else None
 
         if latest_snapshot:
             return {
@@ -920,6 +1417,385 @@ class AnomalyDetectionService:
             # Проверяем необычные паттерны активности
             cls._detect_unusual_activity_patterns(assignment)
 
+    @classmethod
+    def detect_anomalies_batch(cls, user=None, department=None, all_users=False,
+                               batch_size=ANOMALY_BATCH_SIZE, assignment_ids=None):
+        """
+        Пакетный вариант detect_anomalies.
+
+        Для пачки назначений входные данные всех детекторов загружаются
+        несколькими сгруппированными запросами, проверки выполняются над
+        массивами, а дубликаты отсекаются по заранее загруженному набору
+        ключей открытых аномалий. Результат совпадает с detect_anomalies.
+        Детекторы, чьи модели-источники не зарегистрированы в схеме,
+        пропускаются. assignment_ids ограничивает поиск заданными назначениями.
+
+        Возвращает статистику: количество назначений и созданных аномалий по типам.
+        """
+        stats = {
+            'assignments': 0,
+            'anomalies_created': 0,
+            'by_type': {anomaly_type: 0 for anomaly_type in OnboardingAnomaly.AnomalyType.values},
+        }
+
+        queryset = UserOnboardingAssignment.objects.filter(
+            status=UserOnboardingAssignment.AssignmentStatus.ACTIVE
+        )
+
+        if user and not all_users:
+            queryset = queryset.filter(user=user)
+        elif department and not all_users:
+            queryset = queryset.filter(user__department=department)
+
+        if assignment_ids is not None:
+            queryset = queryset.filter(id__in=assignment_ids)
+
+        assignments = list(queryset.order_by('id').values(
+            'id', 'user_id', 'program_id', 'user__department_id'))
+
+        detectors = [
+            cls._detect_slow_progress_batch,
+            cls._detect_skipped_feedback_batch,
+            cls._detect_test_failures_batch,
+            cls._detect_mentor_reassignments_batch,
+            cls._detect_unusual_activity_patterns_batch,
+        ]
+
+        for offset in range(0, len(assignments), batch_size):
+            batch = assignments[offset:offset + batch_size]
+            now = timezone.now()
+            open_keys = cls._load_open_anomaly_keys(batch)
+
+            found = {row['id']: [] for row in batch}
+            for detector in detectors:
+                for assignment_id, anomaly in detector(batch, open_keys, now):
+                    found[assignment_id].append(anomaly)
+
+            # Сохраняем порядок создания detect_anomalies: по назначениям, затем по детекторам
+            anomalies = []
+            for row in batch:
+                for anomaly in found[row['id']]:
+                    anomaly.user_id = row['user_id']
+                    anomaly.assignment_id = row['id']
+                    anomaly.department_id = row['user__department_id']
+                    anomaly.detected_at = now
+                    anomalies.append(anomaly)
+                    stats['by_type'][anomaly.anomaly_type] += 1
+
+            OnboardingAnomaly.objects.bulk_create(anomalies)
+            stats['assignments'] += len(batch)
+            stats['anomalies_created'] += len(anomalies)
+
+        return stats
+
+    @staticmethod
+    def _load_open_anomaly_keys(batch):
+        """
+        Загружает ключи нерешенных аномалий пачки одним запросом.
+
+        Ключ - (id назначения, тип, уточнение), где уточнение - id шага,
+        id теста, шаблон активности или None; значение - время последнего
+        выявления. Ключ без уточнения есть у любой аномалии.
+        """
+        open_keys = {}
+
+        def remember(key, detected_at):
+            if key not in open_keys or open_keys[key] < detected_at:
+                open_keys[key] = detected_at
+
+        for assignment_id, anomaly_type, step_id, details, detected_at in OnboardingAnomaly.objects.filter(
+            assignment_id__in=[row['id'] for row in batch],
+            resolved=False
+        ).values_list('assignment_id', 'anomaly_type', 'step_id', 'details', 'detected_at'):
+            remember((assignment_id, anomaly_type, None), detected_at)
+            if anomaly_type == OnboardingAnomaly.AnomalyType.SKIPPED_FEEDBACK:
+                remember((assignment_id, anomaly_type, step_id), detected_at)
+            elif isinstance(details, dict):
+                if anomaly_type == OnboardingAnomaly.AnomalyType.TEST_FAILURES and 'test_id' in details:
+                    remember((assignment_id, anomaly_type,
+                              ('test', details['test_id'])), detected_at)
+                elif anomaly_type == OnboardingAnomaly.AnomalyType.UNUSUAL_ACTIVITY and 'pattern' in details:
+                    remember((assignment_id, anomaly_type,
+                              ('pattern', details['pattern'])), detected_at)
+
+        return open_keys
+
+    @staticmethod
+    def _has_open_anomaly(open_keys, key, since=None):
+        """
+        Проверяет наличие нерешенной аномалии по ключу (не раньше since)
+        """
+        detected_at = open_keys.get(key)
+        return detected_at is not None and (since is None or detected_at >= since)
+
+    @classmethod
+    def _detect_slow_progress_batch(cls, batch, open_keys, now):
+        """
+        Пакетная версия _detect_slow_progress по двум последним снимкам
+        """
+        anomaly_type = OnboardingAnomaly.AnomalyType.SLOW_PROGRESS
+        rows = OnboardingProgressSnapshot.objects.filter(
+            assignment_id__in=[row['id'] for row in batch]
+        ).annotate(
+            position=Window(
+                expression=RowNumber(),
+                partition_by=[F('assignment_id')],
+                order_by=F('snapshot_date').desc()
+            )
+        ).filter(position__lte=2).order_by('assignment_id', 'position').values_list(
+            'assignment_id', 'snapshot_date', 'completion_percentage')
+
+        latest = {}
+        previous = {}
+        for assignment_id, snapshot_date, percentage in rows:
+            target = previous if assignment_id in latest else latest
+            target[assignment_id] = (snapshot_date, percentage)
+
+        assignment_ids = [row['id'] for row in batch if row['id'] in previous]
+        if not assignment_ids:
+            return
+
+        latest_dates = np.array([latest[a][0] for a in assignment_ids])
+        previous_dates = np.array([previous[a][0] for a in assignment_ids])
+        latest_percentages = np.array([latest[a][1] for a in assignment_ids])
+        previous_percentages = np.array([previous[a][1] for a in assignment_ids])
+
+        time_diffs = latest_dates - previous_dates
+        days_diffs = np.array([diff.days for diff in time_diffs])
+        eligible = np.array(
+            [diff >= datetime.timedelta(days=2) for diff in time_diffs], dtype=bool)
+        progress_diffs = latest_percentages - previous_percentages
+        weekly_rates = np.divide(
+            progress_diffs, days_diffs,
+            out=np.zeros(len(assignment_ids)), where=eligible) * 7
+        slow = eligible & (weekly_rates < 5) & (latest_percentages < 90)
+
+        since = now - datetime.timedelta(days=7)
+        for index in np.flatnonzero(slow):
+            assignment_id = assignment_ids[index]
+            if cls._has_open_anomaly(open_keys, (assignment_id, anomaly_type, None), since):
+                continue
+
+            weekly_progress_rate = float(weekly_rates[index])
+            yield assignment_id, OnboardingAnomaly(
+                anomaly_type=anomaly_type,
+                description=f"Медленный прогресс онбординга: {weekly_progress_rate:.1f}% в неделю",
+                details={
+                    'current_percentage': float(latest_percentages[index]),
+                    'previous_percentage': float(previous_percentages[index]),
+                    'weekly_progress_rate': weekly_progress_rate,
+                    'time_diff_days': int(days_diffs[index])
+                }
+            )
+
+    @classmethod
+    def _detect_skipped_feedback_batch(cls, batch, open_keys, now):
+        """
+        Пакетная версия _detect_skipped_feedback: наличие фидбека проверяется
+        по набору ключей (назначение, шаг), загруженному одним запросом
+        """
+        feedback_model = _get_optional_model('feedback', 'OnboardingFeedback')
+        if feedback_model is None:
+            return
+
+        anomaly_type = OnboardingAnomaly.AnomalyType.SKIPPED_FEEDBACK
+        assignment_ids = [row['id'] for row in batch]
+
+        feedback_keys = set(feedback_model.objects.filter(
+            assignment_id__in=assignment_ids,
+            user_id=F('assignment__user_id')
+        ).values_list('assignment_id', 'step_id'))
+
+        completed_steps = UserStepProgress.objects.filter(
+            step__program__assignments__id__in=assignment_ids,
+            step__program__assignments__user_id=F('user_id'),
+            status=UserStepProgress.ProgressStatus.DONE,
+            completed_at__isnull=False
+        ).values_list(
+            'step__program__assignments__id', 'id', 'step_id', 'step__name',
+            'completed_at'
+        ).order_by('step__program__assignments__id', 'step__order')
+
+        for assignment_id, progress_id, step_id, step_name, completed_at in completed_steps:
+            if (assignment_id, step_id) in feedback_keys:
+                continue
+
+            days_since_completion = (now - completed_at).days
+            if days_since_completion <= 2:
+                continue
+            if cls._has_open_anomaly(open_keys, (assignment_id, anomaly_type, progress_id)):
+                continue
+
+            yield assignment_id, OnboardingAnomaly(
+                anomaly_type=anomaly_type,
+                step_id=progress_id,
+                description=f"Пропущен фидбек по шагу: {step_name}",
+                details={
+                    'step_name': step_name,
+                    'completed_at': completed_at.isoformat(),
+                    'days_since_completion': days_since_completion
+                }
+            )
+
+    @classmethod
+    def _detect_test_failures_batch(cls, batch, open_keys, now):
+        """
+        Пакетная версия _detect_test_failures по сгруппированным провалам тестов
+        """
+        activity_model = _get_optional_model('gamification', 'UserActivity')
+        if activity_model is None:
+            return
+
+        anomaly_type = OnboardingAnomaly.AnomalyType.TEST_FAILURES
+        user_ids = {row['user_id'] for row in batch}
+
+        failures = activity_model.objects.filter(
+            user_id__in=user_ids,
+            activity_type='test_failed',
+            created_at__gte=now - datetime.timedelta(days=30)
+        ).values('user_id', 'metadata__test_id').annotate(
+            failure_count=Count('id')
+        ).filter(failure_count__gt=1).order_by()
+
+        failures_by_user = {}
+        for failure in failures:
+            failures_by_user.setdefault(failure['user_id'], []).append(
+                (failure['metadata__test_id'], failure['failure_count']))
+        if not failures_by_user:
+            return
+
+        # Последняя попытка по каждому тесту (за все время, как в _detect_test_failures)
+        last_attempts = {}
+        for user_id, metadata, created_at in activity_model.objects.filter(
+            user_id__in=failures_by_user.keys(),
+            activity_type='test_failed'
+        ).order_by('-created_at').values_list('user_id', 'metadata', 'created_at'):
+            test_id = metadata.get('test_id') if isinstance(metadata, dict) else None
+            last_attempts.setdefault((user_id, test_id), (metadata, created_at))
+
+        for row in batch:
+            for test_id, failure_count in failures_by_user.get(row['user_id'], []):
+                if cls._has_open_anomaly(open_keys, (row['id'], anomaly_type, ('test', test_id))):
+                    continue
+
+                metadata, last_failure = last_attempts[(row['user_id'], test_id)]
+                test_name = metadata.get('test_name', 'Неизвестный тест')
+                yield row['id'], OnboardingAnomaly(
+                    anomaly_type=anomaly_type,
+                    description=f"Повторные неудачи в тесте: {test_name} ({failure_count} провалов)",
+                    details={
+                        'test_id': test_id,
+                        'test_name': test_name,
+                        'failure_count': failure_count,
+                        'last_failure_date': last_failure.isoformat()
+                    }
+                )
+
+    @classmethod
+    def _detect_mentor_reassignments_batch(cls, batch, open_keys, now):
+        """
+        Пакетная версия _detect_mentor_reassignments
+        """
+        activity_log_model = _get_optional_model('core', 'ActivityLog')
+        if activity_log_model is None:
+            return
+
+        anomaly_type = OnboardingAnomaly.AnomalyType.MENTOR_REASSIGNMENTS
+        mentor_changes = dict(activity_log_model.objects.filter(
+            action_type='mentor_changed',
+            target_user_id__in={row['user_id'] for row in batch},
+            created_at__gte=now - datetime.timedelta(days=30)
+        ).values('target_user_id').annotate(
+            count=Count('id')
+        ).order_by().values_list('target_user_id', 'count'))
+
+        since = now - datetime.timedelta(days=15)
+        for row in batch:
+            changes_count = mentor_changes.get(row['user_id'], 0)
+            if changes_count <= 2:
+                continue
+            if cls._has_open_anomaly(open_keys, (row['id'], anomaly_type, None), since):
+                continue
+
+            yield row['id'], OnboardingAnomaly(
+                anomaly_type=anomaly_type,
+                description=f"Частые смены ментора: {changes_count} раз за 30 дней",
+                details={
+                    'changes_count': changes_count,
+                    'period_days': 30
+                }
+            )
+
+    @classmethod
+    def _detect_unusual_activity_patterns_batch(cls, batch, open_keys, now):
+        """
+        Пакетная версия _detect_unusual_activity_patterns по почасовым
+        гистограммам активности всех пользователей пачки
+        """
+        activity_log_model = _get_optional_model('core', 'UserActivityLog')
+        if activity_log_model is None:
+            return
+
+        anomaly_type = OnboardingAnomaly.AnomalyType.UNUSUAL_ACTIVITY
+        user_ids = sorted({row['user_id'] for row in batch})
+        user_positions = {user_id: position for position,
+                          user_id in enumerate(user_ids)}
+
+        hour_counts = np.zeros((len(user_ids), 24), dtype=np.int64)
+        for user_id, hour, count in activity_log_model.objects.filter(
+            user_id__in=user_ids,
+            created_at__gte=now - datetime.timedelta(days=14)
+        ).annotate(
+            hour=Extract('created_at', 'hour')
+        ).values('user_id', 'hour').annotate(
+            count=Count('id')
+        ).order_by().values_list('user_id', 'hour', 'count'):
+            hour_counts[user_positions[user_id], hour] = count
+
+        totals = hour_counts.sum(axis=1)
+        night_hours = [23, 0, 1, 2, 3, 4, 5]
+        night_activity = hour_counts[:, night_hours].sum(axis=1)
+        night_percentages = np.divide(
+            night_activity, totals,
+            out=np.zeros(len(user_ids)), where=totals > 0) * 100
+
+        since = now - datetime.timedelta(days=7)
+        for row in batch:
+            position = user_positions[row['user_id']]
+            total = int(totals[position])
+
+            if total < 5:
+                if cls._has_open_anomaly(open_keys, (row['id'], anomaly_type, None), since):
+                    continue
+
+                yield row['id'], OnboardingAnomaly(
+                    anomaly_type=anomaly_type,
+                    description="Необычно низкая активность в системе",
+                    details={
+                        'activity_count': total,
+                        'period_days': 14,
+                        'pattern': 'low_activity'
+                    }
+                )
+                continue
+
+            night_activity_percentage = float(night_percentages[position])
+            if night_activity_percentage <= 30:
+                continue
+            if cls._has_open_anomaly(
+                    open_keys, (row['id'], anomaly_type, ('pattern', 'night_activity')), since):
+                continue
+
+            yield row['id'], OnboardingAnomaly(
+                anomaly_type=anomaly_type,
+                description=f"Необычно высокая ночная активность ({night_activity_percentage:.1f}%)",
+                details={
+                    'night_activity_percentage': night_activity_percentage,
+                    'period_days': 14,
+                    'pattern': 'night_activity'
+                }
+            )
+
     @staticmethod
     def _detect_slow_progress(assignment):
         """
@@ -1206,3 +2082,433 @@ class AnomalyDetectionService:
                         'pattern': 'night_activity'
                     }
                 )
+
+
+class IncrementalIntelligenceService:
+    """
+    Сервис инкрементального пересчета: снимки, риски и аномалии
+    рассчитываются только для назначений, изменившихся с прошлого запуска
+    """
+    SNAPSHOTS_JOB = 'snapshots'
+    RISKS_JOB = 'risks'
+    ANOMALIES_JOB = 'anomalies'
+
+    @classmethod
+    def run(cls):
+        """
+        Последовательно выполняет инкрементальные задания снимков, рисков
+        и аномалий. Возвращает статистику по каждому заданию
+        """
+        stats = {
+            cls.SNAPSHOTS_JOB: cls.update_snapshots(),
+            cls.RISKS_JOB: cls.update_risks(),
+            cls.ANOMALIES_JOB: cls.update_anomalies(),
+        }
+        IntelligenceDashboardService.rebuild()
+        return stats
+
+    @classmethod
+    def update_snapshots(cls):
+        """
+        Создает снимки для измененных назначений и для назначений,
+        у которых с прошлого запуска истек срок какого-либо шага
+        """
+        def process(assignment_ids):
+            return {
+                'snapshots_created': OnboardingProgressAggregatorService.generate_user_snapshots_bulk(
+                    all_users=True, assignment_ids=assignment_ids)
+            }
+
+        return cls._run_job(cls.SNAPSHOTS_JOB, process)
+
+    @classmethod
+    def update_risks(cls):
+        """
+        Пересчитывает риски назначений, изменившихся или получивших
+        новый снимок с прошлого запуска
+        """
+        def process(assignment_ids):
+            return OnboardingRiskAnalyzerService.analyze_user_risks_batch(
+                all_users=True, assignment_ids=assignment_ids)
+
+        return cls._run_job(cls.RISKS_JOB, process, include_new_snapshots=True)
+
+    @classmethod
+    def update_anomalies(cls):
+        """
+        Ищет аномалии у назначений, изменившихся или получивших
+        новый снимок с прошлого запуска
+        """
+        def process(assignment_ids):
+            return AnomalyDetectionService.detect_anomalies_batch(
+                all_users=True, assignment_ids=assignment_ids)
+
+        return cls._run_job(cls.ANOMALIES_JOB, process, include_new_snapshots=True)
+
+    @classmethod
+    def get_changed_assignment_ids(cls, since, until, include_new_snapshots=False):
+        """
+        Возвращает id активных назначений, затронутых изменениями в
+        интервале (since, until]. Если since не задан, возвращает None
+        (полный пересчет)
+        """
+        if since is None:
+            return None
+
+        # Назначения, отмеченные сигналами UserStepProgress
+        changed = set(OnboardingAssignmentChange.objects.filter(
+            changed_at__gt=since,
+            assignment__status=UserOnboardingAssignment.AssignmentStatus.ACTIVE
+        ).values_list('assignment_id', flat=True))
+
+        # Переход через дедлайн: шаг стал просроченным без сохранения
+        changed.update(UserStepProgress.objects.filter(
+            planned_date_end__gt=since,
+            planned_date_end__lte=until,
+            step__program__assignments__user_id=F('user_id'),
+            step__program__assignments__status=UserOnboardingAssignment.AssignmentStatus.ACTIVE
+        ).exclude(
+            status=UserStepProgress.ProgressStatus.DONE
+        ).values_list('step__program__assignments__id', flat=True).distinct())
+
+        if include_new_snapshots:
+            changed.update(OnboardingProgressSnapshot.objects.filter(
+                snapshot_date__gt=since
+            ).values_list('assignment_id', flat=True).distinct())
+
+        return sorted(changed)
+
+    @classmethod
+    def _run_job(cls, job, process, include_new_snapshots=False):
+        """
+        Выполняет задание для изменившихся назначений и сдвигает его отметку.
+        Изменения читаются с перекрытием INTELLIGENCE_WATERMARK_OVERLAP секунд
+        до отметки: changed_at ставится до фиксации транзакции, и изменение,
+        зафиксированное после прошлого чтения, иначе было бы пропущено.
+        Повторная обработка назначений безопасна
+        """
+        now = timezone.now()
+        watermark = IntelligenceJobWatermark.objects.filter(job=job).first()
+        since = None
+        if watermark:
+            since = watermark.processed_until - datetime.timedelta(
+                seconds=getattr(settings, 'INTELLIGENCE_WATERMARK_OVERLAP', 300))
+
+        assignment_ids = cls.get_changed_assignment_ids(
+            since, now, include_new_snapshots=include_new_snapshots)
+
+        stats = {'full_run': assignment_ids is None}
+        if assignment_ids is None or assignment_ids:
+            stats.update(process(assignment_ids))
+        stats['assignments_changed'] = None if assignment_ids is None else len(
+            assignment_ids)
+
+        IntelligenceJobWatermark.objects.update_or_create(
+            job=job, defaults={'processed_until': now})
+
+        return stats
+
+
+class IntelligenceDashboardService:
+    """
+    Сервис предрасчитанных данных общего дашборда онбординга.
+
+    Данные хранятся в IntelligenceDashboardPayload и пересобираются после
+    заданий снимков, рисков и аномалий. Перед таблицей стоит кэш Django
+    (INTELLIGENCE_DASHBOARD_CACHE: по умолчанию локальная память, либо
+    Redis), а актуальность кэша проверяется по ETag из таблицы, поэтому
+    пересборка в одном процессе видна всем остальным.
+    """
+    PAYLOAD_KEY = 'overview'
+    # Дата сборки устаревших данных: такие данные отдаются, пока один из
+    # запросов пересобирает их
+    STALE_BUILT_AT = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+    @classmethod
+    def get_etag(cls):
+        """
+        Возвращает ETag актуальных данных, при необходимости пересобирая их.
+        Устаревшие данные пересобирает только запрос, захвативший строку
+        сменой built_at; остальные запросы получают прежний ETag
+        """
+        current = IntelligenceDashboardPayload.objects.filter(
+            key=cls.PAYLOAD_KEY
+        ).values_list('etag', 'built_at').first()
+        if current is None:
+            return cls.rebuild().etag
+
+        etag, built_at = current
+        now = timezone.now()
+        if built_at >= now - datetime.timedelta(seconds=cls._max_age()):
+            return etag
+
+        claimed = IntelligenceDashboardPayload.objects.filter(
+            key=cls.PAYLOAD_KEY, built_at=built_at
+        ).update(built_at=now)
+        if not claimed:
+            return etag
+        try:
+            return cls.rebuild().etag
+        except Exception:
+            IntelligenceDashboardPayload.objects.filter(
+                key=cls.PAYLOAD_KEY, built_at=now
+            ).update(built_at=built_at)
+            raise
+
+    @classmethod
+    def get_payload(cls, etag=None):
+        """
+        Возвращает пару (ETag, данные дашборда)
+
+        Args:
+            etag: ETag, уже полученный через get_etag в этом запросе
+        """
+        if etag is None:
+            etag = cls.get_etag()
+        cached = cls._cache().get(cls._cache_key())
+        if cached is not None and cached[0] == etag:
+            return cached
+
+        current = IntelligenceDashboardPayload.objects.filter(
+            key=cls.PAYLOAD_KEY
+        ).values_list('etag', 'payload').first()
+        if current is None:
+            rebuilt = cls.rebuild()
+            return rebuilt.etag, rebuilt.payload
+
+        cls._cache().set(cls._cache_key(), current, cls._max_age())
+        return current
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Пересобирает данные дашборда и обновляет кэш
+        """
+        payload = json.loads(json.dumps(cls.build_payload(), cls=DjangoJSONEncoder))
+        etag = hashlib.sha1(
+            json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+        dashboard, _ = IntelligenceDashboardPayload.objects.update_or_create(
+            key=cls.PAYLOAD_KEY,
+            defaults={
+                'payload': payload,
+                'etag': etag,
+                'built_at': timezone.now(),
+            }
+        )
+        cls._cache().set(cls._cache_key(), (etag, payload), cls._max_age())
+        return dashboard
+
+    @classmethod
+    def invalidate(cls):
+        """
+        Помечает предрасчитанные данные устаревшими; следующий запрос
+        пересоберет их, параллельные запросы до этого получают прежние данные
+        """
+        IntelligenceDashboardPayload.objects.filter(
+            key=cls.PAYLOAD_KEY).update(built_at=cls.STALE_BUILT_AT)
+
+    @staticmethod
+    def build_payload():
+        """
+        Рассчитывает общую статистику по всем онбордингам
+        """
+        # Получаем данные по снимкам прогресса
+        current_date = timezone.now()
+        start_date = current_date - datetime.timedelta(days=30)
+
+        # Общие метрики
+        total_users = User.objects.all().count()
+        latest_states = OnboardingLatestSnapshot.objects.filter(
+            snapshot_date__gte=start_date)
+        active_onboardings = latest_states.aggregate(
+            count=Count('user', distinct=True))['count']
+
+        # Средний прогресс
+        avg_progress = latest_states.aggregate(
+            avg=Avg('completion_percentage')
+        )['avg'] or 0.0
+
+        # Риски и аномалии
+        high_risks = OnboardingRiskPrediction.objects.filter(
+            severity=OnboardingRiskPrediction.RiskSeverity.HIGH,
+            created_at__gte=start_date
+        ).count()
+
+        active_anomalies = OnboardingAnomaly.objects.filter(
+            resolved=False
+        ).count()
+
+        # Департаменты с самым высоким риском: последняя сводка каждого
+        # департамента выбирается подзапросом DISTINCT ON
+        latest_summaries = OnboardingDepartmentSummary.objects.filter(
+            summary_date__gte=start_date
+        ).order_by('department', '-summary_date').distinct('department').values('id')
+        departments_at_risk = OnboardingDepartmentSummary.objects.filter(
+            id__in=Subquery(latest_summaries)
+        ).order_by('-risk_factor')[:5]
+
+        departments_at_risk_data = OnboardingDepartmentSummarySerializer(
+            departments_at_risk, many=True).data
+
+        # Последние аномалии
+        recent_anomalies = OnboardingAnomaly.objects.filter(
+            resolved=False
+        ).order_by('-detected_at')[:10]
+
+        recent_anomalies_data = OnboardingAnomalySerializer(
+            recent_anomalies, many=True).data
+
+        # Распределение прогресса по департаментам
+        department_progress = latest_states.filter(
+            department__isnull=False
+        ).values('department__name').annotate(
+            completion_percentage=Avg('completion_percentage')
+        ).order_by('department__name')
+
+        # Типы рисков
+        risk_types = OnboardingRiskPrediction.objects.filter(
+            created_at__gte=start_date
+        ).values('risk_type').annotate(
+            count=Count('id')
+        ).order_by('-count')
+
+        # Типы аномалий
+        anomaly_types = OnboardingAnomaly.objects.filter(
+            detected_at__gte=start_date
+        ).values('anomaly_type').annotate(
+            count=Count('id')
+        ).order_by('-count')
+
+        # Строим объект с данными дашборда
+        return {
+            'summary': {
+                'total_users': total_users,
+                'active_onboardings': active_onboardings,
+                'avg_progress': avg_progress,
+                'high_risks': high_risks,
+                'active_anomalies': active_anomalies,
+            },
+            'departments_at_risk': departments_at_risk_data,
+            'recent_anomalies': recent_anomalies_data,
+            'department_progress': list(department_progress),
+            'risk_distribution': list(risk_types),
+            'anomaly_distribution': list(anomaly_types),
+        }
+
+    @staticmethod
+    def _cache():
+        return caches[getattr(settings, 'INTELLIGENCE_DASHBOARD_CACHE', 'default')]
+
+    @classmethod
+    def _cache_key(cls):
+        return f'onboarding_intelligence:dashboard:{cls.PAYLOAD_KEY}'
+
+    @staticmethod
+    def _max_age():
+        return getattr(settings, 'INTELLIGENCE_DASHBOARD_MAX_AGE', 3600)
+
+
+class ProgressSnapshotStateService:
+    """
+    Сервис поддержки таблицы последних снимков (OnboardingLatestSnapshot)
+    и политики хранения истории снимков прогресса
+    """
+
+    @staticmethod
+    def record_snapshots(snapshots):
+        """
+        Обновляет указатели на последний снимок для записанных снимков.
+        Новые указатели вставляются одним запросом, существующие обновляются
+        только более новыми (или равными по дате) снимками, поэтому поздно
+        записанный старый снимок не вытесняет актуальный
+        """
+        latest = {}
+        for snapshot in snapshots:
+            current = latest.get(snapshot.assignment_id)
+            if current is None or current.snapshot_date <= snapshot.snapshot_date:
+                latest[snapshot.assignment_id] = snapshot
+        if not latest:
+            return
+
+        fields = ['snapshot', 'user', 'department', 'completion_percentage', 'snapshot_date']
+        with transaction.atomic():
+            OnboardingLatestSnapshot.objects.bulk_create(
+                [
+                    OnboardingLatestSnapshot(
+                        assignment_id=snapshot.assignment_id,
+                        snapshot_id=snapshot.id,
+                        user_id=snapshot.user_id,
+                        department_id=snapshot.department_id,
+                        completion_percentage=snapshot.completion_percentage,
+                        snapshot_date=snapshot.snapshot_date
+                    )
+                    for snapshot in latest.values()
+                ],
+                ignore_conflicts=True
+            )
+
+            # Строки блокируются, чтобы параллельная запись не вернула
+            # указатель на более старый снимок
+            outdated = []
+            for state in OnboardingLatestSnapshot.objects.select_for_update().filter(
+                    assignment_id__in=list(latest)):
+                snapshot = latest[state.assignment_id]
+                if state.snapshot_id == snapshot.id or state.snapshot_date > snapshot.snapshot_date:
+                    continue
+                state.snapshot_id = snapshot.id
+                state.user_id = snapshot.user_id
+                state.department_id = snapshot.department_id
+                state.completion_percentage = snapshot.completion_percentage
+                state.snapshot_date = snapshot.snapshot_date
+                outdated.append(state)
+
+            OnboardingLatestSnapshot.objects.bulk_update(outdated, fields, batch_size=1000)
+
+    @staticmethod
+    def compact_history(older_than_days=SNAPSHOT_RETENTION_DAYS, dry_run=False, chunk_size=1000):
+        """
+        Прореживает историю снимков старше older_than_days дней до одного
+        (последнего) снимка в неделю на назначение.
+        Последний снимок назначения всегда остается последним в своей неделе
+        и не удаляется. История обрабатывается страницами по диапазонам id
+        назначений (по chunk_size назначений), поэтому в памяти находятся
+        только id одной страницы. Возвращает количество удаленных (или
+        подлежащих удалению при dry_run) снимков
+        """
+        cutoff = timezone.now() - datetime.timedelta(days=older_than_days)
+        old_snapshots = OnboardingProgressSnapshot.objects.filter(snapshot_date__lt=cutoff)
+
+        removed = 0
+        last_assignment_id = 0
+        while True:
+            # Граница страницы: id назначения с номером chunk_size после предыдущей
+            page = list(old_snapshots.filter(
+                assignment_id__gt=last_assignment_id
+            ).order_by('assignment_id').values_list(
+                'assignment_id', flat=True).distinct()[:chunk_size])
+            if not page:
+                break
+
+            # Окно считается только по назначениям страницы: снимки одного
+            # назначения всегда попадают в одну страницу
+            redundant_ids = list(old_snapshots.filter(
+                assignment_id__gt=last_assignment_id,
+                assignment_id__lte=page[-1]
+            ).annotate(
+                position=Window(
+                    expression=RowNumber(),
+                    partition_by=[F('assignment_id'), TruncWeek('snapshot_date')],
+                    order_by=[F('snapshot_date').desc(), F('id').desc()]
+                )
+            ).filter(position__gt=1).values_list('id', flat=True))
+
+            removed += len(redundant_ids)
+            if not dry_run:
+                for offset in range(0, len(redundant_ids), chunk_size):
+                    OnboardingProgressSnapshot.objects.filter(
+                        id__in=redundant_ids[offset:offset + chunk_size]
+                    ).delete()
+            last_assignment_id = page[-1]
+
+        return removed
@@ -0,0 +1,79 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from onboarding.models import UserOnboardingAssignment, UserStepProgress
+from .models import (
+    OnboardingAssignmentChange,
+    OnboardingAnomaly,
+    OnboardingProgressSnapshot
+)
+
+
+def mark_assignments_changed(assignment_ids):
+    """
+    Отмечает назначения как измененные одним upsert-запросом
+    """
+    now = timezone.now()
+    OnboardingAssignmentChange.objects.bulk_create(
+        [OnboardingAssignmentChange(assignment_id=assignment_id, changed_at=now)
+         for assignment_id in assignment_ids],
+        update_conflicts=True,
+        unique_fields=['assignment'],
+        update_fields=['changed_at']
+    )
+
+
+@receiver(post_save, sender=UserStepProgress)
+@receiver(post_delete, sender=UserStepProgress)
+def track_step_progress_change(sender, instance, **kwargs):
+    """
+    Сигнал для отметки назначения, к которому относится измененный шаг
+    """
+    # При каскадном удалении (пользователя, программы) назначение удаляется
+    # вместе с прогрессом, отмечать его не нужно
+    origin = kwargs.get('origin')
+    if origin is not None and getattr(origin, 'model', type(origin)) is not UserStepProgress:
+        return
+
+    assignment_ids = list(UserOnboardingAssignment.objects.filter(
+        user_id=instance.user_id,
+        program__steps__id=instance.step_id,
+        status=UserOnboardingAssignment.AssignmentStatus.ACTIVE
+    ).values_list('id', flat=True))
+
+    if assignment_ids:
+        mark_assignments_changed(assignment_ids)
+
+
+@receiver(post_save, sender=UserOnboardingAssignment)
+def track_assignment_change(sender, instance, **kwargs):
+    """
+    Сигнал для отметки нового или измененного назначения
+    """
+    mark_assignments_changed([instance.id])
+
+
+@receiver(post_save, sender=OnboardingAnomaly)
+@receiver(post_delete, sender=OnboardingAnomaly)
+def invalidate_dashboard_on_anomaly_change(sender, instance, **kwargs):
+    """
+    Сигнал для сброса предрасчитанных данных дашборда при изменении аномалии
+    (например, при ее разрешении через API)
+    """
+    from .services import IntelligenceDashboardService
+
+    IntelligenceDashboardService.invalidate()
+
+
+@receiver(post_save, sender=OnboardingProgressSnapshot)
+def track_latest_snapshot(sender, instance, created, **kwargs):
+    """
+    Сигнал для обновления указателя на последний снимок назначения
+    """
+    if not created:
+        return
+
+    from .services import ProgressSnapshotStateService
+
+    ProgressSnapshotStateService.record_snapshots([instance])
@@ -0,0 +1,498 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from departments.models import Department
+from onboarding.models import (
+    OnboardingProgram,
+    OnboardingStep,
+    UserOnboardingAssignment,
+    UserStepProgress
+)
+from users.models import User, UserRole
+
+from .models import (
+    IntelligenceDashboardPayload,
+    IntelligenceJobWatermark,
+    OnboardingAnomaly,
+    OnboardingAssignmentChange,
+    OnboardingLatestSnapshot,
+    OnboardingProgressSnapshot,
+    OnboardingRiskPrediction
+)
+from .views import IntelligenceDashboardViewSet
+from .services import (
+    AnomalyDetectionService,
+    IncrementalIntelligenceService,
+    IntelligenceDashboardService,
+    OnboardingProgressAggregatorService,
+    OnboardingRiskAnalyzerService,
+    ProgressSnapshotStateService
+)
+
+
+class IntelligenceServiceTestMixin:
+    """
+    Общие данные для тестов сервисов onboarding_intelligence
+    """
+
+    def create_assignments(self, count, steps_per_program=4):
+        """
+        Создает count активных назначений с разнообразным прогрессом по шагам
+        """
+        now = timezone.now()
+        department = Department.objects.create(name='Intelligence Dept')
+        author = User.objects.create_user(
+            email=f'author{OnboardingProgram.objects.count()}@test.com',
+            username=f'author{OnboardingProgram.objects.count()}',
+            password='password',
+            role=UserRole.HR
+        )
+        program = OnboardingProgram.objects.create(
+            name='Intelligence Program', author=author)
+        steps = [
+            OnboardingStep.objects.create(
+                name=f'Step {order}',
+                program=program,
+                order=order,
+                step_type=OnboardingStep.StepType.TRAINING
+            )
+            for order in range(1, steps_per_program + 1)
+        ]
+
+        statuses = [
+            UserStepProgress.ProgressStatus.DONE,
+            UserStepProgress.ProgressStatus.IN_PROGRESS,
+            UserStepProgress.ProgressStatus.NOT_STARTED,
+        ]
+
+        assignments = []
+        for index in range(count):
+            user = User.objects.create_user(
+                email=f'intel{index}@test.com',
+                username=f'intel{index}',
+                password='password',
+                role=UserRole.EMPLOYEE,
+                department=department
+            )
+            assignments.append(UserOnboardingAssignment.objects.create(
+                user=user, program=program))
+
+            for position, step in enumerate(steps):
+                status = statuses[(index + position) % len(statuses)]
+                done = status == UserStepProgress.ProgressStatus.DONE
+                UserStepProgress.objects.filter(user=user, step=step).delete()
+                UserStepProgress.objects.create(
+                    user=user,
+                    step=step,
+                    status=status,
+                    planned_date_start=now - timedelta(days=10 - position),
+                    planned_date_end=now + timedelta(days=position - 2),
+                    completed_at=now - timedelta(days=position) if done else None,
+                    actual_completed_at=now - timedelta(
+                        days=position, hours=index) if done else None
+                )
+
+        return assignments
+
+
+class BulkSnapshotGenerationTest(IntelligenceServiceTestMixin, TestCase):
+    """
+    Тесты массовой генерации снимков прогресса
+    """
+
+    snapshot_fields = [
+        'user_id', 'assignment_id', 'department_id', 'completion_percentage',
+        'steps_total', 'steps_completed', 'steps_in_progress',
+        'steps_not_started', 'steps_overdue', 'avg_step_completion_time',
+    ]
+
+    def _snapshot_values(self):
+        return sorted(
+            OnboardingProgressSnapshot.objects.values_list(*self.snapshot_fields))
+
+    def test_bulk_matches_legacy_counters(self):
+        self.create_assignments(5)
+
+        OnboardingProgressAggregatorService.generate_user_snapshots(all_users=True)
+        legacy = self._snapshot_values()
+        OnboardingProgressSnapshot.objects.all().delete()
+
+        created = OnboardingProgressAggregatorService.generate_user_snapshots_bulk(
+            all_users=True)
+
+        self.assertEqual(created, 5)
+        self.assertEqual(self._snapshot_values(), legacy)
+
+    def test_bulk_query_count_is_constant(self):
+        self.create_assignments(3)
+        with CaptureQueriesContext(connection) as small:
+            OnboardingProgressAggregatorService.generate_user_snapshots_bulk(
+                all_users=True)
+
+        User.objects.all().delete()
+        Department.objects.all().delete()
+        OnboardingProgram.objects.all().delete()
+
+        self.create_assignments(12)
+        with CaptureQueriesContext(connection) as large:
+            OnboardingProgressAggregatorService.generate_user_snapshots_bulk(
+                all_users=True)
+
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(OnboardingProgressSnapshot.objects.count(), 12)
+
+
+class RiskBatchPipelineTest(IntelligenceServiceTestMixin, TestCase):
+    """
+    Тесты пакетного конвейера анализа рисков
+    """
+
+    compared_risk_types = [
+        OnboardingRiskPrediction.RiskType.COMPLETION_RISK,
+        OnboardingRiskPrediction.RiskType.DELAY_RISK,
+        OnboardingRiskPrediction.RiskType.KNOWLEDGE_RETENTION_RISK,
+    ]
+
+    def setUp(self):
+        self.assignments = self.create_assignments(4)
+
+        # История снимков, чтобы сработали факторы скорости прогресса
+        OnboardingProgressAggregatorService.generate_user_snapshots_bulk(
+            all_users=True)
+        OnboardingProgressSnapshot.objects.update(
+            snapshot_date=timezone.now() - timedelta(days=3),
+            completion_percentage=0.0
+        )
+        OnboardingProgressAggregatorService.generate_user_snapshots_bulk(
+            all_users=True)
+
+        OnboardingAnomaly.objects.create(
+            user=self.assignments[0].user,
+            assignment=self.assignments[0],
+            anomaly_type=OnboardingAnomaly.AnomalyType.TEST_FAILURES,
+            description='Test failures'
+        )
+
+    def _prediction_values(self):
+        return sorted(OnboardingRiskPrediction.objects.filter(
+            risk_type__in=self.compared_risk_types
+        ).values_list(
+            'assignment_id', 'risk_type', 'severity', 'probability',
+            'factors', 'recommendation'
+        ))
+
+    def test_batch_matches_legacy_models(self):
+        for assignment in self.assignments:
+            OnboardingRiskAnalyzerService._analyze_completion_risk(assignment)
+            OnboardingRiskAnalyzerService._analyze_delay_risk(assignment)
+            OnboardingRiskAnalyzerService._analyze_knowledge_retention_risk(
+                assignment)
+        legacy = self._prediction_values()
+        OnboardingRiskPrediction.objects.all().delete()
+
+        stats = OnboardingRiskAnalyzerService.analyze_user_risks_batch(
+            all_users=True, batch_size=3)
+
+        self.assertEqual(stats['assignments'], 4)
+        self.assertEqual(stats['predictions_created'], 16)
+        self.assertEqual(set(stats['timings']), {'load', 'score', 'write'})
+        self.assertEqual(self._prediction_values(), legacy)
+
+    def test_batch_updates_predictions_of_the_same_day(self):
+        OnboardingRiskAnalyzerService.analyze_user_risks_batch(all_users=True)
+        stats = OnboardingRiskAnalyzerService.analyze_user_risks_batch(
+            all_users=True)
+
+        self.assertEqual(stats['predictions_created'], 0)
+        self.assertEqual(stats['predictions_updated'], 16)
+        self.assertEqual(OnboardingRiskPrediction.objects.count(), 16)
+
+
+class AnomalyBatchDetectionTest(IntelligenceServiceTestMixin, TestCase):
+    """
+    Тесты пакетного поиска аномалий
+    """
+
+    def setUp(self):
+        self.assignments = self.create_assignments(5)
+
+        OnboardingProgressAggregatorService.generate_user_snapshots_bulk(
+            all_users=True)
+        for index, snapshot in enumerate(OnboardingProgressSnapshot.objects.order_by('id')):
+            snapshot.snapshot_date = timezone.now() - timedelta(days=2 + index)
+            snapshot.completion_percentage = max(
+                snapshot.completion_percentage - index * 3, 0.0)
+            snapshot.save()
+        OnboardingProgressAggregatorService.generate_user_snapshots_bulk(
+            all_users=True)
+
+    def _anomaly_values(self):
+        return sorted(
+            (anomaly.assignment_id, anomaly.anomaly_type, anomaly.step_id,
+             anomaly.description, sorted(anomaly.details.items()))
+            for anomaly in OnboardingAnomaly.objects.all()
+        )
+
+    def test_batch_matches_legacy_detectors(self):
+        for assignment in self.assignments:
+            AnomalyDetectionService._detect_slow_progress(assignment)
+        legacy = self._anomaly_values()
+        self.assertTrue(legacy)
+        OnboardingAnomaly.objects.all().delete()
+
+        stats = AnomalyDetectionService.detect_anomalies_batch(
+            all_users=True, batch_size=2)
+
+        self.assertEqual(stats['assignments'], 5)
+        self.assertEqual(stats['anomalies_created'], len(legacy))
+        self.assertEqual(self._anomaly_values(), legacy)
+
+    def test_batch_skips_open_anomalies(self):
+        AnomalyDetectionService.detect_anomalies_batch(all_users=True)
+        created = OnboardingAnomaly.objects.count()
+
+        stats = AnomalyDetectionService.detect_anomalies_batch(all_users=True)
+
+        self.assertGreater(created, 0)
+        self.assertEqual(stats['anomalies_created'], 0)
+        self.assertEqual(OnboardingAnomaly.objects.count(), created)
+
+
+class IncrementalIntelligenceTest(IntelligenceServiceTestMixin, TestCase):
+    """
+    Тесты инкрементального пересчета по отметкам изменений
+    """
+
+    def setUp(self):
+        self.assignments = self.create_assignments(3)
+
+    def test_step_progress_save_marks_assignment(self):
+        OnboardingAssignmentChange.objects.all().delete()
+        progress = UserStepProgress.objects.filter(
+            user=self.assignments[1].user).first()
+
+        progress.save()
+
+        self.assertEqual(
+            list(OnboardingAssignmentChange.objects.values_list('assignment_id', flat=True)),
+            [self.assignments[1].id])
+
+    def test_only_changed_and_rolled_over_assignments_are_processed(self):
+        first_run = IncrementalIntelligenceService.update_snapshots()
+        self.assertTrue(first_run['full_run'])
+        self.assertEqual(first_run['snapshots_created'], 3)
+        # Изменения из setUp старше перекрытия с прошлым запуском
+        OnboardingAssignmentChange.objects.update(
+            changed_at=timezone.now() - timedelta(hours=1))
+
+        unchanged_run = IncrementalIntelligenceService.update_snapshots()
+        self.assertEqual(unchanged_run['assignments_changed'], 0)
+
+        # Изменение шага через save() и переход через дедлайн без сохранения
+        progress = UserStepProgress.objects.filter(
+            user=self.assignments[0].user).first()
+        progress.status = UserStepProgress.ProgressStatus.DONE
+        progress.save()
+
+        watermark = IntelligenceJobWatermark.objects.get(
+            job=IncrementalIntelligenceService.SNAPSHOTS_JOB)
+        UserStepProgress.objects.filter(
+            user=self.assignments[2].user,
+            status=UserStepProgress.ProgressStatus.NOT_STARTED
+        ).update(planned_date_end=watermark.processed_until + timedelta(microseconds=1))
+
+        stats = IncrementalIntelligenceService.update_snapshots()
+
+        self.assertFalse(stats['full_run'])
+        self.assertEqual(stats['assignments_changed'], 2)
+        self.assertEqual(stats['snapshots_created'], 2)
+        self.assertEqual(
+            set(OnboardingProgressSnapshot.objects.filter(
+                snapshot_date__gt=watermark.processed_until
+            ).values_list('assignment_id', flat=True)),
+            {self.assignments[0].id, self.assignments[2].id})
+
+
+    def test_change_committed_after_scan_is_processed(self):
+        IncrementalIntelligenceService.update_snapshots()
+        OnboardingAssignmentChange.objects.update(
+            changed_at=timezone.now() - timedelta(hours=1))
+        watermark = IntelligenceJobWatermark.objects.get(
+            job=IncrementalIntelligenceService.SNAPSHOTS_JOB)
+
+        # Отметка поставлена до чтения прошлого запуска, но зафиксирована после
+        OnboardingAssignmentChange.objects.update_or_create(
+            assignment=self.assignments[1],
+            defaults={'changed_at': watermark.processed_until - timedelta(seconds=1)})
+
+        stats = IncrementalIntelligenceService.update_snapshots()
+
+        self.assertEqual(stats['assignments_changed'], 1)
+        self.assertEqual(stats['snapshots_created'], 1)
+
+
+class LatestSnapshotStateTest(IntelligenceServiceTestMixin, TestCase):
+    """
+    Тесты таблицы последних снимков и прореживания истории
+    """
+
+    def setUp(self):
+        self.assignments = self.create_assignments(2)
+
+    def create_snapshot(self, assignment, snapshot_date, percentage=0.0):
+        return OnboardingProgressSnapshot.objects.create(
+            user=assignment.user,
+            assignment=assignment,
+            department=assignment.user.department,
+            completion_percentage=percentage,
+            steps_total=4,
+            steps_completed=0,
+            steps_in_progress=0,
+            steps_not_started=4,
+            snapshot_date=snapshot_date
+        )
+
+    def test_latest_snapshot_follows_new_snapshots(self):
+        now = timezone.now()
+        self.create_snapshot(self.assignments[0], now - timedelta(days=2), 10.0)
+        latest = self.create_snapshot(self.assignments[0], now, 40.0)
+        OnboardingProgressAggregatorService.generate_user_snapshots_bulk(
+            user=self.assignments[1].user)
+
+        self.assertEqual(OnboardingLatestSnapshot.objects.count(), 2)
+        state = OnboardingLatestSnapshot.objects.get(assignment=self.assignments[0])
+        self.assertEqual(state.snapshot_id, latest.id)
+        self.assertEqual(state.completion_percentage, 40.0)
+        self.assertEqual(
+            OnboardingLatestSnapshot.objects.get(assignment=self.assignments[1]).snapshot_id,
+            OnboardingProgressSnapshot.objects.filter(
+                assignment=self.assignments[1]).latest('snapshot_date').id)
+
+    def test_older_snapshot_does_not_replace_latest(self):
+        now = timezone.now()
+        latest = self.create_snapshot(self.assignments[0], now, 40.0)
+        # Поздно записанный снимок за прошлую дату
+        self.create_snapshot(self.assignments[0], now - timedelta(days=3), 10.0)
+
+        state = OnboardingLatestSnapshot.objects.get(assignment=self.assignments[0])
+        self.assertEqual(state.snapshot_id, latest.id)
+        self.assertEqual(state.completion_percentage, 40.0)
+
+    def test_compact_keeps_one_snapshot_per_week(self):
+        assignment = self.assignments[0]
+        week_start = (timezone.now() - timedelta(days=200)).replace(
+            hour=12, minute=0, second=0, microsecond=0)
+        week_start -= timedelta(days=week_start.weekday())
+        old_snapshots = [
+            self.create_snapshot(assignment, week_start + timedelta(days=day))
+            for day in range(5)
+        ]
+        recent = [
+            self.create_snapshot(assignment, timezone.now() - timedelta(days=day))
+            for day in (2, 1)
+        ]
+
+        self.assertEqual(
+            ProgressSnapshotStateService.compact_history(dry_run=True), 4)
+        self.assertEqual(OnboardingProgressSnapshot.objects.count(), 7)
+
+        self.assertEqual(ProgressSnapshotStateService.compact_history(), 4)
+        self.assertEqual(
+            set(OnboardingProgressSnapshot.objects.values_list('id', flat=True)),
+            {old_snapshots[-1].id, recent[0].id, recent[1].id})
+        self.assertEqual(
+            OnboardingLatestSnapshot.objects.get(assignment=assignment).snapshot_id,
+            recent[1].id)
+
+    def test_compact_pages_by_assignment(self):
+        week_start = (timezone.now() - timedelta(days=200)).replace(
+            hour=12, minute=0, second=0, microsecond=0)
+        week_start -= timedelta(days=week_start.weekday())
+        kept = []
+        for assignment in self.assignments:
+            snapshots = [
+                self.create_snapshot(assignment, week_start + timedelta(days=day))
+                for day in range(3)
+            ]
+            kept.append(snapshots[-1].id)
+
+        self.assertEqual(ProgressSnapshotStateService.compact_history(chunk_size=1), 4)
+        self.assertEqual(
+            set(OnboardingProgressSnapshot.objects.values_list('id', flat=True)), set(kept))
+
+
+class IntelligenceDashboardCacheTest(IntelligenceServiceTestMixin, TestCase):
+    """
+    Тесты предрасчитанных данных общего дашборда
+    """
+
+    def setUp(self):
+        self.assignments = self.create_assignments(2)
+        OnboardingProgressAggregatorService.generate_user_snapshots_bulk(
+            all_users=True)
+        self.admin = User.objects.create_user(
+            email='dashboard-admin@test.com',
+            username='dashboard-admin',
+            password='password',
+            role=UserRole.ADMIN
+        )
+        self.view = IntelligenceDashboardViewSet.as_view({'get': 'list'})
+        self.factory = APIRequestFactory()
+
+    def _get(self, **headers):
+        request = self.factory.get('/intelligence/dashboard/overview/', **headers)
+        force_authenticate(request, user=self.admin)
+        return self.view(request)
+
+    def test_etag_and_not_modified(self):
+        response = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('summary', response.data)
+        etag = response['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            cached = self._get(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached['ETag'], etag)
+        self.assertEqual(
+            [query['sql'] for query in queries.captured_queries
+             if 'onboardingprogresssnapshot' in query['sql'].lower()], [])
+
+    def test_anomaly_change_invalidates_payload(self):
+        IntelligenceDashboardService.rebuild()
+        etag = IntelligenceDashboardService.get_etag()
+
+        OnboardingAnomaly.objects.create(
+            user=self.assignments[0].user,
+            assignment=self.assignments[0],
+            anomaly_type=OnboardingAnomaly.AnomalyType.SLOW_PROGRESS,
+            description='Slow progress'
+        )
+
+        # Данные не удаляются, а помечаются устаревшими
+        self.assertEqual(
+            IntelligenceDashboardPayload.objects.get().built_at,
+            IntelligenceDashboardService.STALE_BUILT_AT)
+        new_etag, payload = IntelligenceDashboardService.get_payload()
+        self.assertNotEqual(new_etag, etag)
+        self.assertEqual(payload['summary']['active_anomalies'], 1)
+
+    def test_stale_payload_is_rebuilt_once(self):
+        IntelligenceDashboardService.rebuild()
+        IntelligenceDashboardService.invalidate()
+
+        with mock.patch.object(
+                IntelligenceDashboardService, 'rebuild',
+                wraps=IntelligenceDashboardService.rebuild) as rebuild:
+            etag = IntelligenceDashboardService.get_etag()
+            self.assertEqual(IntelligenceDashboardService.get_etag(), etag)
+            self.assertEqual(IntelligenceDashboardService.get_payload(etag)[0], etag)
+
+        rebuild.assert_called_once()
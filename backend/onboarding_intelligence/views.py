@@ -1,6 +1,7 @@
 from datetime import timedelta
 from django.utils import timezone
-from django.db.models import Q, Count, Avg, Sum
+from django.utils.http import parse_etags, quote_etag
+from django.db.models import Q, Avg, Sum
 from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -22,6 +23,7 @@ from .serializers import (
     OnboardingDepartmentSummarySerializer,
     ResolveAnomalySerializer
 )
+from .services import IntelligenceDashboardService
 from departments.models import Department
 
 
@@ -36,90 +38,20 @@ class IntelligenceDashboardViewSet(viewsets.ViewSet):
 
     def list(self, request):
         """
-        Возвращает общую статистику по всем онбордингам
+        Возвращает общую статистику по всем онбордингам из предрасчитанных
+        данных; поддерживает условные запросы по ETag (If-None-Match)
         """
-        # Получаем данные по снимкам прогресса
-        current_date = timezone.now()
-        start_date = current_date - timedelta(days=30)
-
-        # Общие метрики
-        total_users = User.objects.all().count()
-        active_onboardings = OnboardingProgressSnapshot.objects.filter(
-            snapshot_date__gte=start_date
-        ).order_by('user').distinct('user').count()
-
-        # Средний прогресс
-        avg_progress = OnboardingProgressSnapshot.objects.filter(
-            snapshot_date__gte=start_date
-        ).order_by('user', '-snapshot_date').distinct('user').aggregate(
-            avg=Avg('completion_percentage')
-        )['avg'] or 0.0
-
-        # Риски и аномалии
-        high_risks = OnboardingRiskPrediction.objects.filter(
-            severity=OnboardingRiskPrediction.RiskSeverity.HIGH,
-            created_at__gte=start_date
-        ).count()
-
-        active_anomalies = OnboardingAnomaly.objects.filter(
-            resolved=False
-        ).count()
+        etag = IntelligenceDashboardService.get_etag()
+        quoted_etag = quote_etag(etag)
 
-        # Департаменты с самым высоким риском
-        departments_at_risk = OnboardingDepartmentSummary.objects.filter(
-            summary_date__gte=start_date
-        ).order_by('department', '-summary_date').distinct('department').order_by('-risk_factor')[:5]
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            client_etags = parse_etags(if_none_match)
+            if '*' in client_etags or quoted_etag in client_etags:
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': quoted_etag})
 
-        departments_at_risk_data = OnboardingDepartmentSummarySerializer(
-            departments_at_risk, many=True).data
-
-        # Последние аномалии
-        recent_anomalies = OnboardingAnomaly.objects.filter(
-            resolved=False
-        ).order_by('-detected_at')[:10]
-
-        recent_anomalies_data = OnboardingAnomalySerializer(
-            recent_anomalies, many=True).data
-
-        # Распределение прогресса по департаментам
-        department_progress = OnboardingProgressSnapshot.objects.filter(
-            snapshot_date__gte=start_date,
-            department__isnull=False
-        ).order_by('department', '-snapshot_date').distinct('department').values(
-            'department__name', 'completion_percentage'
-        )
-
-        # Типы рисков
-        risk_types = OnboardingRiskPrediction.objects.filter(
-            created_at__gte=start_date
-        ).values('risk_type').annotate(
-            count=Count('id')
-        ).order_by('-count')
-
-        # Типы аномалий
-        anomaly_types = OnboardingAnomaly.objects.filter(
-            detected_at__gte=start_date
-        ).values('anomaly_type').annotate(
-            count=Count('id')
-        ).order_by('-count')
-
-        # Строим объект с данными дашборда
-        dashboard_data = {
-            'summary': {
-                'total_users': total_users,
-                'active_onboardings': active_onboardings,
-                'avg_progress': avg_progress,
-                'high_risks': high_risks,
-                'active_anomalies': active_anomalies,
-            },
-            'departments_at_risk': departments_at_risk_data,
-            'recent_anomalies': recent_anomalies_data,
-            'department_progress': list(department_progress),
-            'risk_distribution': list(risk_types),
-            'anomaly_distribution': list(anomaly_types),
-        }
-
-        return Response(dashboard_data)
+        etag, dashboard_data = IntelligenceDashboardService.get_payload(etag)
+        return Response(dashboard_data, headers={'ETag': quote_etag(etag)})
 
 
 class UserIntelligenceDashboardViewSet(viewsets.ReadOnlyModelViewSet):
@@ -141,8 +73,8 @@ class UserIntelligenceDashboardViewSet(viewsets.ReadOnlyModelViewSet):
         """
         # Получаем последний снимок прогресса
         latest_snapshot = OnboardingProgressSnapshot.objects.filter(
-            user_id=user_id
-        ).order_by('-snapshot_date').first()
+            latest_state__user_id=user_id
+        ).select_related('user').order_by('-snapshot_date').first()
 
         if not latest_snapshot:
             return Response({'detail': 'Нет данных для этого пользователя'}, status=status.HTTP_404_NOT_FOUND)
@@ -231,8 +163,8 @@ class DepartmentIntelligenceDashboardViewSet(viewsets.ReadOnlyModelViewSet):
 
         # Пользователи с самым низким прогрессом
         users_with_low_progress = OnboardingProgressSnapshot.objects.filter(
-            department_id=department_id
-        ).order_by('user', '-snapshot_date').distinct('user').order_by('completion_percentage')[:5]
+            latest_state__department_id=department_id
+        ).select_related('user').order_by('completion_percentage')[:5]
 
         low_progress_data = OnboardingProgressSnapshotSerializer(
             users_with_low_progress, many=True).data
@@ -2,12 +2,17 @@
 Smart Prioritization Engine - AI-модуль для интеллектуального приоритизирования задач
 """
 
+import heapq
 import logging
+import math
+import time
 from datetime import datetime, timedelta
+from django.db import transaction
 from django.utils import timezone
 from django.db.models import Count, F, Q, Avg
 from onboarding.models import OnboardingStep, UserStepProgress, UserOnboardingAssignment
-from .models import ScheduledOnboardingStep, ScheduleConstraint
+from .models import ScheduledOnboardingStep, ScheduleConstraint, MentorLoad, CalendarEvent
+from .services import AvailabilityIndex
 
 logger = logging.getLogger(__name__)
 
@@ -290,7 +295,8 @@ class SmartPrioritizationEngine:
         return risks
 
     @staticmethod
-    def optimize_workload_distribution(user_ids=None, start_date=None, end_date=None):
+    def optimize_workload_distribution(user_ids=None, start_date=None, end_date=None,
+                                       assign_mentors=False):
         """
         Оптимизирует распределение нагрузки между пользователями
 
@@ -298,6 +304,8 @@ class SmartPrioritizationEngine:
             user_ids (list, optional): Список ID пользователей (если None, оптимизируется для всех)
             start_date (datetime, optional): Начальная дата (если None, используется текущая)
             end_date (datetime, optional): Конечная дата (если None, +30 дней от начальной)
+            assign_mentors (bool): Добавить в результат план распределения
+                ожидающих встреч между менторами (без применения)
 
         Returns:
             dict: Результаты оптимизации и рекомендации
@@ -314,7 +322,6 @@ class SmartPrioritizationEngine:
             user_filter['step_progress__user__id__in'] = user_ids
 
         # Получаем всех менторов и их текущую нагрузку
-        from .models import MentorLoad
         mentor_loads = MentorLoad.objects.filter(
             active=True).select_related('mentor')
 
@@ -438,9 +445,533 @@ class SmartPrioritizationEngine:
             underloaded_users.sort(
                 key=lambda x: x['capacity_percentage'], reverse=True)
 
-        return {
+        result = {
             'average_workload_hours': avg_workload,
             'overloaded_users': overloaded_users,
             'underloaded_users': underloaded_users,
             'recommendations': recommendations
         }
+
+        if assign_mentors:
+            result['mentor_assignment_plan'] = MentorAssignmentOptimizer.plan(
+                start_date, end_date)
+
+        return result
+
+
+class MinCostFlow:
+    """
+    Поток минимальной стоимости методом последовательных кратчайших путей
+    (Дейкстра с потенциалами). Стоимости рёбер должны быть целыми неотрицательными.
+    """
+
+    def __init__(self, node_count):
+        # Ребро: [куда, остаточная пропускная способность, стоимость, индекс обратного ребра]
+        self.graph = [[] for _ in range(node_count)]
+
+    def add_node(self):
+        self.graph.append([])
+        return len(self.graph) - 1
+
+    def add_edge(self, source, target, capacity, cost):
+        """
+        Добавляет ребро и возвращает его; поток по ребру равен
+        capacity - edge[1]
+        """
+        edge = [target, capacity, cost, len(self.graph[target])]
+        self.graph[source].append(edge)
+        self.graph[target].append([source, 0, -cost, len(self.graph[source]) - 1])
+        return edge
+
+    def solve(self, source, sink, deadline=None):
+        """
+        Пропускает максимальный поток минимальной стоимости
+
+        Args:
+            source (int): Исток
+            sink (int): Сток
+            deadline (float): Момент time.monotonic(), после которого расчет прерывается
+
+        Returns:
+            tuple: (поток, стоимость, завершен ли расчет)
+        """
+        graph = self.graph
+        node_count = len(graph)
+        potential = [0] * node_count
+        total_flow = 0
+        total_cost = 0
+
+        while True:
+            if deadline is not None and time.monotonic() > deadline:
+                return total_flow, total_cost, False
+
+            distance = [math.inf] * node_count
+            distance[source] = 0
+            previous = [None] * node_count
+            queue = [(0, source)]
+
+            while queue:
+                current_distance, node = heapq.heappop(queue)
+                if current_distance > distance[node]:
+                    continue
+                for position, (target, capacity, cost, _) in enumerate(graph[node]):
+                    if capacity <= 0:
+                        continue
+                    candidate = current_distance + cost + potential[node] - potential[target]
+                    if candidate < distance[target]:
+                        distance[target] = candidate
+                        previous[target] = (node, position)
+                        heapq.heappush(queue, (candidate, target))
+
+            if distance[sink] == math.inf:
+                return total_flow, total_cost, True
+
+            for node in range(node_count):
+                if distance[node] < math.inf:
+                    potential[node] += distance[node]
+
+            # Пропускная способность найденного пути
+            push = math.inf
+            node = sink
+            while node != source:
+                parent, position = previous[node]
+                push = min(push, graph[parent][position][1])
+                node = parent
+
+            node = sink
+            while node != source:
+                parent, position = previous[node]
+                edge = graph[parent][position]
+                edge[1] -= push
+                graph[node][edge[3]][1] += push
+                node = parent
+
+            total_flow += push
+            total_cost += push * (potential[sink] - potential[source])
+
+
+class MentorAssignmentOptimizer:
+    """
+    Глобальное распределение ожидающих встреч онбординга между менторами.
+
+    Встречи с одинаковым днем и набором подходящих менторов объединяются в группы,
+    после чего распределение ищется одним потоком минимальной стоимости:
+    исток -> группа -> (ментор, день) -> (ментор, неделя) -> сток.
+    Ребра (ментор, день) ограничены max_daily_sessions, ребра (ментор, неделя)
+    разбиты на полосы с растущей стоимостью по доле max_weekly_hours, что
+    выравнивает нагрузку. Текущая нагрузка считается по событиям календаря,
+    а не по денормализованным полям MentorLoad. Поток затем раскладывается
+    по конкретным встречам с проверкой пересечений и фактических часов.
+    """
+
+    # Количество полос стоимости для недельной нагрузки
+    LOAD_BANDS = 4
+    # Ограничение времени расчета потока (в секундах)
+    DEFAULT_TIME_LIMIT = 10
+    LOAD_EVENT_TYPES = (
+        CalendarEvent.EventType.ONBOARDING_STEP,
+        CalendarEvent.EventType.MEETING,
+    )
+
+    @classmethod
+    def plan(cls, start_date=None, end_date=None, apply=False, time_limit=None):
+        """
+        Строит (и при необходимости применяет) план распределения встреч
+
+        Args:
+            start_date (datetime): Начало периода (если None, используется текущее время)
+            end_date (datetime): Конец периода (если None, +30 дней от начального)
+            apply (bool): Создать события календаря с выбранными менторами
+            time_limit (float): Ограничение времени расчета потока в секундах;
+                встречи, не распределенные к этому моменту, распределяются жадно
+
+        Returns:
+            dict: План распределения
+        """
+        if not start_date:
+            start_date = timezone.now()
+
+        if not end_date:
+            end_date = start_date + timedelta(days=30)
+
+        if time_limit is None:
+            time_limit = cls.DEFAULT_TIME_LIMIT
+
+        sessions, mentor_loads = cls._load_pending_sessions(start_date, end_date)
+        result = {
+            'assignments': [],
+            'unassigned': [],
+            'mentor_utilization': [],
+            'total_cost': 0,
+            'completed': True,
+            'applied': False,
+        }
+        if not sessions or not mentor_loads:
+            result['unassigned'] = [
+                cls._session_data(session, reason='no_eligible_mentor')
+                for session in sessions
+            ]
+            return result
+
+        mentors = {mentor_load.mentor_id: mentor_load for mentor_load in mentor_loads}
+        daily_sessions, weekly_hours = cls._load_mentor_load(
+            mentors, start_date, max(session.scheduled_end_time for session in sessions))
+        availability_index = AvailabilityIndex.load(
+            mentors, start_date, max(session.scheduled_end_time for session in sessions))
+        required_tags = cls._load_required_tags(
+            {session.step_progress.step_id for session in sessions})
+
+        # Группировка встреч по дню и набору подходящих менторов
+        groups = {}
+        for session in sessions:
+            tags = required_tags.get(session.step_progress.step_id)
+            eligible = tuple(
+                mentor_id for mentor_id, mentor_load in mentors.items()
+                if mentor_id != session.step_progress.user_id
+                and (not tags or tags.intersection(mentor_load.specializations or []))
+                and availability_index.is_available(
+                    mentor_id, session.scheduled_start_time, session.scheduled_end_time)
+            )
+            if not eligible:
+                result['unassigned'].append(
+                    cls._session_data(session, reason='no_eligible_mentor'))
+                continue
+            day = session.scheduled_start_time.date()
+            groups.setdefault((day, eligible), []).append(session)
+
+        flow, group_edges = cls._build_network(groups, mentors, daily_sessions, weekly_hours)
+        _, total_cost, completed = flow.solve(
+            0, 1, deadline=time.monotonic() + time_limit)
+        result['total_cost'] = total_cost
+        result['completed'] = completed
+
+        planned = cls._decompose(
+            groups, group_edges, mentors, availability_index, daily_sessions, weekly_hours)
+
+        for session, mentor_id in planned:
+            if mentor_id is None:
+                result['unassigned'].append(
+                    cls._session_data(session, reason='capacity_exceeded'))
+            else:
+                result['assignments'].append(
+                    cls._session_data(session, mentor=mentors[mentor_id].mentor))
+
+        assigned_counts = {}
+        for session, mentor_id in planned:
+            if mentor_id is not None:
+                sessions_count, hours = assigned_counts.get(mentor_id, (0, 0.0))
+                assigned_counts[mentor_id] = (
+                    sessions_count + 1, hours + cls._duration_hours(session))
+        result['mentor_utilization'] = [
+            {
+                'mentor_id': mentor_id,
+                'mentor_name': mentors[mentor_id].mentor.get_full_name(),
+                'sessions': sessions_count,
+                'hours': hours,
+            }
+            for mentor_id, (sessions_count, hours) in sorted(assigned_counts.items())
+        ]
+
+        if apply:
+            cls._apply(
+                [(session, mentors[mentor_id]) for session, mentor_id in planned
+                 if mentor_id is not None])
+            result['applied'] = True
+
+        return result
+
+    @classmethod
+    def _load_pending_sessions(cls, start_date, end_date):
+        """
+        Загружает невыполненные встречи периода, для которых ментор еще не назначен,
+        и активные нагрузки менторов
+        """
+        mentor_loads = {}
+        for mentor_load in MentorLoad.objects.filter(active=True).select_related('mentor').order_by('id'):
+            mentor_loads.setdefault(mentor_load.mentor_id, mentor_load)
+
+        sessions = list(ScheduledOnboardingStep.objects.filter(
+            step_progress__step__step_type=OnboardingStep.StepType.MEETING,
+            scheduled_start_time__gte=start_date,
+            scheduled_start_time__lt=end_date,
+            scheduled_end_time__isnull=False
+        ).exclude(
+            step_progress__status=UserStepProgress.ProgressStatus.DONE
+        ).select_related(
+            'step_progress', 'step_progress__step', 'step_progress__user'
+        ).order_by('scheduled_start_time', 'id'))
+
+        assigned_ids = set(CalendarEvent.participants.through.objects.filter(
+            user_id__in=list(mentor_loads),
+            calendarevent__scheduled_step_id__in=[session.id for session in sessions]
+        ).values_list('calendarevent__scheduled_step_id', flat=True))
+
+        return ([session for session in sessions if session.id not in assigned_ids],
+                list(mentor_loads.values()))
+
+    @classmethod
+    def _load_mentor_load(cls, mentors, start_date, end_date):
+        """
+        Считает текущую нагрузку менторов по событиям календаря:
+        количество сессий по дням и часы по ISO-неделям
+        """
+        period_start = datetime.combine(
+            start_date.date() - timedelta(days=start_date.weekday()),
+            datetime.min.time(), tzinfo=start_date.tzinfo)
+        period_end = datetime.combine(
+            end_date.date() + timedelta(days=7 - end_date.weekday()),
+            datetime.min.time(), tzinfo=end_date.tzinfo)
+
+        daily_sessions = {}
+        weekly_hours = {}
+        for mentor_id, event_start, event_end in CalendarEvent.participants.through.objects.filter(
+            user_id__in=list(mentors),
+            calendarevent__event_type__in=cls.LOAD_EVENT_TYPES,
+            calendarevent__start_time__lt=period_end,
+            calendarevent__end_time__gt=period_start
+        ).values_list('user_id', 'calendarevent__start_time', 'calendarevent__end_time'):
+            day_key = (mentor_id, event_start.date())
+            week_key = (mentor_id, event_start.isocalendar()[:2])
+            daily_sessions[day_key] = daily_sessions.get(day_key, 0) + 1
+            weekly_hours[week_key] = weekly_hours.get(week_key, 0.0) + (
+                event_end - event_start).total_seconds() / 3600
+
+        return daily_sessions, weekly_hours
+
+    @staticmethod
+    def _load_required_tags(step_ids):
+        """
+        Требуемые специализации шагов из активных ограничений типа ROLE
+        """
+        required_tags = {}
+        for step_id, required_roles in ScheduleConstraint.objects.filter(
+            dependent_step_id__in=step_ids,
+            constraint_type=ScheduleConstraint.ConstraintType.ROLE,
+            active=True
+        ).values_list('dependent_step_id', 'required_roles'):
+            if required_roles:
+                required_tags.setdefault(step_id, set()).update(required_roles)
+        return required_tags
+
+    @classmethod
+    def _build_network(cls, groups, mentors, daily_sessions, weekly_hours):
+        """
+        Строит сеть потока: 0 - исток, 1 - сток
+
+        Returns:
+            tuple: (MinCostFlow, {группа: {mentor_id: (ребро, пропускная способность)}})
+        """
+        flow = MinCostFlow(2)
+        day_nodes = {}
+        week_nodes = {}
+        group_edges = {}
+
+        # Средняя длительность встречи по неделям для перевода часов в сессии
+        week_durations = {}
+        for (day, _), group_sessions in groups.items():
+            week = day.isocalendar()[:2]
+            total, count = week_durations.get(week, (0.0, 0))
+            week_durations[week] = (
+                total + sum(cls._duration_hours(session) for session in group_sessions),
+                count + len(group_sessions))
+
+        for key, group_sessions in groups.items():
+            day, eligible = key
+            week = day.isocalendar()[:2]
+            group_node = flow.add_node()
+            flow.add_edge(0, group_node, len(group_sessions), 0)
+            group_edges[key] = {}
+
+            for mentor_id in eligible:
+                mentor_load = mentors[mentor_id]
+
+                if (mentor_id, week) not in week_nodes:
+                    week_node = week_nodes[(mentor_id, week)] = flow.add_node()
+                    total_hours, count = week_durations[week]
+                    existing_hours = weekly_hours.get((mentor_id, week), 0.0)
+                    capacity = int(
+                        max(0.0, mentor_load.max_weekly_hours - existing_hours)
+                        // (total_hours / count))
+                    cls._add_load_bands(
+                        flow, week_node, capacity, existing_hours,
+                        total_hours / count, mentor_load.max_weekly_hours)
+
+                if (mentor_id, day) not in day_nodes:
+                    day_node = day_nodes[(mentor_id, day)] = flow.add_node()
+                    flow.add_edge(
+                        day_node, week_nodes[(mentor_id, week)],
+                        max(0, mentor_load.max_daily_sessions
+                            - daily_sessions.get((mentor_id, day), 0)),
+                        0)
+
+                capacity = len(group_sessions)
+                group_edges[key][mentor_id] = (
+                    flow.add_edge(group_node, day_nodes[(mentor_id, day)], capacity, 0),
+                    capacity)
+
+        return flow, group_edges
+
+    @classmethod
+    def _add_load_bands(cls, flow, week_node, capacity, existing_hours, session_hours, max_hours):
+        """
+        Разбивает недельную емкость ментора на полосы со стоимостью, растущей
+        вместе с долей занятых часов (в процентах от max_weekly_hours)
+        """
+        if capacity <= 0:
+            return
+
+        band_size = math.ceil(capacity / cls.LOAD_BANDS)
+        used = 0
+        while used < capacity:
+            band = min(band_size, capacity - used)
+            used += band
+            utilization = (existing_hours + used * session_hours) / max(max_hours, 1)
+            flow.add_edge(week_node, 1, band, int(utilization * 100))
+
+    @classmethod
+    def _decompose(cls, groups, group_edges, mentors, availability_index,
+                   daily_sessions, weekly_hours):
+        """
+        Раскладывает поток по конкретным встречам. Ментор встречи проверяется
+        на пересечения и фактические лимиты; при нарушении выбирается другой
+        подходящий ментор с наименьшей загрузкой
+
+        Returns:
+            list: Пары (встреча, mentor_id или None)
+        """
+        daily_sessions = dict(daily_sessions)
+        weekly_hours = dict(weekly_hours)
+        planned = []
+
+        def fits(mentor_id, session):
+            mentor_load = mentors[mentor_id]
+            start_time = session.scheduled_start_time
+            day_key = (mentor_id, start_time.date())
+            week_key = (mentor_id, start_time.isocalendar()[:2])
+            return (
+                daily_sessions.get(day_key, 0) < mentor_load.max_daily_sessions
+                and weekly_hours.get(week_key, 0.0) + cls._duration_hours(session)
+                <= mentor_load.max_weekly_hours
+                and availability_index.is_available(
+                    mentor_id, start_time, session.scheduled_end_time)
+            )
+
+        for key, group_sessions in groups.items():
+            allocation = {
+                mentor_id: capacity - edge[1]
+                for mentor_id, (edge, capacity) in group_edges[key].items()
+            }
+
+            for session in group_sessions:
+                start_time = session.scheduled_start_time
+                mentor_id = next(
+                    (candidate for candidate, count in allocation.items()
+                     if count > 0 and fits(candidate, session)),
+                    None)
+
+                if mentor_id is not None:
+                    allocation[mentor_id] -= 1
+                else:
+                    candidates = [
+                        candidate for candidate in key[1] if fits(candidate, session)]
+                    if candidates:
+                        week = start_time.isocalendar()[:2]
+                        mentor_id = min(candidates, key=lambda candidate: (
+                            weekly_hours.get((candidate, week), 0.0)
+                            / max(mentors[candidate].max_weekly_hours, 1)))
+
+                if mentor_id is not None:
+                    day_key = (mentor_id, start_time.date())
+                    week_key = (mentor_id, start_time.isocalendar()[:2])
+                    daily_sessions[day_key] = daily_sessions.get(day_key, 0) + 1
+                    weekly_hours[week_key] = weekly_hours.get(
+                        week_key, 0.0) + cls._duration_hours(session)
+                    availability_index.reserve(
+                        [mentor_id], start_time, session.scheduled_end_time)
+
+                planned.append((session, mentor_id))
+
+        return planned
+
+    @staticmethod
+    def _apply(planned):
+        """
+        Создает события календаря с менторами и обновляет нагрузку менторов
+        в одной транзакции
+        """
+        if not planned:
+            return
+
+        today = timezone.now().date()
+        current_week = today.isocalendar()[:2]
+
+        with transaction.atomic():
+            existing_events = {}
+            for event in CalendarEvent.objects.filter(
+                scheduled_step__in=[session.id for session, _ in planned]
+            ).order_by('id'):
+                existing_events.setdefault(event.scheduled_step_id, event)
+
+            events_to_create = []
+            participants = []
+            for session, mentor_load in planned:
+                event = existing_events.get(session.id)
+                if event is None:
+                    step = session.step_progress.step
+                    event = CalendarEvent(
+                        scheduled_step=session,
+                        title=f"Онбординг: {step.name}",
+                        description=step.description,
+                        start_time=session.scheduled_start_time,
+                        end_time=session.scheduled_end_time,
+                        event_type=CalendarEvent.EventType.ONBOARDING_STEP,
+                        time_zone=session.time_zone
+                    )
+                    events_to_create.append(event)
+                participants.append(
+                    (event, [session.step_progress.user_id, mentor_load.mentor_id]))
+
+            CalendarEvent.objects.bulk_create(events_to_create)
+
+            Participant = CalendarEvent.participants.through
+            Participant.objects.bulk_create(
+                [Participant(calendarevent_id=event.id, user_id=user_id)
+                 for event, event_user_ids in participants for user_id in event_user_ids],
+                ignore_conflicts=True
+            )
+
+            # Денормализованная нагрузка менторов
+            updated_loads = {}
+            for session, mentor_load in planned:
+                session_date = session.scheduled_start_time.date()
+                iso_date = session_date.isoformat()
+                mentor_load.current_daily_sessions[iso_date] = (
+                    mentor_load.current_daily_sessions.get(iso_date, 0) + 1)
+                if session_date.isocalendar()[:2] == current_week:
+                    mentor_load.current_weekly_hours += MentorAssignmentOptimizer._duration_hours(
+                        session)
+                updated_loads[mentor_load.id] = mentor_load
+
+            MentorLoad.objects.bulk_update(
+                list(updated_loads.values()),
+                ['current_daily_sessions', 'current_weekly_hours'])
+
+    @staticmethod
+    def _duration_hours(session):
+        return (session.scheduled_end_time - session.scheduled_start_time).total_seconds() / 3600
+
+    @staticmethod
+    def _session_data(session, mentor=None, reason=None):
+        data = {
+            'scheduled_step_id': session.id,
+            'step_name': session.step_progress.step.name,
+            'user_id': session.step_progress.user_id,
+            'start_time': session.scheduled_start_time,
+            'end_time': session.scheduled_end_time,
+        }
+        if mentor is not None:
+            data['mentor_id'] = mentor.id
+            data['mentor_name'] = mentor.get_full_name()
+        if reason is not None:
+            data['reason'] = reason
+        return data
@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from datetime import timedelta
+import logging
+from scheduler.ai_services import MentorAssignmentOptimizer
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Распределяет ожидающие встречи онбординга между менторами одним проходом оптимизации'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=30,
+            help='Количество дней для планирования (по умолчанию 30)'
+        )
+        parser.add_argument(
+            '--apply',
+            action='store_true',
+            help='Применить план (по умолчанию план только выводится)'
+        )
+        parser.add_argument(
+            '--time-limit',
+            type=float,
+            default=MentorAssignmentOptimizer.DEFAULT_TIME_LIMIT,
+            help='Ограничение времени расчета в секундах'
+        )
+
+    def handle(self, *args, **options):
+        start_time = timezone.now()
+        self.stdout.write(f'Начинаем распределение встреч между менторами: {start_time}')
+
+        if options['days'] < 1:
+            raise CommandError('Количество дней должно быть положительным')
+
+        try:
+            plan = MentorAssignmentOptimizer.plan(
+                start_date=start_time,
+                end_date=start_time + timedelta(days=options['days']),
+                apply=options['apply'],
+                time_limit=options['time_limit']
+            )
+        except Exception as e:
+            logger.exception('Ошибка при распределении встреч: %s', str(e))
+            raise CommandError(f'Ошибка при распределении встреч: {str(e)}')
+
+        for assignment in plan['assignments']:
+            self.stdout.write(
+                f'{assignment["start_time"]:%d.%m.%Y %H:%M} {assignment["step_name"]} '
+                f'(пользователь {assignment["user_id"]}) -> {assignment["mentor_name"]}')
+
+        for utilization in plan['mentor_utilization']:
+            self.stdout.write(
+                f'{utilization["mentor_name"]}: {utilization["sessions"]} встреч, '
+                f'{utilization["hours"]:.1f} ч')
+
+        duration = (timezone.now() - start_time).total_seconds()
+        self.stdout.write(self.style.SUCCESS(
+            f'\nРаспределение завершено за {duration:.2f} секунд'
+        ))
+        self.stdout.write(f'Распределено встреч: {len(plan["assignments"])}')
+
+        if not plan['completed']:
+            self.stdout.write(self.style.WARNING(
+                'Расчет прерван по ограничению времени, часть встреч распределена жадно'))
+
+        if plan['unassigned']:
+            self.stdout.write(self.style.WARNING(
+                f'Не удалось распределить встреч: {len(plan["unassigned"])}'
+            ))
+
+        if plan['applied']:
+            self.stdout.write(self.style.SUCCESS('План применен'))
+        else:
+            self.stdout.write('План не применен (используйте --apply)')
@@ -5,6 +5,7 @@ from django.db.models import Q
 import logging
 from onboarding.models import UserOnboardingAssignment, UserStepProgress, OnboardingStep
 from scheduler.models import ScheduledOnboardingStep, ScheduleConstraint
+from jobs import outbox
 from scheduler.services import SmartSchedulerEngine
 
 logger = logging.getLogger(__name__)
@@ -44,6 +45,12 @@ class Command(BaseCommand):
         )
 
     def handle(self, *args, **options):
+        # Обработчики сохранений прогресса выполняются один раз после
+        # перепланирования, а не для каждого сохраненного шага
+        with outbox.coalesce():
+            self._handle(*args, **options)
+
+    def _handle(self, *args, **options):
         start_time = timezone.now()
         self.stdout.write(f'Начинаем перепланирование: {start_time}')
 
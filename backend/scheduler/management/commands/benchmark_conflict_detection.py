@@ -0,0 +1,113 @@
+from django.core.management.base import BaseCommand, CommandError
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import groupby
+import random
+import time
+from scheduler.services import SmartSchedulerEngine
+
+
+class Command(BaseCommand):
+    help = 'Замеряет скорость обнаружения конфликтов на синтетических календарях (без обращения к БД)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--events',
+            type=int,
+            default=100000,
+            help='Количество синтетических событий (по умолчанию 100000)'
+        )
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=1000,
+            help='Количество пользователей, между которыми распределяются события'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=30,
+            help='Длина периода в днях (по умолчанию 30)'
+        )
+        parser.add_argument(
+            '--pairwise-limit',
+            type=int,
+            default=20000,
+            help='Максимальное число событий для попарного сравнения (O(n²))'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Зерно генератора случайных чисел'
+        )
+
+    def handle(self, *args, **options):
+        if options['events'] < 1 or options['users'] < 1 or options['days'] < 1:
+            raise CommandError(
+                'Количество событий, пользователей и дней должно быть положительным')
+
+        events = self._generate_events(
+            options['events'], options['users'], options['days'], options['seed'])
+        self.stdout.write(
+            f'Сгенерировано событий: {len(events)} для {options["users"]} пользователей')
+
+        started = time.perf_counter()
+        sweep_conflicts = self._sweep(events)
+        sweep_elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'sweep: {sweep_conflicts} конфликтов за {sweep_elapsed:.3f} с')
+
+        if len(events) > options['pairwise_limit']:
+            self.stdout.write(self.style.WARNING(
+                f'pairwise: пропущено, событий больше {options["pairwise_limit"]}'))
+            return
+
+        started = time.perf_counter()
+        pairwise_conflicts = self._pairwise(events)
+        pairwise_elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'pairwise: {pairwise_conflicts} конфликтов за {pairwise_elapsed:.3f} с')
+
+        if pairwise_conflicts != sweep_conflicts:
+            raise CommandError('Результаты алгоритмов не совпадают')
+
+    def _generate_events(self, count, users, days, seed):
+        """
+        Генерирует события (user_id, start, end) длительностью от 30 минут до 3 часов
+        в рабочие часы, отсортированные по пользователю и началу
+        """
+        rng = random.Random(seed)
+        period_start = datetime(2030, 1, 7, tzinfo=dt_timezone.utc)
+        events = []
+
+        for _ in range(count):
+            start = period_start + timedelta(
+                days=rng.randrange(days),
+                hours=9,
+                minutes=30 * rng.randrange(16)
+            )
+            events.append((rng.randrange(users), start,
+                           start + timedelta(minutes=30 * rng.randint(1, 6))))
+
+        events.sort()
+        return events
+
+    def _sweep(self, events):
+        total = 0
+        for _, user_events in groupby(events, key=lambda event: event[0]):
+            for _ in SmartSchedulerEngine.find_overlaps(
+                    (start, end, None) for _, start, end in user_events):
+                total += 1
+        return total
+
+    def _pairwise(self, events):
+        total = 0
+        for _, user_events in groupby(events, key=lambda event: event[0]):
+            user_events = list(user_events)
+            for i in range(len(user_events)):
+                for j in range(i + 1, len(user_events)):
+                    _, start1, end1 = user_events[i]
+                    _, start2, end2 = user_events[j]
+                    if start1 < end2 and start2 < end1:
+                        total += 1
+        return total
@@ -0,0 +1,93 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from datetime import timedelta
+import logging
+from onboarding.models import UserOnboardingAssignment
+from scheduler.services import BatchSchedulePlanner
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Пакетно планирует шаги онбординга для группы назначений (например, волны новых сотрудников)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--assignments',
+            type=int,
+            nargs='+',
+            help='ID назначений для планирования'
+        )
+        parser.add_argument(
+            '--program',
+            type=int,
+            help='ID программы, все активные назначения которой нужно спланировать'
+        )
+        parser.add_argument(
+            '--assigned-since',
+            type=int,
+            help='Планировать активные назначения, созданные за указанное количество дней'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Количество назначений, планируемых за один проход (по умолчанию 200)'
+        )
+
+    def handle(self, *args, **options):
+        start_time = timezone.now()
+        self.stdout.write(f'Начинаем пакетное планирование: {start_time}')
+
+        if options.get('assignments'):
+            assignment_ids = options['assignments']
+        else:
+            assignments = UserOnboardingAssignment.objects.filter(
+                status=UserOnboardingAssignment.AssignmentStatus.ACTIVE
+            )
+            if options.get('program'):
+                assignments = assignments.filter(program_id=options['program'])
+            if options.get('assigned_since'):
+                assignments = assignments.filter(
+                    assigned_at__gte=start_time - timedelta(days=options['assigned_since']))
+            assignment_ids = list(
+                assignments.order_by('id').values_list('id', flat=True))
+
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('Размер пачки должен быть положительным')
+
+        totals = {
+            'assignments_planned': 0,
+            'steps_scheduled': 0,
+            'steps_skipped': 0,
+            'calendar_events': 0,
+        }
+
+        for offset in range(0, len(assignment_ids), batch_size):
+            try:
+                stats = BatchSchedulePlanner.plan(
+                    assignment_ids[offset:offset + batch_size])
+            except Exception as e:
+                logger.exception('Ошибка при пакетном планировании: %s', str(e))
+                raise CommandError(
+                    f'Ошибка при пакетном планировании: {str(e)}')
+
+            for key in totals:
+                totals[key] += stats[key]
+
+        duration = (timezone.now() - start_time).total_seconds()
+        self.stdout.write(self.style.SUCCESS(
+            f'\nПланирование завершено за {duration:.2f} секунд'
+        ))
+        self.stdout.write(
+            f'Спланировано назначений: {totals["assignments_planned"]}')
+        self.stdout.write(
+            f'Спланировано шагов: {totals["steps_scheduled"]}')
+        self.stdout.write(
+            f'Создано или обновлено событий календаря: {totals["calendar_events"]}')
+
+        if totals['steps_skipped']:
+            self.stdout.write(self.style.WARNING(
+                f'Не удалось спланировать шагов: {totals["steps_skipped"]}'
+            ))
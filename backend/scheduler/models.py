@@ -218,20 +218,26 @@ class MentorLoad(models.Model):
     def __str__(self):
         return f"{self.mentor.email} - Load: {self.current_weekly_hours}/{self.max_weekly_hours} hours"
 
-    def can_accommodate_session(self, date, duration_hours=1.0):
+    def can_accommodate_session(self, date, duration_hours=1.0, booked_sessions=0, booked_hours=0.0):
         """
         Проверяет, может ли ментор взять дополнительную сессию
+
+        Args:
+            booked_sessions: Сессии этого дня, уже забронированные, но еще
+                не учтенные в current_daily_sessions (например, в текущем
+                проходе пакетного планирования)
+            booked_hours: Часы недели сессии, забронированные аналогично
         """
         iso_date = date.date().isoformat()
 
         # Проверка дневного лимита
-        daily_sessions = self.current_daily_sessions.get(iso_date, 0)
+        daily_sessions = self.current_daily_sessions.get(iso_date, 0) + booked_sessions
         if daily_sessions >= self.max_daily_sessions:
             return False
 
         # Проверка недельного лимита
         # Предполагаем, что current_weekly_hours уже обновлено
-        if self.current_weekly_hours + duration_hours > self.max_weekly_hours:
+        if self.current_weekly_hours + booked_hours + duration_hours > self.max_weekly_hours:
             return False
 
         return True
@@ -112,6 +112,7 @@ class ConflictsSerializer(serializers.Serializer):
     user_id = serializers.IntegerField(required=False)
     start_date = serializers.DateTimeField(required=False)
     end_date = serializers.DateTimeField(required=False)
+    include_mentors = serializers.BooleanField(required=False, default=False)
 
 
 class UserScheduleSerializer(serializers.Serializer):
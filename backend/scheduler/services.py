@@ -2,14 +2,20 @@
 Smart Scheduler Engine - интеллектуальный планировщик шагов онбординга
 """
 
+import heapq
 import logging
+from bisect import bisect_left, bisect_right
 from datetime import datetime, timedelta
+from itertools import groupby
+from django.db import transaction
 from django.db.models import Q, F
 from django.utils import timezone
 import pytz
 from django.conf import settings
 from onboarding.models import OnboardingStep, UserOnboardingAssignment, UserStepProgress
 from users.models import User, UserRole
+from jobs import outbox
+from onboarding_intelligence.signals import mark_assignments_changed
 from .models import (
     ScheduledOnboardingStep, ScheduleConstraint, UserAvailability,
     MentorLoad, CalendarEvent
@@ -18,6 +24,258 @@ from .models import (
 logger = logging.getLogger(__name__)
 
 
+class AvailabilityIndex:
+    """
+    Индекс доступности пользователей в заданном временном окне.
+
+    Загружает доступности (UserAvailability) и занятость (недоступности и
+    события календаря) набора пользователей двумя запросами, после чего
+    отвечает на вопросы "свободные слоты пользователя" и "кто свободен
+    в интервале" в памяти по отсортированным спискам интервалов.
+    """
+
+    AVAILABLE_TYPES = (
+        UserAvailability.AvailabilityType.WORKING_HOURS,
+        UserAvailability.AvailabilityType.PREFERRED,
+    )
+    UNAVAILABLE_TYPES = (
+        UserAvailability.AvailabilityType.VACATION,
+        UserAvailability.AvailabilityType.UNAVAILABLE,
+    )
+
+    def __init__(self, user_ids, start_date, end_date):
+        self.user_ids = set(user_ids)
+        self.start_date = start_date
+        self.end_date = end_date
+        # user_id -> отсортированные по началу доступности (start, end, type)
+        self._availabilities = {}
+        self._availability_starts = {}
+        # user_id -> максимальная длина доступности (для поиска перекрытий)
+        self._max_availability_length = {}
+        # user_id -> объединенные непересекающиеся интервалы занятости
+        self._busy_starts = {}
+        self._busy_ends = {}
+
+    @classmethod
+    def load(cls, user_ids, start_date, end_date):
+        """
+        Загружает индекс для пользователей на период [start_date, end_date]
+
+        Args:
+            user_ids (iterable): ID пользователей
+            start_date (datetime): Начало окна
+            end_date (datetime): Конец окна
+
+        Returns:
+            AvailabilityIndex: Заполненный индекс
+        """
+        index = cls(user_ids, start_date, end_date)
+        if not index.user_ids:
+            return index
+
+        availabilities = {}
+        busy = {}
+
+        rows = UserAvailability.objects.filter(
+            user_id__in=index.user_ids,
+            start_time__lt=end_date,
+            end_time__gt=start_date
+        ).order_by('start_time', 'id').values_list(
+            'user_id', 'start_time', 'end_time', 'availability_type')
+
+        for user_id, start_time, end_time, availability_type in rows:
+            if availability_type in cls.AVAILABLE_TYPES:
+                availabilities.setdefault(user_id, []).append(
+                    (start_time, end_time, availability_type))
+            elif availability_type in cls.UNAVAILABLE_TYPES:
+                busy.setdefault(user_id, []).append((start_time, end_time))
+
+        events = CalendarEvent.participants.through.objects.filter(
+            user_id__in=index.user_ids,
+            calendarevent__start_time__lt=end_date,
+            calendarevent__end_time__gt=start_date
+        ).values_list(
+            'user_id', 'calendarevent__start_time', 'calendarevent__end_time')
+
+        for user_id, start_time, end_time in events:
+            busy.setdefault(user_id, []).append((start_time, end_time))
+
+        for user_id, intervals in availabilities.items():
+            index._availabilities[user_id] = intervals
+            index._availability_starts[user_id] = [
+                interval[0] for interval in intervals]
+            index._max_availability_length[user_id] = max(
+                end - start for start, end, _ in intervals)
+
+        for user_id, intervals in busy.items():
+            starts, ends = [], []
+            for start, end in sorted(intervals):
+                # Смежные и перекрывающиеся интервалы объединяются
+                if starts and start <= ends[-1]:
+                    ends[-1] = max(ends[-1], end)
+                else:
+                    starts.append(start)
+                    ends.append(end)
+            index._busy_starts[user_id] = starts
+            index._busy_ends[user_id] = ends
+
+        return index
+
+    def covers(self, user_ids, start_date, end_date):
+        """
+        Проверяет, загружены ли в индекс данные пользователей на указанный период
+        """
+        return (self.start_date <= start_date and end_date <= self.end_date
+                and self.user_ids.issuperset(user_ids))
+
+    def _iter_availabilities(self, user_id, start_date, end_date):
+        """
+        Перебирает доступности пользователя, пересекающиеся с периодом
+        """
+        starts = self._availability_starts.get(user_id)
+        if not starts:
+            return
+
+        intervals = self._availabilities[user_id]
+        lower = bisect_left(
+            starts, start_date - self._max_availability_length[user_id])
+        upper = bisect_left(starts, end_date)
+
+        for position in range(lower, upper):
+            if intervals[position][1] > start_date:
+                yield intervals[position]
+
+    def is_busy(self, user_id, start_time, end_time):
+        """
+        Проверяет, пересекается ли интервал с занятостью пользователя
+        """
+        starts = self._busy_starts.get(user_id)
+        if not starts:
+            return False
+
+        # Последний интервал занятости, начинающийся раньше end_time,
+        # имеет наибольший конец среди всех таких интервалов
+        position = bisect_left(starts, end_time) - 1
+        return position >= 0 and self._busy_ends[user_id][position] > start_time
+
+    def get_available_time_slots(self, user_id, start_date, end_date, min_duration_minutes=30):
+        """
+        Возвращает доступные временные слоты пользователя на период
+
+        Returns:
+            list: Список кортежей (start_time, end_time) доступных слотов
+        """
+        busy_starts = self._busy_starts.get(user_id, [])
+        busy_ends = self._busy_ends.get(user_id, [])
+        available_slots = []
+
+        for avail_start, avail_end, availability_type in self._iter_availabilities(
+                user_id, start_date, end_date):
+            start = max(avail_start, start_date)
+            end = min(avail_end, end_date)
+
+            # Если это рабочий день (для рабочих часов)
+            if availability_type == UserAvailability.AvailabilityType.WORKING_HOURS:
+                if not SmartSchedulerEngine.is_working_day(start.date()):
+                    continue
+
+            current = start
+            # Интервалы занятости, закончившиеся до начала слота, не влияют на него
+            position = bisect_right(busy_ends, current)
+
+            while position < len(busy_starts) and current < end:
+                if current < busy_starts[position]:
+                    slot_end = min(busy_starts[position], end)
+                    if (slot_end - current).total_seconds() / 60 >= min_duration_minutes:
+                        available_slots.append((current, slot_end))
+                current = max(current, busy_ends[position])
+                position += 1
+
+            if current < end:
+                if (end - current).total_seconds() / 60 >= min_duration_minutes:
+                    available_slots.append((current, end))
+
+        return available_slots
+
+    def is_available(self, user_id, start_time, end_time):
+        """
+        Проверяет, свободен ли пользователь на весь интервал [start_time, end_time)
+        """
+        if self.is_busy(user_id, start_time, end_time):
+            return False
+
+        for avail_start, avail_end, availability_type in self._iter_availabilities(
+                user_id, start_time, end_time):
+            if avail_start > start_time or avail_end < end_time:
+                continue
+            if (availability_type == UserAvailability.AvailabilityType.WORKING_HOURS
+                    and not SmartSchedulerEngine.is_working_day(start_time.date())):
+                continue
+            return True
+
+        return False
+
+    def free_users(self, user_ids, start_time, end_time):
+        """
+        Возвращает ID пользователей, свободных на весь интервал [start_time, end_time)
+        """
+        return [user_id for user_id in user_ids
+                if self.is_available(user_id, start_time, end_time)]
+
+    def reserve(self, user_ids, start_time, end_time):
+        """
+        Отмечает интервал как занятый для пользователей (например, после
+        создания события календаря), не обращаясь к базе данных
+        """
+        for user_id in user_ids:
+            starts = self._busy_starts.setdefault(user_id, [])
+            ends = self._busy_ends.setdefault(user_id, [])
+
+            # Интервалы, пересекающиеся или смежные с новым
+            lower = bisect_left(ends, start_time)
+            upper = bisect_right(starts, end_time)
+
+            if lower < upper:
+                start_time_merged = min(start_time, starts[lower])
+                end_time_merged = max(end_time, ends[upper - 1])
+                starts[lower:upper] = [start_time_merged]
+                ends[lower:upper] = [end_time_merged]
+            else:
+                starts.insert(lower, start_time)
+                ends.insert(lower, end_time)
+
+
+class MentorBookings:
+    """
+    Сессии менторов, забронированные в текущем проходе планирования.
+
+    Денормализованная нагрузка MentorLoad не меняется, пока план не сохранен,
+    поэтому без этого учета один проход мог бы превысить дневной и недельный
+    лимиты ментора.
+    """
+
+    def __init__(self):
+        # (mentor_id, дата) -> количество сессий
+        self._daily_sessions = {}
+        # (mentor_id, (год, неделя ISO)) -> часы
+        self._weekly_hours = {}
+
+    def sessions(self, mentor_id, start_time):
+        return self._daily_sessions.get((mentor_id, start_time.date()), 0)
+
+    def hours(self, mentor_id, start_time):
+        return self._weekly_hours.get(
+            (mentor_id, start_time.date().isocalendar()[:2]), 0.0)
+
+    def add(self, mentor_id, start_time, end_time):
+        day_key = (mentor_id, start_time.date())
+        week_key = (mentor_id, start_time.date().isocalendar()[:2])
+        self._daily_sessions[day_key] = self._daily_sessions.get(day_key, 0) + 1
+        self._weekly_hours[week_key] = (
+            self._weekly_hours.get(week_key, 0.0)
+            + (end_time - start_time).total_seconds() / 3600)
+
+
 class SmartSchedulerEngine:
     """
     Сервис для интеллектуального планирования шагов онбординга с учетом:
@@ -66,94 +324,9 @@ class SmartSchedulerEngine:
         Returns:
             list: Список кортежей (start_time, end_time) доступных слотов
         """
-        # Получаем рабочее время и предпочтения пользователя
-        availabilities = UserAvailability.objects.filter(
-            user=user,
-            start_time__lt=end_date,
-            end_time__gt=start_date,
-            availability_type__in=[
-                UserAvailability.AvailabilityType.WORKING_HOURS,
-                UserAvailability.AvailabilityType.PREFERRED
-            ]
-        ).order_by('start_time')
-
-        # Получаем уже занятое время (недоступности и календарные события)
-        unavailable_slots = []
-
-        # Добавляем отпуска и недоступности
-        unavailabilities = UserAvailability.objects.filter(
-            user=user,
-            start_time__lt=end_date,
-            end_time__gt=start_date,
-            availability_type__in=[
-                UserAvailability.AvailabilityType.VACATION,
-                UserAvailability.AvailabilityType.UNAVAILABLE
-            ]
-        )
-
-        for unavail in unavailabilities:
-            unavailable_slots.append((unavail.start_time, unavail.end_time))
-
-        # Добавляем запланированные события в календаре
-        events = CalendarEvent.objects.filter(
-            participants=user,
-            start_time__lt=end_date,
-            end_time__gt=start_date
-        )
-
-        for event in events:
-            unavailable_slots.append((event.start_time, event.end_time))
-
-        # Объединяем перекрывающиеся недоступные слоты
-        unavailable_slots.sort(key=lambda x: x[0])
-        merged_unavailable = []
-
-        for start, end in unavailable_slots:
-            if not merged_unavailable or start > merged_unavailable[-1][1]:
-                merged_unavailable.append((start, end))
-            else:
-                merged_unavailable[-1] = (merged_unavailable[-1]
-                                          [0], max(merged_unavailable[-1][1], end))
-
-        # Находим доступные слоты на основе доступностей и недоступностей
-        available_slots = []
-
-        for avail in availabilities:
-            start = max(avail.start_time, start_date)
-            end = min(avail.end_time, end_date)
-
-            # Если это рабочий день (для рабочих часов)
-            if avail.availability_type == UserAvailability.AvailabilityType.WORKING_HOURS:
-                if not SmartSchedulerEngine.is_working_day(start.date()):
-                    continue
-
-            # Проверяем доступный слот относительно недоступных периодов
-            current = start
-
-            for unavail_start, unavail_end in merged_unavailable:
-                # Если есть доступное время до недоступного периода
-                if current < unavail_start:
-                    slot_end = min(unavail_start, end)
-                    duration = (slot_end - current).total_seconds() / 60
-
-                    # Добавляем только если слот достаточной продолжительности
-                    if duration >= min_duration_minutes:
-                        available_slots.append((current, slot_end))
-
-                # Перемещаем текущее время после недоступного периода
-                current = max(current, unavail_end)
-
-                # Если вышли за пределы доступности, прерываем
-                if current >= end:
-                    break
-
-            # Проверяем остался ли еще доступный слот после всех недоступных периодов
-            if current < end:
-                duration = (end - current).total_seconds() / 60
-                if duration >= min_duration_minutes:
-                    available_slots.append((current, end))
-
-        return available_slots
+        index = AvailabilityIndex.load([user.id], start_date, end_date)
+        return index.get_available_time_slots(
+            user.id, start_date, end_date, min_duration_minutes)
 
     @staticmethod
     def get_step_constraints(step):
@@ -227,7 +400,8 @@ class SmartSchedulerEngine:
         return True
 
     @staticmethod
-    def find_available_mentor(step, start_time, end_time):
+    def find_available_mentor(step, start_time, end_time, availability_index=None, mentor_loads=None,
+                              mentor_bookings=None):
         """
         Находит доступного ментора для шага в указанный временной слот
 
@@ -235,6 +409,11 @@ class SmartSchedulerEngine:
             step (OnboardingStep): Шаг онбординга
             start_time (datetime): Время начала
             end_time (datetime): Время окончания
+            availability_index (AvailabilityIndex): Загруженный индекс доступности
+                (если не покрывает менторов и слот, загружается новый)
+            mentor_loads (list): Заранее загруженные активные нагрузки менторов
+            mentor_bookings (MentorBookings): Сессии, забронированные в текущем
+                проходе и еще не учтенные в нагрузке менторов
 
         Returns:
             User or None: Доступный ментор или None, если такого не найдено
@@ -242,35 +421,106 @@ class SmartSchedulerEngine:
         duration_hours = (end_time - start_time).total_seconds() / 3600
 
         # Получаем всех активных менторов
-        mentor_loads = MentorLoad.objects.filter(
-            active=True).select_related('mentor')
+        if mentor_loads is None:
+            mentor_loads = list(MentorLoad.objects.filter(
+                active=True).select_related('mentor'))
+
+        mentor_ids = [mentor_load.mentor_id for mentor_load in mentor_loads]
+        if availability_index is None or not availability_index.covers(mentor_ids, start_time, end_time):
+            availability_index = AvailabilityIndex.load(
+                mentor_ids, start_time, end_time)
 
-        # Проверяем доступность каждого ментора
+        free_mentor_ids = set(availability_index.free_users(
+            mentor_ids, start_time, end_time))
+
+        # Проверяем нагрузку и доступность каждого ментора
         for mentor_load in mentor_loads:
-            # Проверяем нагрузку
-            if not mentor_load.can_accommodate_session(start_time, duration_hours):
+            if mentor_load.mentor_id not in free_mentor_ids:
                 continue
 
-            # Проверяем доступность во временном слоте
-            mentor_slots = SmartSchedulerEngine.get_available_time_slots(
-                mentor_load.mentor, start_time, end_time,
-                min_duration_minutes=int(duration_hours * 60)
-            )
+            booked_sessions, booked_hours = 0, 0.0
+            if mentor_bookings is not None:
+                booked_sessions = mentor_bookings.sessions(mentor_load.mentor_id, start_time)
+                booked_hours = mentor_bookings.hours(mentor_load.mentor_id, start_time)
 
-            # Если ментор доступен в указанный слот
-            if any(slot_start <= start_time and slot_end >= end_time for slot_start, slot_end in mentor_slots):
+            if mentor_load.can_accommodate_session(
+                    start_time, duration_hours, booked_sessions, booked_hours):
                 return mentor_load.mentor
 
         return None
 
     @staticmethod
-    def schedule_step(step_progress, priority=1):
+    def get_step_duration(step):
+        """
+        Возвращает продолжительность шага для планирования
+        """
+        if step.deadline_days:
+            return timedelta(days=step.deadline_days)
+        # По умолчанию 1 час для шагов без явной длительности
+        return timedelta(hours=1)
+
+    @staticmethod
+    def select_time_slot(step, user_id, availability_index, start_search_time, end_search_time,
+                         duration, mentor_loads=None, mentor_bookings=None):
+        """
+        Выбирает первый подходящий слот пользователя (и ментора для встреч).
+        Для встреч свободное окно пользователя перебирается с шагом в
+        длительность встречи, пока не найдется свободный ментор
+
+        Args:
+            step (OnboardingStep): Шаг онбординга
+            user_id (int): ID пользователя
+            availability_index (AvailabilityIndex): Индекс доступности, покрывающий
+                пользователя, менторов и период поиска
+            start_search_time (datetime): Начало периода поиска
+            end_search_time (datetime): Конец периода поиска
+            duration (timedelta): Продолжительность шага
+            mentor_loads (list): Активные нагрузки менторов (для встреч)
+            mentor_bookings (MentorBookings): Сессии менторов, забронированные
+                в текущем проходе планирования
+
+        Returns:
+            tuple: ((start_time, end_time), mentor) или (None, None)
+        """
+        available_slots = availability_index.get_available_time_slots(
+            user_id, start_search_time, end_search_time
+        )
+
+        for slot_start, slot_end in available_slots:
+            # Если шаг короче доступного слота, устанавливаем конец на начало + продолжительность
+            if step.step_type == OnboardingStep.StepType.MEETING:
+                # Для встреч находим подходящего ментора: начало окна, затем
+                # следующие интервалы, целиком помещающиеся в окно
+                candidate = slot_start
+                while True:
+                    mentor = SmartSchedulerEngine.find_available_mentor(
+                        step, candidate, candidate + duration,
+                        availability_index=availability_index,
+                        mentor_loads=mentor_loads,
+                        mentor_bookings=mentor_bookings)
+                    if mentor:
+                        return (candidate, candidate + duration), mentor
+                    candidate += duration
+                    if candidate + duration > slot_end:
+                        break
+            else:
+                # Для других типов шагов просто проверяем, что слот достаточной длины
+                if (slot_end - slot_start) >= duration:
+                    return (slot_start, slot_start + duration), None
+
+        return None, None
+
+    @staticmethod
+    def schedule_step(step_progress, priority=1, availability_index=None, mentor_loads=None):
         """
         Планирует один шаг онбординга
 
         Args:
             step_progress (UserStepProgress): Прогресс шага пользователя
             priority (int): Приоритет планирования
+            availability_index (AvailabilityIndex): Общий индекс доступности
+                (используется при планировании нескольких шагов подряд)
+            mentor_loads (list): Заранее загруженные активные нагрузки менторов
 
         Returns:
             ScheduledOnboardingStep: Запланированный шаг или None в случае неудачи
@@ -300,37 +550,28 @@ class SmartSchedulerEngine:
             start_search_time = timezone.now()
 
         # Вычисляем продолжительность шага
-        if step.deadline_days:
-            duration = timedelta(days=step.deadline_days)
-        else:
-            # По умолчанию 1 час для шагов без явной длительности
-            duration = timedelta(hours=1)
+        duration = SmartSchedulerEngine.get_step_duration(step)
+
+        is_meeting = step.step_type == OnboardingStep.StepType.MEETING
+        if is_meeting and mentor_loads is None:
+            mentor_loads = list(MentorLoad.objects.filter(
+                active=True).select_related('mentor'))
 
         # Получаем доступные временные слоты пользователя на ближайшие 30 дней
         end_search_time = start_search_time + timedelta(days=30)
-        available_slots = SmartSchedulerEngine.get_available_time_slots(
-            user, start_search_time, end_search_time
-        )
+        index_user_ids = [user.id]
+        if is_meeting:
+            index_user_ids += [mentor_load.mentor_id for mentor_load in mentor_loads]
+        if availability_index is None or not availability_index.covers(
+                index_user_ids, start_search_time, end_search_time + duration):
+            availability_index = AvailabilityIndex.load(
+                index_user_ids, start_search_time, end_search_time + duration)
 
         # Выбираем подходящий временной слот
-        suitable_slot = None
-        chosen_mentor = None
-
-        for slot_start, slot_end in available_slots:
-            # Если шаг короче доступного слота, устанавливаем конец на начало + продолжительность
-            if step.step_type == OnboardingStep.StepType.MEETING:
-                # Для встреч находим подходящего ментора
-                mentor = SmartSchedulerEngine.find_available_mentor(
-                    step, slot_start, slot_start + duration)
-                if mentor:
-                    suitable_slot = (slot_start, slot_start + duration)
-                    chosen_mentor = mentor
-                    break
-            else:
-                # Для других типов шагов просто проверяем, что слот достаточной длины
-                if (slot_end - slot_start) >= duration:
-                    suitable_slot = (slot_start, slot_start + duration)
-                    break
+        suitable_slot, chosen_mentor = SmartSchedulerEngine.select_time_slot(
+            step, user.id, availability_index, start_search_time, end_search_time,
+            duration, mentor_loads
+        )
 
         if not suitable_slot:
             logger.warning(
@@ -373,6 +614,10 @@ class SmartSchedulerEngine:
             calendar_event.participants.add(user)
             calendar_event.participants.add(chosen_mentor)
 
+            # Учитываем новое событие в индексе для следующих шагов
+            availability_index.reserve(
+                [user.id, chosen_mentor.id], suitable_slot[0], suitable_slot[1])
+
         return scheduled_step
 
     @staticmethod
@@ -386,41 +631,11 @@ class SmartSchedulerEngine:
         Returns:
             bool: True если планирование успешно, иначе False
         """
-        try:
-            assignment = UserOnboardingAssignment.objects.get(id=assignment_id)
-        except UserOnboardingAssignment.DoesNotExist:
+        stats = BatchSchedulePlanner.plan([assignment_id])
+        if not stats['assignments_planned']:
             logger.error(f"Assignment with ID {assignment_id} not found")
             return False
 
-        user = assignment.user
-        steps = OnboardingStep.objects.filter(
-            program=assignment.program).order_by('order')
-
-        # Получаем все записи прогресса пользователя для этой программы
-        progresses = {}
-        for progress in UserStepProgress.objects.filter(user=user, step__program=assignment.program):
-            progresses[progress.step_id] = progress
-
-        # Планируем каждый шаг
-        for step in steps:
-            # Получаем или создаем запись о прогрессе
-            if step.id in progresses:
-                progress = progresses[step.id]
-            else:
-                progress = UserStepProgress.objects.create(
-                    user=user,
-                    step=step,
-                    status=UserStepProgress.ProgressStatus.NOT_STARTED
-                )
-
-            # Определяем приоритет (можно расширить логику в будущем)
-            priority = 1
-            if step.is_required:
-                priority += 1
-
-            # Планируем шаг
-            SmartSchedulerEngine.schedule_step(progress, priority)
-
         return True
 
     @staticmethod
@@ -445,41 +660,72 @@ class SmartSchedulerEngine:
         ).select_related('dependent_step')
 
         count = 0
-        for constraint in dependent_constraints:
-            if not constraint.dependent_step:
-                continue
+        # Обработчики сохранений выполняются один раз для всех перепланированных шагов
+        with outbox.coalesce():
+            for constraint in dependent_constraints:
+                if not constraint.dependent_step:
+                    continue
 
-            # Получаем прогресс по зависимому шагу
-            try:
-                dependent_progress = UserStepProgress.objects.get(
-                    user=user,
-                    step=constraint.dependent_step
-                )
+                # Получаем прогресс по зависимому шагу
+                try:
+                    dependent_progress = UserStepProgress.objects.get(
+                        user=user,
+                        step=constraint.dependent_step
+                    )
 
-                # Если шаг еще не выполнен, перепланируем его
-                if dependent_progress.status != UserStepProgress.ProgressStatus.DONE:
-                    SmartSchedulerEngine.schedule_step(
-                        dependent_progress, priority=2)
-                    count += 1
+                    # Если шаг еще не выполнен, перепланируем его
+                    if dependent_progress.status != UserStepProgress.ProgressStatus.DONE:
+                        SmartSchedulerEngine.schedule_step(
+                            dependent_progress, priority=2)
+                        count += 1
 
-            except UserStepProgress.DoesNotExist:
-                continue
+                except UserStepProgress.DoesNotExist:
+                    continue
 
         return count
 
     @staticmethod
-    def detect_conflicts(user_id=None, start_date=None, end_date=None):
+    def find_overlaps(intervals):
         """
-        Обнаруживает конфликты в расписании
+        Находит все пересекающиеся пары интервалов методом заметающей прямой
+        за O(n log n + k), где k - количество пересечений
+
+        Args:
+            intervals (iterable): Кортежи (start, end, payload), отсортированные по start
+
+        Yields:
+            tuple: (payload1, payload2, overlap_start, overlap_end), где payload1
+                принадлежит интервалу, начавшемуся раньше
+        """
+        # Куча активных интервалов, упорядоченная по времени окончания
+        active = []
+
+        for position, (start, end, payload) in enumerate(intervals):
+            # Интервалы, закончившиеся до начала текущего, больше ни с чем не пересекутся
+            while active and active[0][0] <= start:
+                heapq.heappop(active)
+
+            for other_end, _, other_start, other_payload in active:
+                # Исключаем интервалы нулевой длины, касающиеся друг друга
+                if other_start < end:
+                    yield other_payload, payload, start, min(end, other_end)
+
+            heapq.heappush(active, (end, position, start, payload))
+
+    @staticmethod
+    def iter_conflicts(user_id=None, start_date=None, end_date=None, include_mentors=False):
+        """
+        Потоково обнаруживает конфликты в расписании, по одному пользователю за раз
 
         Args:
             user_id (int): ID пользователя для проверки (если None, проверяются все)
             start_date (datetime): Начальная дата для проверки (если None, используется текущая)
             end_date (datetime): Конечная дата для проверки (если None, +30 дней от начальной)
+            include_mentors (bool): Проверять также двойное бронирование менторов
+                по событиям календаря
 
-        Returns:
-            list: Список конфликтов в формате:
-                [{'user_id': id, 'conflicts': [{'step1': step1, 'step2': step2, 'overlap_start': dt, 'overlap_end': dt}]}]
+        Yields:
+            dict: Конфликты одного пользователя в формате detect_conflicts
         """
         if not start_date:
             start_date = timezone.now()
@@ -487,73 +733,135 @@ class SmartSchedulerEngine:
         if not end_date:
             end_date = start_date + timedelta(days=30)
 
-        conflicts = []
-
         # Фильтр по пользователю, если указан
         user_filter = {}
         if user_id:
             user_filter['step_progress__user__id'] = user_id
 
-        # Получаем все запланированные шаги в указанный период
+        # Запланированные шаги читаются порциями в порядке (пользователь, начало)
         scheduled_steps = ScheduledOnboardingStep.objects.filter(
             scheduled_start_time__lt=end_date,
             scheduled_end_time__gt=start_date,
             **user_filter
-        ).select_related('step_progress', 'step_progress__step', 'step_progress__user')
-
-        # Группируем шаги по пользователям
-        users_steps = {}
-        for step in scheduled_steps:
-            user_id = step.step_progress.user.id
-            if user_id not in users_steps:
-                users_steps[user_id] = []
-            users_steps[user_id].append(step)
-
-        # Для каждого пользователя ищем конфликты
-        for user_id, steps in users_steps.items():
-            user_conflicts = []
-
-            # Сравниваем каждый шаг с каждым
-            for i in range(len(steps)):
-                for j in range(i + 1, len(steps)):
-                    step1 = steps[i]
-                    step2 = steps[j]
-
-                    # Проверяем перекрытие времени
-                    if step1.scheduled_start_time < step2.scheduled_end_time and step2.scheduled_start_time < step1.scheduled_end_time:
-                        # Определяем перекрытие
-                        overlap_start = max(
-                            step1.scheduled_start_time, step2.scheduled_start_time)
-                        overlap_end = min(
-                            step1.scheduled_end_time, step2.scheduled_end_time)
-
-                        # Добавляем конфликт
-                        user_conflicts.append({
-                            'step1': {
-                                'id': step1.id,
-                                'name': step1.step_progress.step.name,
-                                'start_time': step1.scheduled_start_time,
-                                'end_time': step1.scheduled_end_time
-                            },
-                            'step2': {
-                                'id': step2.id,
-                                'name': step2.step_progress.step.name,
-                                'start_time': step2.scheduled_start_time,
-                                'end_time': step2.scheduled_end_time
-                            },
-                            'overlap_start': overlap_start,
-                            'overlap_end': overlap_end
-                        })
+        ).select_related(
+            'step_progress', 'step_progress__step', 'step_progress__user'
+        ).order_by(
+            'step_progress__user_id', 'scheduled_start_time', 'id'
+        ).iterator(chunk_size=2000)
+
+        for _, steps in groupby(scheduled_steps, key=lambda step: step.step_progress.user_id):
+            steps = list(steps)
+            user_conflicts = [
+                {
+                    'step1': SmartSchedulerEngine._step_conflict_data(step1),
+                    'step2': SmartSchedulerEngine._step_conflict_data(step2),
+                    'overlap_start': overlap_start,
+                    'overlap_end': overlap_end
+                }
+                for step1, step2, overlap_start, overlap_end in SmartSchedulerEngine.find_overlaps(
+                    (step.scheduled_start_time, step.scheduled_end_time, step) for step in steps)
+            ]
 
             # Если найдены конфликты для пользователя
             if user_conflicts:
-                conflicts.append({
-                    'user_id': user_id,
-                    'user_name': steps[0].step_progress.user.get_full_name(),
+                user = steps[0].step_progress.user
+                yield {
+                    'user_id': user.id,
+                    'user_name': user.get_full_name(),
+                    'conflict_type': 'step_overlap',
                     'conflicts': user_conflicts
-                })
+                }
+
+        if include_mentors:
+            yield from SmartSchedulerEngine.iter_mentor_conflicts(
+                user_id, start_date, end_date)
+
+    @staticmethod
+    def iter_mentor_conflicts(user_id, start_date, end_date):
+        """
+        Потоково обнаруживает двойное бронирование менторов по событиям календаря
+
+        Args:
+            user_id (int): ID ментора для проверки (если None, проверяются все активные)
+            start_date (datetime): Начальная дата для проверки
+            end_date (datetime): Конечная дата для проверки
+
+        Yields:
+            dict: Пересекающиеся события одного ментора
+        """
+        mentor_ids = MentorLoad.objects.filter(
+            active=True).values_list('mentor_id', flat=True)
+        if user_id:
+            mentor_ids = mentor_ids.filter(mentor_id=user_id)
+
+        Participant = CalendarEvent.participants.through
+        participations = Participant.objects.filter(
+            user_id__in=mentor_ids,
+            calendarevent__start_time__lt=end_date,
+            calendarevent__end_time__gt=start_date
+        ).select_related('user', 'calendarevent').order_by(
+            'user_id', 'calendarevent__start_time', 'calendarevent_id'
+        ).iterator(chunk_size=2000)
+
+        for _, mentor_participations in groupby(participations, key=lambda item: item.user_id):
+            mentor_participations = list(mentor_participations)
+            mentor_conflicts = [
+                {
+                    'event1': SmartSchedulerEngine._event_conflict_data(event1),
+                    'event2': SmartSchedulerEngine._event_conflict_data(event2),
+                    'overlap_start': overlap_start,
+                    'overlap_end': overlap_end
+                }
+                for event1, event2, overlap_start, overlap_end in SmartSchedulerEngine.find_overlaps(
+                    (item.calendarevent.start_time, item.calendarevent.end_time, item.calendarevent)
+                    for item in mentor_participations)
+            ]
 
-        return conflicts
+            if mentor_conflicts:
+                mentor = mentor_participations[0].user
+                yield {
+                    'user_id': mentor.id,
+                    'user_name': mentor.get_full_name(),
+                    'conflict_type': 'mentor_double_booking',
+                    'conflicts': mentor_conflicts
+                }
+
+    @staticmethod
+    def _step_conflict_data(scheduled_step):
+        return {
+            'id': scheduled_step.id,
+            'name': scheduled_step.step_progress.step.name,
+            'start_time': scheduled_step.scheduled_start_time,
+            'end_time': scheduled_step.scheduled_end_time
+        }
+
+    @staticmethod
+    def _event_conflict_data(event):
+        return {
+            'id': event.id,
+            'name': event.title,
+            'start_time': event.start_time,
+            'end_time': event.end_time
+        }
+
+    @staticmethod
+    def detect_conflicts(user_id=None, start_date=None, end_date=None, include_mentors=False):
+        """
+        Обнаруживает конфликты в расписании
+
+        Args:
+            user_id (int): ID пользователя для проверки (если None, проверяются все)
+            start_date (datetime): Начальная дата для проверки (если None, используется текущая)
+            end_date (datetime): Конечная дата для проверки (если None, +30 дней от начальной)
+            include_mentors (bool): Проверять также двойное бронирование менторов
+
+        Returns:
+            list: Список конфликтов в формате:
+                [{'user_id': id, 'conflicts': [{'step1': step1, 'step2': step2, 'overlap_start': dt, 'overlap_end': dt}]}]
+                Для менторов вместо step1/step2 используются event1/event2
+        """
+        return list(SmartSchedulerEngine.iter_conflicts(
+            user_id, start_date, end_date, include_mentors))
 
     @staticmethod
     def override_scheduled_step(scheduled_step_id, new_start_time, new_end_time):
@@ -680,3 +988,317 @@ class SmartSchedulerEngine:
         }
 
         return schedule
+
+
+class BatchSchedulePlanner:
+    """
+    Пакетный планировщик назначений онбординга.
+
+    Загружает шаги программ, зависимости, прогресс и календари пользователей
+    и менторов один раз, размещает все шаги за один проход в памяти с учетом
+    порядка и зависимостей и сохраняет результат массовыми операциями
+    в одной транзакции.
+    """
+
+    # Горизонт поиска слотов для каждого шага (в днях)
+    SEARCH_DAYS = 30
+
+    @classmethod
+    def plan(cls, assignment_ids):
+        """
+        Планирует все шаги указанных назначений
+
+        Args:
+            assignment_ids (iterable): ID назначений онбординга
+
+        Returns:
+            dict: Статистика планирования
+        """
+        stats = {
+            'assignments_planned': 0,
+            'steps_scheduled': 0,
+            'steps_skipped': 0,
+            'calendar_events': 0,
+        }
+
+        assignments = list(UserOnboardingAssignment.objects.filter(
+            id__in=list(assignment_ids)).select_related('user'))
+        if not assignments:
+            return stats
+
+        # Шаги программ
+        steps_by_program = {}
+        for step in OnboardingStep.objects.filter(
+                program_id__in={assignment.program_id for assignment in assignments}
+        ).order_by('order', 'id'):
+            steps_by_program.setdefault(step.program_id, []).append(step)
+        step_ids = {step.id for steps in steps_by_program.values() for step in steps}
+
+        # Зависимости между шагами
+        prerequisites = {}
+        for dependent_step_id, prerequisite_step_id in ScheduleConstraint.objects.filter(
+            dependent_step_id__in=step_ids,
+            prerequisite_step__isnull=False,
+            constraint_type=ScheduleConstraint.ConstraintType.DEPENDENCY,
+            active=True
+        ).values_list('dependent_step_id', 'prerequisite_step_id'):
+            prerequisites.setdefault(dependent_step_id, set()).add(prerequisite_step_id)
+
+        # Прогресс пользователей, в том числе по шагам-предпосылкам из других программ
+        user_ids = {assignment.user_id for assignment in assignments}
+        prerequisite_ids = set().union(*prerequisites.values()) if prerequisites else set()
+        progresses = {
+            (progress.user_id, progress.step_id): progress
+            for progress in UserStepProgress.objects.filter(
+                user_id__in=user_ids,
+                step_id__in=step_ids | prerequisite_ids
+            ).select_related('step')
+        }
+
+        # Календари пользователей и менторов
+        now = timezone.now()
+        mentor_loads = list(MentorLoad.objects.filter(
+            active=True).select_related('mentor'))
+        index_user_ids = list(user_ids) + [
+            mentor_load.mentor_id for mentor_load in mentor_loads]
+        longest_step = max(
+            [SmartSchedulerEngine.get_step_duration(step)
+             for steps in steps_by_program.values() for step in steps]
+            + [timedelta(hours=1)]
+        )
+        search_starts = [now] + [
+            progress.planned_date_start for progress in progresses.values()
+            if progress.planned_date_start
+        ]
+        availability_index = AvailabilityIndex.load(
+            index_user_ids,
+            min(search_starts),
+            max(search_starts) + timedelta(days=cls.SEARCH_DAYS) + longest_step
+        )
+        reservations = []
+        mentor_bookings = MentorBookings()
+
+        # Размещение шагов в памяти
+        new_progresses = []
+        planned_steps = []
+
+        for assignment in assignments:
+            user = assignment.user
+            planned_ends = {}
+
+            for step in cls._order_steps(steps_by_program.get(assignment.program_id, []), prerequisites):
+                progress = progresses.get((user.id, step.id))
+                if progress is None:
+                    progress = UserStepProgress(
+                        user=user,
+                        step=step,
+                        status=UserStepProgress.ProgressStatus.NOT_STARTED
+                    )
+                    progresses[(user.id, step.id)] = progress
+                    new_progresses.append(progress)
+
+                start_search_time = progress.planned_date_start or now
+
+                # Предпосылка выполнена, либо уже размещена в этом проходе
+                prerequisites_met = True
+                for prerequisite_id in prerequisites.get(step.id, ()):
+                    prerequisite_progress = progresses.get((user.id, prerequisite_id))
+                    if (prerequisite_progress is not None and
+                            prerequisite_progress.status == UserStepProgress.ProgressStatus.DONE):
+                        continue
+                    if prerequisite_id in planned_ends:
+                        start_search_time = max(
+                            start_search_time, planned_ends[prerequisite_id])
+                        continue
+                    prerequisites_met = False
+                    break
+
+                if not prerequisites_met:
+                    logger.warning(
+                        f"Cannot schedule step {step.id} for user {user.id}: prerequisites not met")
+                    stats['steps_skipped'] += 1
+                    continue
+
+                duration = SmartSchedulerEngine.get_step_duration(step)
+                end_search_time = start_search_time + timedelta(days=cls.SEARCH_DAYS)
+                availability_index = cls._ensure_index(
+                    availability_index, index_user_ids, start_search_time,
+                    end_search_time + duration, reservations)
+
+                slot, mentor = SmartSchedulerEngine.select_time_slot(
+                    step, user.id, availability_index, start_search_time,
+                    end_search_time, duration, mentor_loads, mentor_bookings
+                )
+                if slot is None:
+                    logger.warning(
+                        f"Could not find suitable time slot for step {step.id} and user {user.id}")
+                    stats['steps_skipped'] += 1
+                    continue
+
+                planned_ends[step.id] = slot[1]
+                if mentor:
+                    availability_index.reserve([user.id, mentor.id], slot[0], slot[1])
+                    reservations.append(([user.id, mentor.id], slot[0], slot[1]))
+                    mentor_bookings.add(mentor.id, slot[0], slot[1])
+
+                # Определяем приоритет (можно расширить логику в будущем)
+                priority = 2 if step.is_required else 1
+                planned_steps.append((progress, slot, priority, mentor))
+
+            stats['assignments_planned'] += 1
+
+        stats['steps_scheduled'] = len(planned_steps)
+        stats['calendar_events'] = cls._save_plan(
+            planned_steps, new_progresses, [assignment.id for assignment in assignments])
+
+        return stats
+
+    @staticmethod
+    def _order_steps(steps, prerequisites):
+        """
+        Упорядочивает шаги программы так, чтобы предпосылки шли раньше зависимых
+        шагов, в остальном сохраняя порядок программы.
+        Шаги из циклических зависимостей добавляются в конец в порядке программы
+        """
+        positions = {step.id: position for position, step in enumerate(steps)}
+        dependents = {}
+        waiting = {}
+
+        for step in steps:
+            local_prerequisites = [
+                prerequisite_id for prerequisite_id in prerequisites.get(step.id, ())
+                if prerequisite_id in positions
+            ]
+            waiting[step.id] = len(local_prerequisites)
+            for prerequisite_id in local_prerequisites:
+                dependents.setdefault(prerequisite_id, []).append(step.id)
+
+        ready = [positions[step_id] for step_id, count in waiting.items() if count == 0]
+        heapq.heapify(ready)
+        ordered = []
+
+        while ready:
+            step = steps[heapq.heappop(ready)]
+            ordered.append(step)
+            for dependent_id in dependents.get(step.id, ()):
+                waiting[dependent_id] -= 1
+                if waiting[dependent_id] == 0:
+                    heapq.heappush(ready, positions[dependent_id])
+
+        if len(ordered) < len(steps):
+            ordered_ids = {step.id for step in ordered}
+            ordered += [step for step in steps if step.id not in ordered_ids]
+
+        return ordered
+
+    @staticmethod
+    def _ensure_index(availability_index, user_ids, start_date, end_date, reservations):
+        """
+        Расширяет индекс доступности, если период выходит за загруженное окно,
+        сохраняя сделанные в этом проходе бронирования
+        """
+        if availability_index.covers(user_ids, start_date, end_date):
+            return availability_index
+
+        availability_index = AvailabilityIndex.load(
+            user_ids,
+            min(start_date, availability_index.start_date),
+            max(end_date, availability_index.end_date)
+        )
+        for reserved_user_ids, start_time, end_time in reservations:
+            availability_index.reserve(reserved_user_ids, start_time, end_time)
+
+        return availability_index
+
+    @staticmethod
+    def _save_plan(planned_steps, new_progresses, assignment_ids):
+        """
+        Сохраняет результат планирования массовыми операциями в одной транзакции
+
+        Returns:
+            int: Количество созданных или обновленных событий календаря
+        """
+        # Тайм-зона пользователя (заглушка - в реальном проекте нужно получать из профиля)
+        user_timezone = 'UTC'
+        new_progress_ids = {id(progress) for progress in new_progresses}
+
+        for progress, slot, priority, mentor in planned_steps:
+            progress.planned_date_start, progress.planned_date_end = slot
+
+        with transaction.atomic():
+            UserStepProgress.objects.bulk_create(new_progresses)
+            UserStepProgress.objects.bulk_update(
+                [progress for progress, _, _, _ in planned_steps
+                 if id(progress) not in new_progress_ids],
+                ['planned_date_start', 'planned_date_end']
+            )
+
+            scheduled_steps = [
+                ScheduledOnboardingStep(
+                    step_progress=progress,
+                    scheduled_start_time=slot[0],
+                    scheduled_end_time=slot[1],
+                    priority=priority,
+                    auto_scheduled=True,
+                    time_zone=user_timezone
+                )
+                for progress, slot, priority, mentor in planned_steps
+            ]
+            ScheduledOnboardingStep.objects.bulk_create(
+                scheduled_steps,
+                update_conflicts=True,
+                unique_fields=['step_progress'],
+                update_fields=['scheduled_start_time', 'scheduled_end_time',
+                               'priority', 'auto_scheduled', 'time_zone',
+                               'last_rescheduled_at']
+            )
+
+            # События календаря для встреч
+            meetings = [
+                (scheduled_step, progress, mentor)
+                for scheduled_step, (progress, slot, priority, mentor)
+                in zip(scheduled_steps, planned_steps) if mentor
+            ]
+            existing_events = {}
+            for event in CalendarEvent.objects.filter(
+                scheduled_step__in=[scheduled_step.id for scheduled_step, _, _ in meetings]
+            ).order_by('id'):
+                existing_events.setdefault(event.scheduled_step_id, event)
+
+            events_to_update = []
+            events_to_create = []
+            participants = []
+
+            for scheduled_step, progress, mentor in meetings:
+                event = existing_events.get(scheduled_step.id)
+                if event is None:
+                    event = CalendarEvent(scheduled_step=scheduled_step)
+                    events_to_create.append(event)
+                else:
+                    events_to_update.append(event)
+
+                event.title = f"Онбординг: {progress.step.name}"
+                event.description = progress.step.description
+                event.start_time = scheduled_step.scheduled_start_time
+                event.end_time = scheduled_step.scheduled_end_time
+                event.event_type = CalendarEvent.EventType.ONBOARDING_STEP
+                event.time_zone = user_timezone
+                participants.append((event, [progress.user_id, mentor.id]))
+
+            CalendarEvent.objects.bulk_update(
+                events_to_update,
+                ['title', 'description', 'start_time', 'end_time', 'event_type', 'time_zone']
+            )
+            CalendarEvent.objects.bulk_create(events_to_create)
+
+            Participant = CalendarEvent.participants.through
+            Participant.objects.bulk_create(
+                [Participant(calendarevent_id=event.id, user_id=user_id)
+                 for event, event_user_ids in participants for user_id in event_user_ids],
+                ignore_conflicts=True
+            )
+
+            # Массовые операции не вызывают сигналы, отмечаем назначения для аналитики
+            mark_assignments_changed(assignment_ids)
+
+        return len(meetings)
@@ -1,13 +1,14 @@
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import pre_delete
 from django.dispatch import receiver
+from jobs import outbox
 from onboarding.models import UserStepProgress
 from .models import ScheduledOnboardingStep
 
 
-@receiver(post_save, sender=UserStepProgress)
-def create_or_update_scheduled_step(sender, instance, created, **kwargs):
+def create_or_update_scheduled_step(instance, event):
     """
-    Сигнал для создания или обновления запланированного шага при обновлении UserStepProgress
+    Создает или обновляет запланированный шаг при обновлении UserStepProgress
+    (выполняется через outbox после фиксации транзакции)
     """
     from .services import SmartSchedulerEngine
 
@@ -16,23 +17,47 @@ def create_or_update_scheduled_step(sender, instance, created, **kwargs):
         # Возможно нужно перепланировать зависимые шаги
         SmartSchedulerEngine.reschedule_dependent_steps(instance)
 
-    # Создаем или обновляем запланированный шаг
-    if created:
-        # Если это новый шаг прогресса, создаем соответствующий запланированный шаг
-        scheduled_step = ScheduledOnboardingStep.objects.create(
-            step_progress=instance,
-            scheduled_start_time=instance.planned_date_start,
-            scheduled_end_time=instance.planned_date_end
-        )
-    else:
-        # Если это обновление существующего шага, также обновляем запланированный шаг
-        scheduled_step, created = ScheduledOnboardingStep.objects.update_or_create(
-            step_progress=instance,
-            defaults={
-                'scheduled_start_time': instance.planned_date_start,
-                'scheduled_end_time': instance.planned_date_end,
-            }
-        )
+    # update_or_create вместо create: повторная обработка события не создает дубликат
+    ScheduledOnboardingStep.objects.update_or_create(
+        step_progress=instance,
+        defaults={
+            'scheduled_start_time': instance.planned_date_start,
+            'scheduled_end_time': instance.planned_date_end,
+        }
+    )
+
+
+def create_or_update_scheduled_steps(instances, events):
+    """
+    Пакетный вариант create_or_update_scheduled_step (outbox.coalesce):
+    запланированные шаги обновляются одним запросом
+    """
+    from .services import SmartSchedulerEngine
+
+    with outbox.coalesce():
+        for instance in instances:
+            if instance.status == UserStepProgress.ProgressStatus.DONE:
+                SmartSchedulerEngine.reschedule_dependent_steps(instance)
+
+    ScheduledOnboardingStep.objects.bulk_create(
+        [
+            ScheduledOnboardingStep(
+                step_progress=instance,
+                scheduled_start_time=instance.planned_date_start,
+                scheduled_end_time=instance.planned_date_end,
+            )
+            for instance in instances
+        ],
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['step_progress'],
+        update_fields=['scheduled_start_time', 'scheduled_end_time', 'last_rescheduled_at'],
+    )
+
+
+outbox.subscribe(
+    UserStepProgress, create_or_update_scheduled_step,
+    batch_handler=create_or_update_scheduled_steps)
 
 
 @receiver(pre_delete, sender=UserStepProgress)
@@ -0,0 +1,417 @@
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from onboarding.models import (
+    OnboardingProgram,
+    OnboardingStep,
+    UserOnboardingAssignment,
+    UserStepProgress
+)
+from users.models import User, UserRole
+
+from .models import (
+    CalendarEvent,
+    MentorLoad,
+    ScheduleConstraint,
+    ScheduledOnboardingStep,
+    UserAvailability
+)
+from .ai_services import MentorAssignmentOptimizer
+from .services import AvailabilityIndex, BatchSchedulePlanner, SmartSchedulerEngine
+
+
+# Понедельник, рабочий день
+MONDAY = datetime(2030, 1, 7, tzinfo=dt_timezone.utc)
+
+
+class SchedulerTestMixin:
+    """
+    Общие данные для тестов сервисов планировщика
+    """
+
+    def create_user(self, name, role=UserRole.EMPLOYEE):
+        return User.objects.create_user(
+            email=f'{name}@test.com',
+            username=name,
+            password='password',
+            role=role
+        )
+
+    def add_working_hours(self, user, day, start_hour=9, end_hour=18):
+        return UserAvailability.objects.create(
+            user=user,
+            start_time=day + timedelta(hours=start_hour),
+            end_time=day + timedelta(hours=end_hour),
+            availability_type=UserAvailability.AvailabilityType.WORKING_HOURS
+        )
+
+    def add_event(self, participants, start_time, end_time):
+        event = CalendarEvent.objects.create(
+            title='Busy',
+            start_time=start_time,
+            end_time=end_time
+        )
+        event.participants.add(*participants)
+        return event
+
+
+class AvailabilityIndexTest(SchedulerTestMixin, TestCase):
+    """
+    Тесты индекса доступности пользователей
+    """
+
+    def setUp(self):
+        self.user = self.create_user('employee')
+        self.add_working_hours(self.user, MONDAY)
+        # Выходной день не учитывается для рабочих часов
+        self.add_working_hours(self.user, MONDAY - timedelta(days=1))
+        UserAvailability.objects.create(
+            user=self.user,
+            start_time=MONDAY + timedelta(hours=12),
+            end_time=MONDAY + timedelta(hours=13),
+            availability_type=UserAvailability.AvailabilityType.UNAVAILABLE
+        )
+        self.add_event([self.user], MONDAY + timedelta(hours=12, minutes=30),
+                       MONDAY + timedelta(hours=14))
+        self.add_event([self.user], MONDAY + timedelta(hours=17, minutes=45),
+                       MONDAY + timedelta(hours=19))
+
+    def test_available_time_slots(self):
+        slots = SmartSchedulerEngine.get_available_time_slots(
+            self.user, MONDAY - timedelta(days=1), MONDAY + timedelta(days=1))
+
+        self.assertEqual(slots, [
+            (MONDAY + timedelta(hours=9), MONDAY + timedelta(hours=12)),
+            (MONDAY + timedelta(hours=14), MONDAY + timedelta(hours=17, minutes=45)),
+        ])
+
+    def test_reserve_updates_busy_intervals(self):
+        index = AvailabilityIndex.load(
+            [self.user.id], MONDAY, MONDAY + timedelta(days=1))
+        self.assertTrue(index.is_available(
+            self.user.id, MONDAY + timedelta(hours=9), MONDAY + timedelta(hours=10)))
+
+        index.reserve([self.user.id], MONDAY + timedelta(hours=9, minutes=30),
+                      MONDAY + timedelta(hours=12))
+
+        self.assertFalse(index.is_available(
+            self.user.id, MONDAY + timedelta(hours=9), MONDAY + timedelta(hours=10)))
+        self.assertEqual(
+            index.get_available_time_slots(
+                self.user.id, MONDAY, MONDAY + timedelta(days=1)),
+            [
+                (MONDAY + timedelta(hours=9), MONDAY + timedelta(hours=9, minutes=30)),
+                (MONDAY + timedelta(hours=14), MONDAY + timedelta(hours=17, minutes=45)),
+            ])
+
+    def test_find_available_mentor_uses_constant_queries(self):
+        def create_mentors(count, offset):
+            mentors = []
+            for position in range(offset, offset + count):
+                mentor = self.create_user(f'mentor{position}', UserRole.MANAGER)
+                self.add_working_hours(mentor, MONDAY)
+                MentorLoad.objects.create(mentor=mentor)
+                mentors.append(mentor)
+            return mentors
+
+        slot = (MONDAY + timedelta(hours=10), MONDAY + timedelta(hours=11))
+        busy_mentors = create_mentors(2, 0)
+        for mentor in busy_mentors:
+            self.add_event([mentor], *slot)
+
+        with CaptureQueriesContext(connection) as small:
+            self.assertIsNone(
+                SmartSchedulerEngine.find_available_mentor(None, *slot))
+
+        free_mentors = create_mentors(10, 2)
+        with CaptureQueriesContext(connection) as large:
+            mentor = SmartSchedulerEngine.find_available_mentor(None, *slot)
+
+        self.assertEqual(mentor, free_mentors[0])
+        self.assertEqual(len(small), len(large))
+
+
+class BatchSchedulePlannerTest(SchedulerTestMixin, TestCase):
+    """
+    Тесты пакетного планирования назначений
+    """
+
+    def setUp(self):
+        author = self.create_user('author', UserRole.HR)
+        self.program = OnboardingProgram.objects.create(
+            name='Wave Program', author=author)
+        self.intro = OnboardingStep.objects.create(
+            name='Intro', program=self.program, order=1,
+            step_type=OnboardingStep.StepType.TRAINING)
+        self.meeting = OnboardingStep.objects.create(
+            name='Meet mentor', program=self.program, order=2,
+            step_type=OnboardingStep.StepType.MEETING)
+        ScheduleConstraint.objects.create(
+            name='Intro before meeting',
+            dependent_step=self.meeting,
+            prerequisite_step=self.intro
+        )
+        self.mentor_count = 0
+
+    def create_mentors(self, count):
+        for _ in range(count):
+            self.mentor_count += 1
+            mentor = self.create_user(f'mentor{self.mentor_count}', UserRole.MANAGER)
+            self.add_working_hours(mentor, MONDAY)
+            MentorLoad.objects.create(mentor=mentor)
+
+    def create_wave(self, count, offset=0):
+        assignments = []
+        for position in range(offset, offset + count):
+            user = self.create_user(f'hire{position}')
+            self.add_working_hours(user, MONDAY)
+            assignments.append(UserOnboardingAssignment.objects.create(
+                user=user, program=self.program))
+            for step in (self.intro, self.meeting):
+                UserStepProgress.objects.create(
+                    user=user, step=step, planned_date_start=MONDAY)
+        return assignments
+
+    def test_plan_respects_prerequisites_and_mentor_bookings(self):
+        self.create_mentors(2)
+        assignments = self.create_wave(2)
+
+        stats = BatchSchedulePlanner.plan([assignment.id for assignment in assignments])
+
+        self.assertEqual(stats['assignments_planned'], 2)
+        self.assertEqual(stats['steps_scheduled'], 4)
+        self.assertEqual(stats['calendar_events'], 2)
+
+        mentors = set()
+        for assignment in assignments:
+            intro = ScheduledOnboardingStep.objects.get(
+                step_progress__user=assignment.user, step_progress__step=self.intro)
+            meeting = ScheduledOnboardingStep.objects.get(
+                step_progress__user=assignment.user, step_progress__step=self.meeting)
+            self.assertEqual(intro.scheduled_start_time, MONDAY + timedelta(hours=9))
+            self.assertGreaterEqual(
+                meeting.scheduled_start_time, intro.scheduled_end_time)
+            self.assertEqual(
+                UserStepProgress.objects.get(
+                    user=assignment.user, step=self.meeting).planned_date_start,
+                meeting.scheduled_start_time)
+
+            event = CalendarEvent.objects.get(scheduled_step=meeting)
+            participants = set(event.participants.values_list('id', flat=True))
+            self.assertIn(assignment.user.id, participants)
+            mentors |= participants - {assignment.user.id}
+
+        # Один и тот же ментор не назначается на одно время дважды
+        self.assertEqual(len(mentors), 2)
+
+    def test_plan_query_count_does_not_grow_with_wave(self):
+        self.create_mentors(6)
+        small_wave = self.create_wave(2)
+        with CaptureQueriesContext(connection) as small:
+            BatchSchedulePlanner.plan([assignment.id for assignment in small_wave])
+
+        large_wave = self.create_wave(6, offset=2)
+        with CaptureQueriesContext(connection) as large:
+            stats = BatchSchedulePlanner.plan([assignment.id for assignment in large_wave])
+
+        self.assertEqual(stats['steps_scheduled'], 12)
+        self.assertEqual(len(small), len(large))
+
+
+    def test_plan_uses_later_meeting_slots_within_mentor_limits(self):
+        self.create_mentors(1)
+        MentorLoad.objects.update(max_daily_sessions=2)
+        assignments = self.create_wave(3)
+
+        stats = BatchSchedulePlanner.plan([assignment.id for assignment in assignments])
+
+        # Ментор занят первой встречей в начале окна: вторая ставится позже,
+        # третья не помещается в дневной лимит ментора
+        self.assertEqual(stats['steps_scheduled'], 5)
+        meetings = list(ScheduledOnboardingStep.objects.filter(
+            step_progress__step=self.meeting).order_by('scheduled_start_time'))
+        self.assertEqual(
+            [meeting.scheduled_start_time for meeting in meetings],
+            [MONDAY + timedelta(hours=10), MONDAY + timedelta(hours=11)])
+
+
+class ConflictDetectionTest(SchedulerTestMixin, TestCase):
+    """
+    Тесты обнаружения конфликтов в расписании
+    """
+
+    def setUp(self):
+        self.user = self.create_user('employee')
+        author = self.create_user('author', UserRole.HR)
+        self.program = OnboardingProgram.objects.create(
+            name='Conflict Program', author=author)
+
+    def schedule(self, name, start_hour, end_hour):
+        step = OnboardingStep.objects.create(
+            name=name, program=self.program, order=start_hour,
+            step_type=OnboardingStep.StepType.TASK)
+        progress = UserStepProgress.objects.create(user=self.user, step=step)
+        return ScheduledOnboardingStep.objects.create(
+            step_progress=progress,
+            scheduled_start_time=MONDAY + timedelta(hours=start_hour),
+            scheduled_end_time=MONDAY + timedelta(hours=end_hour)
+        )
+
+    def test_find_overlaps_matches_pairwise_comparison(self):
+        rng = random.Random(7)
+        intervals = []
+        for position in range(300):
+            start = rng.randrange(1000)
+            intervals.append((start, start + rng.randrange(50), position))
+        intervals.sort()
+
+        expected = {
+            (first[2], second[2])
+            for i, first in enumerate(intervals)
+            for second in intervals[i + 1:]
+            if first[0] < second[1] and second[0] < first[1]
+        }
+        found = {
+            (payload1, payload2)
+            for payload1, payload2, _, _ in SmartSchedulerEngine.find_overlaps(intervals)
+        }
+
+        self.assertEqual(found, expected)
+
+    def test_detect_step_conflicts(self):
+        first = self.schedule('First', 9, 11)
+        second = self.schedule('Second', 10, 12)
+        self.schedule('Third', 12, 13)
+
+        conflicts = SmartSchedulerEngine.detect_conflicts(
+            start_date=MONDAY, end_date=MONDAY + timedelta(days=1))
+
+        self.assertEqual(len(conflicts), 1)
+        self.assertEqual(conflicts[0]['user_id'], self.user.id)
+        self.assertEqual(len(conflicts[0]['conflicts']), 1)
+        conflict = conflicts[0]['conflicts'][0]
+        self.assertEqual(conflict['step1']['id'], first.id)
+        self.assertEqual(conflict['step2']['id'], second.id)
+        self.assertEqual(conflict['overlap_start'], MONDAY + timedelta(hours=10))
+        self.assertEqual(conflict['overlap_end'], MONDAY + timedelta(hours=11))
+
+    def test_detect_mentor_double_booking(self):
+        mentor = self.create_user('mentor', UserRole.MANAGER)
+        MentorLoad.objects.create(mentor=mentor)
+        self.add_event([mentor, self.user], MONDAY + timedelta(hours=9),
+                       MONDAY + timedelta(hours=10))
+        self.add_event([mentor], MONDAY + timedelta(hours=9, minutes=30),
+                       MONDAY + timedelta(hours=11))
+
+        period = {'start_date': MONDAY, 'end_date': MONDAY + timedelta(days=1)}
+        self.assertEqual(SmartSchedulerEngine.detect_conflicts(**period), [])
+
+        conflicts = SmartSchedulerEngine.detect_conflicts(
+            include_mentors=True, **period)
+
+        self.assertEqual(len(conflicts), 1)
+        self.assertEqual(conflicts[0]['user_id'], mentor.id)
+        self.assertEqual(conflicts[0]['conflict_type'], 'mentor_double_booking')
+        self.assertEqual(
+            conflicts[0]['conflicts'][0]['overlap_start'],
+            MONDAY + timedelta(hours=9, minutes=30))
+
+
+class MentorAssignmentOptimizerTest(SchedulerTestMixin, TestCase):
+    """
+    Тесты глобального распределения встреч между менторами
+    """
+
+    def setUp(self):
+        author = self.create_user('author', UserRole.HR)
+        self.program = OnboardingProgram.objects.create(
+            name='Mentoring Program', author=author)
+        self.meeting = OnboardingStep.objects.create(
+            name='Meet mentor', program=self.program, order=1,
+            step_type=OnboardingStep.StepType.MEETING)
+        self.session_count = 0
+
+    def create_mentor(self, name, **load):
+        mentor = self.create_user(name, UserRole.MANAGER)
+        self.add_working_hours(mentor, MONDAY)
+        MentorLoad.objects.create(mentor=mentor, **load)
+        return mentor
+
+    def create_session(self, start_hour, step=None):
+        self.session_count += 1
+        user = self.create_user(f'hire{self.session_count}')
+        progress = UserStepProgress.objects.create(
+            user=user, step=step or self.meeting)
+        return ScheduledOnboardingStep.objects.create(
+            step_progress=progress,
+            scheduled_start_time=MONDAY + timedelta(hours=start_hour),
+            scheduled_end_time=MONDAY + timedelta(hours=start_hour + 1)
+        )
+
+    def plan(self, **kwargs):
+        return MentorAssignmentOptimizer.plan(
+            MONDAY, MONDAY + timedelta(days=1), **kwargs)
+
+    def test_plan_respects_daily_limit_and_overlaps(self):
+        limited = self.create_mentor('limited', max_daily_sessions=1)
+        regular = self.create_mentor('regular')
+        sessions = [self.create_session(10), self.create_session(10),
+                    self.create_session(13), self.create_session(15)]
+
+        plan = self.plan()
+
+        self.assertEqual(plan['unassigned'], [])
+        mentors = {assignment['scheduled_step_id']: assignment['mentor_id']
+                   for assignment in plan['assignments']}
+        self.assertEqual(set(mentors), {session.id for session in sessions})
+        # Встречи в одно время достаются разным менторам
+        self.assertNotEqual(mentors[sessions[0].id], mentors[sessions[1].id])
+        self.assertEqual(list(mentors.values()).count(limited.id), 1)
+        self.assertEqual(list(mentors.values()).count(regular.id), 3)
+        self.assertFalse(CalendarEvent.objects.exists())
+
+    def test_plan_respects_specializations(self):
+        self.create_mentor('generalist')
+        backend = self.create_mentor('backend', specializations=['backend'])
+        review = OnboardingStep.objects.create(
+            name='Code review', program=self.program, order=2,
+            step_type=OnboardingStep.StepType.MEETING)
+        ScheduleConstraint.objects.create(
+            name='Backend mentor',
+            constraint_type=ScheduleConstraint.ConstraintType.ROLE,
+            dependent_step=review,
+            required_roles=['backend']
+        )
+        session = self.create_session(11, step=review)
+
+        plan = self.plan()
+
+        self.assertEqual(len(plan['assignments']), 1)
+        self.assertEqual(plan['assignments'][0]['scheduled_step_id'], session.id)
+        self.assertEqual(plan['assignments'][0]['mentor_id'], backend.id)
+
+    def test_apply_creates_calendar_events(self):
+        mentor = self.create_mentor('mentor', max_weekly_hours=1)
+        first = self.create_session(10)
+        second = self.create_session(12)
+
+        plan = self.plan(apply=True)
+
+        self.assertTrue(plan['applied'])
+        self.assertEqual(len(plan['assignments']), 1)
+        self.assertEqual(len(plan['unassigned']), 1)
+        event = CalendarEvent.objects.get(scheduled_step=first)
+        self.assertEqual(
+            set(event.participants.values_list('id', flat=True)),
+            {mentor.id, first.step_progress.user_id})
+        self.assertFalse(CalendarEvent.objects.filter(scheduled_step=second).exists())
+        self.assertEqual(
+            MentorLoad.objects.get(mentor=mentor).current_daily_sessions,
+            {MONDAY.date().isoformat(): 1})
+
+        # Повторный запуск не переназначает уже распределенные встречи
+        self.assertEqual(self.plan()['assignments'], [])
@@ -243,10 +243,11 @@ class SchedulerConflictsAPIView(views.APIView):
             user_id = serializer.validated_data.get('user_id')
             start_date = serializer.validated_data.get('start_date')
             end_date = serializer.validated_data.get('end_date')
+            include_mentors = serializer.validated_data.get('include_mentors')
 
             # Обнаруживаем конфликты
             conflicts = SmartSchedulerEngine.detect_conflicts(
-                user_id, start_date, end_date)
+                user_id, start_date, end_date, include_mentors=include_mentors)
 
             return Response({
                 'status': 'success',
@@ -272,8 +273,12 @@ class SmartPrioritizationAPIView(views.APIView):
         if not user_ids:
             user_ids = None
 
+        assign_mentors = request.query_params.get(
+            'assign_mentors', '').lower() in ('1', 'true')
+
         workload_distribution = SmartPrioritizationEngine.optimize_workload_distribution(
-            user_ids=user_ids
+            user_ids=user_ids,
+            assign_mentors=assign_mentors
         )
 
         return Response({
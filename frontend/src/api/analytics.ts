@@ -28,6 +28,13 @@ export interface AssignmentAnalytics {
   assigned_at: string;
 }
 
+// Страница таблицы назначений (переход по курсору в ссылках next/previous)
+export interface AssignmentAnalyticsPage {
+  next: string | null;
+  previous: string | null;
+  results: AssignmentAnalytics[];
+}
+
 export interface FeedbackSummary {
   days: string[];
   great: number[];
@@ -46,9 +53,11 @@ const analyticsApi = {
     return response.data;
   },
 
-  // Получение таблицы назначений
-  getAssignments: async (): Promise<AssignmentAnalytics[]> => {
-    const response = await api.get("analytics/assignments/");
+  // Получение страницы таблицы назначений
+  getAssignments: async (
+    params?: { cursor?: string; page_size?: number }
+  ): Promise<AssignmentAnalyticsPage> => {
+    const response = await api.get("analytics/assignments/", { params });
     return response.data;
   },
 
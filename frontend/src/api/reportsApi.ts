@@ -1,18 +1,52 @@
 // Сервис для экспорта отчетов
 import apiClient from "./apiClient";
 
+// Интервал опроса состояния фоновой выгрузки (мс)
+const EXPORT_POLL_INTERVAL = 3000;
+// Максимальное число опросов (10 минут), после которого ожидание прекращается
+const EXPORT_MAX_POLLS = 200;
+
+// Состояние фоновой выгрузки отчета
+interface ReportExportState {
+  id: number;
+  status: "pending" | "running" | "done" | "failed";
+  error: string;
+  download_url: string | null;
+}
+
 // Класс для работы с экспортом отчетов
 class ReportsApi {
   constructor() {
     // Используем напрямую apiClient
   }
 
-  // Получение PDF отчета по назначениям программ
+  // Получение PDF отчета по назначениям программ.
+  // Отчет формируется на сервере в фоне: запускаем выгрузку, ждем ее
+  // готовности и скачиваем файл
   async getAssignmentsPdfReport(): Promise<Blob> {
-    const url = `/reports/assignments/pdf/`;
-    const response = await apiClient.get(url, {
-      responseType: "blob",
-    });
+    const { data } = await apiClient.post(`/reports/assignments/pdf/`);
+    let exportState: ReportExportState = data;
+
+    let polls = 0;
+
+    while (exportState.status === "pending" || exportState.status === "running") {
+      if (polls >= EXPORT_MAX_POLLS) {
+        throw new Error("Превышено время ожидания формирования отчета");
+      }
+      polls += 1;
+      await new Promise((resolve) => setTimeout(resolve, EXPORT_POLL_INTERVAL));
+      const response = await apiClient.get(`/reports/exports/${exportState.id}/`);
+      exportState = response.data;
+    }
+
+    if (exportState.status !== "done") {
+      throw new Error(exportState.error || "Не удалось сформировать отчет");
+    }
+
+    const response = await apiClient.get(
+      `/reports/exports/${exportState.id}/download/`,
+      { responseType: "blob" }
+    );
     return response.data;
   }
 
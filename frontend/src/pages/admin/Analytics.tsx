@@ -73,7 +73,7 @@ const Analytics: FC = () => {
       try {
         setLoadingAssignments(true);
         const data = await analyticsApi.getAssignments();
-        setAssignmentsData(data);
+        setAssignmentsData(data.results);
       } catch (error) {
         toast({
           title: "Ошибка загрузки данных",
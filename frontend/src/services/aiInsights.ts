@@ -12,6 +12,7 @@ import {
   RecommendationStats,
   RecommendationActionRequest,
   GenerateRecommendationsRequest,
+  AggregationStatus,
 } from "../types/aiInsights";
 import { PaginatedResponse } from "../types/api";
 
@@ -88,12 +89,18 @@ export const SmartInsightsService = {
     return response.data;
   },
 
-  // Запуск агрегации инсайтов
-  async aggregateInsights(): Promise<{ message: string }> {
+  // Постановка агрегации инсайтов в очередь (выполняется в фоне)
+  async aggregateInsights(): Promise<AggregationStatus> {
     const response = await api.post(`${AI_URL}/insights/aggregate/`);
     return response.data;
   },
 
+  // Состояние фоновой агрегации инсайтов
+  async getAggregationStatus(): Promise<AggregationStatus> {
+    const response = await api.get(`${AI_URL}/insights/aggregate/`);
+    return response.data;
+  },
+
   // Получение тегов инсайтов
   async getTags(category?: string): Promise<InsightTag[]> {
     const params = category ? { category } : {};
@@ -187,6 +187,20 @@ export interface RecommendationFilters {
   show_all?: boolean;
 }
 
+// Состояние фоновой агрегации инсайтов
+export interface AggregationStatus {
+  job: string;
+  state: "running" | "queued" | "scheduled" | "disabled";
+  next_run_at: string;
+  last_run: {
+    id: number;
+    status: "running" | "succeeded" | "failed" | "abandoned";
+    started_at: string;
+    finished_at: string | null;
+  } | null;
+  message?: string;
+}
+
 // Интерфейс для статистики инсайтов
 export interface InsightStats {
   total: number;